@@ -1,32 +1,525 @@
 """
 This file contains the API endpoints for the todo list application.
-"""
 
-from typing import Any, Dict, List, Optional, Tuple
+The API uses the following environment variables:
+
+- SHUTDOWN_DRAIN_DELAY (float): Seconds a worker keeps serving after SIGTERM while GET /health/ready answers 503, so
+  that the load balancer stops sending it requests before the server stops accepting connections. Defaults to 5.
+"""
 
-import bcrypt
-from app.auth.auth import decode_jwt, encode_jwt, get_email_from_token
-from app.config.db import get_db
-from fastapi import Depends, FastAPI, HTTPException
+import asyncio
+import base64
+import hashlib
+import logging
+import math
+import os
+import re
+import signal
+import threading
+import time
+from contextlib import aclosing, asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import (Any, AsyncIterator, Dict, Iterable, List, Optional,
+                    Sequence, Tuple)
+
+from app.auth.auth import (decode_jwt, encode_jwt, get_email_from_token,
+                           token_cache)
+from app.auth.hashing import get_hasher
+from app.cache.cache import todo_cache, todo_stats_cache, user_id_cache
+from app.config import db as database
+from app.config.db import (LAST_WRITE_HEADER, AsyncConnection,
+                           ReadYourWritesMiddleware, connect, get_pool,
+                           get_replicas, monitor_replicas)
+from app.events.events import broker, stream
+from app.metrics.metrics import MetricsMiddleware, registry
+from app.models.models import (Credentials, EmailUpdate, Status, Todo,
+                               TodoCreate, TodoUpdate, User, UserCreate,
+                               UserProfile)
+from app.models.serialization import (ClosingStreamingResponse,
+                                      FastJSONResponse, dumps, row_to_dict,
+                                      rows_to_dicts)
+from app.purge import purge
+from app.ratelimit.ratelimit import admission
+from app.scheduler.scheduler import ReminderScheduler
+from app.sync.sync import (TODO_CHANGE_SLOTS, CursorExpiredError,
+                           change_slot, compact_periodically,
+                           count_todo_changes, fetch_changes)
+from fastapi import (Depends, FastAPI, Header, HTTPException, Query, Request,
+                     Response)
 from fastapi.middleware.cors import CORSMiddleware
-from mysql.connector.connection import MySQLConnection
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from mysql.connector import errorcode
 from mysql.connector.cursor import MySQLCursor
-from mysql.connector.pooling import PooledMySQLConnection
+from mysql.connector.errors import IntegrityError
 from validate_email import validate_email
 
-app = FastAPI()
+HEALTH_CHECK_TIMEOUT = 2.0
+SHUTDOWN_DRAIN_DELAY: float = float(
+    os.getenv(key="SHUTDOWN_DRAIN_DELAY", default="5"))
+
+logger: logging.Logger = logging.getLogger(name="app")
+
+
+def _drain_on_sigterm(app: FastAPI) -> None:
+    """
+    Marks the worker as draining as soon as it receives SIGTERM, and hands the signal to the server, which stops
+    accepting connections, SHUTDOWN_DRAIN_DELAY seconds later.
+
+    The lifespan shutdown only runs once the server has stopped accepting connections, too late for the readiness
+    probe to report the drain. A second SIGTERM is handed to the server at once.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+    previous: Any = signal.getsignal(signal.SIGTERM)
+    if not callable(previous):
+        return
+    loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+
+    def handle(sig: int, frame: Any) -> None:
+        if app.state.draining:
+            previous(sig, frame)
+            return
+        app.state.draining = True
+        logger.info("draining for %.1f seconds before shutting down", SHUTDOWN_DRAIN_DELAY)
+        loop.call_soon_threadsafe(loop.call_later, SHUTDOWN_DRAIN_DELAY, previous, sig, None)
+
+    signal.signal(signal.SIGTERM, handle)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """
+    Opens the first pooled connections when a worker starts, and releases every resource once it has drained.
+
+    The database being unreachable does not prevent the worker from starting: it reports itself as not ready until
+    the database answers. On SIGTERM, the worker reports itself as draining for SHUTDOWN_DRAIN_DELAY seconds; the
+    server then stops accepting connections and waits for the requests in flight before this resumes.
+    """
+    app.state.draining = False
+    _drain_on_sigterm(app=app)
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, get_pool().warm, database.POOL_WARMUP)
+    except Exception as e:
+        logger.warning("could not open the database connections at startup: %s", e)
+    if (replicas := get_replicas()) is not None:
+        await asyncio.get_running_loop().run_in_executor(None, replicas.warm, database.POOL_WARMUP)
+    compaction: asyncio.Task[None] = asyncio.create_task(compact_periodically())
+    reminders: asyncio.Task[None] = asyncio.create_task(scheduler.run())
+    replica_checks: asyncio.Task[None] = asyncio.create_task(monitor_replicas())
+    purges: asyncio.Task[None] = asyncio.create_task(purge.purge_periodically())
+    yield
+    app.state.draining = True
+    tasks: List[asyncio.Task[None]] = [compaction, reminders, replica_checks, purges]
+    for task in tasks:
+        task.cancel()
+    # The tasks may be waiting on a database call or a password hash, which must end before the pools close.
+    await asyncio.gather(*tasks, return_exceptions=True)
+    database.close()
+    get_hasher().shutdown()
+
+
+app = FastAPI(default_response_class=FastJSONResponse, lifespan=lifespan)
 
 ORIGINS: list[str] = ["http://localhost:3000", "localhost:3000"]
 
+TODO_COLUMNS: Tuple[str, ...] = (
+    "id", "title", "description", "created_at", "due_time", "status", "user_id")
+TODO_STATUSES: Tuple[str, ...] = tuple(status.value for status in Status)
+USER_COLUMNS: Tuple[str, ...] = (
+    "id", "email", "password", "name", "firstname", "created_at")
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+EXPORT_BATCH_SIZE = 1000
+MAX_BATCH_SIZE = 1000
+scheduler: ReminderScheduler = ReminderScheduler(columns=TODO_COLUMNS)
+SEARCH_MAX_TERMS = 16
+SEARCH_WORD: re.Pattern[str] = re.compile(r"\w+")
+EXPORT_MEDIA_TYPES: Dict[str, str] = {
+    "ndjson": "application/x-ndjson", "json": "application/json"}
+
 app.add_middleware(
     middleware_class=CORSMiddleware,
     allow_origins=ORIGINS,
     allow_credentials=True,
     allow_methods=["DELETE", "POST", "GET", "PUT"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Last-Modified", LAST_WRITE_HEADER],
 )
+app.add_middleware(middleware_class=ReadYourWritesMiddleware)
+app.add_middleware(middleware_class=MetricsMiddleware)
+
+
+async def get_read_connection(claims: Dict[str, Any] = Depends(dependency=decode_jwt)) -> AsyncIterator[AsyncConnection]:
+    """
+    FastAPI dependency checking a connection out for a handler which only reads.
+
+    The connection comes from a read replica when replicas are configured, unless the user committed a write within
+    the read-your-writes window, see app.config.db.ReadYourWritesMiddleware.
+
+    Args:
+        claims (Dict[str, Any]): The decoded payload of the JWT token, checked before the connection is taken.
+
+    Yields:
+        AsyncConnection: A connection reserved for the current request.
+    """
+    async with connect(read_only=True) as db:
+        yield db
+
+
+async def get_write_connection(claims: Dict[str, Any] = Depends(dependency=decode_jwt)) -> AsyncIterator[AsyncConnection]:
+    """
+    FastAPI dependency checking a connection to the primary out for a handler which writes.
+
+    Committing sends the reads of the client to the primary for the read-your-writes window.
+
+    Args:
+        claims (Dict[str, Any]): The decoded payload of the JWT token, checked before the connection is taken.
+
+    Yields:
+        AsyncConnection: A connection reserved for the current request.
+    """
+    async with connect() as db:
+        yield db
+
+
+def _encode_cursor(value: int | str) -> str:
+    return base64.urlsafe_b64encode(str(value).encode(encoding="utf-8")).decode(encoding="ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> int:
+    try:
+        padded: str = cursor + "=" * (-len(cursor) % 4)
+        return int(base64.urlsafe_b64decode(padded.encode(encoding="ascii")))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail="Bad parameter") from e
+
+
+def _encode_search_cursor(score: float, todo_id: int) -> str:
+    # repr gives the shortest text which reads back as the same float, so the cursor compares equal to the score.
+    return _encode_cursor(value=f"{score!r}:{todo_id}")
+
+
+def _decode_search_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        padded: str = cursor + "=" * (-len(cursor) % 4)
+        score, _, todo_id = base64.urlsafe_b64decode(padded.encode(encoding="ascii")).decode(
+            encoding="utf-8").partition(":")
+        position: Tuple[float, int] = float(score), int(todo_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail="Bad parameter") from e
+    if not math.isfinite(position[0]):
+        raise HTTPException(status_code=400, detail="Bad parameter")
+    return position
+
+
+def _parse_fields(fields: Optional[str]) -> Tuple[str, ...]:
+    if fields is None:
+        return TODO_COLUMNS
+    selected: Tuple[str, ...] = tuple(
+        dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+    if not selected or any(field not in TODO_COLUMNS for field in selected):
+        raise HTTPException(status_code=400, detail="Bad parameter")
+    return selected
+
+
+async def _count_todos(db: AsyncConnection, conditions: List[str], params: List[Any]) -> Dict[str, Any]:
+    """
+    Counts the todos by status, and the open ones by due window, with one GROUP BY status.
+
+    The counts read the status and due_time columns only, which a (status, due_time) index covers, and a handful of
+    rows leave the database whatever the number of todos. The due windows do not overlap: overdue is before now,
+    due_24h within the next 24 hours, due_7d after that and within 7 days, and due_later after that.
+
+    Returns:
+        Dict[str, Any]: The total, open and done counts, the count of each status, the count of the open todos in
+        each due window, and the UTC time the windows start from.
+    """
+    now: datetime = datetime.now(tz=timezone.utc).replace(tzinfo=None)
+    day: datetime = now + timedelta(days=1)
+    week: datetime = now + timedelta(days=7)
+    query: str = ("SELECT status, COUNT(*), SUM(due_time < %s), SUM(due_time >= %s AND due_time < %s), "
+                  "SUM(due_time >= %s AND due_time < %s) FROM todo")
+    if conditions:
+        query += f" WHERE {' AND '.join(conditions)}"
+    query += " GROUP BY status"
+    rows: List[Tuple[Any, ...]] = await db.fetch_all(query, (now, now, day, day, week, *params))
+    statuses: Dict[str, int] = {status: 0 for status in TODO_STATUSES}
+    due: Dict[str, int] = {"overdue": 0, "due_24h": 0, "due_7d": 0, "due_later": 0}
+    for status, total, overdue, due_24h, due_7d in rows:
+        statuses[status] = int(total)
+        if status != Status.DONE.value:
+            due["overdue"] += int(overdue)
+            due["due_24h"] += int(due_24h)
+            due["due_7d"] += int(due_7d)
+            due["due_later"] += int(total) - int(overdue) - int(due_24h) - int(due_7d)
+    total_count: int = sum(statuses.values())
+    return {
+        "total": total_count,
+        "open": total_count - statuses[Status.DONE.value],
+        "done": statuses[Status.DONE.value],
+        "statuses": statuses,
+        "due": due,
+        "computed_at": now,
+    }
+
+
+def _search_terms(q: str) -> str:
+    # Every word is required and matched as a prefix. Only words are kept, so the search cannot inject operators of
+    # the boolean mode, and a word shorter than the minimum indexed length still matches the longer words it starts.
+    words: List[str] = SEARCH_WORD.findall(q)[:SEARCH_MAX_TERMS]
+    if not words:
+        raise HTTPException(status_code=400, detail="Bad parameter")
+    return " ".join(f"+{word}*" for word in words)
+
+
+async def _fetch_todo_page(
+    db: AsyncConnection,
+    conditions: List[str],
+    params: List[Any],
+    limit: int,
+    after: Optional[str],
+    status: Optional[str],
+    due_after: Optional[datetime],
+    due_before: Optional[datetime],
+    created_after: Optional[datetime],
+    created_before: Optional[datetime],
+    fields: Optional[str],
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Fetches one page of todos with keyset pagination on the todo id.
+
+    One more row than requested is fetched to know whether a next page exists, in which case its cursor is returned
+    along with the todos.
+    """
+    selected: Tuple[str, ...] = _parse_fields(fields=fields)
+    if status is not None and status not in TODO_STATUSES:
+        raise HTTPException(status_code=400, detail="Bad parameter")
+    filters: List[Tuple[str, Any]] = [
+        ("id > %s", None if after is None else _decode_cursor(cursor=after)),
+        ("status = %s", status),
+        ("due_time >= %s", due_after),
+        ("due_time < %s", due_before),
+        ("created_at >= %s", created_after),
+        ("created_at < %s", created_before),
+    ]
+    for condition, value in filters:
+        if value is not None:
+            conditions = [*conditions, condition]
+            params = [*params, value]
+    columns: Tuple[str, ...] = selected if "id" in selected else ("id", *selected)
+    query: str = f"SELECT {', '.join(columns)} FROM todo"
+    if conditions:
+        query += f" WHERE {' AND '.join(conditions)}"
+    query += " ORDER BY id LIMIT %s"
+    result: List[Tuple[Any, ...]] = await db.fetch_all(query, (*params, limit + 1))
+    next_cursor: Optional[str] = None
+    if len(result) > limit:
+        result = result[:limit]
+        next_cursor = _encode_cursor(value=result[-1][0])
+    if columns != selected:
+        result = [todo[1:] for todo in result]
+    return rows_to_dicts(columns=selected, rows=result), next_cursor
+
+
+def _todo_page_response(
+    todos: List[Dict[str, Any]], next_cursor: Optional[str], validators: Dict[str, str]
+) -> FastJSONResponse:
+    headers: Dict[str, str] = dict(validators)
+    if next_cursor is not None:
+        headers["X-Next-Cursor"] = next_cursor
+    return FastJSONResponse(content=todos, headers=headers)
+
+
+def _etag(*parts: Any) -> str:
+    return '"' + hashlib.blake2b(repr(parts).encode(encoding="utf-8"), digest_size=12).hexdigest() + '"'
+
+
+def _validators(etag: str, last_modified: Optional[datetime] = None, now: Optional[datetime] = None) -> Dict[str, str]:
+    """
+    Returns the ETag, Last-Modified and Cache-Control headers of a response the client has to revalidate.
+
+    Last-Modified only has a one second resolution. It is left out until a second has passed since the last change,
+    so that a change made later in the same second cannot be mistaken for no change.
+    """
+    headers: Dict[str, str] = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if last_modified is not None and now is not None and now - last_modified >= timedelta(seconds=1):
+        headers["Last-Modified"] = format_datetime(
+            dt=last_modified.replace(microsecond=0, tzinfo=timezone.utc), usegmt=True)
+    return headers
+
+
+def _not_modified(validators: Dict[str, str], if_none_match: Optional[str], if_modified_since: Optional[str]) -> bool:
+    """
+    Returns whether the copy the client already has is current, from its If-None-Match or If-Modified-Since header.
+
+    If-Modified-Since is ignored when If-None-Match is present, as RFC 9110 requires.
+    """
+    if if_none_match is not None:
+        tags: set[str] = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or validators["ETag"] in tags
+    if if_modified_since is None or "Last-Modified" not in validators:
+        return False
+    try:
+        since: datetime = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return parsedate_to_datetime(validators["Last-Modified"]) <= since
+
+
+async def _touch_todos(db: AsyncConnection, user_ids: Iterable[int],
+                       current: Optional[Dict[int, int]] = None) -> Dict[int, int]:
+    """
+    Increases the todos version of the users whose todos change, and the todo_change counter of the first of them,
+    in the transaction of the change.
+
+    The written todos, and the deleted ones before their tombstones are copied from them, are stamped with the
+    returned versions. The user row stays locked until the commit, so the versions of a user's changes are committed
+    in order. The user rows are locked before the todo rows in create_todo, so that two concurrent creations do not
+    deadlock upgrading the shared locks of their foreign key checks. The counter is joined last, so it is locked
+    after the users. The single todo updates and deletions version themselves, see _stamp_todo.
+
+    A single user's new version is read back from the UPDATE itself, through LAST_INSERT_ID(expr), which the server
+    reports as the last row id of the statement, so create_todo does not pay a round trip for it. The batch
+    writes read the current versions in the query locking their rows instead, and pass them as `current`: both the
+    version and its timestamp are then bumped by the one UPDATE, with no statement chained after it.
+
+    Returns:
+        Dict[int, int]: The new todos version of each user.
+    """
+    ids: List[int] = sorted(set(user_ids))
+    if not ids:
+        return {}
+    slot: int = change_slot(user_id=ids[0])
+    if len(ids) == 1 and current is None:
+        query = ("UPDATE user STRAIGHT_JOIN todo_change ON todo_change.slot = %s "
+                 "SET user.todos_version = LAST_INSERT_ID(user.todos_version + 1), "
+                 "user.todos_updated_at = UTC_TIMESTAMP(6), todo_change.changes = todo_change.changes + 1 "
+                 "WHERE user.id = %s")
+        cursor: MySQLCursor = await db.execute(query, (slot, ids[0]))
+        return {ids[0]: cursor.lastrowid} if cursor.rowcount else {}
+    query = ("UPDATE user STRAIGHT_JOIN todo_change ON todo_change.slot = %s "
+             "SET user.todos_version = user.todos_version + 1, user.todos_updated_at = UTC_TIMESTAMP(6), "
+             f"todo_change.changes = todo_change.changes + 1 WHERE user.id IN ({_placeholders(count=len(ids))})")
+    await db.execute(query, (slot, *ids))
+    if current is not None:
+        return {user_id: current[user_id] + 1 for user_id in ids if user_id in current}
+    query = f"SELECT id, todos_version FROM user WHERE id IN ({_placeholders(count=len(ids))})"
+    return {row[0]: row[1] for row in await db.fetch_all(query, ids)}
+
+
+async def _stamp_todo(db: AsyncConnection, todo_id: str, assignments: Sequence[str] = (),
+                      values: Sequence[Any] = ()) -> Optional[int]:
+    """
+    Writes a todo and stamps it with the next todos version of its owner, increasing it with the todo_change counter
+    of the owner, in a single statement.
+
+    The todo is joined first, so its version is computed from the owner's todos version before it is increased:
+    MySQL reads every joined row before it updates the later tables. The todo, its owner and the counter are locked
+    in that order, like the batch writes lock them. The owner is read back from the UPDATE itself, through
+    LAST_INSERT_ID(expr), so neither a lookup of the owner nor one of the new version is sent.
+
+    Args:
+        todo_id (str): The id of the todo.
+        assignments (Sequence[str]): The `todo.column = %s` assignments of the written columns, if any.
+        values (Sequence[Any]): The values of the assignments.
+
+    Returns:
+        Optional[int]: The id of the owner, or None if the todo does not exist.
+    """
+    query = ("UPDATE todo STRAIGHT_JOIN user ON user.id = todo.user_id "
+             "STRAIGHT_JOIN todo_change ON todo_change.slot = MOD(user.id, %s) "
+             f"SET {''.join(f'{assignment}, ' for assignment in assignments)}"
+             "todo.version = user.todos_version + 1, todo.user_id = LAST_INSERT_ID(todo.user_id), "
+             "user.todos_version = user.todos_version + 1, user.todos_updated_at = UTC_TIMESTAMP(6), "
+             "todo_change.changes = todo_change.changes + 1 WHERE todo.id = %s")
+    cursor: MySQLCursor = await db.execute(query, (TODO_CHANGE_SLOTS, *values, todo_id))
+    return cursor.lastrowid if cursor.rowcount else None
+
+
+async def _iter_todo_export(
+    export_format: str, selected: Tuple[str, ...]
+) -> AsyncIterator[bytes]:
+    """
+    Streams every todo as NDJSON lines or as the items of a JSON array, one fetched batch per chunk.
+
+    The connection is checked out by the generator itself so that it is held exactly as long as the response body
+    is being sent, from a replica when one is configured.
+    """
+    query = f"SELECT {', '.join(selected)} FROM todo ORDER BY id"
+    separator: bytes = b"\n" if export_format == "ndjson" else b","
+    first: bool = True
+    if export_format == "json":
+        yield b"["
+    # The stream is closed as soon as the export stops, so that it marks its unread connection as broken before the
+    # connection is given back.
+    async with connect(read_only=True) as db, aclosing(
+            db.stream(query, batch_size=EXPORT_BATCH_SIZE)) as batches:
+        async for rows in batches:
+            chunk: bytes = separator.join(dumps(content=dict(zip(selected, todo))) for todo in rows)
+            if export_format == "ndjson":
+                yield chunk + separator
+            else:
+                yield chunk if first else separator + chunk
+            first = False
+    if export_format == "json":
+        yield b"]"
+
+
+def _placeholders(count: int) -> str:
+    return ", ".join(["%s"] * count)
+
+
+def _check_batch_item(item: Any, required: Tuple[str, ...]) -> Optional[str]:
+    """
+    Validates one item of a batch request, so that a single bad item cannot make the whole statement fail.
+
+    Returns:
+        Optional[str]: The reason why the item is rejected, or None if it is valid.
+    """
+    if not isinstance(item, dict):
+        return "Bad parameter"
+    missing: List[str] = [key for key in required if item.get(key) is None]
+    if missing:
+        return f"Missing fields: {', '.join(missing)}"
+    for key in ("id", "user_id"):
+        if key in required:
+            try:
+                int(item[key])
+            except (TypeError, ValueError):
+                return "Bad parameter"
+    if item["status"] not in TODO_STATUSES:
+        return "Invalid status"
+    try:
+        datetime.fromisoformat(str(item["due_time"]))
+    except ValueError:
+        return "Invalid due_time"
+    return None
+
+
+def _check_batch_size(items: List[Any]) -> None:
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413, detail=f"At most {MAX_BATCH_SIZE} items per batch")
+
+
+async def _execute_unique_email(db: AsyncConnection, query: str, values: Sequence[Any], detail: str) -> MySQLCursor:
+    """
+    Executes a statement writing user.email, turning a violation of its unique index into a 409.
+    """
+    try:
+        return await db.execute(query, values)
+    except IntegrityError as e:
+        if e.errno == errorcode.ER_DUP_ENTRY:
+            raise HTTPException(status_code=409, detail=detail) from e
+        raise
+
 
-db: PooledMySQLConnection | MySQLConnection | Any = get_db()
+def _batch_report(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    succeeded: int = sum(1 for result in results if result["status"] < 400)
+    return {"succeeded": succeeded, "failed": len(results) - succeeded, "results": results}
 
 
 @app.get(path="/", tags=["root"])
@@ -40,113 +533,410 @@ async def read_root() -> Dict[str, str]:
     return {"message": "Welcome to your todo list."}
 
 
-@app.get(path="/todos", tags=["todos"], status_code=200, dependencies=[Depends(dependency=decode_jwt)])
-async def view_all_todos() -> List[Dict[str, str]]:
+@app.get(path="/stats", tags=["monitoring"], status_code=200)
+async def view_stats() -> Dict[str, Dict[str, int | float]]:
     """
-    View all the todos
+    View runtime metrics of the backend.
 
     Returns:
-        List[Dict[str, str]]: A list of dictionaries containing the todos.
+        Dict[str, Dict[str, int | float]]: A dictionary of metrics grouped by component, with the routing and each
+        read replica when replicas are configured.
     """
-    cursor: MySQLCursor = db.cursor()
-    query = "SELECT * FROM todo"
-    cursor.execute(query)
-    result: Any | Tuple[str] | None = cursor.fetchall()
-    if result is None:
-        raise HTTPException(status_code=404, detail="Not Found")
-    todos: list[Dict[str, str]] = [
-        {
-            "id": str(object=todo[0]),
-            "title": str(object=todo[1]),
-            "description": str(object=todo[2]),
-            "created_at": str(object=todo[3]),
-            "due_time": str(object=todo[4]),
-            "status": str(object=todo[5]),
-            "user_id": str(object=todo[6]),
-        }
-        for todo in result
-    ]
-    return todos
+    return {
+        "pool": get_pool().stats(),
+        "password_hasher": get_hasher().stats(),
+        "admission": admission.stats(),
+        "token_cache": token_cache.stats(),
+        "todo_cache": todo_cache.stats(),
+        "user_id_cache": user_id_cache.stats(),
+        "events": broker.stats(),
+        "reminders": scheduler.stats(),
+        **(replicas.stats() if (replicas := get_replicas()) is not None else {}),
+    }
+
+
+@app.get(path="/health/live", tags=["monitoring"], status_code=200)
+async def check_liveness() -> Dict[str, str]:
+    """
+    Liveness probe: answers as long as the event loop of the worker is running.
+
+    Returns:
+        Dict[str, str]: The status of the worker.
+    """
+    return {"status": "ok"}
+
+
+@app.get(path="/health/ready", tags=["monitoring"], status_code=200)
+async def check_readiness() -> FastJSONResponse:
+    """
+    Readiness probe: answers 200 only when the worker is not shutting down and the database is reachable.
+
+    Returns:
+        FastJSONResponse: The status of the worker, with a 503 status code when it should not receive traffic.
+    """
+    if getattr(app.state, "draining", False):
+        return FastJSONResponse(content={"status": "draining"}, status_code=503)
+    if not await database.ping(timeout=HEALTH_CHECK_TIMEOUT):
+        return FastJSONResponse(content={"status": "unavailable"}, status_code=503)
+    return FastJSONResponse(content={"status": "ready"})
+
+
+@app.get(path="/metrics", tags=["monitoring"], status_code=200, response_class=PlainTextResponse)
+async def view_metrics() -> PlainTextResponse:
+    """
+    View the request, database, bcrypt and JWT metrics in the Prometheus text format.
+
+    Returns:
+        PlainTextResponse: The metrics, to be scraped by Prometheus.
+    """
+    return PlainTextResponse(content=registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get(path="/todos", tags=["todos"], status_code=200, response_model=List[Todo],
+         dependencies=[Depends(dependency=decode_jwt)])
+async def view_all_todos(
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    status: Optional[str] = None,
+    due_after: Optional[datetime] = None,
+    due_before: Optional[datetime] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(default=None),
+    if_modified_since: Optional[str] = Header(default=None),
+    db: AsyncConnection = Depends(dependency=get_read_connection),
+) -> Response:
+    """
+    View all the todos, one page at a time
+
+    The todos are sorted by id. When more todos are available, the cursor of the next page is returned in the
+    X-Next-Cursor header and can be passed back as `after`. The page is only read when the number of committed
+    writes to any todo shows that the copy of the client, given by If-None-Match, is not current. No Last-Modified
+    date is sent: a write is stamped when its statement runs, and may be committed after a later stamp was served.
+
+    Args:
+        limit (int): The maximum number of todos to return.
+        after (Optional[str]): The cursor returned with the previous page.
+        status (Optional[str]): Only return the todos with this status.
+        due_after (Optional[datetime]): Only return the todos due at or after this time.
+        due_before (Optional[datetime]): Only return the todos due before this time.
+        created_after (Optional[datetime]): Only return the todos created at or after this time.
+        created_before (Optional[datetime]): Only return the todos created before this time.
+        fields (Optional[str]): A comma separated list of the columns to return. Defaults to every column.
+        if_none_match (Optional[str]): The ETags of the copies the client has.
+        if_modified_since (Optional[str]): Ignored, as no Last-Modified date is sent.
+
+    Returns:
+        Response: The todos, or an empty 304 response if the copy of the client is current.
+    """
+    changes: int = await count_todo_changes(db=db)
+    variant: Tuple[Any, ...] = (
+        limit, after, status, due_after, due_before, created_after, created_before, fields)
+    validators: Dict[str, str] = _validators(etag=_etag("todos", changes, variant))
+    if _not_modified(validators=validators, if_none_match=if_none_match, if_modified_since=if_modified_since):
+        return Response(status_code=304, headers=validators)
+    todos, next_cursor = await _fetch_todo_page(
+        db=db, conditions=[], params=[], limit=limit, after=after, status=status, due_after=due_after,
+        due_before=due_before, created_after=created_after, created_before=created_before, fields=fields)
+    return _todo_page_response(todos=todos, next_cursor=next_cursor, validators=validators)
+
+
+@app.get(path="/todos/export", tags=["todos"], status_code=200, dependencies=[Depends(dependency=decode_jwt)])
+async def export_todos(
+    format: str = "ndjson",
+    fields: Optional[str] = None,
+    claims: Dict[str, Any] = Depends(dependency=decode_jwt),
+) -> StreamingResponse:
+    """
+    Export all the todos as a stream
+
+    The todos are read from an unbuffered cursor in batches and written to the response as they arrive, so memory
+    use does not grow with the number of todos.
+
+    Args:
+        format (str): "ndjson" for one JSON object per line, or "json" for a single JSON array.
+        fields (Optional[str]): A comma separated list of the columns to export. Defaults to every column.
+        claims (Dict[str, Any]): The decoded payload of the JWT token.
+
+    Raises:
+        HTTPException: If the format or the fields are not valid.
+
+    Returns:
+        StreamingResponse: The streamed todos.
+    """
+    if format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="Bad parameter")
+    selected: Tuple[str, ...] = _parse_fields(fields=fields)
+    return ClosingStreamingResponse(
+        content=_iter_todo_export(export_format=format, selected=selected),
+        media_type=EXPORT_MEDIA_TYPES[format])
+
+
+@app.get(path="/todos/stats", tags=["todos"], status_code=200, dependencies=[Depends(dependency=decode_jwt)])
+async def view_todo_stats(db: AsyncConnection = Depends(dependency=get_read_connection)) -> FastJSONResponse:
+    """
+    Count all the todos by status and due window
+
+    The counts are cached until a todo changes, read from the number of committed writes to any todo, and for at
+    most TODO_CACHE_TTL seconds, which bounds how far the due windows lag behind the clock.
+
+    Returns:
+        FastJSONResponse: The total, open and done counts, the count of each status, the count of the open todos
+        due in each window under "due", and the UTC time the windows start from.
+    """
+    changes: int = await count_todo_changes(db=db)
+    stats: Optional[Dict[str, Any]] = todo_stats_cache.get(key=changes)
+    if stats is None:
+        stats = await _count_todos(db=db, conditions=[], params=[])
+        todo_stats_cache.put(key=changes, value=stats)
+    return FastJSONResponse(content=stats)
 
 
 @app.post(path="/todos", tags=["todos"], status_code=201, dependencies=[Depends(dependency=decode_jwt)])
-async def create_todo(todo: Dict[str, str]) -> Dict[str, str]:
+async def create_todo(todo: TodoCreate, db: AsyncConnection = Depends(dependency=get_write_connection)) -> Todo:
     """
     Creates a todo
 
     Args:
-        todo (Dict[str, str]): A dictionary containing the information for the new todo.
+        todo (TodoCreate): The information for the new todo.
+
+    Raises:
+        HTTPException: If the user does not exist or was deleted.
 
     Returns:
-        Dict[str, str]: A dictionary containing the information for the newly created todo.
-    """
-    cursor: MySQLCursor = db.cursor()
-    query = "INSERT INTO todo (title, description, due_time, status, user_id) VALUES (%s, %s, %s, %s, %s)"
-    values: Tuple[str, str, str, str, str] = (
-        todo["title"], todo["description"], todo["due_time"], todo["status"], todo["user_id"])
-    cursor.execute(query, values)
-    db.commit()
+        Todo: The newly created todo.
+    """
+    versions: Dict[int, int] = await _touch_todos(db=db, user_ids=[todo.user_id])
+    # The todos of a deleted user are being purged, so none is added; the user row locked above orders the two.
+    query = ("INSERT INTO todo (title, description, due_time, status, user_id, version) "
+             "SELECT %s, %s, %s, %s, %s, %s FROM user WHERE id = %s AND deleted_at IS NULL")
+    values: Tuple[str, str, datetime, str, int, int, int] = (
+        todo.title, todo.description, todo.due_time, todo.status.value, todo.user_id, versions.get(todo.user_id, 0),
+        todo.user_id)
+    cursor: MySQLCursor = await db.execute(query, values)
+    if cursor.rowcount == 0:
+        raise HTTPException(status_code=404, detail="User not found")
+    await db.commit()
+    todo_cache.invalidate(user_id=todo.user_id)
     todo_id: Any | int | None = cursor.lastrowid
-    query = "SELECT * FROM todo WHERE id = %s"
-    cursor.execute(query, (todo_id,))
-    result: Any | Tuple[str] | None = cursor.fetchone()
+    query = f"SELECT {', '.join(TODO_COLUMNS)} FROM todo WHERE id = %s"
+    result: Optional[Dict[str, Any]] = row_to_dict(columns=TODO_COLUMNS, row=await db.fetch_one(query, (todo_id,)))
     if result is None:
         raise HTTPException(status_code=404, detail="Not Found")
-    return {
-        "id": str(object=result[0]),
-        "title": str(object=result[1]),
-        "description": str(object=result[2]),
-        "created_at": str(object=result[3]),
-        "due_time": str(object=result[4]),
-        "status": str(object=result[5]),
-        "user_id": str(object=result[6]),
-    }
+    broker.publish(user_id=todo.user_id, event={"type": "created", "todo": result})
+    scheduler.schedule(todo_id=result["id"], due_time=result["due_time"], status=result["status"])
+    return Todo.model_validate(obj=result)
+
+
+@app.post(path="/todos/batch", tags=["todos"], status_code=200, dependencies=[Depends(dependency=decode_jwt)])
+async def create_todos(todos: List[Any], db: AsyncConnection = Depends(dependency=get_write_connection)) -> Dict[str, Any]:
+    """
+    Creates several todos in a single transaction
+
+    The valid todos are inserted with one multi-row INSERT. Their ids are consecutive from the first generated id,
+    which MySQL guarantees for a single multi-row statement with the default auto-increment settings.
+
+    Args:
+        todos (List[Any]): A list of dictionaries containing the information for the new todos.
+
+    Raises:
+        HTTPException: If there are too many todos.
+
+    Returns:
+        Dict[str, Any]: The number of created and rejected todos, and one result per todo in request order.
+    """
+    _check_batch_size(items=todos)
+    required: Tuple[str, ...] = ("title", "description", "due_time", "status", "user_id")
+    results: List[Dict[str, Any]] = [{"index": index, "status": 201} for index in range(len(todos))]
+    valid: List[int] = []
+    for index, todo in enumerate(todos):
+        if error := _check_batch_item(item=todo, required=required):
+            results[index] = {"index": index, "status": 400, "detail": error}
+        else:
+            valid.append(index)
+    user_ids: List[int] = list({int(todos[index]["user_id"]) for index in valid})
+    if user_ids:
+        query = (f"SELECT id, todos_version FROM user WHERE id IN ({_placeholders(count=len(user_ids))}) "
+                 "AND deleted_at IS NULL FOR UPDATE")
+        existing: Dict[int, int] = {row[0]: row[1] for row in await db.fetch_all(query, user_ids)}
+        for index in list(valid):
+            if int(todos[index]["user_id"]) not in existing:
+                results[index] = {"index": index, "status": 404, "detail": "User not found"}
+                valid.remove(index)
+    if valid:
+        versions: Dict[int, int] = await _touch_todos(
+            db=db, user_ids=[int(todos[index]["user_id"]) for index in valid], current=existing)
+        query = ("INSERT INTO todo (title, description, due_time, status, user_id, version) "
+                 "VALUES (%s, %s, %s, %s, %s, %s)")
+        cursor: MySQLCursor = await db.executemany(query, [
+            (*(todos[index][key] for key in required), versions[int(todos[index]["user_id"])]) for index in valid])
+        await db.commit()
+        for user_id in {int(todos[index]["user_id"]) for index in valid}:
+            todo_cache.invalidate(user_id=user_id)
+            broker.publish(user_id=user_id, event={"type": "resync"})
+        first_id: Any | int | None = cursor.lastrowid
+        for offset, index in enumerate(valid):
+            results[index]["id"] = first_id + offset
+            scheduler.schedule(todo_id=first_id + offset, due_time=datetime.fromisoformat(
+                str(todos[index]["due_time"])), status=todos[index]["status"])
+    return _batch_report(results=results)
+
+
+@app.put(path="/todos/batch", tags=["todos"], status_code=200, dependencies=[Depends(dependency=decode_jwt)])
+async def update_todos(todos: List[Any], db: AsyncConnection = Depends(dependency=get_write_connection)) -> Dict[str, Any]:
+    """
+    Updates several todos in a single transaction
+
+    The existing todos are locked, then updated with one UPDATE statement using a CASE expression per column.
+
+    Args:
+        todos (List[Any]): A list of dictionaries containing the id and the updated information of each todo.
+
+    Raises:
+        HTTPException: If there are too many todos.
+
+    Returns:
+        Dict[str, Any]: The number of updated and rejected todos, and one result per todo in request order.
+    """
+    _check_batch_size(items=todos)
+    required: Tuple[str, ...] = ("id", "title", "description", "due_time", "status")
+    results: List[Dict[str, Any]] = [{"index": index, "status": 200} for index in range(len(todos))]
+    valid: Dict[int, int] = {}
+    for index, todo in enumerate(todos):
+        if error := _check_batch_item(item=todo, required=required):
+            results[index] = {"index": index, "status": 400, "detail": error}
+        elif int(todo["id"]) in valid:
+            results[index] = {"index": index, "status": 400, "detail": "Duplicate id"}
+        else:
+            valid[int(todo["id"])] = index
+            results[index]["id"] = int(todo["id"])
+    owners: Dict[int, int] = {}
+    if valid:
+        query = ("SELECT todo.id, todo.user_id, user.todos_version FROM todo JOIN user ON user.id = todo.user_id "
+                 f"WHERE todo.id IN ({_placeholders(count=len(valid))}) FOR UPDATE")
+        rows: List[Tuple[Any, ...]] = await db.fetch_all(query, list(valid))
+        owners = {row[0]: row[1] for row in rows}
+        current: Dict[int, int] = {row[1]: row[2] for row in rows}
+        for todo_id in [todo_id for todo_id in valid if todo_id not in owners]:
+            index: int = valid.pop(todo_id)
+            results[index] = {"index": index, "status": 404, "detail": "Not found"}
+    if valid:
+        versions: Dict[int, int] = await _touch_todos(
+            db=db, user_ids=[owners[todo_id] for todo_id in valid], current=current)
+        assignments: List[str] = []
+        values: List[Any] = []
+        for column in ("title", "description", "due_time", "status", "version"):
+            assignments.append(f"{column} = CASE id {' '.join(['WHEN %s THEN %s'] * len(valid))} END")
+            for todo_id, index in valid.items():
+                value: Any = versions[owners[todo_id]] if column == "version" else todos[index][column]
+                values.extend((todo_id, value))
+        query = f"UPDATE todo SET {', '.join(assignments)} WHERE id IN ({_placeholders(count=len(valid))})"
+        await db.execute(query, (*values, *valid))
+        await db.commit()
+        for user_id in set(owners.values()):
+            todo_cache.invalidate(user_id=user_id)
+            broker.publish(user_id=user_id, event={"type": "resync"})
+        for todo_id, index in valid.items():
+            scheduler.schedule(todo_id=todo_id, due_time=datetime.fromisoformat(str(todos[index]["due_time"])),
+                               status=todos[index]["status"])
+    return _batch_report(results=results)
+
+
+@app.delete(path="/todos/batch", tags=["todos"], status_code=200, dependencies=[Depends(dependency=decode_jwt)])
+async def delete_todos(body: Dict[str, List[Any]], db: AsyncConnection = Depends(dependency=get_write_connection)) -> Dict[str, Any]:
+    """
+    Deletes several todos in a single transaction
+
+    Args:
+        body (Dict[str, List[Any]]): A dictionary containing the list of the ids to delete under "ids".
+
+    Raises:
+        HTTPException: If the ids are missing or if there are too many of them.
+
+    Returns:
+        Dict[str, Any]: The number of deleted and rejected todos, and one result per id in request order.
+    """
+    ids: Optional[List[Any]] = body.get("ids")
+    if ids is None:
+        raise HTTPException(status_code=400, detail="Bad parameter")
+    _check_batch_size(items=ids)
+    results: List[Dict[str, Any]] = []
+    valid: Dict[int, int] = {}
+    for index, todo_id in enumerate(ids):
+        try:
+            parsed: int = int(todo_id)
+        except (TypeError, ValueError):
+            results.append({"index": index, "status": 400, "detail": "Bad parameter"})
+            continue
+        if parsed in valid:
+            results.append({"index": index, "status": 400, "detail": "Duplicate id"})
+            continue
+        valid[parsed] = index
+        results.append({"index": index, "status": 200, "id": parsed})
+    owners: Dict[int, int] = {}
+    if valid:
+        query = ("SELECT todo.id, todo.user_id, user.todos_version FROM todo JOIN user ON user.id = todo.user_id "
+                 f"WHERE todo.id IN ({_placeholders(count=len(valid))}) FOR UPDATE")
+        rows: List[Tuple[Any, ...]] = await db.fetch_all(query, list(valid))
+        owners = {row[0]: row[1] for row in rows}
+        current: Dict[int, int] = {row[1]: row[2] for row in rows}
+        for todo_id in [todo_id for todo_id in valid if todo_id not in owners]:
+            index: int = valid.pop(todo_id)
+            results[index] = {"index": index, "status": 404, "detail": "Not found"}
+    if valid:
+        versions: Dict[int, int] = await _touch_todos(
+            db=db, user_ids=[owners[todo_id] for todo_id in valid], current=current)
+        # The tombstones are written by the todo_tombstone_insert trigger, with the versions stamped here.
+        query = (f"UPDATE todo SET version = CASE id {' '.join(['WHEN %s THEN %s'] * len(valid))} END "
+                 f"WHERE id IN ({_placeholders(count=len(valid))})")
+        await db.execute(query, (*(value for todo_id in valid for value in (todo_id, versions[owners[todo_id]])),
+                                 *valid))
+        query = f"DELETE FROM todo WHERE id IN ({_placeholders(count=len(valid))})"
+        await db.execute(query, list(valid))
+        await db.commit()
+        for user_id in set(owners.values()):
+            todo_cache.invalidate(user_id=user_id)
+            broker.publish(user_id=user_id, event={"type": "resync"})
+        for todo_id in valid:
+            scheduler.cancel(todo_id=todo_id)
+    return _batch_report(results=results)
 
 
 @app.put(path="/todos/{id}", tags=["todos"], status_code=200, dependencies=[Depends(dependency=decode_jwt)])
-async def update_todo(id: str, body: Dict) -> Dict[str, str]:
+async def update_todo(id: str, body: TodoUpdate, db: AsyncConnection = Depends(dependency=get_write_connection)) -> Todo:
     """
     Update a todo
 
     Args:
         id (str): A string representing the id of the todo to update.
-        bod (Dict): A dictionary containing the updated information for the todo.
+        body (TodoUpdate): The updated information for the todo.
 
     Returns:
-        Dict[str, str]:A dictionary containing the updated information for the todo.
+        Todo: The updated todo.
     """
     try:
         int(id)
     except ValueError as e:
         raise HTTPException(status_code=400, detail="Bad parameter") from e
-    cursor: MySQLCursor = db.cursor()
-    query = "SELECT * FROM todo WHERE id = %s"
-    cursor.execute(query, (id,))
-    result: Any | Tuple[str] | None = cursor.fetchone()
-    if result is None:
+    values: Tuple[str, str, datetime, str] = (body.title, body.description, body.due_time, body.status.value)
+    owner: Optional[int] = await _stamp_todo(db=db, todo_id=id, assignments=(
+        "todo.title = %s", "todo.description = %s", "todo.due_time = %s", "todo.status = %s"), values=values)
+    if owner is None:
         raise HTTPException(status_code=404, detail="Not found")
-    query = "UPDATE todo SET title = %s, description = %s, due_time = %s, status = %s WHERE id = %s"
-    values: Tuple[str, str, str, str, str] = (
-        body["title"], body["description"], body["due_time"], body["status"], id)
-    cursor.execute(query, values)
-    db.commit()
-    query = "SELECT * FROM todo WHERE id = %s"
-    cursor.execute(query, (id,))
-    result: Any | Tuple[str] | None = cursor.fetchone()
+    query = f"SELECT {', '.join(TODO_COLUMNS)} FROM todo WHERE id = %s"
+    result: Optional[Dict[str, Any]] = row_to_dict(columns=TODO_COLUMNS, row=await db.fetch_one(query, (id,)))
     if result is None:
         raise HTTPException(status_code=404, detail="Not Found")
-    return {
-        "id": str(object=result[0]),
-        "title": str(object=result[1]),
-        "description": str(object=result[2]),
-        "created_at": str(object=result[3]),
-        "due_time": str(object=result[4]),
-        "status": str(object=result[5]),
-    }
+    await db.commit()
+    todo_cache.invalidate(user_id=result["user_id"])
+    broker.publish(user_id=result["user_id"], event={"type": "updated", "todo": result})
+    scheduler.schedule(todo_id=result["id"], due_time=result["due_time"], status=result["status"])
+    return Todo.model_validate(obj=result)
 
 
 @app.delete(path="/todos/{id}", tags=["todos"], status_code=200, dependencies=[Depends(dependency=decode_jwt)])
-async def delete_todo(id: str) -> Dict[str, str]:
+async def delete_todo(id: str, db: AsyncConnection = Depends(dependency=get_write_connection)) -> Dict[str, str]:
     """
     Delete a todo
 
@@ -160,50 +950,116 @@ async def delete_todo(id: str) -> Dict[str, str]:
         int(id)
     except ValueError as e:
         raise HTTPException(status_code=400, detail="Bad parameter") from e
-    cursor: MySQLCursor = db.cursor()
-    query = "SELECT * FROM todo WHERE id = %s"
-    cursor.execute(query, (id,))
-    result: Any | Tuple[str] | None = cursor.fetchone()
-    if result is None:
+    # The version stamped here is copied to the tombstone of the todo by the todo_tombstone_insert trigger.
+    owner: Optional[int] = await _stamp_todo(db=db, todo_id=id)
+    if owner is None:
         raise HTTPException(status_code=404, detail="Not found")
     query = "DELETE FROM todo WHERE id = %s"
-    cursor.execute(query, (id,))
-    db.commit()
+    await db.execute(query, (id,))
+    await db.commit()
+    todo_cache.invalidate(user_id=owner)
+    broker.publish(user_id=owner, event={"type": "deleted", "id": int(id)})
+    scheduler.cancel(todo_id=int(id))
     return {"msg": f"Successfully deleted record number : {id}"}
 
 
-@app.get(path="/user", tags=["users"], status_code=200, dependencies=[Depends(dependency=decode_jwt)])
-async def view_all_users() -> List[Dict[str, str]]:
+@app.get(path="/user", tags=["users"], status_code=200, response_model=List[User],
+         dependencies=[Depends(dependency=decode_jwt)])
+async def view_all_users(db: AsyncConnection = Depends(dependency=get_read_connection)) -> FastJSONResponse:
     """
     View all user information
 
     Returns:
-        List[Dict[str, str]]: A list of dictionaries containing information about each user.
+        FastJSONResponse: The information about each user.
     """
-    cursor: MySQLCursor = db.cursor()
-    query = "SELECT * FROM user"
-    cursor.execute(query)
-    result: Any | Tuple[str] | None = cursor.fetchall()
-    if result is None:
-        raise HTTPException(status_code=404, detail="Not Found")
-    users: list[Dict[str, str]] = [
-        {
-            "id": str(object=user[0]),
-            "email": str(object=user[1]),
-            "password": str(object=user[2]),
-            "name": str(object=user[3]),
-            "firstname": str(object=user[4]),
-            "created_at": str(object=user[5]),
-        }
-        for user in result
-    ]
-    return users
+    query = f"SELECT {', '.join(USER_COLUMNS)} FROM user WHERE deleted_at IS NULL"
+    result: List[Tuple[Any, ...]] = await db.fetch_all(query)
+    return FastJSONResponse(content=rows_to_dicts(columns=USER_COLUMNS, rows=result))
+
+
+@app.get(path="/user/todos", tags=["users"], status_code=200, response_model=List[Todo])
+async def view_all_user_todos(
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    status: Optional[str] = None,
+    due_after: Optional[datetime] = None,
+    due_before: Optional[datetime] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(default=None),
+    if_modified_since: Optional[str] = Header(default=None),
+    email: Optional[str] = Depends(dependency=get_email_from_token),
+) -> Response:
+    """
+    View all user todos, one page at a time
+
+    The todos are sorted by id. When more todos are available, the cursor of the next page is returned in the
+    X-Next-Cursor header and can be passed back as `after`. Pages are cached with their validators, and a cached
+    page is served without checking a connection out. Otherwise the version of the user's todos is read first: when
+    the copy of the client, given by If-None-Match or If-Modified-Since, is current, nothing else is read.
 
+    Args:
+        limit (int): The maximum number of todos to return.
+        after (Optional[str]): The cursor returned with the previous page.
+        status (Optional[str]): Only return the todos with this status.
+        due_after (Optional[datetime]): Only return the todos due at or after this time.
+        due_before (Optional[datetime]): Only return the todos due before this time.
+        created_after (Optional[datetime]): Only return the todos created at or after this time.
+        created_before (Optional[datetime]): Only return the todos created before this time.
+        fields (Optional[str]): A comma separated list of the columns to return. Defaults to every column.
+        if_none_match (Optional[str]): The ETags of the copies the client has.
+        if_modified_since (Optional[str]): The Last-Modified date of the copy the client has.
+        email (Optional[str]): Optional email address of the user.
 
-@app.get(path="/user/todos", tags=["users"], status_code=200)
-async def view_all_user_todos(email: Optional[str] = Depends(dependency=get_email_from_token)) -> List[Dict[str, str]]:
+    Raises:
+        HTTPException: If the user is not found.
+
+    Returns:
+        Response: The todos of the user, or an empty 304 response if the copy of the client is current.
     """
-    View all user todos
+    version: int = todo_cache.version()
+    variant: Tuple[Any, ...] = (
+        limit, after, status, due_after, due_before, created_after, created_before, fields)
+    validators: Dict[str, str]
+    user_id: Optional[int] = user_id_cache.get(email=email)
+    if user_id is not None and (cached := todo_cache.get(user_id=user_id, variant=variant)) is not None:
+        todos, next_cursor, etag, last_modified, now, fetched = cached
+        validators = _validators(
+            etag=etag, last_modified=last_modified, now=now + timedelta(seconds=time.monotonic() - fetched))
+        if _not_modified(validators=validators, if_none_match=if_none_match, if_modified_since=if_modified_since):
+            return Response(status_code=304, headers=validators)
+        return _todo_page_response(todos=todos, next_cursor=next_cursor, validators=validators)
+    async with connect(read_only=True) as db:
+        query = "SELECT id, todos_version, todos_updated_at, UTC_TIMESTAMP(6) FROM user WHERE email = %s"
+        result: Any | Tuple[Any, ...] | None = await db.fetch_one(query, (email,))
+        if result is None:
+            raise HTTPException(status_code=404, detail="Not Found")
+        user_id = int(result[0])
+        user_id_cache.put(email=email, user_id=user_id)
+        etag: str = _etag("user todos", user_id, result[1], variant)
+        validators = _validators(etag=etag, last_modified=result[2], now=result[3])
+        if _not_modified(validators=validators, if_none_match=if_none_match, if_modified_since=if_modified_since):
+            return Response(status_code=304, headers=validators)
+        todos, next_cursor = await _fetch_todo_page(
+            db=db, conditions=["user_id = %s"], params=[user_id], limit=limit, after=after, status=status,
+            due_after=due_after, due_before=due_before, created_after=created_after, created_before=created_before,
+            fields=fields)
+    # The clock of the database is cached with the time it was read, to tell later when Last-Modified can be sent.
+    todo_cache.put(user_id=user_id, variant=variant, value=(
+        todos, next_cursor, etag, result[2], result[3], time.monotonic()), version=version)
+    return _todo_page_response(todos=todos, next_cursor=next_cursor, validators=validators)
+
+
+@app.get(path="/user/todos/events", tags=["users"], status_code=200)
+async def stream_user_todo_events(email: Optional[str] = Depends(dependency=get_email_from_token)) -> StreamingResponse:
+    """
+    Stream the changes of the user todos as Server-Sent Events
+
+    A "created", "updated" or "deleted" event is sent for every change of one of the user's todos, and a "resync"
+    event when the client should fetch its todos again. The stream starts with a retry interval, once the client is
+    subscribed: fetching the todos after receiving it misses no change. No database connection is held while the
+    stream is open.
 
     Args:
         email (Optional[str]): Optional email address of the user.
@@ -212,206 +1068,311 @@ async def view_all_user_todos(email: Optional[str] = Depends(dependency=get_emai
         HTTPException: If the user is not found.
 
     Returns:
-        List[Dict[str, str]]: A list of dictionaries representing the todos for the user.
+        StreamingResponse: The stream of events.
     """
-    cursor: MySQLCursor = db.cursor()
-    query = "SELECT id FROM user WHERE email = %s"
-    cursor.execute(query, (email,))
-    result: Any | Tuple[str] | None = cursor.fetchone()
-    if result is None:
-        raise HTTPException(status_code=404, detail="Not Found")
-    user_id: str = str(object=result[0])
-    query = "SELECT * FROM todo WHERE user_id = %s"
-    cursor.execute(query, (user_id,))
-    result: Any | Tuple[str] | None = cursor.fetchall()
+    user_id: Optional[int] = user_id_cache.get(email=email)
+    if user_id is None:
+        async with connect(read_only=True) as db:
+            result: Any | Tuple[str] | None = await db.fetch_one("SELECT id FROM user WHERE email = %s", (email,))
+        if result is None:
+            raise HTTPException(status_code=404, detail="Not Found")
+        user_id = int(result[0])
+        user_id_cache.put(email=email, user_id=user_id)
+    return ClosingStreamingResponse(
+        content=stream(broker=broker, user_id=user_id), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get(path="/user/todos/search", tags=["users"], status_code=200, response_model=List[Todo])
+async def search_user_todos(
+    q: str = Query(min_length=1, max_length=255),
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    email: Optional[str] = Depends(dependency=get_email_from_token),
+    db: AsyncConnection = Depends(dependency=get_read_connection),
+) -> FastJSONResponse:
+    """
+    Search the user todos by the words of their title and description
+
+    Every word of the search has to start a word of the todo. The todos are read from the full-text index, sorted
+    by relevance, then by newest first. When more todos match, the cursor of the next page is returned in the
+    X-Next-Cursor header and can be passed back as `after`. The cursor holds the relevance and the id of the last
+    todo of the page, and the next page starts after them rather than after a number of rows, so the server does
+    not sort and skip the todos of every previous page, and a todo created meanwhile does not shift the pages.
+
+    Args:
+        q (str): The words to search for.
+        limit (int): The maximum number of todos to return.
+        after (Optional[str]): The cursor returned with the previous page.
+        fields (Optional[str]): A comma separated list of the columns to return. Defaults to every column.
+        email (Optional[str]): Optional email address of the user.
+
+    Raises:
+        HTTPException: If the search has no word, if the cursor is not valid or if the user is not found.
+
+    Returns:
+        FastJSONResponse: The matching todos of the user.
+    """
+    selected: Tuple[str, ...] = _parse_fields(fields=fields)
+    terms: str = _search_terms(q=q)
+    position: Optional[Tuple[float, int]] = None if after is None else _decode_search_cursor(cursor=after)
+    user_id: Optional[int] = user_id_cache.get(email=email)
+    if user_id is None:
+        result: Any | Tuple[int] | None = await db.fetch_one("SELECT id FROM user WHERE email = %s", (email,))
+        if result is None:
+            raise HTTPException(status_code=404, detail="Not Found")
+        user_id = int(result[0])
+        user_id_cache.put(email=email, user_id=user_id)
+    match: str = "MATCH (title, description) AGAINST (%s IN BOOLEAN MODE)"
+    query: str = (
+        f"SELECT {', '.join(selected)}, id, {match} AS score FROM todo WHERE user_id = %s AND {match}")
+    params: List[Any] = [terms, user_id, terms]
+    if position is not None:
+        # The select list alias cannot be used in WHERE, so the relevance is written out again.
+        query += f" AND ({match} < %s OR ({match} = %s AND id < %s))"
+        params.extend((terms, position[0], terms, position[0], position[1]))
+    query += " ORDER BY score DESC, id DESC LIMIT %s"
+    rows: List[Tuple[Any, ...]] = await db.fetch_all(query, (*params, limit + 1))
+    next_cursor: Optional[str] = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_search_cursor(score=rows[-1][-1], todo_id=rows[-1][-2])
+    todos: List[Dict[str, Any]] = rows_to_dicts(columns=selected, rows=(row[:-2] for row in rows))
+    return _todo_page_response(todos=todos, next_cursor=next_cursor, validators={})
+
+
+@app.get(path="/user/todos/stats", tags=["users"], status_code=200)
+async def view_user_todo_stats(
+    email: Optional[str] = Depends(dependency=get_email_from_token),
+    db: AsyncConnection = Depends(dependency=get_read_connection),
+) -> FastJSONResponse:
+    """
+    Count the user todos by status and due window
+
+    The counts are cached with the user's todo lists, until one of their todos changes and for at most
+    TODO_CACHE_TTL seconds, which bounds how far the due windows lag behind the clock.
+
+    Args:
+        email (Optional[str]): Optional email address of the user.
+
+    Raises:
+        HTTPException: If the user is not found.
+
+    Returns:
+        FastJSONResponse: The total, open and done counts, the count of each status, the count of the open todos
+        due in each window under "due", and the UTC time the windows start from.
+    """
+    version: int = todo_cache.version()
+    user_id: Optional[int] = user_id_cache.get(email=email)
+    if user_id is not None and (stats := todo_cache.get(user_id=user_id, variant="stats")) is not None:
+        return FastJSONResponse(content=stats)
+    if user_id is None:
+        result: Any | Tuple[int] | None = await db.fetch_one("SELECT id FROM user WHERE email = %s", (email,))
+        if result is None:
+            raise HTTPException(status_code=404, detail="Not Found")
+        user_id = int(result[0])
+        user_id_cache.put(email=email, user_id=user_id)
+    stats = await _count_todos(db=db, conditions=["user_id = %s"], params=[user_id])
+    todo_cache.put(user_id=user_id, variant="stats", value=stats, version=version)
+    return FastJSONResponse(content=stats)
+
+
+@app.get(path="/user/todos/changes", tags=["users"], status_code=200)
+async def view_user_todo_changes(
+    since: Optional[str] = None,
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    email: Optional[str] = Depends(dependency=get_email_from_token),
+    db: AsyncConnection = Depends(dependency=get_read_connection),
+) -> FastJSONResponse:
+    """
+    View the changes of the user todos since a cursor
+
+    Without a cursor every todo is returned, one page at a time. With the cursor returned by the previous call, only
+    the todos written since and the ids of the todos deleted since are returned, so that syncing costs as much as
+    what changed. While "more" is true, the next page is fetched with the new cursor.
+
+    Args:
+        since (Optional[str]): The cursor returned by the previous call.
+        limit (int): The maximum number of changes to return. A single batch request larger than it is returned
+            whole.
+        email (Optional[str]): Optional email address of the user.
+
+    Raises:
+        HTTPException: If the user is not found, if the cursor is not valid, or with a 410 if the deletions since
+            the cursor were compacted, in which case the client has to sync again without a cursor.
+
+    Returns:
+        FastJSONResponse: The written todos under "todos", the ids of the deleted todos under "deleted", the cursor
+        to pass next time under "cursor" and whether more changes are waiting under "more".
+    """
+    query = "SELECT id, todos_version, todos_compacted_version FROM user WHERE email = %s"
+    result: Any | Tuple[int, int, int] | None = await db.fetch_one(query, (email,))
     if result is None:
         raise HTTPException(status_code=404, detail="Not Found")
-    todos: list[Dict[str, str]] = [
-        {
-            "id": str(object=todo[0]),
-            "title": str(object=todo[1]),
-            "description": str(object=todo[2]),
-            "created_at": str(object=todo[3]),
-            "due_time": str(object=todo[4]),
-            "status": str(object=todo[5]),
-            "user_id": str(object=todo[6]),
-        }
-        for todo in result
-    ]
-    return todos
+    try:
+        todos, deleted, cursor, more = await fetch_changes(
+            db=db, columns=TODO_COLUMNS, user_id=int(result[0]),
+            since=-1 if since is None else _decode_cursor(cursor=since), current=int(result[1]),
+            compacted=int(result[2]), limit=limit)
+    except CursorExpiredError as e:
+        raise HTTPException(status_code=410, detail="Cursor expired") from e
+    return FastJSONResponse(content={
+        "todos": todos, "deleted": deleted, "cursor": _encode_cursor(value=cursor), "more": more})
 
 
 @app.put(path="/users/{id}", tags=["users"], status_code=200, dependencies=[Depends(dependency=decode_jwt)])
-async def update_user(id: str, body: Dict) -> Dict[str, str]:
+async def update_user(id: str, body: UserCreate, db: AsyncConnection = Depends(dependency=get_write_connection)) -> UserProfile:
     """
     Update user information
 
     Args:
         id (str): The ID of the user to update.
-        body (Dict): A dictionary containing the updated user information.
+        body (UserCreate): The updated user information.
 
     Raises:
-        HTTPException: If the ID is not an integer or if the user is not found.
+        HTTPException: If the ID is not an integer, if the user is not found or if the email address is already
+            used by another user.
 
     Returns:
-        Dict[str, str]: A dictionary containing the updated user information.
+        UserProfile: The updated user information.
     """
     try:
         int(id)
     except ValueError as e:
         raise HTTPException(status_code=400, detail="Bad parameter") from e
-    cursor: MySQLCursor = db.cursor()
-    query = "SELECT * FROM user WHERE id = %s"
-    cursor.execute(query, (id,))
-    result: Any | Tuple[str] | None = cursor.fetchone()
-    if result is None:
-        raise HTTPException(status_code=404, detail="Not found")
-    query = "UPDATE user SET email = %s, password = %s, name = %s, firstname = %s WHERE id = %s"
-    if not validate_email(email=body["email"]):
+    query = ("UPDATE user SET email = %s, password = %s, name = %s, firstname = %s, "
+             "profile_version = profile_version + 1 WHERE id = %s AND deleted_at IS NULL")
+    if not validate_email(email=body.email):
         raise HTTPException(
             status_code=400, detail="Invalid email address. Please correct and try again")
-    if body["password"] is None or len(body["password"]) < 6:
+    if len(body.password) < 6:
         raise HTTPException(
             status_code=400, detail="Minimum 6 characters required")
-    password: str = body["password"]
-    password_bytes: bytes = password.encode(encoding="utf-8")
-    salt: bytes = bcrypt.gensalt()
-    hashed_password: bytes = bcrypt.hashpw(password=password_bytes, salt=salt)
+    hashed_password: bytes = await get_hasher().hash_password(password=body.password)
     values: Tuple[str, bytes, str, str, str] = (
-        body["email"], hashed_password, body["name"], body["firstname"], id)
-    cursor.execute(query, values)
-    db.commit()
-    query = "SELECT * FROM user WHERE id = %s"
-    cursor.execute(query, (id,))
-    result: Any | Tuple[str] | None = cursor.fetchone()
-    if result is None:
-        raise HTTPException(status_code=404, detail="Not Found")
-    return {
-        "email": str(object=result[1]),
-        "password": str(object=result[2]),
-        "name": str(object=result[3]),
-        "firstname": str(object=result[4]),
-    }
+        body.email, hashed_password, body.name, body.firstname, id)
+    cursor: MySQLCursor = await _execute_unique_email(
+        db=db, query=query, values=values, detail="Email address already in use")
+    if cursor.rowcount == 0:
+        raise HTTPException(status_code=404, detail="Not found")
+    await db.commit()
+    user_id_cache.invalidate(user_id=int(id))
+    # Every column of the response was written by this statement, so there is nothing to read back.
+    return UserProfile(
+        email=body.email, password=hashed_password.decode(encoding="utf-8"), name=body.name,
+        firstname=body.firstname)
 
 
 @app.put(path="/users/email/{id}", tags=["users"], status_code=200, dependencies=[Depends(dependency=decode_jwt)])
-async def update_user_email(id: str, body: Dict) -> Dict[str, str]:
+async def update_user_email(id: str, body: EmailUpdate, db: AsyncConnection = Depends(dependency=get_write_connection)) -> UserProfile:
     """
     Update user email address
 
     Args:
         id (str): The ID of the user to update.
-        body (Dict): A dictionary containing the updated user information.
+        body (EmailUpdate): The new email address of the user.
 
     Raises:
-        HTTPException: If the ID is not an integer or if the user is not found.
+        HTTPException: If the ID is not an integer, if the user is not found or if the email address is already
+            used by another user.
 
     Returns:
-        Dict[str, str]: A dictionary containing the updated user information.
+        UserProfile: The updated user information.
     """
     try:
         int(id)
     except ValueError as e:
         raise HTTPException(status_code=400, detail="Bad parameter") from e
-    cursor: MySQLCursor = db.cursor()
-    query = "SELECT * FROM user WHERE id = %s"
-    cursor.execute(query, (id,))
-    result: Any | Tuple[str] | None = cursor.fetchone()
-    if result is None:
-        raise HTTPException(status_code=404, detail="Not found")
-    query = "UPDATE user SET email = %s WHERE id = %s"
-    if not validate_email(email=body["email"]):
+    query = "UPDATE user SET email = %s, profile_version = profile_version + 1 WHERE id = %s AND deleted_at IS NULL"
+    if not validate_email(email=body.email):
         raise HTTPException(
             status_code=400, detail="Invalid email address. Please correct and try again")
-    values: Tuple[Any, str] = (body["email"], id)
-    cursor.execute(query, values)
-    db.commit()
-    query = "SELECT * FROM user WHERE id = %s"
-    cursor.execute(query, (id,))
-    result: Any | Tuple[str] | None = cursor.fetchone()
+    values: Tuple[str, str] = (body.email, id)
+    cursor: MySQLCursor = await _execute_unique_email(
+        db=db, query=query, values=values, detail="Email address already in use")
+    if cursor.rowcount == 0:
+        raise HTTPException(status_code=404, detail="Not found")
+    await db.commit()
+    user_id_cache.invalidate(user_id=int(id))
+    query = f"SELECT {', '.join(USER_COLUMNS)} FROM user WHERE id = %s"
+    result: Optional[Dict[str, Any]] = row_to_dict(columns=USER_COLUMNS, row=await db.fetch_one(query, (id,)))
     if result is None:
         raise HTTPException(status_code=404, detail="Not Found")
-    return {
-        "email": str(object=result[1]),
-        "password": str(object=result[2]),
-        "name": str(object=result[3]),
-        "firstname": str(object=result[4]),
-    }
+    return UserProfile.model_validate(obj=result)
 
 
 @app.post(path="/register", tags=["users"], status_code=201)
-async def register_user(user: Dict[str, str]) -> Dict[str, str]:
+async def register_user(user: UserCreate, request: Request) -> Dict[str, str]:
     """
     Register a new user
 
     Args:
-        user (Dict[str, str]): A dictionary containing the user information.
+        user (UserCreate): The user information.
+        request (Request): The request, whose client is rate limited, see app.ratelimit.ratelimit.
 
     Raises:
-        HTTPException: If the user already exists.
+        HTTPException: If the user already exists, or with a 429 if the client or the email made too many attempts.
 
     Returns:
         Dict[str, str]: A dictionary containing the encoded JWT token.
     """
-    cursor: MySQLCursor = db.cursor()
-    query = "SELECT * FROM user WHERE email = %s"
-    cursor.execute(query, (user["email"],))
-    result: Any | Tuple[str] | None = cursor.fetchone()
-    if result is not None:
-        raise HTTPException(status_code=409, detail="Account already exists")
-    if not validate_email(email=user["email"]):
-        raise HTTPException(
-            status_code=400, detail="Invalid email address. Please correct and try again")
-    if user["password"] is None or len(user["password"]) < 6:
-        raise HTTPException(
-            status_code=400, detail="Minimum 6 characters required")
-    password: str = user["password"]
-    password_bytes: bytes = password.encode(encoding="utf-8")
-    salt: bytes = bcrypt.gensalt()
-    hashed_password: bytes = bcrypt.hashpw(password=password_bytes, salt=salt)
-    values: Tuple[str, str, str, bytes] = (
-        user["email"], user["name"], user["firstname"], hashed_password)
-    query = "INSERT INTO user (email, name, firstname, password) VALUES (%s, %s, %s, %s)"
-    cursor.execute(query, values)
-    db.commit()
-    return encode_jwt(email=user["email"])
+    with admission.admit(request=request, email=user.email):
+        if not validate_email(email=user.email):
+            raise HTTPException(
+                status_code=400, detail="Invalid email address. Please correct and try again")
+        if len(user.password) < 6:
+            raise HTTPException(
+                status_code=400, detail="Minimum 6 characters required")
+        hashed_password: bytes = await get_hasher().hash_password(password=user.password)
+        values: Tuple[str, str, str, bytes] = (
+            user.email, user.name, user.firstname, hashed_password)
+        query = "INSERT INTO user (email, name, firstname, password) VALUES (%s, %s, %s, %s)"
+        # Committing gives the client its last write, so that logging in right after reads the account from the primary.
+        async with connect() as db:
+            # The unique index on user.email rejects duplicates, including concurrent registrations of the same email.
+            await _execute_unique_email(db=db, query=query, values=values, detail="Account already exists")
+            await db.commit()
+        return encode_jwt(email=user.email)
 
 
 @app.post(path="/login", tags=["users"], status_code=200)
-async def login_user(user: Dict[str, str]) -> Dict[str, str]:
+async def login_user(user: Credentials, request: Request) -> Dict[str, str]:
     """
     Connect a user
 
     Args:
-        user (Dict[str, str]): A dictionary containing the user's email and password.
+        user (Credentials): The user's email and password.
+        request (Request): The request, whose client is rate limited, see app.ratelimit.ratelimit.
 
     Raises:
-        HTTPException: If the email and password combination is invalid.
+        HTTPException: If the email and password combination is invalid, or with a 429 if the client or the email made
+            too many attempts.
 
     Returns:
         Dict[str, str]: A dictionary containing the encoded JWT token.
     """
-    cursor: MySQLCursor = db.cursor()
-    query = "SELECT * FROM user WHERE email = %s"
-    values: Tuple[str] = (user["email"],)
-    cursor.execute(query, values)
-    result: Any | Tuple[str] | None = cursor.fetchone()
-    if result is None:
-        raise HTTPException(status_code=404, detail="Invalid Credentials")
-    hashed_password_first: str = str(object=result[2])
-    hashed_password: bytes = hashed_password_first.encode(encoding="utf-8")
-    password: str = user["password"]
-    password_bytes: bytes = password.encode(encoding="utf-8")
-    if not bcrypt.checkpw(password=password_bytes, hashed_password=hashed_password):
-        raise HTTPException(status_code=404, detail="Invalid Credentials")
-    return encode_jwt(email=user["email"])
+    with admission.admit(request=request, email=user.email):
+        query = "SELECT password FROM user WHERE email = %s"
+        values: Tuple[str] = (user.email,)
+        async with connect(read_only=True) as db:
+            result: Any | Tuple[str] | None = await db.fetch_one(query, values)
+        if result is None:
+            raise HTTPException(status_code=404, detail="Invalid Credentials")
+        hashed_password: str = str(object=result[0])
+        if not await get_hasher().check_password(password=user.password, hashed_password=hashed_password):
+            raise HTTPException(status_code=404, detail="Invalid Credentials")
+        return encode_jwt(email=user.email)
 
 
 @app.delete(path="/users/{id}", tags=["users"], status_code=200, dependencies=[Depends(dependency=decode_jwt)])
-async def delete_user(id: str) -> Dict[str, str]:
+async def delete_user(id: str, db: AsyncConnection = Depends(dependency=get_write_connection)) -> Dict[str, str]:
     """
     Delete a user
 
+    The user is marked as deleted and its email is freed at once; its todos, then its row, are purged in the
+    background, see app.purge.purge. The progress of the purge is reported by GET /users/{id}/purge.
+
     Args:
         id (str): The ID of the user to delete.
 
@@ -425,18 +1386,50 @@ async def delete_user(id: str) -> Dict[str, str]:
         int(id)
     except ValueError as e:
         raise HTTPException(status_code=400, detail="Bad parameter") from e
-    cursor: MySQLCursor = db.cursor()
-    query = "SELECT * FROM user WHERE id = %s"
-    cursor.execute(query, (id,))
-    result: Any | Tuple[str] | None = cursor.fetchone()
-    if result is None:
+    # The email is replaced by one no address can take, so that it can be registered again before the purge ends.
+    query = "UPDATE user SET deleted_at = UTC_TIMESTAMP(), email = %s WHERE id = %s AND deleted_at IS NULL"
+    cursor: MySQLCursor = await db.execute(query, (f"deleted:{id}", id))
+    if cursor.rowcount == 0:
         raise HTTPException(status_code=404, detail="Not found")
-    query = "DELETE FROM user WHERE id = %s"
-    cursor.execute(query, (id,))
-    db.commit()
+    query = ("INSERT INTO user_purge (user_id, requested_at, updated_at) "
+             "VALUES (%s, UTC_TIMESTAMP(), UTC_TIMESTAMP())")
+    await db.execute(query, (id,))
+    await db.commit()
+    user_id_cache.invalidate(user_id=int(id))
+    todo_cache.invalidate(user_id=int(id))
+    purge.wake()
     return {"msg": f"Successfully deleted record number : {id}"}
 
 
+@app.get(path="/users/{id}/purge", tags=["users"], status_code=200, dependencies=[Depends(dependency=decode_jwt)])
+async def view_user_purge(id: str, db: AsyncConnection = Depends(dependency=get_read_connection)) -> FastJSONResponse:
+    """
+    View the progress of the purge of a deleted user
+
+    Args:
+        id (str): The ID of the deleted user.
+
+    Raises:
+        HTTPException: If the ID is not a valid integer or if the user was not deleted.
+
+    Returns:
+        FastJSONResponse: The number of todos of the user when the purge started under "todos_total", or null until
+        then, the number deleted so far under "todos_deleted", when the deletion was requested, when the purge last
+        progressed, and when it finished, or null while it runs.
+    """
+    try:
+        int(id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail="Bad parameter") from e
+    columns: Tuple[str, ...] = (
+        "user_id", "todos_total", "todos_deleted", "requested_at", "updated_at", "finished_at")
+    query = f"SELECT {', '.join(columns)} FROM user_purge WHERE user_id = %s"
+    result: Optional[Dict[str, Any]] = row_to_dict(columns=columns, row=await db.fetch_one(query, (id,)))
+    if result is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return FastJSONResponse(content=result)
+
+
 @app.get(path="/check_token", tags=["users"], status_code=200, dependencies=[Depends(dependency=decode_jwt)])
 async def check_token() -> Dict[str, str]:
     """
@@ -448,30 +1441,32 @@ async def check_token() -> Dict[str, str]:
     return {"msg": "Token is valid"}
 
 
-@app.get(path="/users", tags=["users"], status_code=200, dependencies=[Depends(dependency=decode_jwt)])
-async def view_user(email: Optional[str] = Depends(dependency=get_email_from_token)) -> Dict[str, str]:
+@app.get(path="/users", tags=["users"], status_code=200, response_model=User,
+         dependencies=[Depends(dependency=decode_jwt)])
+async def view_user(
+    if_none_match: Optional[str] = Header(default=None),
+    email: Optional[str] = Depends(dependency=get_email_from_token),
+    db: AsyncConnection = Depends(dependency=get_read_connection),
+) -> Response:
     """
     View user details.
 
     Args:
+        if_none_match (Optional[str]): The ETags of the copies the client has.
         email (Optional[str], optional): The email of the user. Defaults to Depends(dependency=get_email_from_token).
 
     Raises:
         HTTPException: If the user is not found.
 
     Returns:
-        str: A dictionary containing the user's email, password, name, and firstname.
+        Response: The user's id, email, password, name, firstname and creation date, or an empty 304 response if
+        the copy of the client is current.
     """
-    cursor: MySQLCursor = db.cursor()
-    query = "SELECT * FROM user WHERE email = %s"
-    cursor.execute(query, (email,))
-    result: Any | Tuple[str] | None = cursor.fetchone()
-    if result is None:
+    query = f"SELECT {', '.join(USER_COLUMNS)}, profile_version FROM user WHERE email = %s"
+    row: Any | Tuple[Any, ...] | None = await db.fetch_one(query, (email,))
+    if row is None:
         raise HTTPException(status_code=404, detail="Not Found")
-    return {
-        "id": str(object=result[0]),
-        "email": str(object=result[1]),
-        "password": str(object=result[2]),
-        "name": str(object=result[3]),
-        "firstname": str(object=result[4]),
-    }
+    validators: Dict[str, str] = _validators(etag=_etag("user", row[0], row[-1]))
+    if _not_modified(validators=validators, if_none_match=if_none_match, if_modified_since=None):
+        return Response(status_code=304, headers=validators)
+    return FastJSONResponse(content=row_to_dict(columns=USER_COLUMNS, row=row[:-1]), headers=validators)
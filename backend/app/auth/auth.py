@@ -1,53 +1,152 @@
 """
 This module contains functions for encoding and decoding JWT tokens, as well as extracting the email address from a token.
 
-The following functions are available:
+The following functions and classes are available:
 
-- encode_jwt(email: str) -> Dict[str, str]: Encodes a JWT token with the given email and expiration time.
-- decode_jwt(token: str = Header(description="JWT authorization header")) -> Dict[str, str]: Decodes a JWT token and returns the decoded payload.
-- get_email_from_token(token: str = Header()) -> Optional[str]: Decodes a JWT token and returns the email address from the decoded payload.
+- encode_jwt(email: str, expires_in: int = JWT_EXPIRATION) -> Dict[str, str]: Encodes a JWT token with the given email and expiration time.
+- decode_jwt(token: str = Header(description="JWT authorization header")) -> Dict[str, Any]: Decodes a JWT token and returns the decoded payload.
+- get_email_from_token(claims: Dict[str, Any] = Depends(decode_jwt)) -> Optional[str]: Returns the email address from the decoded payload.
+- TokenCache: A bounded LRU cache of verified token payloads, keyed by a digest of the token.
 
 The module uses the following global variables:
 
 - JWT_SECRET_KEY: The secret key used for encoding and decoding JWT tokens.
 - JWT_ALGORITHM: The algorithm used for encoding and decoding JWT tokens.
+- JWT_EXPIRATION: The lifetime of new tokens in seconds, read from the JWT_EXPIRATION environment variable. Defaults to one day.
+- TOKEN_CACHE_SIZE: The maximum number of cached token payloads, read from the TOKEN_CACHE_SIZE environment variable.
+- TOKEN_CACHE_TTL: The maximum number of seconds a payload stays cached, read from the TOKEN_CACHE_TTL environment variable.
+- token_cache: The cache of verified token payloads shared by every request.
 """
 
+import hashlib
 import os
-from typing import Any, Dict, Optional
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
 
 import jwt
+from app.metrics.metrics import jwt_duration_seconds, timed
 from dotenv import load_dotenv
-from fastapi import Header, HTTPException
+from fastapi import Depends, Header, HTTPException
 
 load_dotenv()
 
 JWT_SECRET_KEY: str | None = os.getenv(key="SECRET")
 JWT_ALGORITHM = "HS256"
+JWT_EXPIRATION: int = int(os.getenv(key="JWT_EXPIRATION", default="86400"))
+TOKEN_CACHE_SIZE: int = int(os.getenv(key="TOKEN_CACHE_SIZE", default="10000"))
+TOKEN_CACHE_TTL: float = float(os.getenv(key="TOKEN_CACHE_TTL", default="300"))
 
 
-def encode_jwt(email: str) -> Dict[str, str]:
+class TokenCache:
+    """
+    A bounded LRU cache of verified token payloads.
+
+    Entries are keyed by the SHA-256 digest of the token, so that the tokens themselves are not kept in memory, and
+    expire after `ttl` seconds or when the token itself expires, whichever comes first. The cache is only used
+    from the event loop thread.
+    """
+
+    def __init__(self, size: int = TOKEN_CACHE_SIZE, ttl: float = TOKEN_CACHE_TTL) -> None:
+        self.size: int = size
+        self.ttl: float = ttl
+        self._entries: OrderedDict[bytes, Tuple[Dict[str, Any], float]] = OrderedDict()
+        self._hits: int = 0
+        self._misses: int = 0
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the cached payload of a token.
+
+        Args:
+            token (str): The JWT token.
+
+        Returns:
+            Optional[Dict[str, Any]]: The payload, or None if the token is not cached or its entry expired.
+        """
+        key: bytes = hashlib.sha256(token.encode(encoding="utf-8")).digest()
+        entry: Optional[Tuple[Dict[str, Any], float]] = self._entries.get(key)
+        if entry is None or entry[1] <= time.time():
+            if entry is not None:
+                del self._entries[key]
+            self._misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return entry[0]
+
+    def put(self, token: str, claims: Dict[str, Any]) -> None:
+        """
+        Caches the payload of a verified token.
+
+        Args:
+            token (str): The JWT token.
+            claims (Dict[str, Any]): The verified payload of the token.
+        """
+        if self.size <= 0:
+            return
+        expires_at: float = time.time() + self.ttl
+        if "exp" in claims:
+            expires_at = min(expires_at, float(claims["exp"]))
+        key: bytes = hashlib.sha256(token.encode(encoding="utf-8")).digest()
+        self._entries[key] = (claims, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        Removes every entry from the cache.
+        """
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int | float]:
+        """
+        Returns a snapshot of the cache metrics.
+
+        Returns:
+            Dict[str, int | float]: The number of entries, hits and misses, and the hit rate.
+        """
+        lookups: int = self._hits + self._misses
+        return {
+            "size": self.size,
+            "entries": len(self._entries),
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": self._hits / lookups if lookups else 0.0,
+        }
+
+
+token_cache: TokenCache = TokenCache()
+
+
+def encode_jwt(email: str, expires_in: int = JWT_EXPIRATION) -> Dict[str, str]:
     """
     Encodes a JWT token with the given email and expiration time.
 
     Args:
         email (str): The email to include in the JWT payload.
+        expires_in (int): The number of seconds the token is valid for.
 
     Returns:
         Dict[str, str]: A dictionary containing the encoded JWT token.
     """
-    payload: dict[str, str] = {
-        "email": email
+    payload: dict[str, Any] = {
+        "email": email,
+        "exp": int(time.time()) + expires_in,
     }
-    token: str = jwt.encode(payload=payload, key=JWT_SECRET_KEY,
-                            algorithm=JWT_ALGORITHM)
+    with timed(histogram=jwt_duration_seconds, operation="encode"):
+        token: str = jwt.encode(payload=payload, key=JWT_SECRET_KEY,
+                                algorithm=JWT_ALGORITHM)
     return {"token": token}
 
 
-async def decode_jwt(token: str = Header(description="JWT authorization header")) -> Dict[str, str]:
+async def decode_jwt(token: str = Header(description="JWT authorization header")) -> Dict[str, Any]:
     """
     Decodes a JWT token and returns the decoded payload.
 
+    The payloads of verified tokens are cached, so a token is only verified again once its cache entry expired.
+
     Args:
         token (str): The JWT token to decode.
 
@@ -55,22 +154,30 @@ async def decode_jwt(token: str = Header(description="JWT authorization header")
         HTTPException: If the token is not valid.
 
     Returns:
-        Dict[str, str]: The decoded payload of the JWT token.
+        Dict[str, Any]: The decoded payload of the JWT token.
     """
+    if (claims := token_cache.get(token=token)) is not None:
+        return claims
     try:
-        return jwt.decode(jwt=token, key=JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+        with timed(histogram=jwt_duration_seconds, operation="decode"):
+            claims = jwt.decode(jwt=token, key=JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
     except jwt.InvalidTokenError as e:
         raise HTTPException(
             status_code=401, detail="Token is not valid"
         ) from e
+    token_cache.put(token=token, claims=claims)
+    return claims
 
 
-async def get_email_from_token(token: str = Header()) -> Optional[str]:
+async def get_email_from_token(claims: Dict[str, Any] = Depends(dependency=decode_jwt)) -> Optional[str]:
     """
-    Decodes a JWT token and returns the email address from the decoded payload.
+    Returns the email address from the decoded payload of a JWT token.
+
+    The payload comes from the `decode_jwt` dependency, which FastAPI resolves once per request even when an endpoint
+    depends on both.
 
     Args:
-        token (str): The JWT token to decode.
+        claims (Dict[str, Any]): The decoded payload of the JWT token.
 
     Raises:
         HTTPException: If the token is not valid or does not contain an email address.
@@ -78,13 +185,7 @@ async def get_email_from_token(token: str = Header()) -> Optional[str]:
     Returns:
         Optional[str]: The email address from the decoded payload of the JWT token.
     """
-    try:
-        decoded_token: dict[str, Any] = jwt.decode(
-            jwt=token, key=JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM]
-        )
-        if email := decoded_token.get("email"):
-            return email
-        else:
-            raise HTTPException(status_code=401, detail="Invalid token")
-    except jwt.InvalidTokenError as e:
-        raise HTTPException(status_code=401, detail="Invalid token") from e
+    if email := claims.get("email"):
+        return email
+    else:
+        raise HTTPException(status_code=401, detail="Invalid token")
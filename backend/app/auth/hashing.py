@@ -0,0 +1,175 @@
+"""
+This module contains the password hasher of the Todo app, which runs bcrypt off the event loop.
+
+The following classes and functions are available:
+
+- PasswordHasher: Hashes and verifies passwords on a bounded worker pool and rejects work when it is saturated.
+- get_hasher() -> PasswordHasher: Returns the process-wide password hasher, creating it on first use.
+
+The hasher uses the following environment variables:
+
+- BCRYPT_ROUNDS (int): The bcrypt cost factor of new hashes. Defaults to 12.
+- HASHER_EXECUTOR (str): "thread" or "process", the kind of worker pool running bcrypt. Defaults to "thread".
+- HASHER_WORKERS (int): The number of workers. Defaults to the number of CPUs.
+- HASHER_QUEUE_SIZE (int): The number of operations allowed to wait for a worker before new ones are rejected with
+  a 503. Defaults to 64.
+"""
+
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+import bcrypt
+from app.metrics.metrics import password_hash_duration_seconds, timed
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+load_dotenv()
+
+BCRYPT_ROUNDS: int = int(os.getenv(key="BCRYPT_ROUNDS", default="12"))
+HASHER_EXECUTOR: str = os.getenv(key="HASHER_EXECUTOR", default="thread")
+HASHER_WORKERS: int = int(
+    os.getenv(key="HASHER_WORKERS", default=str(os.cpu_count() or 1)))
+HASHER_QUEUE_SIZE: int = int(os.getenv(key="HASHER_QUEUE_SIZE", default="64"))
+
+T = TypeVar("T")
+
+
+def _hashpw(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password=password, salt=bcrypt.gensalt(rounds=rounds))
+
+
+def _checkpw(password: bytes, hashed_password: bytes) -> bool:
+    return bcrypt.checkpw(password=password, hashed_password=hashed_password)
+
+
+class PasswordHasher:
+    """
+    Hashes and verifies passwords on a bounded worker pool.
+
+    At most `workers` operations run at once and at most `queue_size` more wait for a worker. Anything beyond that
+    is rejected immediately with a 503 instead of piling up behind a burst of logins.
+    """
+
+    def __init__(
+        self,
+        executor: str = HASHER_EXECUTOR,
+        workers: int = HASHER_WORKERS,
+        queue_size: int = HASHER_QUEUE_SIZE,
+        rounds: int = BCRYPT_ROUNDS,
+    ) -> None:
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown hasher executor: {executor}")
+        self.executor: str = executor
+        self.workers: int = workers
+        self.queue_size: int = queue_size
+        self.rounds: int = rounds
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._pending: int = 0
+        self._completed: int = 0
+        self._rejected: int = 0
+
+    async def hash_password(self, password: str) -> bytes:
+        """
+        Hashes a password with a new salt.
+
+        Args:
+            password (str): The password to hash.
+
+        Raises:
+            HTTPException: If the worker pool is saturated.
+
+        Returns:
+            bytes: The bcrypt hash of the password.
+        """
+        return await self._submit("hash", _hashpw, password.encode(encoding="utf-8"), self.rounds)
+
+    async def check_password(self, password: str, hashed_password: str) -> bool:
+        """
+        Checks a password against a bcrypt hash.
+
+        Args:
+            password (str): The password to check.
+            hashed_password (str): The bcrypt hash to check the password against.
+
+        Raises:
+            HTTPException: If the worker pool is saturated.
+
+        Returns:
+            bool: True if the password matches the hash.
+        """
+        return await self._submit(
+            "check", _checkpw, password.encode(encoding="utf-8"), hashed_password.encode(encoding="utf-8"))
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns a snapshot of the hasher metrics.
+
+        Returns:
+            Dict[str, int]: The pool capacity, the number of pending, completed and rejected operations.
+        """
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "rounds": self.rounds,
+            "pending": self._pending,
+            "completed": self._completed,
+            "rejected": self._rejected,
+        }
+
+    def shutdown(self) -> None:
+        """
+        Stops the worker pool once the running operations have completed.
+        """
+        with self._lock:
+            executor: Optional[Executor] = self._executor
+            self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self.executor == "process":
+                        self._executor = ProcessPoolExecutor(
+                            max_workers=self.workers)
+                    else:
+                        self._executor = ThreadPoolExecutor(
+                            max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _submit(self, operation: str, function: Callable[..., T], *args: Any) -> T:
+        # The counter is only touched from the event loop thread, so it needs no lock.
+        if self._pending >= self.workers + self.queue_size:
+            self._rejected += 1
+            raise HTTPException(status_code=503, detail="Service Unavailable")
+        self._pending += 1
+        try:
+            loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+            with timed(histogram=password_hash_duration_seconds, operation=operation):
+                result: T = await loop.run_in_executor(self._get_executor(), functools.partial(function, *args))
+        finally:
+            self._pending -= 1
+        self._completed += 1
+        return result
+
+
+_hasher: Optional[PasswordHasher] = None
+
+
+def get_hasher() -> PasswordHasher:
+    """
+    Returns the process-wide password hasher, creating it on first use.
+
+    Returns:
+        PasswordHasher: The password hasher shared by every request.
+    """
+    global _hasher
+    if _hasher is None:
+        _hasher = PasswordHasher()
+    return _hasher
@@ -0,0 +1,505 @@
+"""
+This module contains the bulk import and export of the users and todos of the Todo app, as CSV or NDJSON files.
+
+The files are streamed: only one batch of records is held in memory at a time, whatever their size. Each batch is
+imported in a single transaction with one multi-row INSERT, after one lookup of the emails or users it refers to,
+instead of one request, lookup and commit per row. The passwords of a batch are hashed with bcrypt at the usual cost
+on a pool of processes, one per core. The records each job has imported are recorded in the bulk_import table in the
+transaction of each batch, see migrations/0006_bulk_import.sql: an interrupted import run again resumes after the
+last committed batch, and never inserts a record twice.
+
+The files have one record per line or row, with the following fields:
+
+- users: email, name, firstname, and either password, the clear password, or password_hash, a bcrypt hash such as
+  the exports carry. Users whose email is already taken are skipped, and reported as failed when it was taken by a
+  registration racing with the import.
+- todos: title, description, due_time, status, and either user_email or user_id, the owner of the todo. The exports
+  also carry the id and created_at of each todo, which the imports ignore.
+
+Invalid records are skipped and logged with their number, starting at 1. The imported todos are stamped with a new
+todos version of their owner, like the todos created through the API, so the incremental sync and the validators of
+GET /todos see them. The running workers learn of them when their caches expire and their reminder schedulers load
+the todos due soon again.
+
+The following functions are available:
+
+- read_records(file: TextIO, file_format: str) -> Iterator[Optional[Dict[str, Any]]]: Streams the records of a file.
+- import_users(db: AsyncConnection, records: Iterable[Optional[Dict[str, Any]]], job: str, batch_size: int,
+  hasher: PasswordHasher) -> Dict[str, Any]: Imports users, and returns the report of the import.
+- import_todos(db: AsyncConnection, records: Iterable[Optional[Dict[str, Any]]], job: str, batch_size: int)
+  -> Dict[str, Any]: Imports todos, and returns the report of the import.
+- export_records(db: AsyncConnection, kind: str, file: TextIO, file_format: str, batch_size: int) -> Dict[str, Any]:
+  Writes the users or the todos to a file, and returns the report of the export.
+- main(argv: Optional[List[str]]) -> None: The command line entry point, also run by `python main.py import` and
+  `python main.py export`.
+
+The bulk import and export use the following environment variables:
+
+- BULK_BATCH_SIZE (int): The number of records imported per transaction, and exported per fetch. Defaults to 1000.
+- BULK_HASH_WORKERS (int): The number of processes hashing the passwords of the imported users. Defaults to the
+  number of CPUs.
+"""
+
+import argparse
+import asyncio
+import csv
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from typing import (Any, Dict, Iterable, Iterator, List, Optional, Sequence,
+                    TextIO, Tuple)
+
+from app.auth.hashing import PasswordHasher
+from app.config.db import AsyncConnection, connect
+from app.models.models import TodoUpdate
+from app.models.serialization import dumps
+from app.sync.sync import change_slot
+from dotenv import load_dotenv
+from mysql.connector import errorcode
+from mysql.connector.errors import IntegrityError
+from pydantic import ValidationError
+from validate_email import validate_email
+
+load_dotenv()
+
+BULK_BATCH_SIZE: int = int(os.getenv(key="BULK_BATCH_SIZE", default="1000"))
+BULK_HASH_WORKERS: int = int(
+    os.getenv(key="BULK_HASH_WORKERS", default=str(os.cpu_count() or 1)))
+KINDS: Tuple[str, ...] = ("users", "todos")
+FORMATS: Tuple[str, ...] = ("csv", "ndjson")
+# The fields of the exported records, which the imports read back.
+USER_FIELDS: Tuple[str, ...] = ("email", "name", "firstname", "password_hash")
+TODO_FIELDS: Tuple[str, ...] = ("id", "title", "description", "created_at", "due_time", "status", "user_email")
+# Seconds between two progress reports.
+PROGRESS_INTERVAL = 5
+# Attempts at importing a batch of users whose emails keep being registered meanwhile. The last one inserts the
+# users one at a time, so that only the users whose email was taken fail.
+MAX_BATCH_ATTEMPTS = 3
+
+logger: logging.Logger = logging.getLogger(name="app.bulk")
+
+Record = Optional[Dict[str, Any]]
+
+
+class _Progress:
+    """
+    Counts the records of an import or an export and logs the rows per second.
+    """
+
+    def __init__(self, name: str, records: int = 0) -> None:
+        self.name: str = name
+        self.resumed: int = records
+        self.records: int = records
+        self.inserted: int = 0
+        self.skipped: int = 0
+        self.failed: int = 0
+        self.started: float = time.perf_counter()
+        self._logged: float = self.started
+
+    def add(self, records: int, inserted: int = 0, skipped: int = 0, failed: int = 0) -> None:
+        self.records += records
+        self.inserted += inserted
+        self.skipped += skipped
+        self.failed += failed
+        if time.perf_counter() - self._logged >= PROGRESS_INTERVAL:
+            self._logged = time.perf_counter()
+            logger.info("%s: %d records, %.0f rows/s", self.name, self.records, self.report()["rows_per_second"])
+
+    def report(self) -> Dict[str, Any]:
+        seconds: float = time.perf_counter() - self.started
+        return {
+            "job": self.name,
+            "records": self.records,
+            "resumed_after": self.resumed,
+            "inserted": self.inserted,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "seconds": seconds,
+            "rows_per_second": (self.records - self.resumed) / seconds if seconds > 0 else 0.0,
+        }
+
+
+def read_records(file: TextIO, file_format: str) -> Iterator[Record]:
+    """
+    Streams the records of a CSV file with a header row, or of an NDJSON file.
+
+    Args:
+        file (TextIO): The file, opened with `newline=""`.
+        file_format (str): "csv" or "ndjson".
+
+    Yields:
+        Optional[Dict[str, Any]]: The next record, or None for an NDJSON line which is not a JSON object.
+    """
+    if file_format == "csv":
+        yield from csv.DictReader(file)
+        return
+    for line in file:
+        if not line.strip():
+            continue
+        try:
+            record: Any = json.loads(line)
+        except ValueError:
+            record = None
+        yield record if isinstance(record, dict) else None
+
+
+def _batches(records: Iterable[Record], skip: int, batch_size: int) -> Iterator[List[Tuple[int, Record]]]:
+    # Numbers the records from 1 and groups them, after the `skip` first ones an earlier run imported.
+    numbered: Iterator[Tuple[int, Record]] = itertools.islice(enumerate(records, start=1), skip, None)
+    while batch := list(itertools.islice(numbered, batch_size)):
+        yield batch
+
+
+def _text(record: Dict[str, Any], field: str) -> str:
+    value: Any = record.get(field)
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(f"missing {field}")
+    return value
+
+
+def _user_row(record: Record) -> Tuple[str, str, str, str, bool]:
+    # Returns the email, name, firstname and password of a user, and whether the password is still to be hashed.
+    if record is None:
+        raise ValueError("not a JSON object")
+    email: str = _text(record=record, field="email").strip()
+    if not validate_email(email=email):
+        raise ValueError("invalid email address")
+    name: str = _text(record=record, field="name")
+    firstname: str = _text(record=record, field="firstname")
+    if record.get("password_hash"):
+        password_hash: str = str(record["password_hash"])
+        if not password_hash.startswith("$2"):
+            raise ValueError("password_hash is not a bcrypt hash")
+        return email, name, firstname, password_hash, False
+    password: str = _text(record=record, field="password")
+    if len(password) < 6:
+        raise ValueError("password shorter than 6 characters")
+    return email, name, firstname, password, True
+
+
+def _todo_row(record: Record) -> Tuple[Tuple[str, str, datetime, str], Optional[str], Optional[int]]:
+    # Returns the title, description, due time and status of a todo, and the email or the id of its owner.
+    if record is None:
+        raise ValueError("not a JSON object")
+    try:
+        todo: TodoUpdate = TodoUpdate.model_validate(obj=record)
+    except ValidationError as e:
+        raise ValueError("; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors()))
+    due_time: datetime = todo.due_time
+    # The due times are stored in UTC, like UTC_TIMESTAMP(): an offset is converted, a naive time is taken as UTC.
+    if due_time.tzinfo is not None:
+        due_time = due_time.astimezone(timezone.utc).replace(tzinfo=None)
+    values: Tuple[str, str, datetime, str] = (todo.title, todo.description, due_time, todo.status.value)
+    if record.get("user_email"):
+        return values, str(record["user_email"]).strip().casefold(), None
+    try:
+        return values, None, int(record["user_id"])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("missing user_email or user_id")
+
+
+def _placeholders(count: int) -> str:
+    return ", ".join(["%s"] * count)
+
+
+async def _resume(db: AsyncConnection, job: str) -> int:
+    # Returns the number of records the job already imported, creating its checkpoint on its first run.
+    row: Optional[Tuple[Any, ...]] = await db.fetch_one("SELECT records FROM bulk_import WHERE job = %s", (job,))
+    if row is not None:
+        return int(row[0])
+    await db.execute("INSERT INTO bulk_import (job, started_at, updated_at) "
+                     "VALUES (%s, UTC_TIMESTAMP(), UTC_TIMESTAMP())", (job,))
+    await db.commit()
+    return 0
+
+
+async def _checkpoint(db: AsyncConnection, job: str, records: int, inserted: int, skipped: int) -> None:
+    # Runs in the transaction of the batch, which commits it. The failed records are counted as skipped.
+    await db.execute(
+        "UPDATE bulk_import SET records = records + %s, inserted = inserted + %s, skipped = skipped + %s, "
+        "updated_at = UTC_TIMESTAMP() WHERE job = %s", (records, inserted, skipped, job))
+
+
+def _skip(number: int, error: ValueError) -> None:
+    logger.warning("record %d skipped: %s", number, error)
+
+
+async def _insert_users(db: AsyncConnection, rows: List[Tuple[int, Tuple[str, str, str, str | bytes]]]) -> int:
+    # Inserts the users one at a time, in the open transaction, and returns the number of failed ones. A failed
+    # statement does not roll the transaction back.
+    failed: int = 0
+    for number, row in rows:
+        try:
+            await db.execute("INSERT INTO user (email, name, firstname, password) VALUES (%s, %s, %s, %s)", row)
+        except IntegrityError as e:
+            if e.errno != errorcode.ER_DUP_ENTRY:
+                raise
+            logger.warning("record %d failed: email already taken", number)
+            failed += 1
+    return failed
+
+
+async def import_users(
+    db: AsyncConnection, records: Iterable[Record], job: str, batch_size: int = BULK_BATCH_SIZE,
+    hasher: Optional[PasswordHasher] = None
+) -> Dict[str, Any]:
+    """
+    Imports users, one transaction per batch, resuming after the records the job already imported.
+
+    The emails of each batch already taken are looked up with one query before the passwords are hashed, so that
+    bcrypt only runs for the users actually created. A batch racing with a registration of one of its emails is
+    rolled back and imported again, up to MAX_BATCH_ATTEMPTS times; the last attempt inserts its users one at a
+    time and reports those whose email is still taken as failed.
+
+    Args:
+        db (AsyncConnection): The connection to write with.
+        records (Iterable[Optional[Dict[str, Any]]]): The records, see read_records.
+        job (str): The name of the checkpoint of the import.
+        batch_size (int): The number of records imported per transaction.
+        hasher (Optional[PasswordHasher]): The hasher of the clear passwords. Defaults to BULK_HASH_WORKERS
+            processes, shut down once the import is done.
+
+    Returns:
+        Dict[str, Any]: The report of the import: the records read, inserted, skipped and failed, and the rows per
+        second.
+    """
+    if hasher is None:
+        hasher = PasswordHasher(executor="process", workers=BULK_HASH_WORKERS, queue_size=batch_size)
+        try:
+            return await import_users(db=db, records=records, job=job, batch_size=batch_size, hasher=hasher)
+        finally:
+            hasher.shutdown()
+    progress: _Progress = _Progress(name=job, records=await _resume(db=db, job=job))
+    for batch in _batches(records=records, skip=progress.records, batch_size=batch_size):
+        users: Dict[str, Tuple[int, Tuple[str, str, str, str, bool]]] = {}
+        skipped: int = 0
+        for number, record in batch:
+            try:
+                user: Tuple[str, str, str, str, bool] = _user_row(record=record)
+            except ValueError as e:
+                _skip(number=number, error=e)
+                skipped += 1
+                continue
+            if user[0].casefold() in users:
+                _skip(number=number, error=ValueError("duplicate email in the file"))
+                skipped += 1
+                continue
+            users[user[0].casefold()] = (number, user)
+        failed: int = 0
+        for attempt in range(1, MAX_BATCH_ATTEMPTS + 1):
+            if users:
+                query = f"SELECT email FROM user WHERE email IN ({_placeholders(count=len(users))})"
+                for row in await db.fetch_all(query, [user[0] for _, user in users.values()]):
+                    if users.pop(str(row[0]).casefold(), None) is not None:
+                        skipped += 1
+            pending: List[Tuple[int, Tuple[str, str, str, str, bool]]] = list(users.values())
+            hashes: Iterator[bytes] = iter(await asyncio.gather(*(
+                hasher.hash_password(password=user[3]) for _, user in pending if user[4])))
+            rows: List[Tuple[int, Tuple[str, str, str, str | bytes]]] = [
+                (number, (email, name, firstname, next(hashes) if clear else password))
+                for number, (email, name, firstname, password, clear) in pending]
+            try:
+                if rows and attempt < MAX_BATCH_ATTEMPTS:
+                    await db.executemany("INSERT INTO user (email, name, firstname, password) "
+                                         "VALUES (%s, %s, %s, %s)", [row for _, row in rows])
+                elif rows:
+                    failed = await _insert_users(db=db, rows=rows)
+                await _checkpoint(db=db, job=job, records=len(batch), inserted=len(rows) - failed,
+                                  skipped=skipped + failed)
+                await db.commit()
+                break
+            except IntegrityError as e:
+                await db.rollback()
+                if e.errno != errorcode.ER_DUP_ENTRY or attempt == MAX_BATCH_ATTEMPTS:
+                    raise
+                # An email was registered since the lookup: look the emails of the batch up again.
+                failed = 0
+        progress.add(records=len(batch), inserted=len(rows) - failed, skipped=skipped, failed=failed)
+    return progress.report()
+
+
+async def import_todos(
+    db: AsyncConnection, records: Iterable[Record], job: str, batch_size: int = BULK_BATCH_SIZE
+) -> Dict[str, Any]:
+    """
+    Imports todos, one transaction per batch, resuming after the records the job already imported.
+
+    The owners of each batch are looked up by email or id, then locked, with one query each, and their todos
+    version is increased once for the whole batch, whose todos are stamped with it. The todos of unknown and deleted
+    users are skipped.
+
+    Args:
+        db (AsyncConnection): The connection to write with.
+        records (Iterable[Optional[Dict[str, Any]]]): The records, see read_records.
+        job (str): The name of the checkpoint of the import.
+        batch_size (int): The number of records imported per transaction.
+
+    Returns:
+        Dict[str, Any]: The report of the import: the records read, inserted and skipped, and the rows per second.
+    """
+    progress: _Progress = _Progress(name=job, records=await _resume(db=db, job=job))
+    for batch in _batches(records=records, skip=progress.records, batch_size=batch_size):
+        todos: List[Tuple[int, Tuple[str, str, datetime, str], Optional[str], Optional[int]]] = []
+        skipped: int = 0
+        for number, record in batch:
+            try:
+                todos.append((number, *_todo_row(record=record)))
+            except ValueError as e:
+                _skip(number=number, error=e)
+                skipped += 1
+        emails: List[str] = list({email for _, _, email, _ in todos if email is not None})
+        by_email: Dict[str, int] = {}
+        if emails:
+            query = f"SELECT id, email FROM user WHERE email IN ({_placeholders(count=len(emails))})"
+            by_email = {str(row[1]).casefold(): row[0] for row in await db.fetch_all(query, emails)}
+        owners: List[int] = sorted({by_email.get(email, -1) if email is not None else user_id
+                                    for _, _, email, user_id in todos} - {-1})
+        versions: Dict[int, int] = {}
+        if owners:
+            # Locks the owners, in id order, before the todos are inserted, like create_todo does.
+            # The lock keeps their versions current until the commit, so the new ones need not be read back.
+            query = (f"SELECT id, todos_version FROM user WHERE id IN ({_placeholders(count=len(owners))}) "
+                     "AND deleted_at IS NULL FOR UPDATE")
+            versions = {row[0]: row[1] + 1 for row in await db.fetch_all(query, owners)}
+            if versions:
+                await db.execute(
+                    "UPDATE user STRAIGHT_JOIN todo_change ON todo_change.slot = %s "
+                    "SET user.todos_version = user.todos_version + 1, user.todos_updated_at = UTC_TIMESTAMP(6), "
+                    "todo_change.changes = todo_change.changes + 1 "
+                    f"WHERE user.id IN ({_placeholders(count=len(versions))})",
+                    (change_slot(user_id=min(versions)), *versions))
+        rows: List[Tuple[Any, ...]] = []
+        for number, values, email, user_id in todos:
+            owner: Optional[int] = by_email.get(email) if email is not None else user_id
+            if owner not in versions:
+                _skip(number=number, error=ValueError("user not found"))
+                skipped += 1
+                continue
+            rows.append((*values, owner, versions[owner]))
+        if rows:
+            await db.executemany("INSERT INTO todo (title, description, due_time, status, user_id, version) "
+                                 "VALUES (%s, %s, %s, %s, %s, %s)", rows)
+        await _checkpoint(db=db, job=job, records=len(batch), inserted=len(rows), skipped=skipped)
+        await db.commit()
+        progress.add(records=len(batch), inserted=len(rows), skipped=skipped)
+    return progress.report()
+
+
+async def export_records(
+    db: AsyncConnection, kind: str, file: TextIO, file_format: str, batch_size: int = BULK_BATCH_SIZE
+) -> Dict[str, Any]:
+    """
+    Writes the users or the todos of the users not deleted to a file, in id order.
+
+    The rows are read from an unbuffered cursor one batch at a time and written as they arrive, so memory stays
+    bounded whatever the size of the tables.
+
+    Args:
+        db (AsyncConnection): The connection to read with.
+        kind (str): "users" or "todos".
+        file (TextIO): The file to write to, opened with `newline=""`.
+        file_format (str): "csv" or "ndjson".
+        batch_size (int): The number of rows fetched at a time.
+
+    Returns:
+        Dict[str, Any]: The report of the export: the records written, in "records", and the rows per second.
+    """
+    if kind == "users":
+        fields: Sequence[str] = USER_FIELDS
+        query = "SELECT email, name, firstname, password FROM user WHERE deleted_at IS NULL ORDER BY id"
+    else:
+        fields = TODO_FIELDS
+        query = ("SELECT todo.id, todo.title, todo.description, todo.created_at, todo.due_time, todo.status, "
+                 "user.email FROM todo JOIN user ON user.id = todo.user_id WHERE user.deleted_at IS NULL "
+                 "ORDER BY todo.id")
+    writer: Optional[Any] = None
+    if file_format == "csv":
+        writer = csv.writer(file)
+        writer.writerow(fields)
+    progress: _Progress = _Progress(name=f"export {kind}")
+    async for rows in db.stream(query, batch_size=batch_size):
+        if writer is not None:
+            writer.writerows([[value.isoformat() if isinstance(value, datetime) else value for value in row]
+                              for row in rows])
+        else:
+            file.write("".join(dumps(content=dict(zip(fields, row))).decode(encoding="utf-8") + "\n"
+                               for row in rows))
+        progress.add(records=len(rows))
+    return progress.report()
+
+
+def _format(path: str, file_format: Optional[str]) -> str:
+    if file_format is not None:
+        return file_format
+    extension: str = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension in (".ndjson", ".jsonl"):
+        return "ndjson"
+    raise SystemExit(f"Cannot tell the format of {path}: use --format")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Imports or exports the users or the todos.
+
+    Args:
+        argv (Optional[List[str]]): The command line arguments.
+    """
+    parser = argparse.ArgumentParser(description="Import or export the users or the todos as CSV or NDJSON.")
+    parser.add_argument("direction", choices=("import", "export"))
+    parser.add_argument("kind", choices=KINDS)
+    parser.add_argument("path", help="file to read or write, - for the standard input or output")
+    parser.add_argument("--format", choices=FORMATS, help="file format, guessed from the file extension by default")
+    parser.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE,
+                        help="number of records imported per transaction, or exported per fetch")
+    parser.add_argument("--hash-workers", type=int, default=BULK_HASH_WORKERS,
+                        help="number of processes hashing the passwords of the imported users")
+    parser.add_argument("--job", help="name of the checkpoint of the import, defaults to the kind and file name")
+    parser.add_argument("--restart", action="store_true",
+                        help="forget the checkpoint of the job and import from the first record")
+    args: argparse.Namespace = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    file_format: str = _format(path=args.path, file_format=args.format)
+    job: str = (args.job or f"{args.kind}:{os.path.basename(args.path)}")[:255]
+
+    async def run(file: TextIO) -> Dict[str, Any]:
+        if args.direction == "export":
+            async with connect(read_only=True) as db:
+                return await export_records(
+                    db=db, kind=args.kind, file=file, file_format=file_format, batch_size=args.batch_size)
+        async with connect() as db:
+            if args.restart:
+                await db.execute("DELETE FROM bulk_import WHERE job = %s", (job,))
+                await db.commit()
+            records: Iterator[Record] = read_records(file=file, file_format=file_format)
+            if args.kind == "todos":
+                return await import_todos(db=db, records=records, job=job, batch_size=args.batch_size)
+            hasher: PasswordHasher = PasswordHasher(
+                executor="process", workers=args.hash_workers, queue_size=args.batch_size)
+            try:
+                return await import_users(
+                    db=db, records=records, job=job, batch_size=args.batch_size, hasher=hasher)
+            finally:
+                hasher.shutdown()
+
+    if args.path == "-":
+        report: Dict[str, Any] = asyncio.run(run(file=sys.stdout if args.direction == "export" else sys.stdin))
+    else:
+        with open(args.path, mode="w" if args.direction == "export" else "r", encoding="utf-8", newline="") as file:
+            report = asyncio.run(run(file=file))
+    if args.direction == "export":
+        logger.info("%s: %d records written in %.1f s, %.0f rows/s", report["job"], report["records"],
+                    report["seconds"], report["rows_per_second"])
+    else:
+        logger.info("%s: %d records, %d inserted, %d skipped, %d failed in %.1f s, %.0f rows/s", report["job"],
+                    report["records"], report["inserted"], report["skipped"], report["failed"],
+                    report["seconds"], report["rows_per_second"])
+
+
+if __name__ == "__main__":
+    main()
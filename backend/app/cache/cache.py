@@ -0,0 +1,304 @@
+"""
+This module contains the in-process read caches of the Todo app.
+
+The following classes and objects are available:
+
+- LRUCache: A bounded least-recently-used cache with an optional time to live and hit/miss counters.
+- TodoCache: A cache of todo list pages, whose pages of a user are invalidated together whenever one of the user's
+  todos changes.
+- UserIdCache: A cache of the email to user id mapping.
+- todo_cache: The todo list cache shared by every request.
+- user_id_cache: The email to user id cache shared by every request.
+- todo_stats_cache: The cache of the counts of every todo, keyed by the number of committed writes to any todo.
+
+The caches use the following environment variables:
+
+- TODO_CACHE_SIZE (int): The maximum number of cached todo list pages, across every user. Defaults to 4096.
+- TODO_CACHE_TTL (float): The maximum number of seconds a todo list, a count or an email to user id entry stays
+  cached. Defaults to 30. Invalidation only reaches the caches of the process handling the write, so this bounds how
+  stale other worker processes can be, including how long they map the email of a deleted or renamed user to its old
+  id, and how old the due windows of the cached counts are.
+- USER_ID_CACHE_SIZE (int): The maximum number of cached email to user id entries. Defaults to 10000.
+
+The caches are only used from the event loop thread and need no locking.
+"""
+
+import os
+import time
+from collections import OrderedDict
+from typing import (Any, Dict, Generic, Hashable, List, Optional, Set, Tuple,
+                    TypeVar)
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TODO_CACHE_SIZE: int = int(os.getenv(key="TODO_CACHE_SIZE", default="4096"))
+TODO_CACHE_TTL: float = float(os.getenv(key="TODO_CACHE_TTL", default="30"))
+USER_ID_CACHE_SIZE: int = int(
+    os.getenv(key="USER_ID_CACHE_SIZE", default="10000"))
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """
+    A bounded least-recently-used cache.
+
+    Entries beyond `size` evict the least recently used one, and entries older than `ttl` seconds are treated as
+    missing. A size of 0 disables the cache.
+    """
+
+    def __init__(self, size: int, ttl: Optional[float] = None) -> None:
+        self.size: int = size
+        self.ttl: Optional[float] = ttl
+        self._entries: OrderedDict[K, Tuple[V, float]] = OrderedDict()
+        self._hits: int = 0
+        self._misses: int = 0
+        self._evictions: int = 0
+
+    def get(self, key: K) -> Optional[V]:
+        """
+        Returns a cached value.
+
+        Args:
+            key (K): The key of the value.
+
+        Returns:
+            Optional[V]: The value, or None if it is not cached or expired.
+        """
+        entry: Optional[Tuple[V, float]] = self._entries.get(key)
+        if entry is None or (self.ttl is not None and time.monotonic() - entry[1] > self.ttl):
+            if entry is not None:
+                del self._entries[key]
+            self._misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return entry[0]
+
+    def put(self, key: K, value: V) -> None:
+        """
+        Caches a value, evicting the least recently used entries beyond the cache size.
+
+        Args:
+            key (K): The key of the value.
+            value (V): The value.
+        """
+        if self.size <= 0:
+            return
+        self._entries[key] = (value, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def peek(self, key: K) -> Optional[V]:
+        """
+        Returns a cached value without counting a hit or a miss or refreshing its position.
+
+        Args:
+            key (K): The key of the value.
+
+        Returns:
+            Optional[V]: The value, or None if it is not cached.
+        """
+        entry: Optional[Tuple[V, float]] = self._entries.get(key)
+        return None if entry is None else entry[0]
+
+    def keys(self) -> List[K]:
+        """
+        Returns the keys of the cached values, least recently used first, including the expired ones.
+
+        Returns:
+            List[K]: The keys.
+        """
+        return list(self._entries)
+
+    def delete(self, key: K) -> None:
+        """
+        Removes a value from the cache.
+
+        Args:
+            key (K): The key of the value.
+        """
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """
+        Removes every value from the cache.
+        """
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int | float]:
+        """
+        Returns a snapshot of the cache metrics.
+
+        Returns:
+            Dict[str, int | float]: The number of entries, hits, misses and evictions, and the hit rate.
+        """
+        lookups: int = self._hits + self._misses
+        return {
+            "size": self.size,
+            "entries": len(self._entries),
+            "hits": self._hits,
+            "misses": self._misses,
+            "evictions": self._evictions,
+            "hit_rate": self._hits / lookups if lookups else 0.0,
+        }
+
+
+class TodoCache:
+    """
+    A cache of todo list pages.
+
+    Each variant of a user's list (page, filters and projection) is one entry of a single LRU, so `size` bounds the
+    pages of every user together. The variants cached for each user are tracked apart, so that a write to any of
+    their todos drops all of them at once.
+    """
+
+    def __init__(self, size: int = TODO_CACHE_SIZE, ttl: float = TODO_CACHE_TTL) -> None:
+        self._pages: LRUCache[Tuple[int, Hashable], Any] = LRUCache(size=size, ttl=ttl)
+        self._variants: Dict[int, Set[Hashable]] = {}
+        self._tracked: int = 0
+        self._invalidations: int = 0
+
+    def version(self) -> int:
+        """
+        Returns a counter increased by every invalidation.
+
+        A reader takes it before querying the database and passes it to `put`, so that a list read concurrently
+        with a write is never cached after the write invalidated the user's entry.
+
+        Returns:
+            int: The number of invalidations so far.
+        """
+        return self._invalidations
+
+    def get(self, user_id: int, variant: Hashable) -> Optional[Any]:
+        """
+        Returns a cached todo list page.
+
+        Args:
+            user_id (int): The id of the user owning the todos.
+            variant (Hashable): The parameters of the page.
+
+        Returns:
+            Optional[Any]: The cached page, or None if it is not cached.
+        """
+        return self._pages.get(key=(user_id, variant))
+
+    def put(self, user_id: int, variant: Hashable, value: Any, version: int) -> None:
+        """
+        Caches a todo list page, unless an invalidation happened since `version` was taken.
+
+        Args:
+            user_id (int): The id of the user owning the todos.
+            variant (Hashable): The parameters of the page.
+            value (Any): The page.
+            version (int): The value of `version()` before the page was read from the database.
+        """
+        if version != self._invalidations:
+            return
+        self._pages.put(key=(user_id, variant), value=value)
+        variants: Set[Hashable] = self._variants.setdefault(user_id, set())
+        if variant not in variants:
+            variants.add(variant)
+            self._tracked += 1
+        # The tracked variants may keep pages evicted from the LRU; trim them back to the same size.
+        if self._tracked > 2 * max(self._pages.size, 1):
+            self._variants = {}
+            self._tracked = 0
+            for cached_id, cached_variant in self._pages.keys():
+                self._variants.setdefault(cached_id, set()).add(cached_variant)
+                self._tracked += 1
+
+    def invalidate(self, user_id: int) -> None:
+        """
+        Drops every cached page of a user.
+
+        Args:
+            user_id (int): The id of the user whose todos changed.
+        """
+        self._invalidations += 1
+        variants: Set[Hashable] = self._variants.pop(user_id, set())
+        self._tracked -= len(variants)
+        for variant in variants:
+            self._pages.delete(key=(user_id, variant))
+
+    def stats(self) -> Dict[str, int | float]:
+        """
+        Returns a snapshot of the cache metrics.
+
+        Returns:
+            Dict[str, int | float]: The LRU metrics and the number of invalidations.
+        """
+        return {**self._pages.stats(), "invalidations": self._invalidations}
+
+
+class UserIdCache:
+    """
+    A cache of the email to user id mapping, which can be invalidated by user id.
+
+    Entries expire after `ttl` seconds, since the invalidations of a user deleted or renamed in another worker process
+    never reach this one.
+    """
+
+    def __init__(self, size: int = USER_ID_CACHE_SIZE, ttl: float = TODO_CACHE_TTL) -> None:
+        self._ids: LRUCache[str, int] = LRUCache(size=size, ttl=ttl)
+        self._emails: Dict[int, str] = {}
+
+    def get(self, email: str) -> Optional[int]:
+        """
+        Returns the cached id of a user.
+
+        Args:
+            email (str): The email address of the user.
+
+        Returns:
+            Optional[int]: The id of the user, or None if it is not cached.
+        """
+        return self._ids.get(key=email)
+
+    def put(self, email: str, user_id: int) -> None:
+        """
+        Caches the id of a user.
+
+        Args:
+            email (str): The email address of the user.
+            user_id (int): The id of the user.
+        """
+        self._ids.put(key=email, value=user_id)
+        self._emails[user_id] = email
+        # The reverse mapping may keep entries evicted from the LRU; trim it back to the same size.
+        if len(self._emails) > 2 * max(self._ids.size, 1):
+            self._emails = {
+                cached_id: cached_email for cached_id, cached_email in self._emails.items()
+                if self._ids.peek(key=cached_email) == cached_id
+            }
+
+    def invalidate(self, user_id: int) -> None:
+        """
+        Drops the cached mapping of a user whose email changed or who was deleted.
+
+        Args:
+            user_id (int): The id of the user.
+        """
+        email: Optional[str] = self._emails.pop(user_id, None)
+        if email is not None:
+            self._ids.delete(key=email)
+
+    def stats(self) -> Dict[str, int | float]:
+        """
+        Returns a snapshot of the cache metrics.
+
+        Returns:
+            Dict[str, int | float]: The LRU metrics.
+        """
+        return self._ids.stats()
+
+
+todo_cache: TodoCache = TodoCache()
+user_id_cache: UserIdCache = UserIdCache()
+todo_stats_cache: LRUCache[int, Dict[str, Any]] = LRUCache(size=1, ttl=TODO_CACHE_TTL)
@@ -1,41 +1,1135 @@
 """
-This module contains a function for getting a connection to a MySQL database using the mysql.connector module.
+This module contains the database access layer for the Todo app, built on top of the mysql.connector module.
 
-The following function is available:
+The following functions and classes are available:
 
-- get_db() -> PooledMySQLConnection | MySQLConnection | Any: Returns a connection to the MySQL database.
+- get_db(host: Optional[str], port: Optional[int]) -> PooledMySQLConnection | MySQLConnection | Any: Returns a new
+  connection to the MySQL primary, or to the given server.
+- ConnectionPool: A sized, thread-safe pool of MySQL connections with health checks, recycling and metrics.
+- get_pool() -> ConnectionPool: Returns the process-wide connection pool, creating it on first use.
+- AsyncConnection: An asynchronous facade over a pooled connection which keeps blocking driver calls off the
+  event loop.
+- ReplicaSet: The pools of the read replicas, their health, and the routing of the reads.
+- get_replicas() -> Optional[ReplicaSet]: Returns the process-wide replica set, or None without replicas.
+- ReadYourWritesMiddleware: ASGI middleware carrying the time of the last write of a client across its requests, in
+  a signed header and cookie, so that its reads go to the primary until the replicas have applied it.
+- connect(read_only: bool) -> AsyncIterator[AsyncConnection]: Async context manager checking a connection out of the
+  primary pool, or out of a replica pool for reads.
+- monitor_replicas(interval: float) -> None: Checks the health of the replicas forever, for the application lifespan.
+- ping(timeout: float) -> bool: Checks that the database is reachable, for the readiness probe.
+- close() -> None: Closes the pools and the driver and checkout thread pools on shutdown.
 
-The function uses the following parameters:
+The connection uses the following environment variables:
 
-- host (str): The hostname or IP address of the MySQL server.
-- user (str): The MySQL user to authenticate as.
-- password (str): The password for the MySQL user.
-- database (str): The name of the MySQL database to use.
+- MYSQL_HOST (str): The hostname or IP address of the MySQL server.
+- MYSQL_USER (str): The MySQL user to authenticate as.
+- MYSQL_ROOT_PASSWORD (str): The password for the MySQL user.
+- MYSQL_DATABASE (str): The name of the MySQL database to use.
+- MYSQL_REPLICA_HOSTS (str): Comma-separated `host` or `host:port` of the read replicas, which share the user,
+  password and database of the primary. Defaults to none, every statement then goes to the primary.
 
-The function returns a connection to the MySQL database, which can be used to execute SQL queries and transactions.
+The routing of the reads uses the following environment variables:
+
+- REPLICA_MAX_LAG (float): Seconds a replica may lag behind the primary before reads avoid it. Defaults to 10.
+- REPLICA_CHECK_INTERVAL (float): Seconds between two health checks of the replicas. Defaults to 5.
+- REPLICA_RETRY_AFTER (float): Seconds a replica which failed to connect is left out of the rotation. Defaults to 30.
+- READ_YOUR_WRITES_WINDOW (float): Seconds the reads of a client go to the primary after it committed a write, so
+  that it reads its own writes despite the replication lag. Defaults to REPLICA_MAX_LAG: the replicas lagging more
+  are avoided, so the others have applied the write by the time the window ends. The time of the write is kept by
+  the client, see ReadYourWritesMiddleware, so it holds whichever worker process serves its next request.
+- READ_YOUR_WRITES_SECRET (str): The key signing the time of the last write of the clients, shared by every worker
+  process. Defaults to SECRET, the key of the JWT tokens. Without either, each process signs with a random key of its
+  own, and a client whose next request reaches another process may miss its latest writes.
+
+The pool uses the following environment variables:
+
+- MYSQL_POOL_SIZE (int): The maximum number of open connections, to the primary and to each replica. Defaults to 10.
+- MYSQL_POOL_TIMEOUT (float): Seconds a request waits for a free connection before failing with a 503, counted from
+  when it asks for one. Defaults to 10.
+- MYSQL_POOL_RECYCLE (float): Seconds after which a connection is closed and replaced. Defaults to 3600.
+- MYSQL_POOL_PING_INTERVAL (float): Seconds a connection may sit idle before it is pinged on checkout. Defaults to 30.
+- MYSQL_POOL_WARMUP (int): The number of connections opened when the application starts. Defaults to 1.
+
+The asynchronous access path uses the following environment variables:
+
+- DB_EXECUTOR (str): "thread" runs every driver call on a dedicated bounded thread pool, "inline" runs it directly
+  on the event loop. Defaults to "thread".
+- DB_EXECUTOR_WORKERS (int): The number of threads of the driver thread pool. Defaults to MYSQL_POOL_SIZE times the
+  number of servers.
+- DB_CHECKOUT_WORKERS (int): The number of threads of the checkout thread pool, on which the requests wait for a free
+  connection. The requests beyond it wait in line, within the same MYSQL_POOL_TIMEOUT. Defaults to
+  DB_EXECUTOR_WORKERS.
 """
 
+import asyncio
+import contextvars
+import functools
+import hashlib
+import hmac
+import logging
+import math
 import os
-from typing import Any
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import asynccontextmanager, suppress
+from http.cookies import CookieError, SimpleCookie
+from typing import (Any, AsyncIterator, Callable, Dict, List, Optional,
+                    Sequence, Tuple, TypeVar)
 
 import mysql.connector
+from app.metrics.metrics import InstrumentedConnection
 from dotenv import load_dotenv
+from fastapi import HTTPException
 from mysql.connector.connection import MySQLConnection
+from mysql.connector.constants import ClientFlag
+from mysql.connector.cursor import MySQLCursor
 from mysql.connector.pooling import PooledMySQLConnection
 
 load_dotenv()
 
+POOL_SIZE: int = int(os.getenv(key="MYSQL_POOL_SIZE", default="10"))
+POOL_TIMEOUT: float = float(os.getenv(key="MYSQL_POOL_TIMEOUT", default="10"))
+POOL_RECYCLE: float = float(os.getenv(key="MYSQL_POOL_RECYCLE", default="3600"))
+POOL_PING_INTERVAL: float = float(
+    os.getenv(key="MYSQL_POOL_PING_INTERVAL", default="30"))
+POOL_WARMUP: int = int(os.getenv(key="MYSQL_POOL_WARMUP", default="1"))
+REPLICA_HOSTS: List[str] = [
+    host.strip() for host in os.getenv(key="MYSQL_REPLICA_HOSTS", default="").split(",") if host.strip()]
+REPLICA_MAX_LAG: float = float(os.getenv(key="REPLICA_MAX_LAG", default="10"))
+REPLICA_CHECK_INTERVAL: float = float(
+    os.getenv(key="REPLICA_CHECK_INTERVAL", default="5"))
+REPLICA_RETRY_AFTER: float = float(
+    os.getenv(key="REPLICA_RETRY_AFTER", default="30"))
+READ_YOUR_WRITES_WINDOW: float = float(
+    os.getenv(key="READ_YOUR_WRITES_WINDOW", default=str(REPLICA_MAX_LAG)))
+READ_YOUR_WRITES_SECRET: Optional[str] = os.getenv(
+    key="READ_YOUR_WRITES_SECRET", default=os.getenv(key="SECRET"))
+DB_EXECUTOR: str = os.getenv(key="DB_EXECUTOR", default="thread")
+DB_EXECUTOR_WORKERS: int = int(
+    os.getenv(key="DB_EXECUTOR_WORKERS", default=str(POOL_SIZE * (1 + len(REPLICA_HOSTS)))))
+DB_CHECKOUT_WORKERS: int = int(
+    os.getenv(key="DB_CHECKOUT_WORKERS", default=str(DB_EXECUTOR_WORKERS)))
+# The request header and the cookie carrying the signed time of the last write of a client.
+LAST_WRITE_HEADER = "X-Last-Write"
+LAST_WRITE_COOKIE = "last_write"
+
+T = TypeVar("T")
+
+logger: logging.Logger = logging.getLogger(name="app.db")
 
-def get_db() -> PooledMySQLConnection | MySQLConnection | Any:
+
+def get_db(host: Optional[str] = None, port: Optional[int] = None) -> PooledMySQLConnection | MySQLConnection | Any:
     """
     Returns a connection to the MySQL database using the mysql.connector module.
 
+    The connection reports the number of rows matched rather than changed by UPDATE statements, so that handlers
+    can tell a missing row from an update which left the row unchanged without reading it first.
+
+    Args:
+        host (Optional[str]): The server to connect to, such as a replica. Defaults to MYSQL_HOST, the primary.
+        port (Optional[int]): The port of the server. Defaults to the MySQL port.
+
     Returns:
         PooledMySQLConnection | MySQLConnection | Any: A connection to the MySQL database.
     """
     return mysql.connector.connect(
-        host=os.getenv(key="MYSQL_HOST"),
+        host=host or os.getenv(key="MYSQL_HOST"),
         user=os.getenv(key="MYSQL_USER"),
         password=os.getenv(key="MYSQL_ROOT_PASSWORD"),
         database=os.getenv(key="MYSQL_DATABASE"),
+        client_flags=[ClientFlag.FOUND_ROWS],
+        **({} if port is None else {"port": port}),
     )
+
+
+class PoolTimeoutError(Exception):
+    """
+    Raised when no connection could be checked out of the pool before the timeout expired.
+    """
+
+
+class _PooledConnection:
+    """
+    Book-keeping for a connection owned by the pool.
+    """
+
+    __slots__ = ("connection", "created_at", "last_used_at")
+
+    def __init__(self, connection: MySQLConnection | Any) -> None:
+        now: float = time.monotonic()
+        self.connection: MySQLConnection | Any = connection
+        self.created_at: float = now
+        self.last_used_at: float = now
+
+
+class ConnectionPool:
+    """
+    A sized, thread-safe pool of database connections.
+
+    Connections are opened lazily up to `size`. A checkout blocks for at most `timeout` seconds when every
+    connection is in use. Connections older than `recycle` seconds are replaced, and connections idle for more
+    than `ping_interval` seconds are pinged before being handed out so that dropped connections are replaced
+    instead of failing the request. The connections returned by `factory` are wrapped so that their statements
+    are timed.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], MySQLConnection | Any] = get_db,
+        size: int = POOL_SIZE,
+        timeout: float = POOL_TIMEOUT,
+        recycle: float = POOL_RECYCLE,
+        ping_interval: float = POOL_PING_INTERVAL,
+    ) -> None:
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self.factory: Callable[[], MySQLConnection | Any] = factory
+        self.size: int = size
+        self.timeout: float = timeout
+        self.recycle: float = recycle
+        self.ping_interval: float = ping_interval
+        self._idle: List[_PooledConnection] = []
+        self._in_use: Dict[int, _PooledConnection] = {}
+        self._opened: int = 0
+        self._waiters: int = 0
+        self._condition = threading.Condition()
+        self._checkouts: int = 0
+        self._timeouts: int = 0
+        self._recycled: int = 0
+        self._wait_time_total: float = 0.0
+        self._wait_time_max: float = 0.0
+        self._closed: bool = False
+
+    def acquire(self, timeout: Optional[float] = None) -> MySQLConnection | Any:
+        """
+        Checks a healthy connection out of the pool.
+
+        Args:
+            timeout (Optional[float]): Seconds to wait for a free connection. Defaults to the pool timeout.
+
+        Raises:
+            PoolTimeoutError: If no connection became available within the timeout.
+
+        Returns:
+            MySQLConnection | Any: A connection which must be given back with `release`.
+        """
+        started: float = time.monotonic()
+        deadline: float = started + (self.timeout if timeout is None else timeout)
+        while True:
+            entry: Optional[_PooledConnection] = None
+            with self._condition:
+                if not self._idle and self._opened >= self.size:
+                    self._waiters += 1
+                    try:
+                        while not self._idle and self._opened >= self.size:
+                            remaining: float = deadline - time.monotonic()
+                            if remaining <= 0:
+                                self._timeouts += 1
+                                raise PoolTimeoutError(
+                                    "Timed out waiting for a database connection")
+                            self._condition.wait(timeout=remaining)
+                    finally:
+                        self._waiters -= 1
+                if self._idle:
+                    entry = self._idle.pop()
+                else:
+                    self._opened += 1
+            if entry is None:
+                entry = self._open()
+            elif not self._is_healthy(entry=entry):
+                self._discard(entry=entry)
+                continue
+            waited: float = time.monotonic() - started
+            with self._condition:
+                self._in_use[id(entry.connection)] = entry
+                self._checkouts += 1
+                self._wait_time_total += waited
+                self._wait_time_max = max(self._wait_time_max, waited)
+            return entry.connection
+
+    def release(self, connection: MySQLConnection | Any, discard: bool = False) -> None:
+        """
+        Gives a connection back to the pool, rolling back any transaction left open by the request.
+
+        Args:
+            connection (MySQLConnection | Any): A connection previously returned by `acquire`.
+            discard (bool): Close the connection instead of reusing it, e.g. when a result set was left unread.
+        """
+        with self._condition:
+            entry: Optional[_PooledConnection] = self._in_use.pop(
+                id(connection), None)
+        if entry is None:
+            return
+        if discard:
+            self._discard(entry=entry)
+            return
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+        except mysql.connector.Error:
+            self._discard(entry=entry)
+            return
+        entry.last_used_at = time.monotonic()
+        with self._condition:
+            if not self._closed:
+                self._idle.append(entry)
+                self._condition.notify()
+                return
+        self._discard(entry=entry)
+
+    def warm(self, count: int) -> int:
+        """
+        Opens connections until at least `count` of them, capped at the pool size, are open.
+
+        Args:
+            count (int): The number of connections to have open.
+
+        Returns:
+            int: The number of connections opened by this call.
+        """
+        opened: int = 0
+        while True:
+            with self._condition:
+                if self._closed or self._opened >= min(count, self.size):
+                    return opened
+                self._opened += 1
+            entry: _PooledConnection = self._open()
+            opened += 1
+            with self._condition:
+                self._idle.append(entry)
+                self._condition.notify()
+
+    def close(self) -> None:
+        """
+        Closes every idle connection. Connections still checked out are closed when they are released.
+        """
+        with self._condition:
+            self._closed = True
+            idle: List[_PooledConnection] = self._idle
+            self._idle = []
+        for entry in idle:
+            self._discard(entry=entry)
+
+    def load(self) -> float:
+        """
+        Returns how busy the pool is, without locking: the connections in use and the waiting requests per connection.
+
+        Returns:
+            float: 0 when no connection is in use, 1 when every connection is, more when requests are waiting.
+        """
+        return (len(self._in_use) + self._waiters) / self.size
+
+    def stats(self) -> Dict[str, int | float]:
+        """
+        Returns a snapshot of the pool metrics.
+
+        Returns:
+            Dict[str, int | float]: The pool size, the number of open, idle and in-use connections, the number of
+            requests currently waiting for a connection, and checkout wait time counters.
+        """
+        with self._condition:
+            return {
+                "size": self.size,
+                "opened": self._opened,
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+                "waiters": self._waiters,
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "recycled": self._recycled,
+                "wait_time_total": self._wait_time_total,
+                "wait_time_max": self._wait_time_max,
+                "wait_time_avg": self._wait_time_total / self._checkouts if self._checkouts else 0.0,
+            }
+
+    def _open(self) -> _PooledConnection:
+        try:
+            return _PooledConnection(connection=InstrumentedConnection(connection=self.factory()))
+        except BaseException:
+            with self._condition:
+                self._opened -= 1
+                self._condition.notify()
+            raise
+
+    def _is_healthy(self, entry: _PooledConnection) -> bool:
+        now: float = time.monotonic()
+        if now - entry.created_at > self.recycle:
+            with self._condition:
+                self._recycled += 1
+            return False
+        if now - entry.last_used_at < self.ping_interval:
+            return True
+        try:
+            entry.connection.ping(reconnect=False)
+        except mysql.connector.Error:
+            return False
+        return True
+
+    def _discard(self, entry: _PooledConnection) -> None:
+        try:
+            entry.connection.close()
+        except mysql.connector.Error:
+            pass
+        finally:
+            with self._condition:
+                self._opened -= 1
+                self._condition.notify()
+
+
+class AsyncConnection:
+    """
+    An asynchronous facade over a pooled connection.
+
+    Every driver call is a blocking network round trip, so each method runs it on the executor given at
+    construction time and awaits the result. Without an executor the calls run directly on the event loop.
+    The number of statements sent through the connection is counted in `statements`, and every statement is timed
+    by the cursors of the pooled connection, see app.metrics.metrics. `on_commit` is called on the event loop after
+    each commit.
+
+    A caller cancelled while awaiting a driver call stops waiting, but the call goes on in its thread with the
+    connection; `settle` waits for it before the connection is given back.
+    """
+
+    def __init__(self, connection: MySQLConnection | Any, executor: Optional[ThreadPoolExecutor]) -> None:
+        self.connection: MySQLConnection | Any = connection
+        self.broken: bool = False
+        self.statements: int = 0
+        self.on_commit: Optional[Callable[[], None]] = None
+        self._executor: Optional[ThreadPoolExecutor] = executor
+        self._in_flight: Optional[Future[Any]] = None
+
+    async def run(self, function: Callable[..., T], *args: Any) -> T:
+        """
+        Runs a blocking callable on the driver executor.
+
+        Args:
+            function (Callable[..., T]): The callable to run.
+            *args (Any): The positional arguments of the callable.
+
+        Returns:
+            T: The value returned by the callable.
+        """
+        if self._executor is None:
+            return function(*args)
+        # The context carries the request the statement is attributed to in the metrics.
+        context: contextvars.Context = contextvars.copy_context()
+        # Cancelling the caller cancels the call only if no thread has started it yet; `settle` waits for the others.
+        self._in_flight = self._executor.submit(context.run, function, *args)
+        return await asyncio.wrap_future(self._in_flight)
+
+    async def settle(self) -> None:
+        """
+        Waits for the driver call a cancelled caller left running, if any, so that the connection is free.
+        """
+        future: Optional[Future[Any]] = self._in_flight
+        if future is not None and not future.done():
+            # Its outcome is of no use to anyone: the release rolls back or discards the connection as needed.
+            with suppress(Exception):
+                await asyncio.wrap_future(future)
+
+    async def fetch_one(self, query: str, params: Sequence[Any] = ()) -> Optional[Tuple[Any, ...]]:
+        """
+        Executes a query and returns its first row.
+
+        Args:
+            query (str): The SQL query to execute.
+            params (Sequence[Any]): The query parameters.
+
+        Returns:
+            Optional[Tuple[Any, ...]]: The first row, or None if the query returned no row.
+        """
+        return await self.run(self._fetch_one, query, params)
+
+    async def fetch_all(self, query: str, params: Sequence[Any] = ()) -> List[Tuple[Any, ...]]:
+        """
+        Executes a query and returns every row.
+
+        Args:
+            query (str): The SQL query to execute.
+            params (Sequence[Any]): The query parameters.
+
+        Returns:
+            List[Tuple[Any, ...]]: The rows returned by the query.
+        """
+        return await self.run(self._fetch_all, query, params)
+
+    async def execute(self, query: str, params: Sequence[Any] = ()) -> MySQLCursor:
+        """
+        Executes a statement which returns no rows.
+
+        Args:
+            query (str): The SQL statement to execute.
+            params (Sequence[Any]): The statement parameters.
+
+        Returns:
+            MySQLCursor: The closed cursor, exposing `rowcount` and `lastrowid`.
+        """
+        return await self.run(self._execute, query, params)
+
+    async def executemany(self, query: str, seq_params: Sequence[Sequence[Any]]) -> MySQLCursor:
+        """
+        Executes a statement once per parameter set, as a single multi-row INSERT when possible.
+
+        Args:
+            query (str): The SQL statement to execute.
+            seq_params (Sequence[Sequence[Any]]): One parameter set per row.
+
+        Returns:
+            MySQLCursor: The closed cursor, exposing `rowcount` and `lastrowid`.
+        """
+        return await self.run(self._executemany, query, seq_params)
+
+    async def stream(
+        self, query: str, params: Sequence[Any] = (), batch_size: int = 1000
+    ) -> AsyncIterator[List[Tuple[Any, ...]]]:
+        """
+        Executes a query on an unbuffered cursor and yields its rows in batches as the server sends them.
+
+        Only one batch is held in memory at a time. If the iteration stops before the last row, the rest of the
+        result set is never read and the connection is marked as broken so that the pool discards it.
+
+        Args:
+            query (str): The SQL query to execute.
+            params (Sequence[Any]): The query parameters.
+            batch_size (int): The maximum number of rows per batch.
+
+        Yields:
+            List[Tuple[Any, ...]]: The next batch of rows.
+        """
+        cursor: MySQLCursor = await self.run(self._open_cursor, query, params)
+        exhausted: bool = False
+        try:
+            while True:
+                rows: List[Tuple[Any, ...]] = await self.run(cursor.fetchmany, batch_size)
+                if not rows:
+                    exhausted = True
+                    break
+                yield rows
+        finally:
+            if exhausted:
+                await self.run(cursor.close)
+            else:
+                self.broken = True
+
+    async def commit(self) -> None:
+        """
+        Commits the current transaction.
+        """
+        await self.run(self.connection.commit)
+        if self.on_commit is not None:
+            self.on_commit()
+
+    async def rollback(self) -> None:
+        """
+        Rolls back the current transaction.
+        """
+        await self.run(self.connection.rollback)
+
+    def _fetch_one(self, query: str, params: Sequence[Any]) -> Optional[Tuple[Any, ...]]:
+        cursor: MySQLCursor = self.connection.cursor()
+        self.statements += 1
+        try:
+            cursor.execute(query, params)
+            row: Optional[Tuple[Any, ...]] = cursor.fetchone()
+            # Drain the remaining rows so that the connection can run the next statement.
+            cursor.fetchall()
+            return row
+        finally:
+            cursor.close()
+
+    def _open_cursor(self, query: str, params: Sequence[Any]) -> MySQLCursor:
+        cursor: MySQLCursor = self.connection.cursor()
+        self.statements += 1
+        cursor.execute(query, params)
+        return cursor
+
+    def _fetch_all(self, query: str, params: Sequence[Any]) -> List[Tuple[Any, ...]]:
+        cursor: MySQLCursor = self.connection.cursor()
+        self.statements += 1
+        try:
+            cursor.execute(query, params)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def _execute(self, query: str, params: Sequence[Any]) -> MySQLCursor:
+        cursor: MySQLCursor = self.connection.cursor()
+        self.statements += 1
+        try:
+            cursor.execute(query, params)
+            return cursor
+        finally:
+            cursor.close()
+
+    def _executemany(self, query: str, seq_params: Sequence[Sequence[Any]]) -> MySQLCursor:
+        cursor: MySQLCursor = self.connection.cursor()
+        self.statements += 1
+        try:
+            cursor.executemany(query, seq_params)
+            return cursor
+        finally:
+            cursor.close()
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Returns the process-wide connection pool, creating it on first use.
+
+    Returns:
+        ConnectionPool: The connection pool shared by every request.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_checkout_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_executor() -> Optional[ThreadPoolExecutor]:
+    """
+    Returns the thread pool running the blocking driver calls, creating it on first use.
+
+    Returns:
+        Optional[ThreadPoolExecutor]: The driver thread pool, or None when DB_EXECUTOR is "inline".
+    """
+    global _executor
+    if DB_EXECUTOR == "inline":
+        return None
+    if _executor is None:
+        with _pool_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="db")
+    return _executor
+
+
+def get_checkout_executor() -> ThreadPoolExecutor:
+    """
+    Returns the thread pool on which the requests wait for a free connection, creating it on first use.
+
+    It is kept apart from the driver thread pool, whose threads the requests holding a connection need to give it
+    back, and from the default executor of the event loop, which the readiness probe and the replica health checks
+    use.
+
+    Returns:
+        ThreadPoolExecutor: The checkout thread pool.
+    """
+    global _checkout_executor
+    if _checkout_executor is None:
+        with _pool_lock:
+            if _checkout_executor is None:
+                _checkout_executor = ThreadPoolExecutor(
+                    max_workers=DB_CHECKOUT_WORKERS, thread_name_prefix="db-checkout")
+    return _checkout_executor
+
+
+class _Replica:
+    """
+    Book-keeping for a read replica.
+    """
+
+    __slots__ = ("name", "pool", "down_until", "lag", "reads", "failures")
+
+    def __init__(self, name: str, pool: ConnectionPool) -> None:
+        self.name: str = name
+        self.pool: ConnectionPool = pool
+        self.down_until: float = 0.0
+        self.lag: Optional[float] = None
+        self.reads: int = 0
+        self.failures: int = 0
+
+
+class ReplicaSet:
+    """
+    The read replicas of the database, each with its own pool.
+
+    A read goes to the healthy replica with the least busy pool, and to the primary when no replica is healthy. A
+    replica is left out for `retry_after` seconds when a connection to it cannot be opened, and while the last health
+    check found it more than `max_lag` seconds behind the primary or not replicating. A server which reports no
+    replication status at all, or does not let the user read it, is assumed to be current.
+
+    A client which committed a write less than `window` seconds ago reads from the primary, so that it reads its own
+    writes. The time of its last write comes with its request, see ReadYourWritesMiddleware, so no state about the
+    clients is kept here. The pools and the health are shared with the driver threads.
+    """
+
+    def __init__(
+        self,
+        pools: Dict[str, ConnectionPool],
+        max_lag: float = REPLICA_MAX_LAG,
+        retry_after: float = REPLICA_RETRY_AFTER,
+        window: float = READ_YOUR_WRITES_WINDOW,
+    ) -> None:
+        if not pools:
+            raise ValueError("A replica set needs at least one replica")
+        self.max_lag: float = max_lag
+        self.retry_after: float = retry_after
+        self.window: float = window
+        self._replicas: List[_Replica] = [_Replica(name=name, pool=pool) for name, pool in pools.items()]
+        self._lock = threading.Lock()
+        self._pinned_reads: int = 0
+        self._fallback_reads: int = 0
+
+    def reads_primary(self, written_at: Optional[float]) -> bool:
+        """
+        Tells whether the reads of a client go to the primary, and counts them when they do.
+
+        Args:
+            written_at (Optional[float]): The Unix time of the last write the client committed, if any.
+
+        Returns:
+            bool: True if the client committed a write less than `window` seconds ago.
+        """
+        # Either way: the write may have been timed by a worker on another host, whose clock is slightly ahead.
+        if written_at is None or abs(time.time() - written_at) >= self.window:
+            return False
+        self._pinned_reads += 1
+        return True
+
+    def acquire(
+        self, primary: ConnectionPool, timeout: Optional[float] = None
+    ) -> Tuple[ConnectionPool, MySQLConnection | Any]:
+        """
+        Checks a connection out of the least busy healthy replica, or out of the primary pool when none is healthy.
+
+        Args:
+            primary (ConnectionPool): The pool of the primary.
+            timeout (Optional[float]): Seconds to wait for a free connection. Defaults to the timeout of the pool.
+
+        Raises:
+            PoolTimeoutError: If no connection of the chosen pool became available within its timeout.
+
+        Returns:
+            Tuple[ConnectionPool, MySQLConnection | Any]: The pool the connection must be given back to, and the
+            connection.
+        """
+        now: float = time.monotonic()
+        with self._lock:
+            healthy: List[_Replica] = [
+                replica for replica in self._replicas
+                if replica.down_until <= now and (replica.lag is None or replica.lag <= self.max_lag)]
+        # Shuffled first, so that idle replicas share the reads instead of the first one taking them all.
+        random.shuffle(healthy)
+        healthy.sort(key=lambda replica: replica.pool.load())
+        for replica in healthy:
+            try:
+                connection: MySQLConnection | Any = replica.pool.acquire(timeout=timeout)
+            except PoolTimeoutError:
+                raise
+            except Exception as e:
+                self._mark_down(replica=replica, error=e)
+                continue
+            with self._lock:
+                replica.reads += 1
+            return replica.pool, connection
+        with self._lock:
+            self._fallback_reads += 1
+        return primary, primary.acquire(timeout=timeout)
+
+    def check(self) -> None:
+        """
+        Pings every replica and reads its replication lag. Blocking, to be run off the event loop.
+        """
+        for replica in self._replicas:
+            try:
+                connection: MySQLConnection | Any = replica.pool.acquire()
+            except PoolTimeoutError:
+                # Every connection is in use, which shows the replica answers.
+                continue
+            except Exception as e:
+                self._mark_down(replica=replica, error=e)
+                continue
+            discard: bool = False
+            try:
+                connection.ping(reconnect=False)
+                lag: Optional[float] = self._read_lag(connection=connection)
+            except Exception as e:
+                discard = True
+                self._mark_down(replica=replica, error=e)
+                continue
+            finally:
+                replica.pool.release(connection, discard)
+            if lag is not None and lag > self.max_lag and (replica.lag is None or replica.lag <= self.max_lag):
+                logger.warning("replica %s is %s seconds behind, reads avoid it", replica.name, lag)
+            with self._lock:
+                replica.lag = lag
+                replica.down_until = 0.0
+
+    def warm(self, count: int) -> None:
+        """
+        Opens `count` connections to every replica, leaving out the replicas which cannot be reached.
+
+        Args:
+            count (int): The number of connections to have open to each replica.
+        """
+        for replica in self._replicas:
+            try:
+                replica.pool.warm(count=count)
+            except Exception as e:
+                self._mark_down(replica=replica, error=e)
+
+    def close(self) -> None:
+        """
+        Closes the pool of every replica.
+        """
+        for replica in self._replicas:
+            replica.pool.close()
+
+    def stats(self) -> Dict[str, Dict[str, int | float]]:
+        """
+        Returns a snapshot of the routing metrics and of the pool metrics of each replica.
+
+        Returns:
+            Dict[str, Dict[str, int | float]]: The reads pinned to the primary and the reads which fell back to it
+            under "routing", and the pool metrics, health, lag in seconds (-1 when unknown or not replicating), reads
+            and connection failures of each replica under "replica:<host>".
+        """
+        now: float = time.monotonic()
+        stats: Dict[str, Dict[str, int | float]] = {"routing": {
+            "pinned_reads": self._pinned_reads,
+            "fallback_reads": self._fallback_reads,
+        }}
+        with self._lock:
+            for replica in self._replicas:
+                stats[f"replica:{replica.name}"] = {
+                    **replica.pool.stats(),
+                    "healthy": int(replica.down_until <= now and (
+                        replica.lag is None or replica.lag <= self.max_lag)),
+                    "lag": -1.0 if replica.lag is None or replica.lag == float("inf") else replica.lag,
+                    "reads": replica.reads,
+                    "failures": replica.failures,
+                }
+        return stats
+
+    def _mark_down(self, replica: _Replica, error: Exception) -> None:
+        logger.warning("replica %s is unreachable, reads avoid it for %s seconds: %s",
+                       replica.name, self.retry_after, error)
+        with self._lock:
+            replica.failures += 1
+            replica.down_until = time.monotonic() + self.retry_after
+
+    @staticmethod
+    def _read_lag(connection: MySQLConnection | Any) -> Optional[float]:
+        # Servers before MySQL 8.0.22 only know the older statement and column names.
+        for query, column in (("SHOW REPLICA STATUS", "Seconds_Behind_Source"),
+                              ("SHOW SLAVE STATUS", "Seconds_Behind_Master")):
+            cursor: MySQLCursor = connection.cursor()
+            try:
+                cursor.execute(query)
+                row: Optional[Tuple[Any, ...]] = cursor.fetchone()
+                names: List[str] = [description[0] for description in cursor.description or ()]
+                cursor.fetchall()
+            except Exception:
+                continue
+            finally:
+                cursor.close()
+            if row is None or column not in names:
+                return None
+            lag: Any = row[names.index(column)]
+            # NULL when the replication threads are stopped.
+            return float("inf") if lag is None else float(lag)
+        return None
+
+
+_replicas: Optional[ReplicaSet] = None
+
+
+def _replica_pool(address: str) -> ConnectionPool:
+    host, _, port = address.partition(":")
+    return ConnectionPool(factory=functools.partial(get_db, host=host, port=int(port) if port else None))
+
+
+def get_replicas() -> Optional[ReplicaSet]:
+    """
+    Returns the process-wide replica set, creating it on first use from MYSQL_REPLICA_HOSTS.
+
+    Returns:
+        Optional[ReplicaSet]: The read replicas, or None when every statement goes to the primary.
+    """
+    global _replicas
+    if _replicas is None and REPLICA_HOSTS:
+        with _pool_lock:
+            if _replicas is None:
+                _replicas = ReplicaSet(pools={address: _replica_pool(address=address) for address in REPLICA_HOSTS})
+    return _replicas
+
+
+class _LastWrite:
+    """
+    The time of the last write of the client of a request: the one its request carried, then the one it committed.
+    """
+
+    def __init__(self, written_at: Optional[float]) -> None:
+        self.written_at: Optional[float] = written_at
+        self.committed: bool = False
+
+    def commit(self) -> None:
+        self.written_at = time.time()
+        self.committed = True
+
+
+_last_write: contextvars.ContextVar[Optional[_LastWrite]] = contextvars.ContextVar("last_write", default=None)
+
+
+class ReadYourWritesMiddleware:
+    """
+    ASGI middleware carrying the time of the last write of a client across its requests, so that its reads go to the
+    primary for the read-your-writes window after it, whichever worker process serves them.
+
+    The time is read from the X-Last-Write request header, or else from the last_write cookie, and is only trusted
+    when its HMAC-SHA256 signature matches: a client cannot send every read of its own to the primary. A response to
+    a request which committed a write carries the new signed time in both, for the clients which echo the header and
+    for the browsers which send the cookie back. Nothing is added without replicas, since every read then goes to the
+    primary anyway.
+
+    Args:
+        app (Callable): The ASGI application to wrap.
+        secret (Optional[str]): The signing key, shared by every worker process. A random key of this process is
+            used without one.
+        window (float): The seconds the cookie lasts, as long as the reads go to the primary after a write.
+    """
+
+    def __init__(
+        self, app: Callable[..., Any], secret: Optional[str] = READ_YOUR_WRITES_SECRET,
+        window: float = READ_YOUR_WRITES_WINDOW,
+    ) -> None:
+        self.app: Callable[..., Any] = app
+        self.window: float = window
+        if secret is None:
+            logger.warning("no READ_YOUR_WRITES_SECRET nor SECRET, the last writes are only known to the worker "
+                           "which served them")
+        self._key: bytes = secret.encode(encoding="utf-8") if secret is not None else os.urandom(32)
+
+    def sign(self, written_at: float) -> str:
+        """
+        Returns the signed token of the time of a write.
+
+        Args:
+            written_at (float): The Unix time of the write.
+
+        Returns:
+            str: The time and its signature, separated by a dot.
+        """
+        timestamp: str = f"{written_at:.6f}"
+        signature: str = hmac.new(key=self._key, msg=timestamp.encode(encoding="ascii"),
+                                  digestmod=hashlib.sha256).hexdigest()[:32]
+        return f"{timestamp}.{signature}"
+
+    def verify(self, token: str) -> Optional[float]:
+        """
+        Returns the time of a write from its signed token.
+
+        Args:
+            token (str): The token, from the header or the cookie of a request.
+
+        Returns:
+            Optional[float]: The Unix time of the write, or None if the token is malformed or not signed with the key.
+        """
+        token = token.strip()
+        try:
+            written_at: float = float(token.rpartition(".")[0])
+        except ValueError:
+            return None
+        # Signing the time again gives back the token only if it was issued with the same key.
+        if not math.isfinite(written_at) or not hmac.compare_digest(self.sign(written_at=written_at), token):
+            return None
+        return written_at
+
+    def _read(self, headers: Sequence[Tuple[bytes, bytes]]) -> Optional[float]:
+        header: bytes = LAST_WRITE_HEADER.lower().encode(encoding="ascii")
+        tokens: List[str] = []
+        for name, value in headers:
+            if name == header:
+                tokens.insert(0, value.decode(encoding="latin-1"))
+            elif name == b"cookie":
+                cookie: SimpleCookie = SimpleCookie()
+                with suppress(CookieError):
+                    cookie.load(value.decode(encoding="latin-1"))
+                if LAST_WRITE_COOKIE in cookie:
+                    tokens.append(cookie[LAST_WRITE_COOKIE].value)
+        for token in tokens:
+            written_at: Optional[float] = self.verify(token=token)
+            if written_at is not None:
+                return written_at
+        return None
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable[..., Any], send: Callable[..., Any]) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        state = _LastWrite(written_at=self._read(headers=scope["headers"]))
+        token: contextvars.Token = _last_write.set(state)
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start" and state.committed and self.window > 0:
+                signed: str = self.sign(written_at=state.written_at)
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (LAST_WRITE_HEADER.encode(encoding="ascii"), signed.encode(encoding="ascii")),
+                    (b"set-cookie", f"{LAST_WRITE_COOKIE}={signed}; Max-Age={math.ceil(self.window)}; Path=/; "
+                                    "HttpOnly; SameSite=Lax".encode(encoding="ascii")),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _last_write.reset(token)
+
+
+def _release_checkout(future: asyncio.Future[Tuple[ConnectionPool, MySQLConnection | Any]]) -> None:
+    # Gives back the connection of a checkout whose caller was cancelled.
+    if future.cancelled() or future.exception() is not None:
+        return
+    pool, connection = future.result()
+    pool.release(connection)
+
+
+@asynccontextmanager
+async def connect(read_only: bool = False) -> AsyncIterator[AsyncConnection]:
+    """
+    Checks a connection out of the pool and gives it back on exit.
+
+    Read-only connections come from a replica when replicas are configured, unless the client of the request committed
+    a write within the read-your-writes window, see ReadYourWritesMiddleware. Committing records the write for the
+    response to carry, and sends the later reads of the request to the primary. Waiting for a free connection happens
+    on the checkout thread pool, see get_checkout_executor, and lasts at most the pool timeout from the call, including
+    the time spent in line for a checkout thread. A cancelled caller never leaks the connection: one checked out after
+    the cancellation is given back at once, and one in use is given back once its driver call returns.
+
+    Args:
+        read_only (bool): Whether the caller only reads, and can be served by a replica. Reads outside of a request,
+            or of a client which does not send its last write back, may miss the latest writes.
+
+    Raises:
+        HTTPException: If no connection became available within the pool timeout.
+
+    Yields:
+        AsyncConnection: A connection reserved for the caller.
+    """
+    pool: ConnectionPool = get_pool()
+    replicas: Optional[ReplicaSet] = get_replicas()
+    executor: Optional[ThreadPoolExecutor] = get_executor()
+    last_write: Optional[_LastWrite] = _last_write.get()
+    replica: bool = replicas is not None and read_only and not replicas.reads_primary(
+        written_at=None if last_write is None else last_write.written_at)
+    deadline: float = time.monotonic() + pool.timeout
+
+    def checkout() -> Tuple[ConnectionPool, MySQLConnection | Any]:
+        # A checkout which waited in line for a thread past the deadline still takes an idle connection, if any.
+        timeout: float = max(deadline - time.monotonic(), 0)
+        if replica:
+            return replicas.acquire(primary=pool, timeout=timeout)
+        return pool, pool.acquire(timeout=timeout)
+
+    try:
+        if executor is None:
+            pool, connection = checkout()
+        else:
+            future: asyncio.Future[Tuple[ConnectionPool, MySQLConnection | Any]] = (
+                asyncio.get_running_loop().run_in_executor(get_checkout_executor(), checkout))
+            try:
+                pool, connection = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # The checkout goes on in its thread: the connection it gets must be given back.
+                future.add_done_callback(_release_checkout)
+                raise
+    except PoolTimeoutError as e:
+        raise HTTPException(
+            status_code=503, detail="Service Unavailable") from e
+    db: AsyncConnection = AsyncConnection(
+        connection=connection, executor=executor)
+    if replicas is not None and last_write is not None:
+        db.on_commit = last_write.commit
+
+    async def give_back() -> None:
+        await db.settle()
+        await db.run(pool.release, connection, db.broken)
+
+    try:
+        yield db
+    finally:
+        # Shielded, so that the connection is given back even if the caller is cancelled again meanwhile.
+        await asyncio.shield(give_back())
+
+
+async def monitor_replicas(interval: float = REPLICA_CHECK_INTERVAL) -> None:
+    """
+    Checks the health of the replicas every `interval` seconds, until cancelled. Returns at once without replicas.
+
+    Args:
+        interval (float): Seconds between two health checks.
+    """
+    replicas: Optional[ReplicaSet] = get_replicas()
+    if replicas is None:
+        return
+    while True:
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, replicas.check)
+        except Exception as e:
+            logger.warning("could not check the replicas: %s", e)
+        await asyncio.sleep(interval)
+
+
+async def ping(timeout: float) -> bool:
+    """
+    Checks that a connection can be checked out of the pool and answers a ping, within `timeout` seconds.
+
+    Args:
+        timeout (float): Seconds to wait for a free connection and its answer.
+
+    Returns:
+        bool: True if the database is reachable.
+    """
+    pool: ConnectionPool = get_pool()
+
+    def check() -> bool:
+        try:
+            connection: MySQLConnection | Any = pool.acquire(timeout=timeout)
+        except PoolTimeoutError:
+            return False
+        discard: bool = False
+        try:
+            connection.ping(reconnect=False)
+            return True
+        except Exception:
+            discard = True
+            return False
+        finally:
+            pool.release(connection, discard)
+
+    try:
+        # The check goes on in its thread after a timeout, and gives its connection back when it ends.
+        return await asyncio.wait_for(asyncio.get_running_loop().run_in_executor(None, check), timeout=timeout)
+    except Exception:
+        # Opening a new connection failed, or took too long.
+        return False
+
+
+def close() -> None:
+    """
+    Closes the process-wide connection pools and waits for the driver and checkout thread pools to finish their work.
+    """
+    global _executor, _checkout_executor
+    if _pool is not None:
+        _pool.close()
+    if _replicas is not None:
+        _replicas.close()
+    with _pool_lock:
+        executors: List[Optional[ThreadPoolExecutor]] = [_executor, _checkout_executor]
+        _executor = None
+        _checkout_executor = None
+    for executor in executors:
+        if executor is not None:
+            executor.shutdown(wait=True)
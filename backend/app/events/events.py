@@ -0,0 +1,210 @@
+"""
+This module contains the in-process fan-out of todo change events, streamed to the clients as Server-Sent Events.
+
+The following classes, functions and objects are available:
+
+- Subscription: The bounded queue of the events waiting to be sent to one connected client.
+- EventBroker: Delivers the events published for a user to every subscription of that user.
+- stream(broker: EventBroker, user_id: int, heartbeat: float) -> AsyncIterator[bytes]: Subscribes to the events of a
+  user and yields them in the Server-Sent Events format until the client disconnects.
+- broker: The broker shared by every request.
+
+The events are JSON objects with a "type" field:
+
+- {"type": "created", "todo": {...}} and {"type": "updated", "todo": {...}} carry the whole todo.
+- {"type": "deleted", "id": 1} carries the id of the deleted todo.
+- {"type": "reminder", "todo": {...}} carries a todo which came due, see app.scheduler.scheduler.
+- {"type": "resync"} tells the client to fetch its todos again: it is sent after a batch request, and instead of
+  the pending events of a client too slow to keep up with them.
+
+The broker uses the following environment variables:
+
+- EVENT_QUEUE_SIZE (int): The maximum number of events waiting to be sent to one client. Defaults to 64.
+- EVENT_HEARTBEAT (float): Seconds between two keep-alive comments on an idle stream, which also bounds how long
+  the subscription of a disconnected client lives. Defaults to 15.
+
+The broker only reaches the clients connected to the process handling the write. With several worker processes,
+`EventBroker.publish` is the single place to forward the events to a shared broker. It is only used from the event
+loop thread and needs no locking.
+"""
+
+import asyncio
+import os
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+from app.models.serialization import dumps
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EVENT_QUEUE_SIZE: int = int(os.getenv(key="EVENT_QUEUE_SIZE", default="64"))
+EVENT_HEARTBEAT: float = float(os.getenv(key="EVENT_HEARTBEAT", default="15"))
+
+# Tells the browser how many milliseconds to wait before reconnecting a dropped stream.
+RETRY_MS = 3000
+
+KEEPALIVE: bytes = b": keepalive\n\n"
+
+
+def _format(event: Dict[str, Any]) -> bytes:
+    return b"event: " + str(event["type"]).encode(encoding="utf-8") + b"\ndata: " + dumps(content=event) + b"\n\n"
+
+
+RESYNC: bytes = _format(event={"type": "resync"})
+
+
+class Subscription:
+    """
+    The bounded queue of the events waiting to be sent to one connected client.
+
+    When the queue is full, its events are dropped and replaced by a single resync event, so that a slow client
+    costs at most `size` events of memory and still ends up with the current todos.
+    """
+
+    def __init__(self, user_id: int, size: int = EVENT_QUEUE_SIZE) -> None:
+        self.user_id: int = user_id
+        self.overflows: int = 0
+        self._queue: asyncio.Queue[bytes] = asyncio.Queue(maxsize=max(size, 1))
+
+    def put(self, message: bytes) -> None:
+        """
+        Queues a formatted event, replacing the pending events by a resync event if the queue is full.
+
+        Args:
+            message (bytes): The event, in the Server-Sent Events format.
+        """
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflows += 1
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self._queue.put_nowait(RESYNC)
+
+    async def get(self) -> bytes:
+        """
+        Waits for the next event.
+
+        Returns:
+            bytes: The event, in the Server-Sent Events format.
+        """
+        return await self._queue.get()
+
+    def pending(self) -> int:
+        """
+        Returns the number of events waiting to be sent.
+
+        Returns:
+            int: The number of queued events.
+        """
+        return self._queue.qsize()
+
+
+class EventBroker:
+    """
+    Delivers the events published for a user to every subscription of that user.
+
+    An event is serialized once, whatever the number of subscriptions it is delivered to.
+    """
+
+    def __init__(self, queue_size: int = EVENT_QUEUE_SIZE) -> None:
+        self.queue_size: int = queue_size
+        self._subscriptions: Dict[int, Set[Subscription]] = {}
+        self._published: int = 0
+        self._delivered: int = 0
+
+    def subscribe(self, user_id: int) -> Subscription:
+        """
+        Starts receiving the events of a user.
+
+        Args:
+            user_id (int): The id of the user owning the todos.
+
+        Returns:
+            Subscription: The queue the events are delivered to, to be passed to `unsubscribe` once done.
+        """
+        subscription = Subscription(user_id=user_id, size=self.queue_size)
+        self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """
+        Stops delivering events to a subscription.
+
+        Args:
+            subscription (Subscription): The subscription returned by `subscribe`.
+        """
+        subscriptions: Optional[Set[Subscription]] = self._subscriptions.get(subscription.user_id)
+        if subscriptions is None:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._subscriptions[subscription.user_id]
+
+    def publish(self, user_id: int, event: Dict[str, Any]) -> None:
+        """
+        Delivers an event to every subscription of a user, without waiting for any client.
+
+        Args:
+            user_id (int): The id of the user owning the changed todos.
+            event (Dict[str, Any]): The event, with its "type" field.
+        """
+        self._published += 1
+        subscriptions: Optional[Set[Subscription]] = self._subscriptions.get(user_id)
+        if not subscriptions:
+            return
+        message: bytes = RESYNC if event["type"] == "resync" else _format(event=event)
+        for subscription in subscriptions:
+            subscription.put(message=message)
+        self._delivered += len(subscriptions)
+
+    def stats(self) -> Dict[str, int | float]:
+        """
+        Returns a snapshot of the broker metrics.
+
+        Returns:
+            Dict[str, int | float]: The number of subscribed users and subscriptions, of queued events, of published
+            and delivered events and of queue overflows.
+        """
+        subscriptions = [subscription for group in self._subscriptions.values() for subscription in group]
+        return {
+            "users": len(self._subscriptions),
+            "subscriptions": len(subscriptions),
+            "pending": sum(subscription.pending() for subscription in subscriptions),
+            "published": self._published,
+            "delivered": self._delivered,
+            "overflows": sum(subscription.overflows for subscription in subscriptions),
+        }
+
+
+broker: EventBroker = EventBroker()
+
+
+async def stream(broker: EventBroker, user_id: int, heartbeat: float = EVENT_HEARTBEAT) -> AsyncIterator[bytes]:
+    """
+    Subscribes to the events of a user and yields them in the Server-Sent Events format.
+
+    The subscription is taken before the first chunk is yielded, so a client which fetches its todos once it
+    received that chunk misses no change. A keep-alive comment is sent on idle streams: writing it is how a
+    disconnected client is noticed, which ends the generator and drops the subscription.
+
+    Args:
+        broker (EventBroker): The broker to subscribe to.
+        user_id (int): The id of the user owning the todos.
+        heartbeat (float): Seconds between two keep-alive comments.
+
+    Returns:
+        AsyncIterator[bytes]: The chunks of the stream.
+    """
+    subscription: Subscription = broker.subscribe(user_id=user_id)
+    try:
+        yield f"retry: {RETRY_MS}\n\n".encode(encoding="ascii")
+        while True:
+            try:
+                async with asyncio.timeout(heartbeat):
+                    message: bytes = await subscription.get()
+            except TimeoutError:
+                message = KEEPALIVE
+            yield message
+    finally:
+        broker.unsubscribe(subscription=subscription)
@@ -0,0 +1,429 @@
+"""
+This module contains the instrumentation of the Todo app: request, query, bcrypt and JWT timings exposed in the
+Prometheus text format.
+
+The following classes, functions and objects are available:
+
+- Counter: A monotonically increasing counter with labels.
+- Histogram: A cumulative histogram with labels.
+- Registry: A set of metrics rendered together in the Prometheus text exposition format.
+- MetricsMiddleware: ASGI middleware recording the latency, the status and the database work of every request.
+- InstrumentedConnection: A proxy of a database connection whose cursors time every statement.
+- InstrumentedCursor: A proxy of a database cursor timing every statement.
+- timed(histogram: Histogram, **labels: str) -> Iterator[None]: Context manager observing the duration of a block.
+- registry: The registry of every metric below, rendered by GET /metrics.
+- http_requests_total, http_request_duration_seconds, http_request_db_queries, http_request_db_seconds,
+  db_query_duration_seconds, db_slow_queries_total, password_hash_duration_seconds, jwt_duration_seconds: The
+  metrics of the app.
+
+The metrics use the following environment variables:
+
+- SLOW_QUERY_MS (float): Statements taking at least this many milliseconds are logged on the "app.slow_query"
+  logger with their SQL text and the types of their parameters, never their values. Defaults to 200.
+
+The database statements run on the driver threads. They are attributed to the request which sent them through a
+context variable, which AsyncConnection.run copies into the driver thread.
+"""
+
+import bisect
+import contextvars
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import (Any, Callable, Dict, Iterator, List, Optional, Sequence,
+                    Tuple, TypeVar)
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SLOW_QUERY_MS: float = float(os.getenv(key="SLOW_QUERY_MS", default="200"))
+
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS: Tuple[float, ...] = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+slow_query_logger: logging.Logger = logging.getLogger(name="app.slow_query")
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs: List[str] = [f'{name}="{_escape(value=value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Counter:
+    """
+    A monotonically increasing counter with labels.
+
+    Args:
+        name (str): The name of the metric.
+        documentation (str): The help text of the metric.
+        labelnames (Sequence[str]): The names of the labels, given as keyword arguments to `inc`.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name: str = name
+        self.documentation: str = documentation
+        self.labelnames: Tuple[str, ...] = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        """
+        Increments the counter of the given labels.
+
+        Args:
+            amount (float): The amount to add.
+            **labels (str): The value of every label.
+        """
+        key: Tuple[str, ...] = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        """
+        Returns the current value of the counter of the given labels.
+
+        Args:
+            **labels (str): The value of every label.
+
+        Returns:
+            float: The value, or 0 if the counter was never incremented.
+        """
+        return self._values.get(tuple(labels[name] for name in self.labelnames), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values: List[Tuple[Tuple[str, ...], float]] = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(names=self.labelnames, values=key)} {_format_value(value=value)}"
+                for key, value in values]
+
+
+class Histogram:
+    """
+    A cumulative histogram with labels.
+
+    Args:
+        name (str): The name of the metric.
+        documentation (str): The help text of the metric.
+        labelnames (Sequence[str]): The names of the labels, given as keyword arguments to `observe`.
+        buckets (Sequence[float]): The upper bounds of the buckets, in increasing order.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.name: str = name
+        self.documentation: str = documentation
+        self.labelnames: Tuple[str, ...] = tuple(labelnames)
+        self.buckets: Tuple[float, ...] = tuple(buckets)
+        # Per label values: the count of each bucket, not cumulative, with a last one for +Inf, then the sum.
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        """
+        Records an observation.
+
+        Args:
+            value (float): The observed value.
+            **labels (str): The value of every label.
+        """
+        key: Tuple[str, ...] = tuple(labels[name] for name in self.labelnames)
+        index: int = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry: Optional[Tuple[List[int], List[float]]] = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    def count(self, **labels: str) -> int:
+        """
+        Returns the number of observations of the given labels.
+
+        Args:
+            **labels (str): The value of every label.
+
+        Returns:
+            int: The number of observations.
+        """
+        entry: Optional[Tuple[List[int], List[float]]] = self._values.get(
+            tuple(labels[name] for name in self.labelnames))
+        return 0 if entry is None else sum(entry[0])
+
+    def sum(self, **labels: str) -> float:
+        """
+        Returns the sum of the observations of the given labels.
+
+        Args:
+            **labels (str): The value of every label.
+
+        Returns:
+            float: The sum, or 0 if nothing was observed.
+        """
+        entry: Optional[Tuple[List[int], List[float]]] = self._values.get(
+            tuple(labels[name] for name in self.labelnames))
+        return 0.0 if entry is None else entry[1][0]
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values: List[Tuple[Tuple[str, ...], List[int], float]] = [
+                (key, list(counts), total[0]) for key, (counts, total) in sorted(self._values.items())]
+        lines: List[str] = []
+        for key, counts, total in values:
+            cumulative: int = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le: str = f'le="{_format_value(value=bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(names=self.labelnames, values=key, extra=le)} {cumulative}")
+            labels: str = _format_labels(names=self.labelnames, values=key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(value=total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+M = TypeVar("M", Counter, Histogram)
+
+
+class Registry:
+    """
+    A set of metrics rendered together in the Prometheus text exposition format.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: List[Counter | Histogram] = []
+
+    def register(self, metric: M) -> M:
+        """
+        Adds a metric to the registry.
+
+        Args:
+            metric (M): The metric to add.
+
+        Returns:
+            M: The metric.
+        """
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """
+        Renders every metric of the registry.
+
+        Returns:
+            str: The metrics in the Prometheus text exposition format, version 0.0.4.
+        """
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+http_requests_total: Counter = registry.register(Counter(
+    name="http_requests_total", documentation="Requests handled, by route template and status code.",
+    labelnames=("method", "route", "status")))
+http_request_duration_seconds: Histogram = registry.register(Histogram(
+    name="http_request_duration_seconds", documentation="Time to handle a request, until its last byte is sent.",
+    labelnames=("method", "route")))
+http_request_db_queries: Histogram = registry.register(Histogram(
+    name="http_request_db_queries", documentation="Database statements sent while handling a request.",
+    labelnames=("method", "route"), buckets=COUNT_BUCKETS))
+http_request_db_seconds: Histogram = registry.register(Histogram(
+    name="http_request_db_seconds", documentation="Time spent in database statements while handling a request.",
+    labelnames=("method", "route")))
+db_query_duration_seconds: Histogram = registry.register(Histogram(
+    name="db_query_duration_seconds", documentation="Time to execute a database statement, by SQL verb.",
+    labelnames=("operation",)))
+db_slow_queries_total: Counter = registry.register(Counter(
+    name="db_slow_queries_total", documentation="Database statements slower than SLOW_QUERY_MS.",
+    labelnames=("operation",)))
+password_hash_duration_seconds: Histogram = registry.register(Histogram(
+    name="password_hash_duration_seconds",
+    documentation="Time to hash or check a password with bcrypt, including the wait for a worker.",
+    labelnames=("operation",)))
+jwt_duration_seconds: Histogram = registry.register(Histogram(
+    name="jwt_duration_seconds", documentation="Time to encode or verify a JWT, cache hits excluded.",
+    labelnames=("operation",)))
+
+
+@contextmanager
+def timed(histogram: Histogram, **labels: str) -> Iterator[None]:
+    """
+    Observes the duration of the block in a histogram, whether it raises or not.
+
+    Args:
+        histogram (Histogram): The histogram to record the duration in.
+        **labels (str): The value of every label of the histogram.
+    """
+    started: float = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - started, **labels)
+
+
+class _RequestStats:
+    """
+    The database work of the request being handled.
+    """
+
+    __slots__ = ("path", "queries", "seconds")
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        self.queries: int = 0
+        self.seconds: float = 0.0
+
+
+_request_stats: contextvars.ContextVar[Optional[_RequestStats]] = contextvars.ContextVar(
+    "request_stats", default=None)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _operation(query: str) -> str:
+    verb: str = query.lstrip()[:6].upper()
+    return verb if verb in ("SELECT", "INSERT", "UPDATE", "DELETE") else "OTHER"
+
+
+def _params_shape(params: Any, many: bool) -> str:
+    def shape(values: Any) -> str:
+        if values is None:
+            return "()"
+        if isinstance(values, dict):
+            return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in values.items()) + "}"
+        return "(" + ", ".join(type(value).__name__ for value in values) + ")"
+
+    if many:
+        rows: List[Any] = list(params)
+        return f"{len(rows)} x {shape(values=rows[0]) if rows else '()'}"
+    return shape(values=params)
+
+
+def _record_statement(query: str, params: Any, many: bool, seconds: float) -> None:
+    operation: str = _operation(query=query)
+    db_query_duration_seconds.observe(seconds, operation=operation)
+    stats: Optional[_RequestStats] = _request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.seconds += seconds
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        db_slow_queries_total.inc(operation=operation)
+        slow_query_logger.warning(
+            "slow query: %.1f ms path=%s params=%s sql=%s", seconds * 1000,
+            stats.path if stats is not None else "-", _params_shape(params=params, many=many),
+            _WHITESPACE.sub(" ", query).strip()[:2000])
+
+
+class InstrumentedCursor:
+    """
+    A proxy of a database cursor timing every statement it executes.
+
+    Args:
+        cursor (Any): The cursor of the driver.
+    """
+
+    def __init__(self, cursor: Any) -> None:
+        self._cursor: Any = cursor
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cursor, name)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._cursor)
+
+    def execute(self, operation: str, params: Any = (), *args: Any, **kwargs: Any) -> Any:
+        started: float = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params, *args, **kwargs)
+        finally:
+            _record_statement(query=operation, params=params, many=False, seconds=time.perf_counter() - started)
+
+    def executemany(self, operation: str, seq_params: Any, *args: Any, **kwargs: Any) -> Any:
+        started: float = time.perf_counter()
+        try:
+            return self._cursor.executemany(operation, seq_params, *args, **kwargs)
+        finally:
+            _record_statement(query=operation, params=seq_params, many=True, seconds=time.perf_counter() - started)
+
+
+class InstrumentedConnection:
+    """
+    A proxy of a database connection whose cursors time every statement they execute.
+
+    Args:
+        connection (Any): The connection of the driver.
+    """
+
+    def __init__(self, connection: Any) -> None:
+        self._connection: Any = connection
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._connection, name)
+
+    def cursor(self, *args: Any, **kwargs: Any) -> InstrumentedCursor:
+        return InstrumentedCursor(cursor=self._connection.cursor(*args, **kwargs))
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the latency, the status code and the database work of every HTTP request.
+
+    Requests are labelled with the template of the route which handled them, such as "/todos/{id}", so that the
+    number of series does not grow with the ids in the paths. Requests matching no route are labelled "unmatched".
+
+    Args:
+        app (Callable): The ASGI application to wrap.
+    """
+
+    def __init__(self, app: Callable[..., Any]) -> None:
+        self.app: Callable[..., Any] = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable[..., Any], send: Callable[..., Any]) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = _RequestStats(path=scope["path"])
+        token: contextvars.Token = _request_stats.set(stats)
+        status: List[int] = [500]
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        started: float = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_stats.reset(token)
+            # The router stores the matched route in the scope before calling the endpoint.
+            template: str = getattr(scope.get("route"), "path", None) or "unmatched"
+            method: str = scope["method"]
+            http_requests_total.inc(method=method, route=template, status=str(status[0]))
+            http_request_duration_seconds.observe(time.perf_counter() - started, method=method, route=template)
+            http_request_db_queries.observe(stats.queries, method=method, route=template)
+            http_request_db_seconds.observe(stats.seconds, method=method, route=template)
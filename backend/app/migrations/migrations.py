@@ -0,0 +1,321 @@
+"""
+This module contains the schema migrations runner of the Todo app.
+
+The migrations are the `NNNN_name.sql` files of the backend/migrations directory. They are applied in version order,
+each exactly once, and recorded with a checksum in the `schema_migrations` table. Run them at deploy time, from the
+backend directory, before starting the new version of the app:
+
+    python -m app.migrations.migrations
+
+`--verify` then runs EXPLAIN on the hot queries of the API and fails if any of them scans a whole table or index
+instead of looking rows up through an index, or sorts the rows it reads instead of reading them in index order. The
+optimizer picks full scans on nearly empty tables, so verify against a database holding realistic data.
+
+The following classes and functions are available:
+
+- MigrationError: Raised when the migrations cannot be applied or verified.
+- Migration: A migration file.
+- discover(directory: str) -> List[Migration]: Returns the migrations of a directory, in version order.
+- migrate(connection: Any, directory: str, dry_run: bool) -> List[Migration]: Applies the pending migrations.
+- verify(connection: Any, queries: Sequence[Tuple[str, str, Sequence[Any]]]) -> List[Dict[str, Any]]: Explains
+  the hot queries and reports the ones which do not use an index or sort their rows.
+- main(argv: Optional[List[str]]) -> None: The command line entry point.
+
+The runner uses the following environment variables, besides the MYSQL_* connection settings:
+
+- MIGRATIONS_DIR (str): The directory of the migration files. Defaults to backend/migrations.
+- MIGRATIONS_LOCK_TIMEOUT (int): Seconds to wait for another deploy applying migrations. Defaults to 60.
+"""
+
+import argparse
+import hashlib
+import logging
+import os
+import re
+import sys
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.config.db import get_db
+from dotenv import load_dotenv
+from mysql.connector import errorcode
+from mysql.connector.errors import DatabaseError
+
+load_dotenv()
+
+MIGRATIONS_DIR: str = os.getenv(key="MIGRATIONS_DIR", default=os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "migrations"))
+MIGRATIONS_LOCK_TIMEOUT: int = int(
+    os.getenv(key="MIGRATIONS_LOCK_TIMEOUT", default="60"))
+
+# DDL is not transactional in MySQL, so a migration interrupted half-way leaves its first statements applied.
+# Re-running it must not fail on them.
+ALREADY_APPLIED_ERRORS: Tuple[int, ...] = (
+    errorcode.ER_TABLE_EXISTS_ERROR, errorcode.ER_DUP_FIELDNAME, errorcode.ER_DUP_KEYNAME,
+    errorcode.ER_CANT_DROP_FIELD_OR_KEY, errorcode.ER_TRG_ALREADY_EXISTS)
+
+# The queries of app/api.py which run on every request of the hot endpoints, with representative parameters.
+HOT_QUERIES: List[Tuple[str, str, Sequence[Any]]] = [
+    ("login, register, view_user", "SELECT id, email, password, name, firstname, created_at FROM user WHERE email = %s",
+     ("user@example.com",)),
+    ("user todos: first page", "SELECT id, title, description, created_at, due_time, status, user_id FROM todo "
+     "WHERE user_id = %s ORDER BY id LIMIT %s", (1, 101)),
+    ("user todos: by status and due time", "SELECT id, title, description, created_at, due_time, status, user_id "
+     "FROM todo WHERE user_id = %s AND status = %s AND due_time >= %s ORDER BY id LIMIT %s",
+     (1, "todo", "2030-01-01 00:00:00", 101)),
+    ("user todos: by creation time", "SELECT id, title, description, created_at, due_time, status, user_id "
+     "FROM todo WHERE user_id = %s AND created_at >= %s ORDER BY id LIMIT %s", (1, "2030-01-01 00:00:00", 101)),
+    ("todo by id", "SELECT id, title, description, created_at, due_time, status, user_id FROM todo WHERE id = %s",
+     (1,)),
+    ("user todos: validator", "SELECT id, todos_version, todos_updated_at, UTC_TIMESTAMP(6) FROM user "
+     "WHERE email = %s", ("user@example.com",)),
+    ("todos: validator", "SELECT SUM(changes) FROM todo_change", ()),
+    ("user todos: changes", "SELECT version, id, title, description, created_at, due_time, status, user_id "
+     "FROM todo WHERE user_id = %s AND version > %s ORDER BY version, id LIMIT %s", (1, 0, 101)),
+    ("user todos: deletions", "SELECT version, todo_id FROM todo_tombstone WHERE user_id = %s AND version > %s "
+     "ORDER BY version, todo_id LIMIT %s", (1, 0, 101)),
+    ("user todos: search", "SELECT id, title, description, created_at, due_time, status, user_id, id, "
+     "MATCH (title, description) AGAINST (%s IN BOOLEAN MODE) AS score FROM todo WHERE user_id = %s "
+     "AND MATCH (title, description) AGAINST (%s IN BOOLEAN MODE) ORDER BY score DESC, id DESC LIMIT %s",
+     ("+groc*", 1, "+groc*", 101)),
+    ("user todos: search, next page", "SELECT id, title, description, created_at, due_time, status, user_id, id, "
+     "MATCH (title, description) AGAINST (%s IN BOOLEAN MODE) AS score FROM todo WHERE user_id = %s "
+     "AND MATCH (title, description) AGAINST (%s IN BOOLEAN MODE) "
+     "AND (MATCH (title, description) AGAINST (%s IN BOOLEAN MODE) < %s "
+     "OR (MATCH (title, description) AGAINST (%s IN BOOLEAN MODE) = %s AND id < %s)) "
+     "ORDER BY score DESC, id DESC LIMIT %s",
+     ("+groc*", 1, "+groc*", "+groc*", 0.5, "+groc*", 0.5, 1000, 101)),
+    ("reminders: due todos", "SELECT due_time, id FROM todo WHERE status = %s AND due_time >= %s "
+     "AND due_time <= %s AND (due_time > %s OR id > %s) ORDER BY due_time, id LIMIT %s",
+     ("todo", "2030-01-01 00:00:00", "2030-01-01 01:00:00", "2030-01-01 00:00:00", 0, 100000)),
+    ("user todos: stats", "SELECT status, COUNT(*), SUM(due_time < %s), SUM(due_time >= %s AND due_time < %s), "
+     "SUM(due_time >= %s AND due_time < %s) FROM todo WHERE user_id = %s GROUP BY status",
+     ("2030-01-01 00:00:00", "2030-01-01 00:00:00", "2030-01-02 00:00:00", "2030-01-02 00:00:00",
+      "2030-01-08 00:00:00", 1)),
+    ("tombstone compaction", "SELECT user_id, MAX(version) FROM todo_tombstone WHERE deleted_at < %s "
+     "GROUP BY user_id LIMIT %s", ("2030-01-01 00:00:00", 500)),
+    ("user purge: deleted users", "SELECT id FROM user WHERE deleted_at IS NOT NULL ORDER BY deleted_at, id LIMIT %s",
+     (100,)),
+    ("user purge: claim", "SELECT todos_total FROM user_purge WHERE user_id = %s AND finished_at IS NULL "
+     "FOR UPDATE SKIP LOCKED", (1,)),
+    ("user purge: next batch", "SELECT id FROM todo WHERE user_id = %s ORDER BY id LIMIT %s", (1, 1000)),
+]
+
+# The hot queries whose order no index can give, which are expected to sort: search results are ordered by relevance.
+SORTED_QUERIES: Tuple[str, ...] = ("user todos: search", "user todos: search, next page")
+
+# The tables of a fixed handful of rows, which are read whole: the todo_change counters are summed.
+SMALL_TABLES: Tuple[str, ...] = ("todo_change",)
+
+_FILE_NAME = re.compile(r"^(\d{4})_(\w+)\.sql$")
+
+logger: logging.Logger = logging.getLogger(name="app.migrations")
+
+
+class MigrationError(Exception):
+    """
+    Raised when the migrations cannot be applied or verified.
+    """
+
+
+class Migration:
+    """
+    A migration file.
+
+    Args:
+        version (int): The version, from the 4 digit prefix of the file name.
+        name (str): The rest of the file name, without the extension.
+        path (str): The path of the file.
+    """
+
+    def __init__(self, version: int, name: str, path: str) -> None:
+        self.version: int = version
+        self.name: str = name
+        self.path: str = path
+        with open(path, mode="r", encoding="utf-8") as file:
+            self.sql: str = file.read()
+        self.checksum: str = hashlib.sha256(self.sql.encode(encoding="utf-8")).hexdigest()
+
+    def statements(self) -> List[str]:
+        """
+        Splits the file into statements, dropping the comment lines.
+
+        Returns:
+            List[str]: The statements, without their terminating semicolon.
+        """
+        lines: List[str] = [line for line in self.sql.splitlines() if not line.lstrip().startswith("--")]
+        return [statement.strip() for statement in "\n".join(lines).split(";") if statement.strip()]
+
+
+def discover(directory: str = MIGRATIONS_DIR) -> List[Migration]:
+    """
+    Returns the migrations of a directory, in version order.
+
+    Args:
+        directory (str): The directory of the migration files.
+
+    Raises:
+        MigrationError: If two files have the same version.
+
+    Returns:
+        List[Migration]: The migrations.
+    """
+    migrations: Dict[int, Migration] = {}
+    for file_name in sorted(os.listdir(directory)):
+        if (match := _FILE_NAME.match(file_name)) is None:
+            continue
+        version: int = int(match.group(1))
+        if version in migrations:
+            raise MigrationError(f"Duplicate migration version {version}: {file_name}")
+        migrations[version] = Migration(version=version, name=match.group(2), path=os.path.join(directory, file_name))
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def _applied(cursor: Any) -> Dict[int, str]:
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INT UNSIGNED NOT NULL PRIMARY KEY, name VARCHAR(255) NOT NULL, checksum CHAR(64) NOT NULL, "
+        "applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP)")
+    cursor.execute("SELECT version, checksum FROM schema_migrations")
+    return {version: checksum for version, checksum in cursor.fetchall()}
+
+
+def _apply(cursor: Any, migration: Migration) -> None:
+    for statement in migration.statements():
+        try:
+            cursor.execute(statement)
+        except DatabaseError as e:
+            if e.errno not in ALREADY_APPLIED_ERRORS:
+                raise MigrationError(f"Migration {migration.version} failed: {e.msg}") from e
+            logger.warning("migration %04d: already applied: %s", migration.version, e.msg)
+    cursor.execute(
+        "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+        (migration.version, migration.name, migration.checksum))
+
+
+def migrate(connection: Any, directory: str = MIGRATIONS_DIR, dry_run: bool = False) -> List[Migration]:
+    """
+    Applies the pending migrations in version order.
+
+    A named lock serializes concurrent deploys, so that each migration is applied once even when several instances
+    start together.
+
+    Args:
+        connection (Any): A connection to the database to migrate.
+        directory (str): The directory of the migration files.
+        dry_run (bool): Only return the pending migrations, without applying them.
+
+    Raises:
+        MigrationError: If an applied migration was modified, if the lock could not be taken or if a statement
+            failed.
+
+    Returns:
+        List[Migration]: The migrations which were applied, or would be with `dry_run`.
+    """
+    migrations: List[Migration] = discover(directory=directory)
+    cursor: Any = connection.cursor(buffered=True)
+    try:
+        cursor.execute("SELECT GET_LOCK('schema_migrations', %s)", (MIGRATIONS_LOCK_TIMEOUT,))
+        if cursor.fetchone()[0] != 1:
+            raise MigrationError("Another deploy is applying the migrations")
+        try:
+            applied: Dict[int, str] = _applied(cursor=cursor)
+            for migration in migrations:
+                if migration.version in applied and applied[migration.version] != migration.checksum:
+                    raise MigrationError(
+                        f"Migration {migration.version} was modified after it was applied: add a new migration")
+            pending: List[Migration] = [migration for migration in migrations if migration.version not in applied]
+            if dry_run:
+                return pending
+            for migration in pending:
+                logger.info("applying migration %04d_%s", migration.version, migration.name)
+                _apply(cursor=cursor, migration=migration)
+                connection.commit()
+            return pending
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK('schema_migrations')")
+            cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def verify(connection: Any, queries: Sequence[Tuple[str, str, Sequence[Any]]] = HOT_QUERIES) -> List[Dict[str, Any]]:
+    """
+    Explains the hot queries and reports, for each table they read, whether an index is used and whether the rows
+    are sorted.
+
+    An access is reported as a full scan when its EXPLAIN type is ALL, or index which reads the whole index, unless
+    the table is one of SMALL_TABLES. Rows without a table, such as a MIN or MAX read from the end of an index, access
+    no table. An access is reported as a filesort when its Extra column contains "Using filesort", unless the query
+    is one of SORTED_QUERIES: a paginated query which sorts reads every matching row before returning the first page.
+
+    Args:
+        connection (Any): A connection to the migrated database.
+        queries (Sequence[Tuple[str, str, Sequence[Any]]]): The name, the SQL and the parameters of each query.
+
+    Returns:
+        List[Dict[str, Any]]: One entry per table access, with its query, table, access type, index, estimated rows
+        and whether it is a full scan or an unexpected filesort.
+    """
+    report: List[Dict[str, Any]] = []
+    cursor: Any = connection.cursor(buffered=True)
+    try:
+        for name, query, params in queries:
+            cursor.execute(f"EXPLAIN {query}", params)
+            columns: List[str] = [column[0] for column in cursor.description]
+            for row in cursor.fetchall():
+                plan: Dict[str, Any] = dict(zip(columns, row))
+                report.append({
+                    "query": name,
+                    "table": plan.get("table"),
+                    "type": plan.get("type"),
+                    "key": plan.get("key"),
+                    "rows": plan.get("rows"),
+                    "full_scan": plan.get("table") is not None and plan.get("table") not in SMALL_TABLES and (
+                        plan.get("type") in ("ALL", "index") or plan.get("key") is None),
+                    "filesort": "Using filesort" in (plan.get("Extra") or "") and name not in SORTED_QUERIES,
+                })
+    finally:
+        cursor.close()
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Applies the pending migrations, then optionally verifies the query plans.
+
+    Args:
+        argv (Optional[List[str]]): The command line arguments.
+    """
+    parser = argparse.ArgumentParser(description="Apply the schema migrations of the Todo app.")
+    parser.add_argument("--directory", default=MIGRATIONS_DIR, help="directory of the migration files")
+    parser.add_argument("--dry-run", action="store_true", help="only list the pending migrations")
+    parser.add_argument("--verify", action="store_true", help="check that the hot queries use an index, unsorted")
+    args: argparse.Namespace = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    connection: Any = get_db()
+    try:
+        migrations: List[Migration] = migrate(connection=connection, directory=args.directory, dry_run=args.dry_run)
+        verb: str = "pending" if args.dry_run else "applied"
+        logger.info("%d migration(s) %s%s", len(migrations), verb, "".join(
+            f"\n  {migration.version:04d}_{migration.name}" for migration in migrations))
+        if args.verify:
+            scans: int = 0
+            sorts: int = 0
+            for access in verify(connection=connection):
+                scans += access["full_scan"]
+                sorts += access["filesort"]
+                status: str = "SCAN" if access["full_scan"] else "SORT" if access["filesort"] else "ok"
+                logger.info("%-5s %-40s %-10s type=%-6s key=%-30s rows=%s", status,
+                            access["query"], access["table"], access["type"], access["key"], access["rows"])
+            if scans:
+                logger.error("%d table access(es) do not use an index", scans)
+            if sorts:
+                logger.error("%d table access(es) sort their rows instead of reading them in index order", sorts)
+            if scans or sorts:
+                sys.exit(1)
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+This module contains the request and response models of the Todo app.
+
+The following classes are available:
+
+- Status: The statuses a todo can have.
+- TodoCreate: The body of a request creating a todo.
+- TodoUpdate: The body of a request updating a todo.
+- Todo: A todo as returned by the API.
+- UserCreate: The body of a request registering or updating a user.
+- EmailUpdate: The body of a request updating the email address of a user.
+- Credentials: The body of a login request.
+- UserProfile: The editable information of a user as returned by the API.
+- User: A user as returned by the API.
+
+The response models describe the responses in the OpenAPI schema. The list endpoints do not build them row by row:
+they map the database rows to dictionaries with the same keys and serialize those directly, see
+app.models.serialization.
+"""
+
+from datetime import datetime
+from enum import Enum
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class Status(str, Enum):
+    """
+    The statuses a todo can have, as stored in the `todo.status` column.
+    """
+
+    NOT_STARTED = "not started"
+    TODO = "todo"
+    IN_PROGRESS = "in progress"
+    DONE = "done"
+
+
+class TodoUpdate(BaseModel):
+    """
+    The body of a request updating a todo.
+    """
+
+    title: str
+    description: str
+    due_time: datetime
+    status: Status
+
+
+class TodoCreate(TodoUpdate):
+    """
+    The body of a request creating a todo.
+    """
+
+    user_id: int
+
+
+class Todo(BaseModel):
+    """
+    A todo as returned by the API. Endpoints accepting a `fields` parameter only return the selected keys.
+    """
+
+    id: int
+    title: str
+    description: str
+    created_at: datetime
+    due_time: datetime
+    status: Status
+    user_id: int
+
+
+class UserCreate(BaseModel):
+    """
+    The body of a request registering or updating a user.
+    """
+
+    email: str
+    password: str
+    name: str
+    firstname: str
+
+
+class EmailUpdate(BaseModel):
+    """
+    The body of a request updating the email address of a user.
+    """
+
+    email: str
+
+
+class Credentials(BaseModel):
+    """
+    The body of a login request.
+    """
+
+    email: str
+    password: str
+
+
+class UserProfile(BaseModel):
+    """
+    The editable information of a user as returned by the API.
+    """
+
+    email: str
+    password: str
+    name: str
+    firstname: str
+
+
+class User(UserProfile):
+    """
+    A user as returned by the API.
+    """
+
+    id: int
+    created_at: Optional[datetime] = None
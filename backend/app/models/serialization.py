@@ -0,0 +1,114 @@
+"""
+This module contains the fast serialization of the Todo app responses.
+
+The following classes and functions are available:
+
+- FastJSONResponse: A JSON response serialized with orjson when it is installed.
+- ClosingStreamingResponse: A streaming response which closes its body iterator when the client disconnects.
+- dumps(content: Any) -> bytes: Serializes a value to JSON, handling datetimes, dates, decimals and enums.
+- rows_to_dicts(columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> List[Dict[str, Any]]: Maps database rows
+  to dictionaries keyed by column name.
+- row_to_dict(columns: Sequence[str], row: Optional[Sequence[Any]]) -> Optional[Dict[str, Any]]: Maps a single
+  database row to a dictionary keyed by column name.
+
+Responses returned as a FastJSONResponse skip the validation and the jsonable_encoder pass FastAPI runs on plain
+return values, which is most of the cost of a large list. They must therefore only carry values the database
+already typed: ints, strings, datetimes and enums.
+"""
+
+import datetime
+import decimal
+import enum
+import json
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence
+
+from fastapi.responses import JSONResponse, StreamingResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is an optional speedup
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode(encoding="utf-8")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Serializes a value to compact JSON.
+
+    Args:
+        content (Any): The value to serialize.
+
+    Returns:
+        bytes: The UTF-8 encoded JSON.
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode(encoding="utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    A JSON response serialized with orjson when it is installed, and with the standard library otherwise.
+
+    Datetimes are serialized in ISO 8601 format in both cases.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class ClosingStreamingResponse(StreamingResponse):
+    """
+    A streaming response which closes its body iterator however the response ends.
+
+    When the client disconnects, Starlette stops iterating the body but leaves the generator suspended until it is
+    garbage collected, together with what it holds, such as a database connection or an event subscription.
+    """
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable[..., Awaitable[Any]],
+                       send: Callable[..., Awaitable[None]]) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            aclose: Optional[Callable[[], Awaitable[None]]] = getattr(self.body_iterator, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+
+def rows_to_dicts(columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> List[Dict[str, Any]]:
+    """
+    Maps database rows to dictionaries keyed by column name, without converting the values.
+
+    Args:
+        columns (Sequence[str]): The names of the columns, in the order of the row values.
+        rows (Iterable[Sequence[Any]]): The rows returned by the cursor.
+
+    Returns:
+        List[Dict[str, Any]]: One dictionary per row.
+    """
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def row_to_dict(columns: Sequence[str], row: Optional[Sequence[Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Maps a single database row to a dictionary keyed by column name.
+
+    Args:
+        columns (Sequence[str]): The names of the columns, in the order of the row values.
+        row (Optional[Sequence[Any]]): The row returned by the cursor, or None.
+
+    Returns:
+        Optional[Dict[str, Any]]: The dictionary, or None if there was no row.
+    """
+    return None if row is None else dict(zip(columns, row))
@@ -0,0 +1,203 @@
+"""
+This module contains the purge of the deleted users: DELETE /users/{id} only marks the user as deleted, and the purge
+then removes its todos in the background, see migrations/0005_user_soft_delete.sql.
+
+The todos are deleted in batches of bounded size, each in a short transaction of its own on a connection checked
+out for that batch only and looked up by primary key, followed by a pause, so that the writes of the other users only
+ever wait for one small batch and the purge never holds a connection while it sleeps. The progress of each purge is
+recorded in the user_purge table after every batch; an interrupted purge resumes from what is left when the
+application restarts.
+
+Every worker process runs the purge. Each batch claims the user_purge row of its user with `FOR UPDATE SKIP LOCKED`
+until it commits, and a worker which finds the row claimed leaves the user to the worker holding it and moves on to
+the next deleted user: the workers purge different users side by side instead of racing each other over the same
+rows.
+
+The following functions are available:
+
+- purge_user(user_id: int, batch_size: int, pause: float) -> Optional[bool]: Deletes the todos then the row of a
+  deleted user, unless another worker is purging it.
+- purge_deleted_users(batch_size: int, pause: float) -> int: Purges every deleted user.
+- wake() -> None: Starts the purge running in the background without waiting for its next interval.
+- purge_periodically(interval: float) -> None: Purges the deleted users forever, for the application lifespan.
+- main(argv: Optional[List[str]]) -> None: The command line entry point, purging the deleted users once.
+
+The purge uses the following environment variables:
+
+- USER_PURGE_BATCH_SIZE (int): The number of todos deleted per transaction. Defaults to 1000.
+- USER_PURGE_PAUSE (float): Seconds slept between two batches, which bounds the share of the database the purge
+  takes. Defaults to 0.05.
+- USER_PURGE_INTERVAL (float): Seconds between two looks for deleted users by each worker, besides the purges
+  started by DELETE /users/{id}. Defaults to 60.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+from typing import Any, List, Optional, Tuple
+
+from app.config.db import connect
+from app.sync.sync import change_slot
+from dotenv import load_dotenv
+from mysql.connector.errors import IntegrityError
+
+load_dotenv()
+
+USER_PURGE_BATCH_SIZE: int = int(
+    os.getenv(key="USER_PURGE_BATCH_SIZE", default="1000"))
+USER_PURGE_PAUSE: float = float(
+    os.getenv(key="USER_PURGE_PAUSE", default="0.05"))
+USER_PURGE_INTERVAL: float = float(
+    os.getenv(key="USER_PURGE_INTERVAL", default="60"))
+# The number of deleted users looked up at a time.
+PENDING_BATCH_SIZE = 100
+
+logger: logging.Logger = logging.getLogger(name="app.purge")
+
+_wake: Optional[asyncio.Event] = None
+
+
+async def purge_user(
+    user_id: int, batch_size: int = USER_PURGE_BATCH_SIZE, pause: float = USER_PURGE_PAUSE
+) -> Optional[bool]:
+    """
+    Deletes the todos of a deleted user one batch at a time, then its tombstones and its row.
+
+    Each batch claims the user_purge row of the user, then reads the ids of the next todos without locking them and
+    deletes them by primary key: only those rows are locked, never a range of the user_id index which the writes of
+    the neighbouring users would wait on.
+
+    Args:
+        user_id (int): The id of the deleted user.
+        batch_size (int): The number of todos deleted per transaction.
+        pause (float): Seconds slept between two batches.
+
+    Returns:
+        Optional[bool]: True if the user is gone, False if a todo was created for it meanwhile and the purge has to
+        run again, None if another worker claimed the user or already finished its purge.
+    """
+    while True:
+        async with connect() as db:
+            row: Optional[Tuple[Any, ...]] = await db.fetch_one(
+                "SELECT todos_total FROM user_purge WHERE user_id = %s AND finished_at IS NULL FOR UPDATE SKIP LOCKED",
+                (user_id,))
+            if row is None:
+                await db.rollback()
+                return None
+            if row[0] is None:
+                total: Tuple[Any, ...] = await db.fetch_one(
+                    "SELECT COUNT(*) FROM todo WHERE user_id = %s", (user_id,))
+                await db.execute(
+                    "UPDATE user_purge SET todos_total = %s, updated_at = UTC_TIMESTAMP() WHERE user_id = %s",
+                    (total[0], user_id))
+            ids: List[int] = [row[0] for row in await db.fetch_all(
+                "SELECT id FROM todo WHERE user_id = %s ORDER BY id LIMIT %s", (user_id, batch_size))]
+            if not ids:
+                await db.execute("DELETE FROM todo_tombstone WHERE user_id = %s", (user_id,))
+                try:
+                    await db.execute("DELETE FROM user WHERE id = %s AND deleted_at IS NOT NULL", (user_id,))
+                except IntegrityError:
+                    await db.rollback()
+                    return False
+                await db.execute("UPDATE user_purge SET finished_at = UTC_TIMESTAMP(), updated_at = UTC_TIMESTAMP() "
+                                 "WHERE user_id = %s", (user_id,))
+                await db.commit()
+                return True
+            cursor: Any = await db.execute(
+                f"DELETE FROM todo WHERE id IN ({', '.join(['%s'] * len(ids))})", ids)
+            await db.execute(
+                "UPDATE user_purge SET todos_deleted = todos_deleted + %s, updated_at = UTC_TIMESTAMP() "
+                "WHERE user_id = %s", (max(cursor.rowcount, 0), user_id))
+            # Moves the validator of GET /todos and the key of the cached counts, which include these todos.
+            await db.execute(
+                "UPDATE user STRAIGHT_JOIN todo_change ON todo_change.slot = %s "
+                "SET user.todos_updated_at = UTC_TIMESTAMP(6), todo_change.changes = todo_change.changes + 1 "
+                "WHERE user.id = %s", (change_slot(user_id=user_id), user_id))
+            await db.commit()
+        await asyncio.sleep(pause)
+
+
+async def purge_deleted_users(batch_size: int = USER_PURGE_BATCH_SIZE, pause: float = USER_PURGE_PAUSE) -> int:
+    """
+    Purges the deleted users, oldest deletion first, skipping those another worker is purging.
+
+    Args:
+        batch_size (int): The number of todos deleted per transaction.
+        pause (float): Seconds slept between two batches.
+
+    Returns:
+        int: The number of users purged.
+    """
+    purged: int = 0
+    skipped: List[int] = []
+    while True:
+        async with connect() as db:
+            rows: List[Tuple[Any, ...]] = await db.fetch_all(
+                "SELECT id FROM user WHERE deleted_at IS NOT NULL ORDER BY deleted_at, id LIMIT %s",
+                (PENDING_BATCH_SIZE + len(skipped),))
+        pending: List[int] = [row[0] for row in rows if row[0] not in skipped]
+        if not pending:
+            return purged
+        for user_id in pending:
+            result: Optional[bool] = await purge_user(user_id=user_id, batch_size=batch_size, pause=pause)
+            if result:
+                purged += 1
+                logger.info("purged deleted user %d", user_id)
+            else:
+                # Left to the worker which claimed it, or for the next run, so that a client still creating todos for
+                # the user cannot keep this one busy.
+                skipped.append(user_id)
+
+
+def wake() -> None:
+    """
+    Starts the purge running in the background without waiting for its next interval.
+    """
+    if _wake is not None:
+        _wake.set()
+
+
+async def purge_periodically(interval: float = USER_PURGE_INTERVAL) -> None:
+    """
+    Purges the deleted users when woken, and every `interval` seconds, until cancelled.
+
+    The first run happens at once, to resume the purges interrupted by the last shutdown.
+
+    Args:
+        interval (float): Seconds between two looks for deleted users.
+    """
+    global _wake
+    _wake = asyncio.Event()
+    while True:
+        _wake.clear()
+        try:
+            await purge_deleted_users()
+        except Exception as e:
+            logger.warning("could not purge the deleted users: %s", e)
+        try:
+            await asyncio.wait_for(_wake.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Purges the deleted users once.
+
+    Args:
+        argv (Optional[List[str]]): The command line arguments.
+    """
+    parser = argparse.ArgumentParser(description="Purge the todos and rows of the deleted users.")
+    parser.add_argument("--batch-size", type=int, default=USER_PURGE_BATCH_SIZE,
+                        help="number of todos deleted per transaction")
+    parser.add_argument("--pause", type=float, default=USER_PURGE_PAUSE, help="seconds slept between two batches")
+    args: argparse.Namespace = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    logger.info("%d deleted user(s) purged",
+                asyncio.run(purge_deleted_users(batch_size=args.batch_size, pause=args.pause)))
+
+
+if __name__ == "__main__":
+    main()
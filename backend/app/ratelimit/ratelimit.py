@@ -0,0 +1,246 @@
+"""
+This module contains the admission control of the unauthenticated routes of the Todo app, /login and /register,
+which each cost a database lookup and a bcrypt operation.
+
+A request is admitted only if the token bucket of its client IP address and the one of the email it names both have
+a token left, and if fewer than AUTH_MAX_IN_FLIGHT admitted requests are still running. Otherwise it is rejected
+with a 429 and a Retry-After header before touching the database or bcrypt, so a credential stuffing burst or a
+retry storm costs a dictionary lookup per request instead of starving every other route.
+
+The following classes and objects are available:
+
+- TokenBucketLimiter: Token buckets for any number of keys, each stored as a single float in a bounded LRU.
+- ConcurrencyLimiter: A cap on the number of admitted requests running at once.
+- AdmissionController: The admission control of the authentication routes, combining both.
+- admission: The admission controller shared by every request.
+
+The admission control uses the following environment variables:
+
+- RATE_LIMIT_IP_BURST (int): The number of attempts a client IP address can make at once. Defaults to 20.
+- RATE_LIMIT_IP_PERIOD (float): Seconds for a client IP address to earn one more attempt. Defaults to 3, 20 a
+  minute.
+- RATE_LIMIT_EMAIL_BURST (int): The number of attempts an email can be named in at once. Defaults to 5.
+- RATE_LIMIT_EMAIL_PERIOD (float): Seconds for an email to earn one more attempt. Defaults to 12, 5 a minute.
+- RATE_LIMIT_MAX_KEYS (int): The maximum number of client IP addresses, and of emails, tracked at once. Beyond it the
+  least recently seen ones are forgotten, which refills their buckets. Defaults to 100000.
+- RATE_LIMIT_TRUST_PROXY (bool): "true" to identify clients by the first address of X-Forwarded-For, when the app
+  runs behind a proxy which sets it. Defaults to "false", the address of the connection.
+- AUTH_MAX_IN_FLIGHT (int): The maximum number of admitted requests running at once. Defaults to HASHER_WORKERS
+  plus HASHER_QUEUE_SIZE, the bcrypt operations the password hasher accepts at once.
+
+The limiters are only used from the event loop thread and need no locking.
+"""
+
+import math
+import os
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from app.auth.hashing import HASHER_QUEUE_SIZE, HASHER_WORKERS
+from dotenv import load_dotenv
+from fastapi import HTTPException, Request
+
+load_dotenv()
+
+RATE_LIMIT_IP_BURST: int = int(os.getenv(key="RATE_LIMIT_IP_BURST", default="20"))
+RATE_LIMIT_IP_PERIOD: float = float(
+    os.getenv(key="RATE_LIMIT_IP_PERIOD", default="3"))
+RATE_LIMIT_EMAIL_BURST: int = int(
+    os.getenv(key="RATE_LIMIT_EMAIL_BURST", default="5"))
+RATE_LIMIT_EMAIL_PERIOD: float = float(
+    os.getenv(key="RATE_LIMIT_EMAIL_PERIOD", default="12"))
+RATE_LIMIT_MAX_KEYS: int = int(
+    os.getenv(key="RATE_LIMIT_MAX_KEYS", default="100000"))
+RATE_LIMIT_TRUST_PROXY: bool = os.getenv(
+    key="RATE_LIMIT_TRUST_PROXY", default="false").lower() == "true"
+AUTH_MAX_IN_FLIGHT: int = int(
+    os.getenv(key="AUTH_MAX_IN_FLIGHT", default=str(HASHER_WORKERS + HASHER_QUEUE_SIZE)))
+
+
+class TokenBucketLimiter:
+    """
+    Token buckets holding up to `burst` tokens and earning one every `period` seconds, for any number of keys.
+
+    Each bucket is stored as the single time at which it will be full again, the generic cell rate algorithm form of
+    a token bucket: taking a token pushes that time `period` seconds later, and a bucket may be taken from while it
+    is less than `burst` periods ahead. A bucket whose time has passed is full, and is the same as no bucket at all,
+    so such entries are dropped as they are met at the least recently used end. At most `size` buckets are kept; the
+    keys are stored as their hash, so the memory used does not depend on their length.
+    """
+
+    def __init__(self, burst: int, period: float, size: int = RATE_LIMIT_MAX_KEYS) -> None:
+        if burst < 1 or period <= 0:
+            raise ValueError("A token bucket needs a burst of at least 1 and a positive period")
+        self.burst: int = burst
+        self.period: float = period
+        self.size: int = size
+        self._full_at: OrderedDict[int, float] = OrderedDict()
+        self._admitted: int = 0
+        self._rejected: int = 0
+        self._evictions: int = 0
+
+    def acquire(self, key: str) -> float:
+        """
+        Takes a token from the bucket of a key.
+
+        Args:
+            key (str): The key, such as a client IP address or an email.
+
+        Returns:
+            float: 0 if a token was taken, otherwise the number of seconds until the bucket has one.
+        """
+        now: float = time.monotonic()
+        slot: int = hash(key)
+        full_at: float = max(self._full_at.get(slot, now), now)
+        wait: float = full_at + self.period - self.burst * self.period - now
+        if wait > 0:
+            self._rejected += 1
+            return wait
+        self._full_at[slot] = full_at + self.period
+        self._full_at.move_to_end(key=slot)
+        self._admitted += 1
+        while self._full_at:
+            oldest: float = next(iter(self._full_at.values()))
+            if oldest > now and len(self._full_at) <= self.size:
+                break
+            if oldest > now:
+                self._evictions += 1
+            self._full_at.popitem(last=False)
+        return 0.0
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns a snapshot of the limiter metrics.
+
+        Returns:
+            Dict[str, int]: The maximum and current number of tracked keys, the number of admitted and rejected
+            requests, and the number of buckets forgotten before they were full.
+        """
+        return {
+            "size": self.size,
+            "keys": len(self._full_at),
+            "admitted": self._admitted,
+            "rejected": self._rejected,
+            "evictions": self._evictions,
+        }
+
+
+class ConcurrencyLimiter:
+    """
+    A cap on the number of admitted requests running at once, rejecting the others instead of queueing them.
+    """
+
+    def __init__(self, limit: int = AUTH_MAX_IN_FLIGHT) -> None:
+        if limit < 1:
+            raise ValueError("A concurrency limit must be at least 1")
+        self.limit: int = limit
+        self._in_flight: int = 0
+        self._rejected: int = 0
+
+    def try_acquire(self) -> bool:
+        """
+        Takes a slot if one is free.
+
+        Returns:
+            bool: True if the caller may run, and must call `release` once done.
+        """
+        if self._in_flight >= self.limit:
+            self._rejected += 1
+            return False
+        self._in_flight += 1
+        return True
+
+    def release(self) -> None:
+        """
+        Gives back a slot taken by `try_acquire`.
+        """
+        self._in_flight -= 1
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns a snapshot of the limiter metrics.
+
+        Returns:
+            Dict[str, int]: The limit, the number of requests running and the number of rejected requests.
+        """
+        return {"limit": self.limit, "in_flight": self._in_flight, "rejected": self._rejected}
+
+
+class AdmissionController:
+    """
+    The admission control of the authentication routes: per client IP address and per email token buckets, then a
+    cap on the requests running at once.
+    """
+
+    def __init__(
+        self,
+        ips: Optional[TokenBucketLimiter] = None,
+        emails: Optional[TokenBucketLimiter] = None,
+        in_flight: Optional[ConcurrencyLimiter] = None,
+        trust_proxy: bool = RATE_LIMIT_TRUST_PROXY,
+    ) -> None:
+        self.ips: TokenBucketLimiter = ips or TokenBucketLimiter(
+            burst=RATE_LIMIT_IP_BURST, period=RATE_LIMIT_IP_PERIOD)
+        self.emails: TokenBucketLimiter = emails or TokenBucketLimiter(
+            burst=RATE_LIMIT_EMAIL_BURST, period=RATE_LIMIT_EMAIL_PERIOD)
+        self.in_flight: ConcurrencyLimiter = in_flight or ConcurrencyLimiter()
+        self.trust_proxy: bool = trust_proxy
+
+    def client_address(self, request: Request) -> str:
+        """
+        Returns the address identifying the client of a request.
+
+        Args:
+            request (Request): The request.
+
+        Returns:
+            str: The first address of X-Forwarded-For when the proxy is trusted, else the address of the connection.
+        """
+        if self.trust_proxy and (forwarded := request.headers.get("x-forwarded-for")):
+            return forwarded.split(",")[0].strip()
+        return request.client.host if request.client is not None else "unknown"
+
+    @contextmanager
+    def admit(self, request: Request, email: str) -> Iterator[None]:
+        """
+        Admits a request naming an email for the duration of the block, or rejects it.
+
+        Args:
+            request (Request): The request, whose client address is limited.
+            email (str): The email the request logs in or registers with.
+
+        Raises:
+            HTTPException: With a 429 and a Retry-After header if a bucket is empty or too many requests are
+                running.
+        """
+        wait: float = self.ips.acquire(key=self.client_address(request=request))
+        if not wait:
+            wait = self.emails.acquire(key=email.casefold())
+        if wait:
+            raise HTTPException(status_code=429, detail="Too Many Requests",
+                                headers={"Retry-After": str(math.ceil(wait))})
+        if not self.in_flight.try_acquire():
+            raise HTTPException(status_code=429, detail="Too Many Requests", headers={"Retry-After": "1"})
+        try:
+            yield
+        finally:
+            self.in_flight.release()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns a snapshot of the admission metrics.
+
+        Returns:
+            Dict[str, int]: The metrics of the IP and email buckets and of the concurrency cap, prefixed by "ip_",
+            "email_" and "in_flight_".
+        """
+        return {
+            **{f"ip_{name}": value for name, value in self.ips.stats().items()},
+            **{f"email_{name}": value for name, value in self.emails.stats().items()},
+            **{f"in_flight_{name}": value for name, value in self.in_flight.stats().items()},
+        }
+
+
+admission: AdmissionController = AdmissionController()
@@ -0,0 +1,362 @@
+"""
+This module contains the scheduler of the due-time reminders of the todos.
+
+The todos due within the next REMINDER_HORIZON seconds are loaded into a min-heap ordered by due time, at most
+REMINDER_HEAP_SIZE of them, through a range query on the (status, due_time) index, so that memory stays bounded
+whatever the number of pending todos. The write endpoints keep the heap in sync, and the heap is loaded again as
+time goes by. When todos come due, their reminders are fired in batches: every todo is read back first, so a todo
+done, deleted or moved since it was loaded is not fired. Due times are in UTC.
+
+The following classes, functions and objects are available:
+
+- ReminderScheduler: Keeps the todos due soon in a min-heap and fires their reminders when they come due.
+- claim(todos: List[Dict[str, Any]]) -> List[Dict[str, Any]]: Records the reminders of the todos as posted, and
+  returns those no other worker had posted.
+- notify(todos: List[Dict[str, Any]]) -> None: Publishes a "reminder" event to the owner of each todo and posts the
+  todos it claims to the webhook, if one is configured.
+
+The scheduler uses the following environment variables:
+
+- REMINDER_LEAD (float): Seconds before its due time the reminder of a todo fires. Defaults to 0.
+- REMINDER_HORIZON (float): Seconds ahead the due todos are loaded. Defaults to 3600.
+- REMINDER_HEAP_SIZE (int): The maximum number of todos kept in memory. Defaults to 100000.
+- REMINDER_BATCH_SIZE (int): The maximum number of reminders fired together. Defaults to 500.
+- REMINDER_WEBHOOK_URL (str): The URL each batch of reminders is posted to as JSON. Defaults to none.
+
+Every worker process runs its own scheduler, so that the reminder events reach the clients connected to it. The
+webhook is only posted the reminders a worker claimed in the database first, see claim, so each reminder is posted
+once whatever the number of workers; one whose post failed is not posted again. A todo which came due while no worker
+was running gets no reminder.
+"""
+
+import asyncio
+import functools
+import heapq
+import logging
+import os
+import time
+import urllib.request
+from datetime import datetime, timezone
+from typing import (Any, Awaitable, Callable, Dict, List, Optional, Sequence,
+                    Tuple)
+
+from app.config.db import connect
+from app.events.events import broker
+from app.models.models import Status
+from app.models.serialization import dumps, rows_to_dicts
+from dotenv import load_dotenv
+
+load_dotenv()
+
+REMINDER_LEAD: float = float(os.getenv(key="REMINDER_LEAD", default="0"))
+REMINDER_HORIZON: float = float(os.getenv(key="REMINDER_HORIZON", default="3600"))
+REMINDER_HEAP_SIZE: int = int(os.getenv(key="REMINDER_HEAP_SIZE", default="100000"))
+REMINDER_BATCH_SIZE: int = int(os.getenv(key="REMINDER_BATCH_SIZE", default="500"))
+REMINDER_WEBHOOK_URL: Optional[str] = os.getenv(key="REMINDER_WEBHOOK_URL")
+
+WEBHOOK_TIMEOUT = 5.0
+# Seconds between two loads when the heap is full.
+RELOAD_DELAY = 1.0
+# Seconds before a load or a batch which failed is retried.
+RETRY_DELAY = 5.0
+
+PENDING_STATUSES: Tuple[str, ...] = tuple(status.value for status in Status if status is not Status.DONE)
+
+# A todo is ordered by its due time, as a UTC timestamp, then by its id.
+Key = Tuple[float, int]
+
+logger: logging.Logger = logging.getLogger(name="app.scheduler")
+
+
+def _timestamp(value: datetime) -> float:
+    return (value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)).timestamp()
+
+
+def _datetime(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).replace(tzinfo=None)
+
+
+def _post(url: str, body: bytes) -> None:
+    request = urllib.request.Request(url=url, data=body, method="POST", headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=WEBHOOK_TIMEOUT):
+        pass
+
+
+async def claim(todos: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Records the reminders of the todos as posted, and returns those no other worker recorded first.
+
+    The todo rows are locked while their reminded_due_time is compared to their due time, so that of the workers
+    firing the same reminders, only the first one to commit claims each of them.
+
+    Args:
+        todos (List[Dict[str, Any]]): The todos which came due, with their id and due_time.
+
+    Returns:
+        List[Dict[str, Any]]: The todos claimed, still due at the same time.
+    """
+    if not todos:
+        return []
+    query = (f"SELECT id, due_time FROM todo WHERE id IN ({', '.join(['%s'] * len(todos))}) "
+             "AND (reminded_due_time IS NULL OR reminded_due_time <> due_time) FOR UPDATE")
+    async with connect() as db:
+        due: Dict[int, float] = {row[0]: _timestamp(value=row[1]) for row in await db.fetch_all(
+            query, [todo["id"] for todo in todos])}
+        claimed: List[Dict[str, Any]] = [
+            todo for todo in todos if due.get(todo["id"]) == _timestamp(value=todo["due_time"])]
+        if claimed:
+            await db.execute(
+                f"UPDATE todo SET reminded_due_time = due_time WHERE id IN ({', '.join(['%s'] * len(claimed))})",
+                [todo["id"] for todo in claimed])
+        await db.commit()
+    return claimed
+
+
+async def notify(todos: List[Dict[str, Any]]) -> None:
+    """
+    Publishes a "reminder" event to the owner of each todo, and posts the todos it claims to REMINDER_WEBHOOK_URL if
+    set.
+
+    Args:
+        todos (List[Dict[str, Any]]): The todos which came due.
+    """
+    for todo in todos:
+        broker.publish(user_id=todo["user_id"], event={"type": "reminder", "todo": todo})
+    if REMINDER_WEBHOOK_URL:
+        claimed: List[Dict[str, Any]] = []
+        try:
+            claimed = await claim(todos=todos)
+            if claimed:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, _post, REMINDER_WEBHOOK_URL, dumps(content={"reminders": claimed}))
+        except Exception as e:
+            logger.warning("could not post %d reminder(s) to the webhook: %s", len(claimed or todos), e)
+
+
+class ReminderScheduler:
+    """
+    Keeps the todos due soon in a min-heap and fires their reminders when they come due.
+
+    Every pending todo due up to `loaded_until` is in memory; the later ones are loaded when that bound comes
+    closer than half the horizon. Changed todos are not searched for in the heap: their previous entry is left
+    behind and skipped when popped, as only the entry matching the due time in `_due` is current.
+
+    Args:
+        columns (Sequence[str]): The columns of the todos passed to `fire`, including id, due_time and status.
+        fire (Callable[[List[Dict[str, Any]]], Awaitable[None]]): Called with each batch of todos which came due.
+        lead (float): Seconds before its due time the reminder of a todo fires.
+        horizon (float): Seconds ahead the due todos are loaded.
+        heap_size (int): The maximum number of todos kept in memory.
+        batch_size (int): The maximum number of reminders fired together.
+    """
+
+    def __init__(
+        self,
+        columns: Sequence[str],
+        fire: Callable[[List[Dict[str, Any]]], Awaitable[None]] = notify,
+        lead: float = REMINDER_LEAD,
+        horizon: float = REMINDER_HORIZON,
+        heap_size: int = REMINDER_HEAP_SIZE,
+        batch_size: int = REMINDER_BATCH_SIZE,
+    ) -> None:
+        self.columns: Tuple[str, ...] = tuple(columns)
+        self.lead: float = lead
+        self.horizon: float = horizon
+        self.heap_size: int = max(heap_size, 1)
+        self.batch_size: int = max(batch_size, 1)
+        self._fire: Callable[[List[Dict[str, Any]]], Awaitable[None]] = fire
+        self._heap: List[Key] = []
+        self._due: Dict[int, float] = {}
+        self._loaded_until: Optional[Key] = None
+        self._loading: Optional[List[Callable[[], None]]] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._loads: int = 0
+        self._fired: int = 0
+        self._skipped: int = 0
+        self._max_lateness: float = 0.0
+
+    def schedule(self, todo_id: int, due_time: datetime, status: str) -> None:
+        """
+        Updates the reminder of a created or updated todo.
+
+        Args:
+            todo_id (int): The id of the todo.
+            due_time (datetime): The due time of the todo, in UTC if naive.
+            status (str): The status of the todo: a done todo gets no reminder.
+        """
+        if self._loading is not None:
+            # The load in progress may have read the todo before this change, which is replayed once it is done.
+            self._loading.append(functools.partial(self.schedule, todo_id=todo_id, due_time=due_time, status=status))
+        self._due.pop(todo_id, None)
+        if status not in PENDING_STATUSES or self._loaded_until is None:
+            return
+        key: Key = (_timestamp(value=due_time), todo_id)
+        if key > self._loaded_until or key[0] - self.lead < time.time():
+            return
+        self._push(key=key)
+        if len(self._due) > self.heap_size:
+            self._shrink()
+        if self._wake is not None and self._heap[0] == key:
+            self._wake.set()
+
+    def cancel(self, todo_id: int) -> None:
+        """
+        Drops the reminder of a deleted todo.
+
+        Args:
+            todo_id (int): The id of the todo.
+        """
+        if self._loading is not None:
+            self._loading.append(functools.partial(self.cancel, todo_id=todo_id))
+        self._due.pop(todo_id, None)
+
+    def _push(self, key: Key) -> None:
+        self._due[key[1]] = key[0]
+        heapq.heappush(self._heap, key)
+        if len(self._heap) > 2 * len(self._due) + 1024:
+            self._heap = [(due, todo_id) for todo_id, due in self._due.items()]
+            heapq.heapify(self._heap)
+
+    def _shrink(self) -> None:
+        # Keeps the earliest todos only, and lowers the bound of the loaded todos to the last one kept.
+        kept: List[Key] = heapq.nsmallest(
+            self.heap_size * 9 // 10 or 1, ((due, todo_id) for todo_id, due in self._due.items()))
+        self._due = {todo_id: due for due, todo_id in kept}
+        self._heap = kept
+        self._loaded_until = kept[-1]
+
+    def _pop_due(self, now: float) -> List[Key]:
+        keys: List[Key] = []
+        while self._heap and self._heap[0][0] - self.lead <= now and len(keys) < self.batch_size:
+            key: Key = heapq.heappop(self._heap)
+            if self._due.get(key[1]) == key[0]:
+                del self._due[key[1]]
+                keys.append(key)
+        return keys
+
+    async def _load(self, now: float) -> None:
+        """
+        Loads the pending todos due after the loaded ones, up to the horizon and the free room of the heap.
+
+        Each status is read in (due_time, id) order from the (status, due_time) index, which ends with the primary
+        key, so that no sort is needed, and the three ranges are merged.
+        """
+        previous: Optional[Key] = self._loaded_until
+        start: Key = previous or (now + self.lead, 0)
+        until: float = now + self.lead + self.horizon
+        room: int = self.heap_size - len(self._due)
+        if room <= 0 or start[0] >= until:
+            return
+        self._loading = []
+        try:
+            query = ("SELECT due_time, id FROM todo WHERE status = %s AND due_time >= %s AND due_time <= %s "
+                     "AND (due_time > %s OR id > %s) ORDER BY due_time, id LIMIT %s")
+            bound: Key = (until, 2 ** 63)
+            loaded: List[Key] = []
+            async with connect() as db:
+                for status in PENDING_STATUSES:
+                    rows: List[Tuple[Any, ...]] = await db.fetch_all(query, (
+                        status, _datetime(timestamp=start[0]), _datetime(timestamp=until),
+                        _datetime(timestamp=start[0]), start[1], room))
+                    keys: List[Key] = [(_timestamp(value=row[0]), row[1]) for row in rows]
+                    if len(keys) == room:
+                        # The todos of this status after the last one read are unknown, so none can be kept.
+                        bound = min(bound, keys[-1])
+                    loaded.extend(keys)
+            loaded = sorted(key for key in loaded if key <= bound)[:room]
+            if self._loaded_until != previous:
+                # The heap was shrunk while loading, and the todos read past its new bound cannot be kept.
+                loaded = [key for key in loaded if self._loaded_until is not None and key <= self._loaded_until]
+            else:
+                self._loaded_until = loaded[-1] if len(loaded) == room else bound
+            for key in loaded:
+                self._push(key=key)
+            self._loads += 1
+        finally:
+            changes: List[Callable[[], None]] = self._loading
+            self._loading = None
+        for change in changes:
+            change()
+
+    async def _fire_batch(self, keys: List[Key], now: float) -> None:
+        """
+        Reads the todos back and fires the reminders of those still pending and due at the same time.
+        """
+        # The todos of the deleted users are left to their purge, see app.purge.purge.
+        query = (f"SELECT {', '.join(self.columns)} FROM todo "
+                 f"WHERE id IN ({', '.join(['%s'] * len(keys))}) AND NOT EXISTS ("
+                 "SELECT 1 FROM user WHERE user.id = todo.user_id AND user.deleted_at IS NOT NULL)")
+        async with connect() as db:
+            rows: List[Tuple[Any, ...]] = await db.fetch_all(query, [todo_id for _, todo_id in keys])
+        expected: Dict[int, float] = {todo_id: due for due, todo_id in keys}
+        todos: List[Dict[str, Any]] = []
+        for todo in rows_to_dicts(columns=self.columns, rows=rows):
+            if todo["status"] not in PENDING_STATUSES:
+                continue
+            if _timestamp(value=todo["due_time"]) != expected[todo["id"]]:
+                self.schedule(todo_id=todo["id"], due_time=todo["due_time"], status=todo["status"])
+                continue
+            todos.append(todo)
+        self._skipped += len(keys) - len(todos)
+        if todos:
+            self._max_lateness = max(self._max_lateness, now - (min(expected.values()) - self.lead))
+            await self._fire(todos)
+            self._fired += len(todos)
+
+    async def run(self) -> None:
+        """
+        Loads the due todos and fires their reminders, until cancelled.
+        """
+        self._wake = asyncio.Event()
+        next_load: float = 0.0
+        while True:
+            now: float = time.time()
+            if now >= next_load and (
+                    self._loaded_until is None or self._loaded_until[0] - self.lead - now < self.horizon / 2):
+                try:
+                    await self._load(now=now)
+                    next_load = time.time() + RELOAD_DELAY
+                except Exception as e:
+                    logger.warning("could not load the due todos: %s", e)
+                    next_load = time.time() + RETRY_DELAY
+            keys: List[Key] = self._pop_due(now=time.time())
+            if keys:
+                try:
+                    await self._fire_batch(keys=keys, now=time.time())
+                except Exception as e:
+                    logger.warning("could not fire %d reminder(s): %s", len(keys), e)
+                    for key in keys:
+                        if key[1] not in self._due:
+                            self._push(key=key)
+                    await asyncio.sleep(RETRY_DELAY)
+                continue
+            now = time.time()
+            timeout: float = next_load - now
+            if self._loaded_until is not None:
+                timeout = max(timeout, self._loaded_until[0] - self.lead - self.horizon / 2 - now)
+            if self._heap:
+                timeout = min(timeout, self._heap[0][0] - self.lead - now)
+            self._wake.clear()
+            try:
+                async with asyncio.timeout(max(timeout, 0)):
+                    await self._wake.wait()
+            except TimeoutError:
+                pass
+
+    def stats(self) -> Dict[str, int | float]:
+        """
+        Returns a snapshot of the scheduler metrics.
+
+        Returns:
+            Dict[str, int | float]: The number of todos in memory, the seconds ahead up to which every pending todo
+            is loaded, the number of loads, of fired and skipped reminders, and the latest a reminder was fired in
+            seconds.
+        """
+        return {
+            "pending": len(self._due),
+            "loaded_ahead": 0.0 if self._loaded_until is None else self._loaded_until[0] - self.lead - time.time(),
+            "loads": self._loads,
+            "fired": self._fired,
+            "skipped": self._skipped,
+            "max_lateness": self._max_lateness,
+        }
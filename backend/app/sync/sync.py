@@ -0,0 +1,246 @@
+"""
+This module contains the incremental sync of the todos: the changes of a user's todos since a version, and the
+compaction of the tombstones left by deleted todos.
+
+Every write to the todos of a user increases user.todos_version and stamps the written todos, or the tombstones of
+the deleted ones, with the new version, see migrations/0003_todo_change_tracking.sql. A client keeps the version it
+synced up to as an opaque cursor and only receives what changed since.
+
+The same writes increase one of the TODO_CHANGE_SLOTS counters of the todo_change table, whose sum changes with
+every commit to any todo, see migrations/0008_todo_change_counter.sql.
+
+The following classes and functions are available:
+
+- CursorExpiredError: Raised when the tombstones a cursor needs were compacted.
+- change_slot(user_id: int) -> int: Returns the todo_change counter increased by the writes to a user's todos.
+- count_todo_changes(db: AsyncConnection) -> int: Returns the number of committed writes to any todo.
+- fetch_changes(db: AsyncConnection, columns: Sequence[str], user_id: int, since: int, current: int, compacted: int,
+  limit: int) -> Tuple[List[Dict[str, Any]], List[int], int, bool]: Returns the todos written and deleted after a
+  version.
+- compact_tombstones(db: AsyncConnection, retention: float, batch_size: int) -> int: Deletes the tombstones older
+  than the retention period.
+- compact_periodically(interval: float) -> None: Compacts the tombstones forever, for the application lifespan.
+- main(argv: Optional[List[str]]) -> None: The command line entry point, compacting the tombstones once.
+
+The sync uses the following environment variables:
+
+- TOMBSTONE_RETENTION (float): Seconds a tombstone is kept. Clients which did not sync for longer have to download
+  their whole list again. Defaults to 30 days.
+- TOMBSTONE_COMPACT_INTERVAL (float): Seconds between two compactions run by each worker. Defaults to 3600.
+- TOMBSTONE_COMPACT_BATCH (int): The number of users whose tombstones are compacted per transaction. Defaults to
+  500.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.config.db import AsyncConnection, connect
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TOMBSTONE_RETENTION: float = float(
+    os.getenv(key="TOMBSTONE_RETENTION", default=str(30 * 24 * 3600)))
+TOMBSTONE_COMPACT_INTERVAL: float = float(
+    os.getenv(key="TOMBSTONE_COMPACT_INTERVAL", default="3600"))
+TOMBSTONE_COMPACT_BATCH: int = int(
+    os.getenv(key="TOMBSTONE_COMPACT_BATCH", default="500"))
+
+# The number of rows of the todo_change table, created by migrations/0008_todo_change_counter.sql.
+TODO_CHANGE_SLOTS: int = 16
+
+logger: logging.Logger = logging.getLogger(name="app.sync")
+
+
+class CursorExpiredError(Exception):
+    """
+    Raised when the tombstones a cursor needs were compacted: the client has to download its whole list again.
+    """
+
+
+def change_slot(user_id: int) -> int:
+    """
+    Returns the todo_change counter increased by the writes to a user's todos.
+
+    The counter is updated in the statement increasing the user's todos version, joined as
+    `STRAIGHT_JOIN todo_change ON todo_change.slot = %s` after every other table, so that it is locked last. A write
+    to the todos of several users increases the counter of the first one only.
+
+    Args:
+        user_id (int): The id of the user, or of the first user in id order.
+
+    Returns:
+        int: The slot of the counter.
+    """
+    return user_id % TODO_CHANGE_SLOTS
+
+
+async def count_todo_changes(db: AsyncConnection) -> int:
+    """
+    Returns the number of committed writes to any todo, which only grows: it changes whenever a todo did.
+
+    Args:
+        db (AsyncConnection): The connection to read with.
+
+    Returns:
+        int: The sum of the todo_change counters.
+    """
+    row: Tuple[Any, ...] = await db.fetch_one("SELECT SUM(changes) FROM todo_change")
+    return int(row[0] or 0)
+
+
+async def _fetch_versions(
+    db: AsyncConnection, columns: Sequence[str], user_id: int, condition: str, params: Sequence[Any],
+    limit: Optional[int]
+) -> List[Tuple[int, Optional[Dict[str, Any]], int]]:
+    """
+    Returns the written todos and the tombstones of a user matching a condition on their version, sorted by version.
+
+    Returns:
+        List[Tuple[int, Optional[Dict[str, Any]], int]]: The version, the todo or None for a deletion, and the id of
+        the todo of each change.
+    """
+    suffix: str = "" if limit is None else " LIMIT %s"
+    extra: Tuple[Any, ...] = () if limit is None else (limit,)
+    rows: List[Tuple[Any, ...]] = await db.fetch_all(
+        f"SELECT version, {', '.join(columns)} FROM todo WHERE user_id = %s AND {condition} "
+        f"ORDER BY version, id{suffix}", (user_id, *params, *extra))
+    tombstones: List[Tuple[Any, ...]] = await db.fetch_all(
+        f"SELECT version, todo_id FROM todo_tombstone WHERE user_id = %s AND {condition} "
+        f"ORDER BY version, todo_id{suffix}", (user_id, *params, *extra))
+    changes: List[Tuple[int, Optional[Dict[str, Any]], int]] = [
+        (row[0], dict(zip(columns, row[1:])), row[1]) for row in rows]
+    changes.extend((row[0], None, row[1]) for row in tombstones)
+    changes.sort(key=lambda change: change[0])
+    return changes
+
+
+async def fetch_changes(
+    db: AsyncConnection, columns: Sequence[str], user_id: int, since: int, current: int, compacted: int, limit: int
+) -> Tuple[List[Dict[str, Any]], List[int], int, bool]:
+    """
+    Returns the todos of a user written and deleted after a version, oldest first.
+
+    The changes of one write share its version and are never split across two pages, so the version of the last
+    change returned is a cursor which misses nothing. A single write larger than `limit` is returned whole.
+
+    Args:
+        db (AsyncConnection): The connection to read from.
+        columns (Sequence[str]): The columns of the todos to return, starting with the id.
+        user_id (int): The id of the user owning the todos.
+        since (int): The version the client synced up to, or -1 to receive every todo.
+        current (int): The todos version of the user, read before the changes.
+        compacted (int): The newest version of the compacted tombstones of the user.
+        limit (int): The maximum number of changes to return, beyond which the rest is left to the next page.
+
+    Raises:
+        CursorExpiredError: If tombstones after `since` were compacted.
+
+    Returns:
+        Tuple[List[Dict[str, Any]], List[int], int, bool]: The written todos, the ids of the deleted todos, the
+        version to sync from next time and whether more changes are waiting.
+    """
+    if 0 <= since < compacted:
+        raise CursorExpiredError(f"Changes before version {compacted} were compacted")
+    if since >= current:
+        return [], [], since, False
+    changes: List[Tuple[int, Optional[Dict[str, Any]], int]] = await _fetch_versions(
+        db=db, columns=columns, user_id=user_id, condition="version > %s", params=(since,), limit=limit + 1)
+    more: bool = len(changes) > limit
+    if more:
+        # Each source returned its first limit + 1 changes, so the merged list is exact up to that length, and the
+        # version of the first change left out may continue past what was fetched.
+        cut: int = changes[limit][0]
+        changes = [change for change in changes if change[0] < cut]
+        if not changes:
+            changes = await _fetch_versions(
+                db=db, columns=columns, user_id=user_id, condition="version = %s", params=(cut,), limit=None)
+        cursor: int = changes[-1][0]
+    else:
+        cursor = max(current, changes[-1][0]) if changes else current
+    todos: List[Dict[str, Any]] = [todo for _, todo, _ in changes if todo is not None]
+    deleted: List[int] = [todo_id for _, todo, todo_id in changes if todo is None]
+    return todos, deleted, cursor, more
+
+
+async def compact_tombstones(
+    db: AsyncConnection, retention: float = TOMBSTONE_RETENTION, batch_size: int = TOMBSTONE_COMPACT_BATCH
+) -> int:
+    """
+    Deletes the tombstones older than the retention period, one batch of users per transaction.
+
+    The compacted version of each user is raised first, so that a cursor needing the deleted tombstones is rejected
+    instead of silently missing the deletions.
+
+    Args:
+        db (AsyncConnection): The connection to write with.
+        retention (float): Seconds a tombstone is kept.
+        batch_size (int): The number of users whose tombstones are compacted per transaction.
+
+    Returns:
+        int: The number of deleted tombstones.
+    """
+    cutoff: datetime = datetime.now(tz=timezone.utc).replace(tzinfo=None) - timedelta(seconds=retention)
+    deleted: int = 0
+    while True:
+        horizons: List[Tuple[Any, ...]] = await db.fetch_all(
+            "SELECT user_id, MAX(version) FROM todo_tombstone WHERE deleted_at < %s GROUP BY user_id LIMIT %s",
+            (cutoff, batch_size))
+        if not horizons:
+            return deleted
+        await db.executemany(
+            "UPDATE user SET todos_compacted_version = %s WHERE id = %s AND todos_compacted_version < %s",
+            [(version, user_id, version) for user_id, version in horizons])
+        cursor: Any = await db.executemany(
+            "DELETE FROM todo_tombstone WHERE user_id = %s AND version <= %s",
+            [(user_id, version) for user_id, version in horizons])
+        await db.commit()
+        deleted += max(cursor.rowcount, 0)
+
+
+async def compact_periodically(interval: float = TOMBSTONE_COMPACT_INTERVAL) -> None:
+    """
+    Compacts the tombstones every `interval` seconds, until cancelled.
+
+    Every worker runs it; concurrent compactions delete disjoint or already deleted rows and do not conflict.
+
+    Args:
+        interval (float): Seconds between two compactions.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with connect() as db:
+                deleted: int = await compact_tombstones(db=db)
+            if deleted:
+                logger.info("compacted %d todo tombstone(s)", deleted)
+        except Exception as e:
+            logger.warning("could not compact the todo tombstones: %s", e)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Compacts the tombstones once.
+
+    Args:
+        argv (Optional[List[str]]): The command line arguments.
+    """
+    parser = argparse.ArgumentParser(description="Compact the tombstones of the deleted todos.")
+    parser.add_argument("--retention", type=float, default=TOMBSTONE_RETENTION,
+                        help="seconds a tombstone is kept")
+    args: argparse.Namespace = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    async def run() -> int:
+        async with connect() as db:
+            return await compact_tombstones(db=db, retention=args.retention)
+
+    logger.info("%d tombstone(s) compacted", asyncio.run(run()))
+
+
+if __name__ == "__main__":
+    main()
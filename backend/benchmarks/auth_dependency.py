@@ -0,0 +1,70 @@
+"""
+This module benchmarks the per-request cost of the authentication dependencies.
+
+It compares verifying the token twice, as endpoints depending on both `decode_jwt` and `get_email_from_token` used
+to, with one verification per request on a cold cache and with a warm token cache. It needs no database. Run it
+from the backend directory:
+
+    python -m benchmarks.auth_dependency --iterations 100000
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Any, Callable, Coroutine, Dict, List, Optional
+
+import jwt
+from app.auth import auth
+from benchmarks.common import write_report
+
+
+async def _double_decode(token: str) -> None:
+    for _ in range(2):
+        jwt.decode(jwt=token, key=auth.JWT_SECRET_KEY, algorithms=[auth.JWT_ALGORITHM])
+
+
+async def _cold_cache(token: str) -> None:
+    auth.token_cache.clear()
+    await auth.get_email_from_token(claims=await auth.decode_jwt(token=token))
+
+
+async def _warm_cache(token: str) -> None:
+    await auth.get_email_from_token(claims=await auth.decode_jwt(token=token))
+
+
+async def _time(function: Callable[[str], Coroutine[Any, Any, None]], token: str, iterations: int) -> Dict[str, float]:
+    started: float = time.perf_counter()
+    for _ in range(iterations):
+        await function(token)
+    elapsed: float = time.perf_counter() - started
+    return {"microseconds_per_request": elapsed / iterations * 1e6, "requests_per_second": iterations / elapsed}
+
+
+async def _run(iterations: int) -> Dict[str, Any]:
+    if auth.JWT_SECRET_KEY is None:
+        auth.JWT_SECRET_KEY = "benchmark-secret-key-of-at-least-32-bytes"
+    token: str = auth.encode_jwt(email="bench@example.com")["token"]
+    results: Dict[str, Any] = {"iterations": iterations}
+    for name, function in (("double_decode", _double_decode), ("cold_cache", _cold_cache),
+                           ("warm_cache", _warm_cache)):
+        results[name] = await _time(function=function, token=token, iterations=iterations)
+    results["token_cache"] = auth.token_cache.stats()
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Runs the benchmark and prints the report.
+
+    Args:
+        argv (Optional[List[str]]): The command line arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=100000, help="number of simulated requests per case")
+    parser.add_argument("--output", help="file to write the JSON report to")
+    args: argparse.Namespace = parser.parse_args(argv)
+    write_report(name="auth_dependency", results=asyncio.run(_run(iterations=args.iterations)), output=args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+This module benchmarks creating, updating and deleting todos one request per todo versus through the batch
+endpoints.
+
+It needs the MySQL server configured by the usual MYSQL_* environment variables. Run it from the backend directory:
+
+    python -m benchmarks.batch_writes --rows 10000 --batch-size 1000 --concurrency 8
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+from benchmarks.common import app_client, bench_user, write_report
+
+
+def _todo(index: int, user_id: int) -> Dict[str, Any]:
+    return {"title": f"todo {index}", "description": f"description of todo {index}",
+            "due_time": "2030-01-01 00:00:00", "status": "todo", "user_id": str(user_id)}
+
+
+async def _per_item(client: httpx.AsyncClient, headers: Dict[str, str], user_id: int,
+                    args: argparse.Namespace) -> Dict[str, float]:
+    semaphore: asyncio.Semaphore = asyncio.Semaphore(args.concurrency)
+    ids: List[str] = []
+
+    async def create(index: int) -> None:
+        async with semaphore:
+            response: httpx.Response = await client.post("/todos", json=_todo(index=index, user_id=user_id),
+                                                          headers=headers)
+            ids.append(response.json()["id"])
+
+    async def update(todo_id: str) -> None:
+        async with semaphore:
+            await client.put(f"/todos/{todo_id}", json={**_todo(index=0, user_id=user_id), "status": "done"},
+                             headers=headers)
+
+    async def delete(todo_id: str) -> None:
+        async with semaphore:
+            await client.delete(f"/todos/{todo_id}", headers=headers)
+
+    results: Dict[str, float] = {}
+    started: float = time.perf_counter()
+    await asyncio.gather(*(create(index=index) for index in range(args.rows)))
+    results["create_rows_per_second"] = args.rows / (time.perf_counter() - started)
+    started = time.perf_counter()
+    await asyncio.gather(*(update(todo_id=todo_id) for todo_id in ids))
+    results["update_rows_per_second"] = args.rows / (time.perf_counter() - started)
+    started = time.perf_counter()
+    await asyncio.gather(*(delete(todo_id=todo_id) for todo_id in ids))
+    results["delete_rows_per_second"] = args.rows / (time.perf_counter() - started)
+    return results
+
+
+async def _batched(client: httpx.AsyncClient, headers: Dict[str, str], user_id: int,
+                   args: argparse.Namespace) -> Dict[str, float]:
+    chunks: List[range] = [range(start, min(args.rows, start + args.batch_size))
+                           for start in range(0, args.rows, args.batch_size)]
+    ids: List[str] = []
+    results: Dict[str, float] = {}
+    started: float = time.perf_counter()
+    for chunk in chunks:
+        response: httpx.Response = await client.post(
+            "/todos/batch", json=[_todo(index=index, user_id=user_id) for index in chunk], headers=headers)
+        ids.extend(result["id"] for result in response.json()["results"])
+    results["create_rows_per_second"] = args.rows / (time.perf_counter() - started)
+    id_chunks: List[List[str]] = [ids[start:start + args.batch_size] for start in range(0, len(ids), args.batch_size)]
+    started = time.perf_counter()
+    for id_chunk in id_chunks:
+        await client.put("/todos/batch", headers=headers, json=[
+            {**_todo(index=0, user_id=user_id), "id": todo_id, "status": "done"} for todo_id in id_chunk])
+    results["update_rows_per_second"] = args.rows / (time.perf_counter() - started)
+    started = time.perf_counter()
+    for id_chunk in id_chunks:
+        await client.request("DELETE", "/todos/batch", json={"ids": id_chunk}, headers=headers)
+    results["delete_rows_per_second"] = args.rows / (time.perf_counter() - started)
+    return results
+
+
+async def _run(args: argparse.Namespace) -> Dict[str, Any]:
+    user_id, headers = await bench_user()
+    async with app_client() as client:
+        per_item: Dict[str, float] = await _per_item(client=client, headers=headers, user_id=user_id, args=args)
+        batched: Dict[str, float] = await _batched(client=client, headers=headers, user_id=user_id, args=args)
+    return {
+        "parameters": {"rows": args.rows, "batch_size": args.batch_size, "concurrency": args.concurrency},
+        "per_item": per_item,
+        "batched": batched,
+        "speedup": {key: batched[key] / per_item[key] for key in per_item},
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Runs the benchmark and prints the report.
+
+    Args:
+        argv (Optional[List[str]]): The command line arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10000, help="number of todos to write")
+    parser.add_argument("--batch-size", type=int, default=1000, help="number of todos per batch request")
+    parser.add_argument("--concurrency", type=int, default=8, help="number of per-item requests in flight")
+    parser.add_argument("--output", help="file to write the JSON report to")
+    args: argparse.Namespace = parser.parse_args(argv)
+    write_report(name="batch_writes", results=asyncio.run(_run(args=args)), output=args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+This module benchmarks the bulk import and export of app.bulk.bulk against creating the same rows through the API.
+
+The app is called in-process. By default it runs against the SQLite stand-in of benchmarks.standin; `--backend mysql`
+uses the MySQL server configured by the usual MYSQL_* environment variables instead. NDJSON files of `--users` users
+and `--todos` todos spread over them are generated in a temporary directory, then:
+
+- "api_users" and "api_todos": the first `--api-sample` records of each file are sent one request at a time to
+  POST /register and POST /todos, as onboarding did,
+- "import_users" and "import_todos": the whole files are imported in batches of `--batch-size`,
+- "export_users" and "export_todos": the tables are written back to NDJSON files.
+
+The report gives the rows per second of each, and the memory the imports and exports allocated at their peak,
+traced with tracemalloc. Run it from the backend directory:
+
+    python -m benchmarks.bulk --users 2000 --todos 200000 --api-sample 500
+"""
+
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+from app import api
+from app.auth import auth
+from app.auth.hashing import PasswordHasher
+from app.bulk import bulk
+from app.config import db
+from app.ratelimit import ratelimit
+from benchmarks import standin
+from benchmarks.common import app_client, write_report
+
+
+def _generate(directory: str, users: int, todos: int) -> List[str]:
+    run: str = uuid.uuid4().hex[:8]
+    emails: List[str] = [f"bulk-{run}-{index}@example.com" for index in range(users)]
+    with open(os.path.join(directory, "users.ndjson"), mode="w", encoding="utf-8") as file:
+        for index, email in enumerate(emails):
+            file.write(json.dumps({"email": email, "name": "Bulk", "firstname": "Bench",
+                                   "password": f"password {index}"}) + "\n")
+    with open(os.path.join(directory, "todos.ndjson"), mode="w", encoding="utf-8") as file:
+        for index in range(todos):
+            file.write(json.dumps({"title": f"todo {index}", "description": "generated by the bulk benchmark",
+                                   "due_time": "2030-01-01T00:00:00", "status": "todo",
+                                   "user_email": emails[index % users]}) + "\n")
+    return emails
+
+
+def _records(directory: str, kind: str, limit: int) -> List[Dict[str, Any]]:
+    with open(os.path.join(directory, f"{kind}.ndjson"), encoding="utf-8") as file:
+        return [json.loads(line) for line in itertools.islice(file, limit)]
+
+
+async def _measure(work: Callable[[], Awaitable[int]]) -> Dict[str, Any]:
+    tracemalloc.start()
+    started: float = time.perf_counter()
+    rows: int = await work()
+    seconds: float = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"rows": rows, "seconds": seconds, "rows_per_second": rows / seconds, "peak_traced_bytes": peak}
+
+
+async def _run(args: argparse.Namespace) -> Dict[str, Any]:
+    if auth.JWT_SECRET_KEY is None:
+        auth.JWT_SECRET_KEY = "benchmark-secret-key-of-at-least-32-bytes"
+    database: Optional[str] = None
+    if args.backend == "standin":
+        database = standin.install(path=args.database)
+    directory: str = tempfile.mkdtemp(prefix="bulk-")
+    # The API runs are a single client registering many accounts, which the admission control would reject.
+    original: ratelimit.AdmissionController = api.admission
+    try:
+        emails: List[str] = _generate(directory=directory, users=args.users, todos=args.todos)
+        results: Dict[str, Any] = {}
+        api.admission = ratelimit.AdmissionController(
+            ips=ratelimit.TokenBucketLimiter(burst=2 ** 30, period=1),
+            emails=ratelimit.TokenBucketLimiter(burst=2 ** 30, period=1))
+        async with app_client() as client:
+            async def register() -> int:
+                for record in _records(directory=directory, kind="users", limit=args.api_sample):
+                    response: httpx.Response = await client.post(
+                        "/register", json={**record, "email": "api-" + record["email"]})
+                    response.raise_for_status()
+                return min(args.api_sample, args.users)
+
+            results["api_users"] = await _measure(work=register)
+
+            async def create() -> int:
+                headers: Dict[str, str] = {"token": auth.encode_jwt(email="api-" + emails[0])["token"]}
+                async with db.connect() as connection:
+                    user_id: int = (await connection.fetch_one(
+                        "SELECT id FROM user WHERE email = %s", ("api-" + emails[0],)))[0]
+                for record in _records(directory=directory, kind="todos", limit=args.api_sample):
+                    body: Dict[str, Any] = {key: record[key] for key in ("title", "description", "due_time", "status")}
+                    response: httpx.Response = await client.post("/todos", headers=headers,
+                                                                 json={**body, "user_id": user_id})
+                    response.raise_for_status()
+                return min(args.api_sample, args.todos)
+
+            results["api_todos"] = await _measure(work=create)
+        hasher: PasswordHasher = PasswordHasher(
+            executor="process", workers=args.hash_workers, queue_size=args.batch_size)
+        try:
+            async with db.connect() as connection:
+                for kind in bulk.KINDS:
+                    async def load(kind: str = kind) -> int:
+                        with open(os.path.join(directory, f"{kind}.ndjson"), encoding="utf-8", newline="") as file:
+                            records = bulk.read_records(file=file, file_format="ndjson")
+                            job: str = f"benchmark {kind} {uuid.uuid4().hex[:8]}"
+                            report: Dict[str, Any] = await (
+                                bulk.import_users(db=connection, records=records, job=job,
+                                                  batch_size=args.batch_size, hasher=hasher)
+                                if kind == "users" else
+                                bulk.import_todos(db=connection, records=records, job=job,
+                                                  batch_size=args.batch_size))
+                        return report["inserted"]
+
+                    results[f"import_{kind}"] = await _measure(work=load)
+            async with db.connect(read_only=True) as connection:
+                for kind in bulk.KINDS:
+                    async def dump(kind: str = kind) -> int:
+                        path: str = os.path.join(directory, f"export-{kind}.ndjson")
+                        with open(path, mode="w", encoding="utf-8", newline="") as file:
+                            report: Dict[str, Any] = await bulk.export_records(
+                                db=connection, kind=kind, file=file, file_format="ndjson",
+                                batch_size=args.batch_size)
+                        return report["records"]
+
+                    results[f"export_{kind}"] = await _measure(work=dump)
+        finally:
+            hasher.shutdown()
+        return {
+            "parameters": {
+                "backend": args.backend, "users": args.users, "todos": args.todos, "api_sample": args.api_sample,
+                "batch_size": args.batch_size, "hash_workers": args.hash_workers,
+            },
+            **results,
+        }
+    finally:
+        api.admission = original
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+        if database is not None and args.database is None:
+            db.get_pool().close()
+            for suffix in ("", "-wal", "-shm"):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(database + suffix)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Runs the benchmark and prints the report.
+
+    Args:
+        argv (Optional[List[str]]): The command line arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("standin", "mysql"), default="standin", help="database to run against")
+    parser.add_argument("--database", help="SQLite file of the stand-in, defaults to a new temporary file")
+    parser.add_argument("--users", type=int, default=2000, help="number of users in the generated file")
+    parser.add_argument("--todos", type=int, default=200000, help="number of todos in the generated file")
+    parser.add_argument("--api-sample", type=int, default=500,
+                        help="number of users and of todos created through the API")
+    parser.add_argument("--batch-size", type=int, default=bulk.BULK_BATCH_SIZE,
+                        help="number of records imported per transaction")
+    parser.add_argument("--hash-workers", type=int, default=bulk.BULK_HASH_WORKERS,
+                        help="number of processes hashing the passwords")
+    parser.add_argument("--output", help="file to write the JSON report to")
+    args: argparse.Namespace = parser.parse_args(argv)
+    write_report(name="bulk", results=asyncio.run(_run(args=args)), output=args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""
+This module load tests the todo change feed of GET /user/todos/events with many idle subscribers.
+
+The app runs in a separate uvicorn process, so that its memory can be measured on its own. By default it runs against
+the SQLite stand-in of benchmarks.standin; `--backend mysql` uses the MySQL server configured by the usual MYSQL_*
+environment variables instead. `--users` users are seeded, then `--subscribers` event streams are opened over raw
+sockets and spread evenly over the users. The benchmark reports:
+
+- the resident memory of the server before and after the subscribers connected, and per subscriber,
+- the latency of GET /health/live without and with the idle subscribers connected,
+- the delivery latency of the events of `--writes` todo creations, from the start of the POST /todos request to the
+  reception of the event by each subscriber of the todo's owner.
+
+The resident memory is read from /proc and is only reported on Linux. Opening many streams needs as many file
+descriptors on both sides, see `ulimit -n`. Run it from the backend directory:
+
+    python -m benchmarks.change_feed --subscribers 10000 --users 100 --writes 50
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from app.auth import auth
+from app.config import db
+from benchmarks import standin
+from benchmarks.common import summarize, write_report
+
+BACKEND_DIR: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LATENCY_SAMPLES = 200
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _rss_bytes(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status", mode="r", encoding="ascii") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+async def _seed(users: int) -> List[Tuple[int, str]]:
+    run: str = uuid.uuid4().hex[:8]
+    emails: List[str] = [f"feed-{run}-{index}@example.com" for index in range(users)]
+    async with db.connect() as connection:
+        cursor: Any = await connection.executemany(
+            "INSERT INTO user (email, password, name, firstname) VALUES (%s, %s, %s, %s)",
+            [(email, "-", "Bench", "Bench") for email in emails])
+        await connection.commit()
+    return [(cursor.lastrowid + index, email) for index, email in enumerate(emails)]
+
+
+class _Subscriber:
+    """
+    An event stream read over a raw socket, recording when each event arrived.
+    """
+
+    def __init__(self, token: str) -> None:
+        self.token: str = token
+        self.received: Dict[str, float] = {}
+        self.ready: asyncio.Event = asyncio.Event()
+        self.error: Optional[str] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def run(self, port: int) -> None:
+        try:
+            reader, self._writer = await asyncio.open_connection(host="127.0.0.1", port=port)
+            self._writer.write((
+                f"GET /user/todos/events HTTP/1.1\r\nHost: 127.0.0.1\r\ntoken: {self.token}\r\n"
+                "Accept: text/event-stream\r\n\r\n").encode(encoding="ascii"))
+            await self._writer.drain()
+            status: bytes = await reader.readline()
+            if b" 200 " not in status:
+                raise ConnectionError(status.decode(encoding="ascii", errors="replace").strip())
+            while (line := await reader.readline()) not in (b"\r\n", b""):
+                pass
+            # The body is chunked: the data lines of the events are read, the chunk sizes and the rest ignored.
+            while line := await reader.readline():
+                if line.startswith(b"retry:"):
+                    self.ready.set()
+                elif line.startswith(b"data:"):
+                    event: Dict[str, Any] = json.loads(line[5:])
+                    if event["type"] == "created":
+                        self.received[event["todo"]["title"]] = time.perf_counter()
+        except (OSError, ConnectionError) as e:
+            self.error = str(e)
+        finally:
+            self.ready.set()
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+
+
+async def _live_latency(client: httpx.AsyncClient) -> Dict[str, float]:
+    samples: List[float] = []
+    started: float = time.perf_counter()
+    for _ in range(LATENCY_SAMPLES):
+        request_started: float = time.perf_counter()
+        await client.get("/health/live")
+        samples.append(time.perf_counter() - request_started)
+    return summarize(samples=samples, elapsed=time.perf_counter() - started)
+
+
+async def _wait_until_live(client: httpx.AsyncClient, process: subprocess.Popen) -> None:
+    deadline: float = time.perf_counter() + 60
+    while time.perf_counter() < deadline and process.poll() is None:
+        with contextlib.suppress(httpx.HTTPError):
+            if (await client.get("/health/live")).status_code == 200:
+                return
+        await asyncio.sleep(0.05)
+    raise RuntimeError("the server did not start")
+
+
+async def _load(args: argparse.Namespace, users: List[Tuple[int, str]], port: int,
+                process: subprocess.Popen) -> Dict[str, Any]:
+    tokens: Dict[int, str] = {user_id: auth.encode_jwt(email=email)["token"] for user_id, email in users}
+    limits = httpx.Limits(max_connections=8)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+        await _wait_until_live(client=client, process=process)
+        idle_rss: Optional[int] = _rss_bytes(pid=process.pid)
+        baseline: Dict[str, float] = await _live_latency(client=client)
+        owners: List[int] = [users[index % len(users)][0] for index in range(args.subscribers)]
+        subscribers: List[_Subscriber] = [_Subscriber(token=tokens[owner]) for owner in owners]
+        started: float = time.perf_counter()
+        tasks: List[asyncio.Task[None]] = []
+        for start in range(0, len(subscribers), args.connect_batch):
+            batch: List[_Subscriber] = subscribers[start:start + args.connect_batch]
+            tasks.extend(asyncio.create_task(subscriber.run(port=port)) for subscriber in batch)
+            await asyncio.gather(*(subscriber.ready.wait() for subscriber in batch))
+        connect_seconds: float = time.perf_counter() - started
+        errors: List[str] = [subscriber.error for subscriber in subscribers if subscriber.error]
+        await asyncio.sleep(1)
+        subscribed_rss: Optional[int] = _rss_bytes(pid=process.pid)
+        loaded: Dict[str, float] = await _live_latency(client=client)
+        sent: Dict[str, Tuple[int, float]] = {}
+        for index in range(args.writes):
+            user_id: int = random.choice(users)[0]
+            title: str = f"feed {index}"
+            sent[title] = (user_id, time.perf_counter())
+            await client.post("/todos", headers={"token": tokens[user_id]}, json={
+                "title": title, "description": "created by the change feed benchmark",
+                "due_time": "2030-01-01T00:00:00", "status": "todo", "user_id": user_id})
+        await asyncio.sleep(args.settle)
+        stats: Dict[str, Any] = (await client.get("/stats")).json().get("events", {})
+        samples: List[float] = []
+        missed: int = 0
+        for subscriber, owner in zip(subscribers, owners):
+            for title, (user_id, sent_at) in sent.items():
+                if user_id != owner:
+                    continue
+                if title in subscriber.received:
+                    samples.append(subscriber.received[title] - sent_at)
+                else:
+                    missed += 1
+        for subscriber in subscribers:
+            subscriber.close()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    memory: Dict[str, Optional[float]] = {"idle_rss_bytes": idle_rss, "subscribed_rss_bytes": subscribed_rss}
+    if idle_rss is not None and subscribed_rss is not None and args.subscribers:
+        memory["bytes_per_subscriber"] = (subscribed_rss - idle_rss) / args.subscribers
+    return {
+        "connect_seconds": connect_seconds,
+        "subscribe_errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "memory": memory,
+        "health_live": {"without_subscribers": baseline, "with_subscribers": loaded},
+        "delivery": {**summarize(samples=samples, elapsed=args.settle), "missed": missed},
+        "broker": stats,
+    }
+
+
+async def _run(args: argparse.Namespace) -> Dict[str, Any]:
+    if auth.JWT_SECRET_KEY is None:
+        auth.JWT_SECRET_KEY = "benchmark-secret-key-of-at-least-32-bytes"
+    database: Optional[str] = None
+    if args.backend == "standin":
+        database = standin.install(path=args.database)
+    port: int = _free_port()
+    process: Optional[subprocess.Popen] = None
+    try:
+        users: List[Tuple[int, str]] = await _seed(users=args.users)
+        command: List[str] = [sys.executable, "-m", "benchmarks.change_feed", "--serve", "--port", str(port),
+                              "--backend", args.backend]
+        if database is not None:
+            command += ["--database", database]
+        env: Dict[str, str] = {**os.environ, "SECRET": auth.JWT_SECRET_KEY}
+        process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env)
+        results: Dict[str, Any] = await _load(args=args, users=users, port=port, process=process)
+        return {
+            "parameters": {
+                "backend": args.backend, "subscribers": args.subscribers, "users": args.users,
+                "writes": args.writes,
+            },
+            **results,
+        }
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        if database is not None and args.database is None:
+            db.get_pool().close()
+            for suffix in ("", "-wal", "-shm"):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(database + suffix)
+
+
+def _serve(args: argparse.Namespace) -> None:
+    import uvicorn
+
+    if args.backend == "standin":
+        standin.install(path=args.database)
+    from app.api import app
+
+    uvicorn.run(app=app, host="127.0.0.1", port=args.port, log_level="warning", backlog=4096)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Runs the benchmark and prints the report.
+
+    Args:
+        argv (Optional[List[str]]): The command line arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("standin", "mysql"), default="standin", help="database to run against")
+    parser.add_argument("--database", help="SQLite file of the stand-in, defaults to a new temporary file")
+    parser.add_argument("--subscribers", type=int, default=10000, help="number of idle event streams")
+    parser.add_argument("--users", type=int, default=100, help="number of users the streams are spread over")
+    parser.add_argument("--writes", type=int, default=50, help="number of todos created while the streams are open")
+    parser.add_argument("--connect-batch", type=int, default=500, help="number of streams opened at once")
+    parser.add_argument("--settle", type=float, default=2, help="seconds to wait for the last events")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random choices")
+    parser.add_argument("--output", help="file to write the JSON report to")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args: argparse.Namespace = parser.parse_args(argv)
+    if args.serve:
+        _serve(args=args)
+        return
+    random.seed(args.seed)
+    write_report(name="change_feed", results=asyncio.run(_run(args=args)), output=args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+This module contains helpers shared by the benchmarks of the Todo app backend.
+
+The following functions are available:
+
+- percentile(samples: Sequence[float], pct: float) -> float: Returns the given percentile of a list of samples.
+- summarize(samples: Sequence[float], elapsed: float) -> Dict[str, float]: Returns throughput and latency
+  percentiles of a list of latency samples.
+- write_report(name: str, results: Dict[str, Any], output: Optional[str]) -> None: Prints a benchmark report as
+  JSON and optionally writes it to a file, so that reports can be diffed between commits.
+- app_client() -> httpx.AsyncClient: Returns an HTTP client calling the FastAPI app in-process.
+- bench_user() -> Tuple[int, Dict[str, str]]: Creates the benchmark user and returns its id and auth headers.
+"""
+
+import json
+import math
+import platform
+import subprocess
+import sys
+import time
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import httpx
+from app.auth.auth import encode_jwt
+from app.config import db
+
+BENCH_EMAIL = "bench@example.com"
+
+
+def percentile(samples: Sequence[float], pct: float) -> float:
+    """
+    Returns the given percentile of a list of samples, using the nearest-rank method.
+
+    Args:
+        samples (Sequence[float]): The samples.
+        pct (float): The percentile, between 0 and 100.
+
+    Returns:
+        float: The percentile, or 0 if there are no samples.
+    """
+    if not samples:
+        return 0.0
+    ordered: list[float] = sorted(samples)
+    rank: int = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(samples: Sequence[float], elapsed: float) -> Dict[str, float]:
+    """
+    Returns throughput and latency percentiles of a list of latency samples.
+
+    Args:
+        samples (Sequence[float]): Latencies in seconds.
+        elapsed (float): Wall-clock duration of the run in seconds.
+
+    Returns:
+        Dict[str, float]: The number of samples, the throughput per second and the p50/p95/p99/max latencies in
+        milliseconds.
+    """
+    return {
+        "count": len(samples),
+        "throughput": len(samples) / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": percentile(samples=samples, pct=50) * 1000,
+        "p95_ms": percentile(samples=samples, pct=95) * 1000,
+        "p99_ms": percentile(samples=samples, pct=99) * 1000,
+        "max_ms": max(samples, default=0.0) * 1000,
+    }
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_report(name: str, results: Dict[str, Any], output: Optional[str] = None) -> None:
+    """
+    Prints a benchmark report as JSON and optionally writes it to a file.
+
+    Args:
+        name (str): The name of the benchmark.
+        results (Dict[str, Any]): The measurements.
+        output (Optional[str]): The path of the file to write the report to.
+    """
+    report: Dict[str, Any] = {
+        "benchmark": name,
+        "revision": _git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "results": results,
+    }
+    text: str = json.dumps(report, indent=2, sort_keys=True)
+    print(text)
+    if output:
+        with open(output, mode="w", encoding="utf-8") as file:
+            file.write(text + "\n")
+
+
+def app_client() -> httpx.AsyncClient:
+    """
+    Returns an HTTP client calling the FastAPI app in-process, without any network hop.
+
+    Returns:
+        httpx.AsyncClient: The client, to be used as an async context manager.
+    """
+    from app.api import app
+
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None)
+
+
+async def bench_user() -> Tuple[int, Dict[str, str]]:
+    """
+    Creates the benchmark user if needed and returns its id and the headers authenticating as it.
+
+    Returns:
+        Tuple[int, Dict[str, str]]: The id of the user and the request headers carrying its token.
+    """
+    async with db.connect() as connection:
+        row: Optional[Tuple[Any, ...]] = await connection.fetch_one(
+            "SELECT id FROM user WHERE email = %s", (BENCH_EMAIL,))
+        if row is None:
+            cursor: Any = await connection.execute(
+                "INSERT INTO user (email, password, name, firstname) VALUES (%s, %s, %s, %s)",
+                (BENCH_EMAIL, "-", "Bench", "Bench"))
+            await connection.commit()
+            row = (cursor.lastrowid,)
+    return row[0], {"token": encode_jwt(email=BENCH_EMAIL)["token"]}
@@ -0,0 +1,403 @@
+"""
+This module benchmarks every route of the API with concurrent clients and reports throughput and latency per
+endpoint.
+
+The app is called in-process. By default it runs against the SQLite stand-in of benchmarks.standin, so it needs no
+server; `--backend mysql` uses the MySQL server configured by the usual MYSQL_* environment variables instead. The
+database is first seeded with `--users` users sharing `--todos` todos, then each endpoint is driven by `--clients`
+concurrent clients for `--duration` seconds, one endpoint after the other. Writes only touch rows created by the
+benchmark or leave the seeded rows as they were, so the read endpoints see the same data in every run. Run it from
+the backend directory:
+
+    python -m benchmarks.endpoints --users 100 --todos 100000 --clients 16 --duration 5 --output endpoints.json
+
+Use `--only` to run a subset of the endpoints, for instance `--only "GET /user/todos" "POST /login"`. With the
+stand-in, `--replicas` routes the reads to that many replicas opening the same file; with MySQL, the replicas are
+the ones of MYSQL_REPLICA_HOSTS.
+"""
+
+import argparse
+import asyncio
+import collections
+import contextlib
+import datetime
+import os
+import random
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import bcrypt
+import httpx
+from app.auth import auth
+from app.auth.hashing import get_hasher
+from app.config import db
+from app.models.models import Status
+from benchmarks import standin
+from benchmarks.common import app_client, summarize, write_report
+
+PASSWORD = "benchmark"
+SEED_BATCH_SIZE = 5000
+WRITE_BATCH_SIZE = 100
+
+
+def _due_time(index: int) -> datetime.datetime:
+    return datetime.datetime(2025, 1, 1) + datetime.timedelta(hours=index % 20000)
+
+
+def _status(index: int) -> str:
+    return list(Status)[index % len(Status)].value
+
+
+class _Context:
+    """
+    The state shared by the clients of a benchmark run: the seeded users and todos, and the rows created by the
+    write endpoints, which the delete endpoints consume.
+    """
+
+    def __init__(self, users: List[Tuple[int, str]], first_todo_id: int, todos: int) -> None:
+        self.users: List[Tuple[int, str]] = users
+        self.headers: Dict[int, Dict[str, str]] = {
+            user_id: {"token": auth.encode_jwt(email=email)["token"]} for user_id, email in users}
+        self.first_todo_id: int = first_todo_id
+        self.todos: int = todos
+        self.created_todos: List[int] = []
+        self.registered: List[str] = []
+        self.registered_ids: List[int] = []
+        self.etags: Dict[Tuple[str, int], str] = {}
+        self.sync_cursors: Dict[int, str] = {}
+
+    def user(self) -> Tuple[int, str, Dict[str, str]]:
+        user_id, email = random.choice(self.users)
+        return user_id, email, self.headers[user_id]
+
+    def todo_id(self) -> int:
+        return self.first_todo_id + random.randrange(self.todos)
+
+    def todo(self, user_id: int, index: int) -> Dict[str, Any]:
+        return {
+            "title": f"benchmark todo {index}",
+            "description": "created by the endpoint benchmark",
+            "due_time": "2030-01-01T00:00:00",
+            "status": Status.TODO.value,
+            "user_id": user_id,
+        }
+
+
+Request = Callable[[httpx.AsyncClient, _Context], Awaitable[Optional[httpx.Response]]]
+
+
+async def _root(client: httpx.AsyncClient, context: _Context) -> httpx.Response:
+    return await client.get("/")
+
+
+async def _stats(client: httpx.AsyncClient, context: _Context) -> httpx.Response:
+    return await client.get("/stats")
+
+
+async def _metrics(client: httpx.AsyncClient, context: _Context) -> httpx.Response:
+    return await client.get("/metrics")
+
+
+async def _check_token(client: httpx.AsyncClient, context: _Context) -> httpx.Response:
+    return await client.get("/check_token", headers=context.user()[2])
+
+
+async def _view_user(client: httpx.AsyncClient, context: _Context) -> httpx.Response:
+    return await client.get("/users", headers=context.user()[2])
+
+
+async def _view_all_users(client: httpx.AsyncClient, context: _Context) -> httpx.Response:
+    return await client.get("/user", headers=context.user()[2])
+
+
+async def _view_all_todos(client: httpx.AsyncClient, context: _Context) -> httpx.Response:
+    return await client.get("/todos", headers=context.user()[2], params={
+        "limit": 100, "status": random.choice(list(Status)).value})
+
+
+async def _view_all_user_todos(client: httpx.AsyncClient, context: _Context) -> httpx.Response:
+    return await client.get("/user/todos", headers=context.user()[2], params={"limit": 100})
+
+
+async def _revalidate(client: httpx.AsyncClient, context: _Context, path: str) -> httpx.Response:
+    # Polls like a browser cache: sends back the ETag of the previous response of the same user.
+    user_id, _, headers = context.user()
+    etag: Optional[str] = context.etags.get((path, user_id))
+    response: httpx.Response = await client.get(
+        path, headers=headers if etag is None else {**headers, "If-None-Match": etag}, params={"limit": 100})
+    if "ETag" in response.headers:
+        context.etags[(path, user_id)] = response.headers["ETag"]
+    return response
+
+
+async def _revalidate_all_todos(client: httpx.AsyncClient, context: _Context) -> httpx.Response:
+    return await _revalidate(client=client, context=context, path="/todos")
+
+
+async def _revalidate_all_user_todos(client: httpx.AsyncClient, context: _Context) -> httpx.Response:
+    return await _revalidate(client=client, context=context, path="/user/todos")
+
+
+async def _search_user_todos(client: httpx.AsyncClient, context: _Context) -> httpx.Response:
+    # The seeded titles are "todo <index>": a number prefix matches a few todos of every user.
+    return await client.get("/user/todos/search", headers=context.user()[2], params={
+        "q": str(random.randrange(context.todos))[:3], "limit": 20})
+
+
+async def _sync_user_todos(client: httpx.AsyncClient, context: _Context) -> httpx.Response:
+    # Syncs like an offline client: pages through the full list once, then only asks for the changes since.
+    user_id, _, headers = context.user()
+    cursor: Optional[str] = context.sync_cursors.get(user_id)
+    response: httpx.Response = await client.get(
+        "/user/todos/changes", headers=headers, params={"limit": 100} if cursor is None else {
+            "limit": 100, "since": cursor})
+    if response.status_code == 200:
+        context.sync_cursors[user_id] = response.json()["cursor"]
+    return response
+
+
+async def _export_todos(client: httpx.AsyncClient, context: _Context) -> httpx.Response:
+    return await client.get("/todos/export", headers=context.user()[2], params={"format": "ndjson"})
+
+
+async def _create_todo(client: httpx.AsyncClient, context: _Context) -> httpx.Response:
+    user_id, _, headers = context.user()
+    response: httpx.Response = await client.post(
+        "/todos", headers=headers, json=context.todo(user_id=user_id, index=len(context.created_todos)))
+    if response.status_code == 201:
+        context.created_todos.append(response.json()["id"])
+    return response
+
+
+async def _update_todo(client: httpx.AsyncClient, context: _Context) -> httpx.Response:
+    # The seeded values are written back, so that the read endpoints see the same data in every run.
+    todo_id: int = context.todo_id()
+    return await client.put(f"/todos/{todo_id}", headers=context.user()[2], json={
+        "title": f"todo {todo_id - context.first_todo_id}", "description": "seeded by the endpoint benchmark",
+        "due_time": _due_time(index=todo_id - context.first_todo_id).isoformat(),
+        "status": _status(index=todo_id - context.first_todo_id)})
+
+
+async def _delete_todo(client: httpx.AsyncClient, context: _Context) -> Optional[httpx.Response]:
+    if not context.created_todos:
+        return None
+    return await client.delete(f"/todos/{context.created_todos.pop()}", headers=context.user()[2])
+
+
+async def _create_todos(client: httpx.AsyncClient, context: _Context) -> httpx.Response:
+    user_id, _, headers = context.user()
+    response: httpx.Response = await client.post("/todos/batch", headers=headers, json=[
+        context.todo(user_id=user_id, index=index) for index in range(WRITE_BATCH_SIZE)])
+    if response.status_code == 200:
+        context.created_todos.extend(
+            result["id"] for result in response.json()["results"] if result["status"] == 201)
+    return response
+
+
+async def _update_todos(client: httpx.AsyncClient, context: _Context) -> httpx.Response:
+    todo_ids: List[int] = list({context.todo_id() for _ in range(WRITE_BATCH_SIZE)})
+    return await client.put("/todos/batch", headers=context.user()[2], json=[
+        {"id": todo_id, "title": f"todo {todo_id - context.first_todo_id}",
+         "description": "seeded by the endpoint benchmark",
+         "due_time": _due_time(index=todo_id - context.first_todo_id).isoformat(),
+         "status": _status(index=todo_id - context.first_todo_id)}
+        for todo_id in todo_ids])
+
+
+async def _delete_todos(client: httpx.AsyncClient, context: _Context) -> Optional[httpx.Response]:
+    if not context.created_todos:
+        return None
+    todo_ids: List[int] = context.created_todos[-WRITE_BATCH_SIZE:]
+    del context.created_todos[-WRITE_BATCH_SIZE:]
+    return await client.request("DELETE", "/todos/batch", headers=context.user()[2], json={"ids": todo_ids})
+
+
+async def _register_user(client: httpx.AsyncClient, context: _Context) -> httpx.Response:
+    email: str = f"register-{uuid.uuid4().hex}@example.com"
+    response: httpx.Response = await client.post("/register", json={
+        "email": email, "password": PASSWORD, "name": "Bench", "firstname": "Bench"})
+    if response.status_code == 201:
+        context.registered.append(email)
+    return response
+
+
+async def _login_user(client: httpx.AsyncClient, context: _Context) -> httpx.Response:
+    return await client.post("/login", json={"email": context.user()[1], "password": PASSWORD})
+
+
+async def _update_user(client: httpx.AsyncClient, context: _Context) -> httpx.Response:
+    user_id, email, headers = context.user()
+    return await client.put(f"/users/{user_id}", headers=headers, json={
+        "email": email, "password": PASSWORD, "name": "Bench", "firstname": "Bench"})
+
+
+async def _update_user_email(client: httpx.AsyncClient, context: _Context) -> httpx.Response:
+    user_id, email, headers = context.user()
+    return await client.put(f"/users/email/{user_id}", headers=headers, json={"email": email})
+
+
+async def _delete_user(client: httpx.AsyncClient, context: _Context) -> Optional[httpx.Response]:
+    if not context.registered_ids:
+        return None
+    return await client.delete(f"/users/{context.registered_ids.pop()}", headers=context.user()[2])
+
+
+async def _find_registered(context: _Context) -> None:
+    if not context.registered:
+        return
+    async with db.connect() as connection:
+        for start in range(0, len(context.registered), SEED_BATCH_SIZE):
+            emails: List[str] = context.registered[start:start + SEED_BATCH_SIZE]
+            rows: List[Tuple[Any, ...]] = await connection.fetch_all(
+                f"SELECT id FROM user WHERE email IN ({', '.join(['%s'] * len(emails))})", emails)
+            context.registered_ids.extend(row[0] for row in rows)
+    context.registered = []
+
+
+ENDPOINTS: List[Tuple[str, Request]] = [
+    ("GET /", _root),
+    ("GET /stats", _stats),
+    ("GET /metrics", _metrics),
+    ("GET /check_token", _check_token),
+    ("GET /users", _view_user),
+    ("GET /user", _view_all_users),
+    ("GET /todos", _view_all_todos),
+    ("GET /user/todos", _view_all_user_todos),
+    ("GET /todos If-None-Match", _revalidate_all_todos),
+    ("GET /user/todos If-None-Match", _revalidate_all_user_todos),
+    ("GET /user/todos/search", _search_user_todos),
+    ("GET /user/todos/changes", _sync_user_todos),
+    ("GET /todos/export", _export_todos),
+    ("POST /todos", _create_todo),
+    ("PUT /todos/{id}", _update_todo),
+    ("DELETE /todos/{id}", _delete_todo),
+    ("POST /todos/batch", _create_todos),
+    ("PUT /todos/batch", _update_todos),
+    ("DELETE /todos/batch", _delete_todos),
+    ("POST /register", _register_user),
+    ("POST /login", _login_user),
+    ("PUT /users/{id}", _update_user),
+    ("PUT /users/email/{id}", _update_user_email),
+    ("DELETE /users/{id}", _delete_user),
+]
+
+# Hooks run, untimed, before the given endpoint.
+PREPARE: Dict[str, Callable[[_Context], Awaitable[None]]] = {"DELETE /users/{id}": _find_registered}
+
+
+async def _seed(users: int, todos: int) -> _Context:
+    hasher = get_hasher()
+    hashed_password: str = bcrypt.hashpw(
+        password=PASSWORD.encode(encoding="utf-8"), salt=bcrypt.gensalt(rounds=hasher.rounds)).decode(encoding="utf-8")
+    run: str = uuid.uuid4().hex[:8]
+    seeded: List[Tuple[int, str]] = []
+    async with db.connect() as connection:
+        emails: List[str] = [f"bench-{run}-{index}@example.com" for index in range(users)]
+        cursor: Any = await connection.executemany(
+            "INSERT INTO user (email, password, name, firstname) VALUES (%s, %s, %s, %s)",
+            [(email, hashed_password, "Bench", "Bench") for email in emails])
+        seeded = [(cursor.lastrowid + index, email) for index, email in enumerate(emails)]
+        first_todo_id: Optional[int] = None
+        for start in range(0, todos, SEED_BATCH_SIZE):
+            cursor = await connection.executemany(
+                "INSERT INTO todo (title, description, due_time, status, user_id) VALUES (%s, %s, %s, %s, %s)",
+                [(f"todo {index}", "seeded by the endpoint benchmark", _due_time(index=index), _status(index=index),
+                  seeded[index % users][0]) for index in range(start, min(todos, start + SEED_BATCH_SIZE))])
+            if first_todo_id is None:
+                first_todo_id = cursor.lastrowid
+        # Versions the seeded todos like migrations/0003_todo_change_tracking.sql versions the existing ones.
+        await connection.execute("UPDATE todo SET version = id WHERE version = 0")
+        await connection.execute(
+            "UPDATE user SET todos_version = todos_version + "
+            "(SELECT COALESCE(MAX(todo.id), 0) FROM todo WHERE todo.user_id = user.id) WHERE id BETWEEN %s AND %s",
+            (seeded[0][0], seeded[-1][0]))
+        await connection.commit()
+    return _Context(users=seeded, first_todo_id=first_todo_id or 0, todos=todos)
+
+
+async def _client(request: Request, client: httpx.AsyncClient, context: _Context, deadline: float,
+                  samples: List[float], statuses: collections.Counter) -> None:
+    while time.perf_counter() < deadline:
+        started: float = time.perf_counter()
+        response: Optional[httpx.Response] = await request(client, context)
+        if response is None:
+            return
+        samples.append(time.perf_counter() - started)
+        statuses[str(response.status_code)] += 1
+
+
+async def _run_endpoint(request: Request, client: httpx.AsyncClient, context: _Context, clients: int,
+                        duration: float) -> Dict[str, Any]:
+    samples: List[float] = []
+    statuses: collections.Counter = collections.Counter()
+    started: float = time.perf_counter()
+    await asyncio.gather(*(
+        _client(request=request, client=client, context=context, deadline=started + duration, samples=samples,
+                statuses=statuses)
+        for _ in range(clients)))
+    elapsed: float = time.perf_counter() - started
+    return {**summarize(samples=samples, elapsed=elapsed), "statuses": dict(statuses)}
+
+
+async def _run(args: argparse.Namespace) -> Dict[str, Any]:
+    if auth.JWT_SECRET_KEY is None:
+        auth.JWT_SECRET_KEY = "benchmark-secret-key-of-at-least-32-bytes"
+    database: Optional[str] = None
+    if args.backend == "standin":
+        database = standin.install(path=args.database, replicas=args.replicas)
+    try:
+        started: float = time.perf_counter()
+        context: _Context = await _seed(users=args.users, todos=args.todos)
+        seed_seconds: float = time.perf_counter() - started
+        endpoints: Dict[str, Any] = {}
+        async with app_client() as client:
+            for name, request in ENDPOINTS:
+                if args.only and name not in args.only:
+                    continue
+                if name in PREPARE:
+                    await PREPARE[name](context)
+                endpoints[name] = await _run_endpoint(
+                    request=request, client=client, context=context, clients=args.clients, duration=args.duration)
+        return {
+            "parameters": {
+                "backend": args.backend, "users": args.users, "todos": args.todos, "clients": args.clients,
+                "duration": args.duration, "replicas": args.replicas, "seed_seconds": seed_seconds,
+            },
+            "endpoints": endpoints,
+            "pool": db.get_pool().stats(),
+            **(replicas.stats() if (replicas := db.get_replicas()) is not None else {}),
+        }
+    finally:
+        if database is not None and args.database is None:
+            db.get_pool().close()
+            for suffix in ("", "-wal", "-shm"):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(database + suffix)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Runs the benchmark and prints the report.
+
+    Args:
+        argv (Optional[List[str]]): The command line arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("standin", "mysql"), default="standin", help="database to run against")
+    parser.add_argument("--database", help="SQLite file of the stand-in, defaults to a new temporary file")
+    parser.add_argument("--users", type=int, default=100, help="number of users to seed")
+    parser.add_argument("--todos", type=int, default=10000, help="number of todos to seed, from 1000 to 1000000")
+    parser.add_argument("--clients", type=int, default=16, help="number of concurrent clients per endpoint")
+    parser.add_argument("--duration", type=float, default=5, help="seconds each endpoint is driven for")
+    parser.add_argument("--replicas", type=int, default=0, help="number of stand-in read replicas")
+    parser.add_argument("--only", nargs="+", help="endpoints to run, as listed in the report")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random choices of the clients")
+    parser.add_argument("--output", help="file to write the JSON report to")
+    args: argparse.Namespace = parser.parse_args(argv)
+    random.seed(args.seed)
+    write_report(name="endpoints", results=asyncio.run(_run(args=args)), output=args.output)
+
+
+if __name__ == "__main__":
+    main()
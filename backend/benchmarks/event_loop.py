@@ -0,0 +1,89 @@
+"""
+This module benchmarks the latency of fast queries while slow queries are in flight, once with the driver calls
+running inline on the event loop and once with them offloaded to the driver thread pool.
+
+It needs the MySQL server configured by the usual MYSQL_* environment variables. Run it from the backend directory:
+
+    python -m benchmarks.event_loop --slow 4 --slow-seconds 0.2 --fast 16 --fast-interval 0.01 --duration 10
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+from app.config import db
+from benchmarks.common import summarize, write_report
+
+
+async def _slow_client(stop: asyncio.Event, seconds: float) -> None:
+    while not stop.is_set():
+        async with db.connect() as connection:
+            await connection.fetch_one("SELECT SLEEP(%s)", (seconds,))
+        # With the inline driver nothing else would ever give control back to the event loop.
+        await asyncio.sleep(0)
+
+
+async def _fast_client(stop: asyncio.Event, interval: float, samples: List[float]) -> None:
+    # Queries are issued on a fixed schedule and timed from their scheduled start, so that the time spent waiting
+    # for a blocked event loop is part of the measured latency.
+    scheduled: float = time.perf_counter()
+    while not stop.is_set():
+        scheduled += interval
+        await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+        async with db.connect() as connection:
+            await connection.fetch_one("SELECT 1")
+        samples.append(time.perf_counter() - scheduled)
+
+
+async def _run(mode: str, args: argparse.Namespace) -> Dict[str, float]:
+    db.DB_EXECUTOR = mode
+    db.DB_EXECUTOR_WORKERS = args.slow + args.fast
+    db._executor = None
+    db._pool = db.ConnectionPool(size=args.slow + args.fast)
+    stop: asyncio.Event = asyncio.Event()
+    samples: List[float] = []
+    tasks: List[asyncio.Task[None]] = [
+        asyncio.create_task(_slow_client(stop=stop, seconds=args.slow_seconds)) for _ in range(args.slow)
+    ] + [asyncio.create_task(_fast_client(stop=stop, interval=args.fast_interval, samples=samples)) for _ in range(args.fast)]
+    started: float = time.perf_counter()
+    await asyncio.sleep(args.duration)
+    stop.set()
+    await asyncio.gather(*tasks)
+    elapsed: float = time.perf_counter() - started
+    db._pool.close()
+    if db._executor is not None:
+        db._executor.shutdown()
+    return summarize(samples=samples, elapsed=elapsed)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Runs the benchmark and prints the report.
+
+    Args:
+        argv (Optional[List[str]]): The command line arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--slow", type=int, default=4,
+                        help="number of clients running slow queries")
+    parser.add_argument("--slow-seconds", type=float, default=0.2,
+                        help="duration of each slow query")
+    parser.add_argument("--fast", type=int, default=16,
+                        help="number of clients running fast queries")
+    parser.add_argument("--fast-interval", type=float, default=0.01,
+                        help="seconds between two fast queries of a client")
+    parser.add_argument("--duration", type=float, default=10,
+                        help="duration of each run in seconds")
+    parser.add_argument("--output", help="file to write the JSON report to")
+    args: argparse.Namespace = parser.parse_args(argv)
+    results: Dict[str, Any] = {
+        "parameters": {"slow": args.slow, "slow_seconds": args.slow_seconds, "fast": args.fast,
+                       "fast_interval": args.fast_interval},
+        "fast_queries": {mode: asyncio.run(_run(mode=mode, args=args)) for mode in ("inline", "thread")},
+    }
+    write_report(name="event_loop", results=results, output=args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+This module benchmarks the peak memory of exporting every todo, materialized as one list versus streamed by
+GET /todos/export.
+
+It needs the MySQL server configured by the usual MYSQL_* environment variables. `--seed` first inserts the given
+number of todos for a benchmark user. Run it from the backend directory:
+
+    python -m benchmarks.export_memory --seed 1000000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.api import TODO_COLUMNS, _iter_todo_export
+from app.config import db
+from benchmarks.common import bench_user, write_report
+
+SEED_BATCH_SIZE = 5000
+
+
+async def _seed(count: int) -> None:
+    user_id, _ = await bench_user()
+    async with db.connect() as connection:
+        for start in range(0, count, SEED_BATCH_SIZE):
+            await connection.executemany(
+                "INSERT INTO todo (title, description, due_time, status, user_id) VALUES (%s, %s, %s, %s, %s)",
+                [(f"todo {i}", f"description of todo {i}", "2030-01-01 00:00:00", "todo", user_id)
+                 for i in range(start, min(count, start + SEED_BATCH_SIZE))])
+            await connection.commit()
+
+
+async def _materialized() -> int:
+    async with db.connect() as connection:
+        rows: List[Tuple[Any, ...]] = await connection.fetch_all(f"SELECT {', '.join(TODO_COLUMNS)} FROM todo")
+    todos: List[Dict[str, str]] = [
+        {column: str(object=todo[index]) for index, column in enumerate(TODO_COLUMNS)} for todo in rows
+    ]
+    return len(json.dumps(todos).encode(encoding="utf-8"))
+
+
+async def _streamed(export_format: str) -> int:
+    size: int = 0
+    async for chunk in _iter_todo_export(export_format=export_format, selected=TODO_COLUMNS):
+        size += len(chunk)
+    return size
+
+
+async def _measure(name: str, coroutine: Any) -> Dict[str, float]:
+    tracemalloc.start()
+    started: float = time.perf_counter()
+    size: int = await coroutine
+    elapsed: float = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name}: {size} bytes in {elapsed:.2f}s, peak {peak / 2 ** 20:.1f} MiB")
+    return {"bytes": size, "seconds": elapsed, "peak_mib": peak / 2 ** 20}
+
+
+async def _run(args: argparse.Namespace) -> Dict[str, Any]:
+    if args.seed:
+        await _seed(count=args.seed)
+    async with db.connect() as connection:
+        row: Optional[Tuple[Any, ...]] = await connection.fetch_one("SELECT COUNT(*) FROM todo")
+    results: Dict[str, Any] = {"rows": row[0] if row else 0}
+    results["streamed_ndjson"] = await _measure(name="streamed ndjson", coroutine=_streamed(export_format="ndjson"))
+    results["streamed_json"] = await _measure(name="streamed json", coroutine=_streamed(export_format="json"))
+    if not args.skip_materialized:
+        results["materialized"] = await _measure(name="materialized", coroutine=_materialized())
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Runs the benchmark and prints the report.
+
+    Args:
+        argv (Optional[List[str]]): The command line arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seed", type=int, default=0,
+                        help="number of todos to insert before measuring")
+    parser.add_argument("--skip-materialized", action="store_true",
+                        help="only measure the streamed export")
+    parser.add_argument("--output", help="file to write the JSON report to")
+    args: argparse.Namespace = parser.parse_args(argv)
+    write_report(name="export_memory", results=asyncio.run(_run(args=args)), output=args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+This module benchmarks password verification throughput and its impact on the other requests of a worker.
+
+A burst of logins is verified with bcrypt either inline on the event loop or through the password hasher, while a
+probe coroutine standing in for concurrent /todos requests wakes up on a fixed schedule and records how late it
+runs. It needs no database. Run it from the backend directory:
+
+    python -m benchmarks.password_hashing --logins 200 --concurrency 32 --rounds 10
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import bcrypt
+from app.auth.hashing import PasswordHasher
+from benchmarks.common import summarize, write_report
+
+PASSWORD = "correct horse battery staple"
+
+
+async def _probe(stop: asyncio.Event, interval: float, samples: List[float]) -> None:
+    scheduled: float = time.perf_counter()
+    while not stop.is_set():
+        scheduled += interval
+        await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+        samples.append(time.perf_counter() - scheduled)
+
+
+async def _run(mode: str, hashed_password: str, args: argparse.Namespace) -> Dict[str, Any]:
+    hasher: Optional[PasswordHasher] = None
+    if mode != "inline":
+        hasher = PasswordHasher(executor=mode, workers=args.workers,
+                                queue_size=args.logins, rounds=args.rounds)
+    semaphore: asyncio.Semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def login() -> None:
+        async with semaphore:
+            if hasher is None:
+                bcrypt.checkpw(password=PASSWORD.encode(encoding="utf-8"),
+                               hashed_password=hashed_password.encode(encoding="utf-8"))
+                # Let the probe run between two logins, as the event loop would between two requests.
+                await asyncio.sleep(0)
+            else:
+                await hasher.check_password(password=PASSWORD, hashed_password=hashed_password)
+
+    stop: asyncio.Event = asyncio.Event()
+    probe_samples: List[float] = []
+    probe: asyncio.Task[None] = asyncio.create_task(
+        _probe(stop=stop, interval=args.probe_interval, samples=probe_samples))
+    started: float = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(args.logins)))
+    elapsed: float = time.perf_counter() - started
+    stop.set()
+    await probe
+    if hasher is not None:
+        hasher.shutdown()
+    cores: int = 1 if hasher is None else min(args.workers, os.cpu_count() or 1)
+    return {
+        "logins_per_second": args.logins / elapsed,
+        "logins_per_second_per_core": args.logins / elapsed / cores,
+        "probe_latency": summarize(samples=probe_samples, elapsed=elapsed),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Runs the benchmark and prints the report.
+
+    Args:
+        argv (Optional[List[str]]): The command line arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=200,
+                        help="number of logins in the burst")
+    parser.add_argument("--concurrency", type=int, default=32,
+                        help="number of logins in flight at once")
+    parser.add_argument("--rounds", type=int, default=12,
+                        help="bcrypt cost factor")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="number of hasher workers")
+    parser.add_argument("--probe-interval", type=float, default=0.01,
+                        help="seconds between two probe wake-ups")
+    parser.add_argument("--modes", default="inline,thread,process",
+                        help="comma separated list of inline, thread and process")
+    parser.add_argument("--output", help="file to write the JSON report to")
+    args: argparse.Namespace = parser.parse_args(argv)
+    hashed_password: str = bcrypt.hashpw(
+        password=PASSWORD.encode(encoding="utf-8"), salt=bcrypt.gensalt(rounds=args.rounds)
+    ).decode(encoding="utf-8")
+    results: Dict[str, Any] = {
+        "parameters": {"logins": args.logins, "concurrency": args.concurrency, "rounds": args.rounds,
+                       "workers": args.workers, "cpus": os.cpu_count()},
+        "modes": {
+            mode: asyncio.run(_run(mode=mode, hashed_password=hashed_password, args=args))
+            for mode in args.modes.split(",")
+        },
+    }
+    write_report(name="password_hashing", results=results, output=args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+This module benchmarks the deletion of a user with a huge todo list, and its effect on the writes of the other users.
+
+The app is called in-process. By default it runs against the SQLite stand-in of benchmarks.standin; `--backend mysql`
+uses the MySQL server configured by the usual MYSQL_* environment variables instead. Two users with `--todos` todos
+each are seeded, then `--writers` clients create todos for other users without pause while:
+
+- "idle": nothing else runs, for the same time as the purge, as a baseline,
+- "cascade": the first user is deleted the way a single request had to, its todos then its row in one transaction,
+- "purge": the second user is deleted with DELETE /users/{id}, then purged by app.purge.purge in batches.
+
+The report gives, for each phase, how long the deletion took, how long the request deleting the user took for the
+purge, and the latency of the concurrent writes. Run it from the backend directory:
+
+    python -m benchmarks.purge --todos 200000 --writers 8
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from app.auth import auth
+from app.config import db
+from app.purge import purge
+from benchmarks import standin
+from benchmarks.common import app_client, summarize, write_report
+
+SEED_BATCH_SIZE = 5000
+
+User = Tuple[int, Dict[str, str]]
+
+
+async def _seed_user(todos: int) -> User:
+    email: str = f"purge-{uuid.uuid4().hex[:8]}@example.com"
+    async with db.connect() as connection:
+        cursor: Any = await connection.execute(
+            "INSERT INTO user (email, password, name, firstname) VALUES (%s, %s, %s, %s)",
+            (email, "-", "Bench", "Bench"))
+        user_id: int = cursor.lastrowid
+        await connection.commit()
+        for start in range(0, todos, SEED_BATCH_SIZE):
+            await connection.executemany(
+                "INSERT INTO todo (title, description, due_time, status, user_id) VALUES (%s, %s, %s, %s, %s)",
+                [(f"todo {index}", "seeded by the purge benchmark", "2030-01-01 00:00:00", "todo", user_id)
+                 for index in range(start, min(todos, start + SEED_BATCH_SIZE))])
+            await connection.commit()
+    return user_id, {"token": auth.encode_jwt(email=email)["token"]}
+
+
+async def _write(client: httpx.AsyncClient, writer: User, stop: asyncio.Event, samples: List[float]) -> None:
+    user_id, headers = writer
+    body: Dict[str, Any] = {
+        "title": "write", "description": "", "due_time": "2030-01-01T00:00:00", "status": "todo", "user_id": user_id}
+    while not stop.is_set():
+        started: float = time.perf_counter()
+        response: httpx.Response = await client.post("/todos", headers=headers, json=body)
+        response.raise_for_status()
+        samples.append(time.perf_counter() - started)
+
+
+async def _phase(client: httpx.AsyncClient, writers: List[User], work: Callable[[], Awaitable[Dict[str, Any]]]
+                 ) -> Dict[str, Any]:
+    samples: List[float] = []
+    stop: asyncio.Event = asyncio.Event()
+    tasks: List[asyncio.Task[None]] = [
+        asyncio.create_task(_write(client=client, writer=writer, stop=stop, samples=samples)) for writer in writers]
+    started: float = time.perf_counter()
+    try:
+        result: Dict[str, Any] = await work()
+    finally:
+        stop.set()
+        await asyncio.gather(*tasks)
+    return {**result, "writes": summarize(samples=samples, elapsed=time.perf_counter() - started)}
+
+
+async def _cascade(user_id: int) -> Dict[str, Any]:
+    started: float = time.perf_counter()
+    async with db.connect() as connection:
+        await connection.execute("DELETE FROM todo WHERE user_id = %s", (user_id,))
+        await connection.execute("DELETE FROM user WHERE id = %s", (user_id,))
+        await connection.commit()
+    return {"seconds": time.perf_counter() - started}
+
+
+async def _purge(client: httpx.AsyncClient, user: User, headers: Dict[str, str], batch_size: int,
+                 pause: float) -> Dict[str, Any]:
+    started: float = time.perf_counter()
+    response: httpx.Response = await client.delete(f"/users/{user[0]}", headers=headers)
+    response.raise_for_status()
+    request_seconds: float = time.perf_counter() - started
+    await purge.purge_deleted_users(batch_size=batch_size, pause=pause)
+    return {"seconds": time.perf_counter() - started, "request_ms": request_seconds * 1000}
+
+
+async def _run(args: argparse.Namespace) -> Dict[str, Any]:
+    if auth.JWT_SECRET_KEY is None:
+        auth.JWT_SECRET_KEY = "benchmark-secret-key-of-at-least-32-bytes"
+    database: Optional[str] = None
+    if args.backend == "standin":
+        database = standin.install(path=args.database)
+    try:
+        started: float = time.perf_counter()
+        cascaded: User = await _seed_user(todos=args.todos)
+        purged: User = await _seed_user(todos=args.todos)
+        writers: List[User] = [await _seed_user(todos=0) for _ in range(args.writers)]
+        seed_seconds: float = time.perf_counter() - started
+        results: Dict[str, Any] = {}
+        async with app_client() as client:
+            results["cascade"] = await _phase(
+                client=client, writers=writers, work=lambda: _cascade(user_id=cascaded[0]))
+            results["purge"] = await _phase(client=client, writers=writers, work=lambda: _purge(
+                client=client, user=purged, headers=writers[0][1], batch_size=args.batch_size, pause=args.pause))
+
+            async def idle() -> Dict[str, Any]:
+                await asyncio.sleep(results["purge"]["seconds"])
+                return {"seconds": results["purge"]["seconds"]}
+
+            results["idle"] = await _phase(client=client, writers=writers, work=idle)
+        return {
+            "parameters": {
+                "backend": args.backend, "todos": args.todos, "writers": args.writers,
+                "batch_size": args.batch_size, "pause": args.pause, "seed_seconds": seed_seconds,
+            },
+            **results,
+        }
+    finally:
+        if database is not None and args.database is None:
+            db.get_pool().close()
+            for suffix in ("", "-wal", "-shm"):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(database + suffix)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Runs the benchmark and prints the report.
+
+    Args:
+        argv (Optional[List[str]]): The command line arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("standin", "mysql"), default="standin", help="database to run against")
+    parser.add_argument("--database", help="SQLite file of the stand-in, defaults to a new temporary file")
+    parser.add_argument("--todos", type=int, default=200000, help="number of todos of each deleted user")
+    parser.add_argument("--writers", type=int, default=8, help="number of concurrent clients creating todos")
+    parser.add_argument("--batch-size", type=int, default=purge.USER_PURGE_BATCH_SIZE,
+                        help="number of todos deleted per transaction by the purge")
+    parser.add_argument("--pause", type=float, default=purge.USER_PURGE_PAUSE,
+                        help="seconds slept between two batches of the purge")
+    parser.add_argument("--output", help="file to write the JSON report to")
+    args: argparse.Namespace = parser.parse_args(argv)
+    write_report(name="purge", results=asyncio.run(_run(args=args)), output=args.output)
+
+
+if __name__ == "__main__":
+    main()
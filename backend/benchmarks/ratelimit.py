@@ -0,0 +1,181 @@
+"""
+This module benchmarks the admission control of /login and /register, app.ratelimit.ratelimit.
+
+It runs two measurements:
+
+- "limiter": `--keys` distinct keys go through a token bucket limiter tracking at most `--max-keys` of them, the way
+  a credential stuffing run spreads over emails and addresses. The report gives the time per decision and the memory
+  the limiter holds, traced with tracemalloc, which stays bounded by `--max-keys` however many keys go through.
+- "storm": `--attackers` clients send `--attempts` logins each with a wrong password, each from an address of its
+  own given by X-Forwarded-For and most of them for the same email, while a reader requests GET /user/todos without
+  pause. It runs once with limits too high to ever reject, "unlimited", then with the configured ones, "limited".
+  The report gives the latency of the logins and of the reads, the status codes of the logins and the number of
+  bcrypt checks the password hasher completed.
+
+The app is called in-process. By default it runs against the SQLite stand-in of benchmarks.standin; `--backend mysql`
+uses the MySQL server configured by the usual MYSQL_* environment variables instead. Run it from the backend
+directory:
+
+    python -m benchmarks.ratelimit --keys 2000000 --attackers 50 --attempts 40
+"""
+
+import argparse
+import asyncio
+import collections
+import contextlib
+import os
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from app import api
+from app.auth import auth
+from app.auth.hashing import get_hasher
+from app.config import db
+from app.ratelimit.ratelimit import (RATE_LIMIT_MAX_KEYS, AdmissionController, ConcurrencyLimiter,
+                                     TokenBucketLimiter)
+from benchmarks import standin
+from benchmarks.common import app_client, bench_user, summarize, write_report
+
+TARGET_EMAIL = "bench@example.com"
+
+
+def _fill(limiter: TokenBucketLimiter, keys: int) -> float:
+    started: float = time.perf_counter()
+    for index in range(keys):
+        limiter.acquire(key=f"203.0.{index // 256 % 256}.{index % 256}/{index}")
+    return time.perf_counter() - started
+
+
+def _limiter(keys: int, max_keys: int) -> Dict[str, Any]:
+    # The decisions are timed first, as tracing the allocations slows them down many times.
+    elapsed: float = _fill(limiter=TokenBucketLimiter(burst=5, period=12, size=max_keys), keys=keys)
+    limiter: TokenBucketLimiter = TokenBucketLimiter(burst=5, period=12, size=max_keys)
+    tracemalloc.start()
+    _fill(limiter=limiter, keys=keys)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "seconds": elapsed,
+        "ns_per_decision": elapsed / max(keys, 1) * 1e9,
+        "traced_bytes": current,
+        "peak_traced_bytes": peak,
+        "bytes_per_key": current / max(limiter.stats()["keys"], 1),
+        "limiter": limiter.stats(),
+    }
+
+
+async def _attack(client: httpx.AsyncClient, attacker: int, attempts: int, samples: List[float],
+                  codes: collections.Counter) -> None:
+    headers: Dict[str, str] = {"X-Forwarded-For": f"198.51.{attacker // 256 % 256}.{attacker % 256}"}
+    for attempt in range(attempts):
+        # One attempt in ten targets an email of its own, the others all go for the same account.
+        email: str = f"victim-{attacker}-{attempt}@example.com" if attempt % 10 == 0 else TARGET_EMAIL
+        started: float = time.perf_counter()
+        response: httpx.Response = await client.post(
+            "/login", headers=headers, json={"email": email, "password": "wrong password"})
+        samples.append(time.perf_counter() - started)
+        codes[response.status_code] += 1
+
+
+async def _read(client: httpx.AsyncClient, headers: Dict[str, str], stop: asyncio.Event,
+                samples: List[float]) -> None:
+    while not stop.is_set():
+        started: float = time.perf_counter()
+        response: httpx.Response = await client.get("/user/todos", headers=headers)
+        response.raise_for_status()
+        samples.append(time.perf_counter() - started)
+
+
+async def _storm(client: httpx.AsyncClient, headers: Dict[str, str], controller: AdmissionController,
+                 args: argparse.Namespace) -> Dict[str, Any]:
+    api.admission = controller
+    login_samples: List[float] = []
+    read_samples: List[float] = []
+    codes: collections.Counter = collections.Counter()
+    checked: int = get_hasher().stats()["completed"]
+    stop: asyncio.Event = asyncio.Event()
+    reader: asyncio.Task[None] = asyncio.create_task(
+        _read(client=client, headers=headers, stop=stop, samples=read_samples))
+    started: float = time.perf_counter()
+    try:
+        await asyncio.gather(*(
+            _attack(client=client, attacker=attacker, attempts=args.attempts, samples=login_samples, codes=codes)
+            for attacker in range(args.attackers)))
+    finally:
+        stop.set()
+        await reader
+    elapsed: float = time.perf_counter() - started
+    return {
+        "logins": summarize(samples=login_samples, elapsed=elapsed),
+        "status_codes": {str(code): count for code, count in sorted(codes.items())},
+        "bcrypt_checks": get_hasher().stats()["completed"] - checked,
+        "reads": summarize(samples=read_samples, elapsed=elapsed),
+        "admission": controller.stats(),
+    }
+
+
+async def _run(args: argparse.Namespace) -> Dict[str, Any]:
+    if auth.JWT_SECRET_KEY is None:
+        auth.JWT_SECRET_KEY = "benchmark-secret-key-of-at-least-32-bytes"
+    database: Optional[str] = None
+    if args.backend == "standin":
+        database = standin.install(path=args.database)
+    try:
+        results: Dict[str, Any] = {"limiter": _limiter(keys=args.keys, max_keys=args.max_keys)}
+        user: Tuple[int, Dict[str, str]] = await bench_user()
+        # The logins fail on the password, after a real bcrypt check, rather than on the email.
+        hashed_password: bytes = await get_hasher().hash_password(password="correct horse battery staple")
+        async with db.connect() as connection:
+            await connection.execute("UPDATE user SET password = %s WHERE id = %s", (hashed_password, user[0]))
+            await connection.commit()
+        controllers: Dict[str, AdmissionController] = {
+            "unlimited": AdmissionController(
+                ips=TokenBucketLimiter(burst=2 ** 30, period=1), emails=TokenBucketLimiter(burst=2 ** 30, period=1),
+                in_flight=ConcurrencyLimiter(limit=2 ** 30), trust_proxy=True),
+            "limited": AdmissionController(trust_proxy=True),
+        }
+        original: AdmissionController = api.admission
+        try:
+            async with app_client() as client:
+                for name, controller in controllers.items():
+                    results[name] = await _storm(client=client, headers=user[1], controller=controller, args=args)
+        finally:
+            api.admission = original
+        return {
+            "parameters": {
+                "backend": args.backend, "keys": args.keys, "max_keys": args.max_keys,
+                "attackers": args.attackers, "attempts": args.attempts,
+            },
+            **results,
+        }
+    finally:
+        if database is not None and args.database is None:
+            db.get_pool().close()
+            for suffix in ("", "-wal", "-shm"):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(database + suffix)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Runs the benchmark and prints the report.
+
+    Args:
+        argv (Optional[List[str]]): The command line arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("standin", "mysql"), default="standin", help="database to run against")
+    parser.add_argument("--database", help="SQLite file of the stand-in, defaults to a new temporary file")
+    parser.add_argument("--keys", type=int, default=2000000, help="number of distinct keys sent to the limiter")
+    parser.add_argument("--max-keys", type=int, default=RATE_LIMIT_MAX_KEYS, help="maximum keys tracked at once")
+    parser.add_argument("--attackers", type=int, default=50, help="number of clients sending logins at once")
+    parser.add_argument("--attempts", type=int, default=40, help="number of logins sent by each client")
+    parser.add_argument("--output", help="file to write the JSON report to")
+    args: argparse.Namespace = parser.parse_args(argv)
+    write_report(name="ratelimit", results=asyncio.run(_run(args=args)), output=args.output)
+
+
+if __name__ == "__main__":
+    main()
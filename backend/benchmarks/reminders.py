@@ -0,0 +1,154 @@
+"""
+This module benchmarks the due-time reminder scheduler of app.scheduler.scheduler with many pending todos.
+
+By default it runs against the SQLite stand-in of benchmarks.standin; `--backend mysql` uses the MySQL server
+configured by the usual MYSQL_* environment variables instead. `--todos` todos are seeded: `--due-soon` of them
+come due during the `--window` seconds of the run, the others are due later over the next 30 days, and a quarter of
+each are already done. A scheduler keeping at most `--heap-size` todos in memory then runs for the window. The
+benchmark reports:
+
+- the duration of the first load and the memory allocated by the todos it loaded, traced with tracemalloc,
+- the number of reminders fired against the number of pending todos which came due,
+- the lateness of each reminder, from the due time of the todo to the call of the fire callback.
+
+Run it from the backend directory:
+
+    python -m benchmarks.reminders --todos 1000000 --due-soon 20000 --window 10 --heap-size 5000
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import random
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import db
+from app.models.models import Status
+from app.scheduler.scheduler import REMINDER_HEAP_SIZE, ReminderScheduler
+from benchmarks import standin
+from benchmarks.common import summarize, write_report
+
+SEED_BATCH_SIZE = 5000
+COLUMNS = ("id", "due_time", "status", "user_id")
+# Seconds between the seeding of the soon due todos and the first of them coming due, for the scheduler to start.
+START_DELAY = 3
+
+
+def _now() -> datetime:
+    return datetime.now(tz=timezone.utc).replace(tzinfo=None, microsecond=0)
+
+
+async def _seed(todos: int, due_soon: int, window: float) -> None:
+    async with db.connect() as connection:
+        cursor: Any = await connection.execute(
+            "INSERT INTO user (email, password, name, firstname) VALUES (%s, %s, %s, %s)",
+            (f"reminders-{uuid.uuid4().hex[:8]}@example.com", "-", "Bench", "Bench"))
+        user_id: int = cursor.lastrowid
+        # The todos due later are inserted first, so that the time the seeding takes does not eat into the window.
+        for soon, count in ((False, todos - due_soon), (True, due_soon)):
+            start: datetime = _now() + timedelta(seconds=START_DELAY if soon else window + 3600)
+            span: float = window if soon else 30 * 24 * 3600
+            for first in range(0, count, SEED_BATCH_SIZE):
+                rows: List[Tuple[Any, ...]] = []
+                for index in range(first, min(count, first + SEED_BATCH_SIZE)):
+                    status: Status = Status.DONE if index % 4 == 0 else list(Status)[index % 3]
+                    rows.append(("reminder", "", start + timedelta(seconds=int(random.random() * span)),
+                                 status.value, user_id))
+                await connection.executemany(
+                    "INSERT INTO todo (title, description, due_time, status, user_id) VALUES (%s, %s, %s, %s, %s)",
+                    rows)
+                await connection.commit()
+
+
+async def _count_pending(since: float, until: float) -> int:
+    async with db.connect() as connection:
+        row: Optional[Tuple[Any, ...]] = await connection.fetch_one(
+            "SELECT COUNT(*) FROM todo WHERE status <> %s AND due_time >= %s AND due_time <= %s", (
+                Status.DONE.value, datetime.fromtimestamp(since, tz=timezone.utc).replace(tzinfo=None),
+                datetime.fromtimestamp(until, tz=timezone.utc).replace(tzinfo=None)))
+    return row[0] if row else 0
+
+
+async def _measure(args: argparse.Namespace) -> Dict[str, Any]:
+    lateness: List[float] = []
+
+    async def fire(todos: List[Dict[str, Any]]) -> None:
+        now: float = time.time()
+        lateness.extend(now - todo["due_time"].replace(tzinfo=timezone.utc).timestamp() for todo in todos)
+
+    scheduler = ReminderScheduler(columns=COLUMNS, fire=fire, heap_size=args.heap_size)
+    tracemalloc.start()
+    started: float = time.perf_counter()
+    loaded_at: float = time.time()
+    await scheduler._load(now=loaded_at)
+    load_seconds: float = time.perf_counter() - started
+    loaded_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    loaded: Dict[str, Any] = scheduler.stats()
+    task: asyncio.Task[None] = asyncio.create_task(scheduler.run())
+    await asyncio.sleep(args.window + START_DELAY + 2)
+    task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await task
+    # The todos which came due before the first load, while the last ones were seeded, get no reminder.
+    expected: int = await _count_pending(since=loaded_at, until=time.time() - 1)
+    return {
+        "first_load": {"seconds": load_seconds, "todos": loaded["pending"], "traced_bytes": loaded_bytes},
+        "expected": expected,
+        "fired": len(lateness),
+        "lateness": summarize(samples=lateness, elapsed=args.window),
+        "scheduler": scheduler.stats(),
+    }
+
+
+async def _run(args: argparse.Namespace) -> Dict[str, Any]:
+    database: Optional[str] = None
+    if args.backend == "standin":
+        database = standin.install(path=args.database)
+    try:
+        started: float = time.perf_counter()
+        await _seed(todos=args.todos, due_soon=args.due_soon, window=args.window)
+        seed_seconds: float = time.perf_counter() - started
+        return {
+            "parameters": {
+                "backend": args.backend, "todos": args.todos, "due_soon": args.due_soon, "window": args.window,
+                "heap_size": args.heap_size, "seed_seconds": seed_seconds,
+            },
+            **await _measure(args=args),
+        }
+    finally:
+        if database is not None and args.database is None:
+            db.get_pool().close()
+            for suffix in ("", "-wal", "-shm"):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(database + suffix)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Runs the benchmark and prints the report.
+
+    Args:
+        argv (Optional[List[str]]): The command line arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("standin", "mysql"), default="standin", help="database to run against")
+    parser.add_argument("--database", help="SQLite file of the stand-in, defaults to a new temporary file")
+    parser.add_argument("--todos", type=int, default=1000000, help="number of todos to seed")
+    parser.add_argument("--due-soon", type=int, default=20000, help="number of todos coming due during the run")
+    parser.add_argument("--window", type=float, default=10, help="seconds over which the soon due todos come due")
+    parser.add_argument("--heap-size", type=int, default=REMINDER_HEAP_SIZE, help="maximum todos kept in memory")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random due times")
+    parser.add_argument("--output", help="file to write the JSON report to")
+    args: argparse.Namespace = parser.parse_args(argv)
+    random.seed(args.seed)
+    write_report(name="reminders", results=asyncio.run(_run(args=args)), output=args.output)
+
+
+if __name__ == "__main__":
+    main()
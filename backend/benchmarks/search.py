@@ -0,0 +1,150 @@
+"""
+This module benchmarks GET /user/todos/search against downloading every todo of the user and filtering them on the
+client, the only way to find a todo before the search existed.
+
+The app is called in-process. By default it runs against the SQLite stand-in of benchmarks.standin, whose FTS5
+index stands in for the MySQL full-text index; `--backend mysql` uses the MySQL server configured by the usual
+MYSQL_* environment variables instead. `--todos` todos made of words drawn from a fixed vocabulary are spread over
+`--users` users, then `--queries` searches for the prefix of a random word are run one after the other with both
+approaches, for a random user each time. The pages of GET /user/todos are evicted from the todo cache before each
+download, so that both approaches read the database. Run it from the backend directory:
+
+    python -m benchmarks.search --todos 1000000 --users 100 --queries 50
+"""
+
+import argparse
+import asyncio
+import contextlib
+import itertools
+import os
+import random
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from app.auth import auth
+from app.cache.cache import todo_cache
+from app.config import db
+from benchmarks import standin
+from benchmarks.common import app_client, summarize, write_report
+
+SEED_BATCH_SIZE = 5000
+PAGE_SIZE = 20
+DOWNLOAD_PAGE_SIZE = 1000
+VOCABULARY: List[str] = [
+    "".join(syllables) for syllables in itertools.product(
+        ("ba", "co", "di", "fe", "gu", "ka", "lo", "mi", "nu", "pe", "ro", "sa", "ti", "vo"), repeat=3)]
+
+
+def _words(count: int) -> str:
+    return " ".join(random.choices(VOCABULARY, k=count))
+
+
+async def _seed(users: int, todos: int) -> List[Tuple[int, Dict[str, str]]]:
+    run: str = uuid.uuid4().hex[:8]
+    emails: List[str] = [f"search-{run}-{index}@example.com" for index in range(users)]
+    async with db.connect() as connection:
+        cursor: Any = await connection.executemany(
+            "INSERT INTO user (email, password, name, firstname) VALUES (%s, %s, %s, %s)",
+            [(email, "-", "Bench", "Bench") for email in emails])
+        seeded: List[Tuple[int, str]] = [(cursor.lastrowid + index, email) for index, email in enumerate(emails)]
+        for start in range(0, todos, SEED_BATCH_SIZE):
+            await connection.executemany(
+                "INSERT INTO todo (title, description, due_time, status, user_id) VALUES (%s, %s, %s, %s, %s)",
+                [(_words(count=3), _words(count=12), "2030-01-01 00:00:00", "todo", seeded[index % users][0])
+                 for index in range(start, min(todos, start + SEED_BATCH_SIZE))])
+            await connection.commit()
+    return [(user_id, {"token": auth.encode_jwt(email=email)["token"]}) for user_id, email in seeded]
+
+
+async def _search(client: httpx.AsyncClient, headers: Dict[str, str], prefix: str) -> int:
+    response: httpx.Response = await client.get(
+        "/user/todos/search", headers=headers, params={"q": prefix, "limit": PAGE_SIZE})
+    response.raise_for_status()
+    return len(response.json())
+
+
+async def _download_and_filter(client: httpx.AsyncClient, user_id: int, headers: Dict[str, str],
+                               prefix: str) -> int:
+    todo_cache.invalidate(user_id=user_id)
+    todos: List[Dict[str, Any]] = []
+    params: Dict[str, Any] = {"limit": DOWNLOAD_PAGE_SIZE}
+    while True:
+        response: httpx.Response = await client.get("/user/todos", headers=headers, params=params)
+        response.raise_for_status()
+        todos.extend(response.json())
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params = {"limit": DOWNLOAD_PAGE_SIZE, "after": response.headers["X-Next-Cursor"]}
+    matches: List[Dict[str, Any]] = [
+        todo for todo in todos
+        if any(word.startswith(prefix) for word in f"{todo['title']} {todo['description']}".split())]
+    return len(matches[:PAGE_SIZE])
+
+
+async def _run(args: argparse.Namespace) -> Dict[str, Any]:
+    if auth.JWT_SECRET_KEY is None:
+        auth.JWT_SECRET_KEY = "benchmark-secret-key-of-at-least-32-bytes"
+    database: Optional[str] = None
+    if args.backend == "standin":
+        database = standin.install(path=args.database)
+    try:
+        started: float = time.perf_counter()
+        users: List[Tuple[int, Dict[str, str]]] = await _seed(users=args.users, todos=args.todos)
+        seed_seconds: float = time.perf_counter() - started
+        queries: List[Tuple[int, Dict[str, str], str]] = [
+            (*random.choice(users), random.choice(VOCABULARY)[:args.prefix_length]) for _ in range(args.queries)]
+        results: Dict[str, Any] = {}
+        async with app_client() as client:
+            for name in ("search", "download_and_filter"):
+                samples: List[float] = []
+                found: int = 0
+                started = time.perf_counter()
+                for user_id, headers, prefix in queries:
+                    request_started: float = time.perf_counter()
+                    if name == "search":
+                        found += await _search(client=client, headers=headers, prefix=prefix)
+                    else:
+                        found += await _download_and_filter(
+                            client=client, user_id=user_id, headers=headers, prefix=prefix)
+                    samples.append(time.perf_counter() - request_started)
+                results[name] = {**summarize(samples=samples, elapsed=time.perf_counter() - started), "found": found}
+        return {
+            "parameters": {
+                "backend": args.backend, "users": args.users, "todos": args.todos, "queries": args.queries,
+                "prefix_length": args.prefix_length, "seed_seconds": seed_seconds,
+            },
+            **results,
+        }
+    finally:
+        if database is not None and args.database is None:
+            db.get_pool().close()
+            for suffix in ("", "-wal", "-shm"):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(database + suffix)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Runs the benchmark and prints the report.
+
+    Args:
+        argv (Optional[List[str]]): The command line arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("standin", "mysql"), default="standin", help="database to run against")
+    parser.add_argument("--database", help="SQLite file of the stand-in, defaults to a new temporary file")
+    parser.add_argument("--users", type=int, default=100, help="number of users to seed")
+    parser.add_argument("--todos", type=int, default=1000000, help="number of todos to seed")
+    parser.add_argument("--queries", type=int, default=50, help="number of searches run with each approach")
+    parser.add_argument("--prefix-length", type=int, default=4, help="number of letters of the searched prefixes")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random words and queries")
+    parser.add_argument("--output", help="file to write the JSON report to")
+    args: argparse.Namespace = parser.parse_args(argv)
+    random.seed(args.seed)
+    write_report(name="search", results=asyncio.run(_run(args=args)), output=args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+This module benchmarks the cost of turning a large page of todo rows into a JSON response body.
+
+It compares the former path, where every column was converted with `str()` and the list of dictionaries was then
+validated and encoded generically by FastAPI, with validating the rows into `Todo` models, and with the direct
+mapping serialized by `FastJSONResponse`, with orjson and with the standard library fallback. It needs no database.
+Run it from the backend directory:
+
+    python -m benchmarks.serialization --rows 10000
+"""
+
+import argparse
+import datetime
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.api import TODO_COLUMNS
+from app.models import serialization
+from app.models.models import Todo
+from app.models.serialization import FastJSONResponse, rows_to_dicts
+from benchmarks.common import write_report
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+STR_DICTS: TypeAdapter = TypeAdapter(List[Dict[str, str]])
+TODOS: TypeAdapter = TypeAdapter(List[Todo])
+
+
+def _rows(count: int) -> List[Tuple[Any, ...]]:
+    created_at = datetime.datetime(2024, 1, 1, 12, 0, 0)
+    return [
+        (index, f"todo {index}", f"description of todo {index}", created_at,
+         created_at + datetime.timedelta(days=index % 365), ("not started", "todo", "in progress", "done")[index % 4],
+         1 + index % 100)
+        for index in range(count)
+    ]
+
+
+def _str_dicts(rows: List[Tuple[Any, ...]]) -> bytes:
+    todos: List[Dict[str, str]] = [
+        {column: str(object=todo[index]) for index, column in enumerate(TODO_COLUMNS)} for todo in rows]
+    return JSONResponse(content=STR_DICTS.dump_python(STR_DICTS.validate_python(todos), mode="json")).body
+
+
+def _models(rows: List[Tuple[Any, ...]]) -> bytes:
+    todos: List[Todo] = TODOS.validate_python(rows_to_dicts(columns=TODO_COLUMNS, rows=rows))
+    return JSONResponse(content=TODOS.dump_python(todos, mode="json")).body
+
+
+def _fast(rows: List[Tuple[Any, ...]]) -> bytes:
+    return FastJSONResponse(content=rows_to_dicts(columns=TODO_COLUMNS, rows=rows)).body
+
+
+def _fast_stdlib(rows: List[Tuple[Any, ...]]) -> bytes:
+    orjson: Any = serialization.orjson
+    serialization.orjson = None
+    try:
+        return _fast(rows=rows)
+    finally:
+        serialization.orjson = orjson
+
+
+def _time(function: Callable[[List[Tuple[Any, ...]]], bytes], rows: List[Tuple[Any, ...]], repeat: int) -> Dict[str, float]:
+    timings: List[float] = []
+    body: bytes = b""
+    for _ in range(repeat):
+        started: float = time.perf_counter()
+        body = function(rows)
+        timings.append(time.perf_counter() - started)
+    best: float = min(timings)
+    return {
+        "best_ms": best * 1000,
+        "mean_ms": sum(timings) / len(timings) * 1000,
+        "rows_per_second": len(rows) / best,
+        "body_bytes": len(body),
+    }
+
+
+def _run(rows: int, repeat: int) -> Dict[str, Any]:
+    data: List[Tuple[Any, ...]] = _rows(count=rows)
+    results: Dict[str, Any] = {"rows": rows, "repeat": repeat, "orjson": serialization.orjson is not None}
+    for name, function in (("str_dicts", _str_dicts), ("models", _models), ("fast", _fast),
+                           ("fast_stdlib", _fast_stdlib)):
+        results[name] = _time(function=function, rows=data, repeat=repeat)
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Runs the benchmark and prints the report.
+
+    Args:
+        argv (Optional[List[str]]): The command line arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10000, help="number of todos in the response")
+    parser.add_argument("--repeat", type=int, default=20, help="number of timed runs per case")
+    parser.add_argument("--output", help="file to write the JSON report to")
+    args: argparse.Namespace = parser.parse_args(argv)
+    write_report(name="serialization", results=_run(rows=args.rows, repeat=args.repeat), output=args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+This module benchmarks the production server of main.py: cold start time and throughput per number of workers.
+
+For every worker count it starts `python main.py --production`, measures the time until /health/live answers and
+until /health/ready answers, then drives `--path` over HTTP from several client processes and finally measures how
+long the server takes to drain and exit on SIGTERM. The default paths need no database, so that the results show the
+scaling of the server itself; readiness is only reached when the MySQL server of the MYSQL_* environment variables
+is reachable. Run it from the backend directory:
+
+    python -m benchmarks.server --workers 1 2 4 --duration 10 --path / /check_token
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from app.auth import auth
+from benchmarks.common import summarize, write_report
+
+BACKEND_DIR: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for(url: str, timeout: float, process: subprocess.Popen) -> Optional[float]:
+    started: float = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if process.poll() is not None:
+            return None
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return time.perf_counter() - started
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.01)
+    return None
+
+
+def _start(workers: int, port: int, ready_timeout: float) -> Tuple[subprocess.Popen, Dict[str, Optional[float]]]:
+    env: Dict[str, str] = {**os.environ, "SECRET": auth.JWT_SECRET_KEY or ""}
+    started: float = time.perf_counter()
+    process: subprocess.Popen = subprocess.Popen(
+        [sys.executable, "main.py", "--production", "--workers", str(workers), "--host", "127.0.0.1",
+         "--port", str(port)],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base: str = f"http://127.0.0.1:{port}"
+    live: Optional[float] = _wait_for(url=f"{base}/health/live", timeout=60, process=process)
+    ready: Optional[float] = None
+    if live is not None:
+        ready = _wait_for(url=f"{base}/health/ready", timeout=ready_timeout, process=process)
+    return process, {
+        "live_seconds": live,
+        "ready_seconds": None if ready is None else time.perf_counter() - started,
+    }
+
+
+def _stop(process: subprocess.Popen) -> float:
+    started: float = time.perf_counter()
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=60)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+    return time.perf_counter() - started
+
+
+async def _load(url: str, headers: Dict[str, str], connections: int, duration: float) -> Tuple[List[float], int]:
+    samples: List[float] = []
+    errors: List[int] = [0]
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        deadline: float = time.perf_counter() + duration
+
+        async def worker() -> None:
+            while time.perf_counter() < deadline:
+                started: float = time.perf_counter()
+                try:
+                    response: httpx.Response = await client.get(url, headers=headers)
+                    if response.status_code >= 400:
+                        errors[0] += 1
+                except httpx.HTTPError:
+                    errors[0] += 1
+                samples.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(worker() for _ in range(connections)))
+    return samples, errors[0]
+
+
+def _client_process(arguments: Tuple[str, Dict[str, str], int, float]) -> Tuple[List[float], int]:
+    url, headers, connections, duration = arguments
+    return asyncio.run(_load(url=url, headers=headers, connections=connections, duration=duration))
+
+
+def _throughput(port: int, path: str, args: argparse.Namespace) -> Dict[str, Any]:
+    headers: Dict[str, str] = {"token": auth.encode_jwt(email="bench@example.com")["token"]}
+    url: str = f"http://127.0.0.1:{port}{path}"
+    with multiprocessing.Pool(processes=args.client_processes) as pool:
+        results: List[Tuple[List[float], int]] = pool.map(
+            _client_process, [(url, headers, args.connections, args.duration)] * args.client_processes)
+    samples: List[float] = [sample for result in results for sample in result[0]]
+    # The client processes run concurrently for the same duration, their start-up excluded.
+    return {**summarize(samples=samples, elapsed=args.duration), "errors": sum(result[1] for result in results)}
+
+
+def _run(args: argparse.Namespace) -> Dict[str, Any]:
+    if auth.JWT_SECRET_KEY is None:
+        auth.JWT_SECRET_KEY = "benchmark-secret-key-of-at-least-32-bytes"
+    results: Dict[str, Any] = {
+        "parameters": {
+            "client_processes": args.client_processes, "connections": args.connections, "duration": args.duration,
+            "paths": args.path,
+        },
+        "workers": {},
+    }
+    for workers in args.workers:
+        port: int = _free_port()
+        process, startup = _start(workers=workers, port=port, ready_timeout=args.ready_timeout)
+        try:
+            if startup["live_seconds"] is None:
+                results["workers"][str(workers)] = {"startup": startup, "error": "the server did not start"}
+                continue
+            paths: Dict[str, Any] = {path: _throughput(port=port, path=path, args=args) for path in args.path}
+        finally:
+            shutdown: float = _stop(process=process)
+        results["workers"][str(workers)] = {"startup": startup, "paths": paths, "shutdown_seconds": shutdown}
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Runs the benchmark and prints the report.
+
+    Args:
+        argv (Optional[List[str]]): The command line arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="worker counts to compare")
+    parser.add_argument("--path", nargs="+", default=["/", "/check_token"], help="paths to request")
+    parser.add_argument("--client-processes", type=int, default=os.cpu_count() or 1,
+                        help="number of load generating processes")
+    parser.add_argument("--connections", type=int, default=16, help="concurrent connections per client process")
+    parser.add_argument("--duration", type=float, default=10, help="seconds each path is driven for")
+    parser.add_argument("--ready-timeout", type=float, default=10,
+                        help="seconds to wait for /health/ready, which needs the database")
+    parser.add_argument("--output", help="file to write the JSON report to")
+    args: argparse.Namespace = parser.parse_args(argv)
+    write_report(name="server", results=_run(args=args), output=args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+"""
+This module contains an in-process stand-in for the MySQL server, so that the benchmarks can run offline.
+
+The following classes and functions are available:
+
+- StandInConnection: A SQLite connection exposing the subset of the mysql.connector connection API the app uses.
+- StandInCursor: A SQLite cursor exposing the subset of the mysql.connector cursor API the app uses.
+- install(path: Optional[str]) -> str: Points the app connection pool at a stand-in database and returns its path.
+
+The stand-in translates the `%s` placeholders, drops the `FOR UPDATE` and `FOR UPDATE SKIP LOCKED` locking clauses,
+runs the multiple-table `UPDATE a STRAIGHT_JOIN b ON ... SET ... WHERE ...` statements as one UPDATE per table,
+provides `NOW()` and `UTC_TIMESTAMP()`, answers the `MATCH (title, description) AGAINST (%s IN BOOLEAN MODE)` searches
+of the app from an FTS5 index, returns the timestamps computed by expressions such as `MAX(created_at)` as
+datetimes and reports unique and foreign key violations as mysql.connector IntegrityErrors with the MySQL error
+numbers. It creates the same tables and indexes as todo.sql and the migrations. SQLite serializes writers and plans
+queries differently, so its numbers are only meant to compare two revisions of the app on the same machine, not to
+predict production throughput. Pass `--backend mysql` to the endpoint benchmark to run against a real server instead.
+"""
+
+import datetime
+import os
+import re
+import sqlite3
+import tempfile
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.config import db
+from mysql.connector import errorcode
+from mysql.connector.errors import IntegrityError
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS user (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  email VARCHAR(255) NOT NULL UNIQUE,
+  password VARCHAR(255) NOT NULL,
+  name VARCHAR(255) NOT NULL,
+  firstname VARCHAR(255) NOT NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  profile_version INTEGER NOT NULL DEFAULT 0,
+  todos_version INTEGER NOT NULL DEFAULT 0,
+  todos_updated_at TIMESTAMP NULL,
+  todos_compacted_version INTEGER NOT NULL DEFAULT 0,
+  deleted_at TIMESTAMP NULL
+);
+CREATE TABLE IF NOT EXISTS todo (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  title VARCHAR(255) NOT NULL,
+  description TEXT NOT NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  due_time TIMESTAMP NOT NULL,
+  status TEXT NOT NULL DEFAULT 'not started'
+    CHECK (status IN ('not started', 'todo', 'in progress', 'done')),
+  user_id INTEGER NOT NULL REFERENCES user (id),
+  version INTEGER NOT NULL DEFAULT 0,
+  reminded_due_time TIMESTAMP NULL
+);
+CREATE TABLE IF NOT EXISTS todo_tombstone (
+  user_id INTEGER NOT NULL,
+  version INTEGER NOT NULL,
+  todo_id INTEGER NOT NULL,
+  deleted_at TIMESTAMP NOT NULL,
+  PRIMARY KEY (user_id, version, todo_id)
+);
+CREATE TABLE IF NOT EXISTS user_purge (
+  user_id INTEGER NOT NULL PRIMARY KEY,
+  todos_total INTEGER NULL,
+  todos_deleted INTEGER NOT NULL DEFAULT 0,
+  requested_at TIMESTAMP NOT NULL,
+  updated_at TIMESTAMP NOT NULL,
+  finished_at TIMESTAMP NULL
+);
+CREATE TABLE IF NOT EXISTS bulk_import (
+  job TEXT NOT NULL PRIMARY KEY,
+  records INTEGER NOT NULL DEFAULT 0,
+  inserted INTEGER NOT NULL DEFAULT 0,
+  skipped INTEGER NOT NULL DEFAULT 0,
+  started_at TIMESTAMP NOT NULL,
+  updated_at TIMESTAMP NOT NULL
+);
+CREATE TABLE IF NOT EXISTS todo_change (
+  slot INTEGER NOT NULL PRIMARY KEY,
+  changes INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS todo_user_id_status_due_time ON todo (user_id, status, due_time);
+CREATE INDEX IF NOT EXISTS todo_user_id_created_at ON todo (user_id, created_at);
+CREATE INDEX IF NOT EXISTS todo_status_due_time ON todo (status, due_time);
+CREATE INDEX IF NOT EXISTS todo_created_at ON todo (created_at);
+CREATE INDEX IF NOT EXISTS todo_user_id_version ON todo (user_id, version);
+CREATE INDEX IF NOT EXISTS todo_tombstone_deleted_at ON todo_tombstone (deleted_at);
+CREATE INDEX IF NOT EXISTS user_deleted_at ON user (deleted_at);
+CREATE INDEX IF NOT EXISTS todo_user_id_id ON todo (user_id, id);
+CREATE VIRTUAL TABLE IF NOT EXISTS todo_fts USING fts5(title, description, content='todo', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS todo_fts_insert AFTER INSERT ON todo BEGIN
+  INSERT INTO todo_fts (rowid, title, description) VALUES (new.id, new.title, new.description);
+END;
+CREATE TRIGGER IF NOT EXISTS todo_fts_delete AFTER DELETE ON todo BEGIN
+  INSERT INTO todo_fts (todo_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+END;
+CREATE TRIGGER IF NOT EXISTS todo_tombstone_insert AFTER DELETE ON todo BEGIN
+  INSERT INTO todo_tombstone (user_id, version, todo_id, deleted_at)
+  SELECT old.user_id, old.version, old.id, UTC_TIMESTAMP() FROM user WHERE user.id = old.user_id
+  AND user.deleted_at IS NULL;
+END;
+CREATE TRIGGER IF NOT EXISTS todo_fts_update AFTER UPDATE OF title, description ON todo BEGIN
+  INSERT INTO todo_fts (todo_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+  INSERT INTO todo_fts (rowid, title, description) VALUES (new.id, new.title, new.description);
+END;
+"""
+
+# Run once by install, rather than by every new connection, which would otherwise wait for the writers to commit.
+SEED = """
+INSERT OR IGNORE INTO todo_change (slot) VALUES (0), (1), (2), (3), (4), (5), (6), (7), (8), (9), (10), (11), (12), (13),
+  (14), (15);
+"""
+
+_FOR_UPDATE = re.compile(r"\s+FOR UPDATE(?:\s+SKIP LOCKED)?\b", flags=re.IGNORECASE)
+_MATCH = r"MATCH\s*\(\s*title\s*,\s*description\s*\)\s*AGAINST\s*\(\s*%s\s+IN BOOLEAN MODE\s*\)"
+# A MATCH right after WHERE or AND is a filter; anywhere else, such as in the select list or in a comparison, it is
+# the relevance.
+_MATCH_FILTER = re.compile(r"(?:(?<=WHERE )|(?<=AND ))" + _MATCH, flags=re.IGNORECASE)
+_MATCH_SCORE = re.compile(_MATCH, flags=re.IGNORECASE)
+_SEARCH_TERM = re.compile(r"\+(\w+)\*")
+_WORD = re.compile(r"\w+")
+_TIMESTAMP = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(\.\d+)?$")
+_MULTI_UPDATE = re.compile(r"^\s*UPDATE\s+(\w+)\s+(STRAIGHT_JOIN\s.+?)\s+SET\s+(.+?)\s+WHERE\s+(.+)$",
+                           flags=re.IGNORECASE | re.DOTALL)
+_JOIN = re.compile(r"\s*STRAIGHT_JOIN\s+(\w+)\s+ON\s+", flags=re.IGNORECASE)
+
+sqlite3.register_adapter(datetime.datetime, lambda value: value.isoformat(sep=" "))
+sqlite3.register_converter("TIMESTAMP", lambda value: datetime.datetime.fromisoformat(value.decode(encoding="utf-8")))
+
+
+def _translate(query: str) -> str:
+    if "AGAINST" in query:
+        query = _MATCH_FILTER.sub("id IN (SELECT rowid FROM todo_fts WHERE todo_fts MATCH FT_QUERY(%s))", query)
+        query = _MATCH_SCORE.sub("FT_SCORE(title, description, %s)", query)
+    return _FOR_UPDATE.sub("", query).replace("%s", "?")
+
+
+def _split_assignments(assignments: str) -> List[str]:
+    # Splits a SET clause on the commas which are not inside the parentheses of a function call.
+    parts: List[str] = []
+    depth: int = 0
+    start: int = 0
+    for index, character in enumerate(assignments):
+        depth += {"(": 1, ")": -1}.get(character, 0)
+        if character == "," and depth == 0:
+            parts.append(assignments[start:index].strip())
+            start = index + 1
+    parts.append(assignments[start:].strip())
+    return parts
+
+
+def _split_multi_update(query: str, params: Sequence[Any]) -> Optional[List[Tuple[str, Tuple[Any, ...]]]]:
+    """
+    Rewrites a multiple-table UPDATE as one `UPDATE ... FROM` statement per updated table, in the order of its SET
+    clause, or returns None for any other statement.
+
+    The tables are updated one after the other, so an assignment reads the new values of the tables updated before
+    its own. The app lists the table whose values are computed from the others first, which MySQL updates while it
+    reads the joined rows.
+    """
+    match: Optional[re.Match[str]] = _MULTI_UPDATE.match(query)
+    if match is None:
+        return None
+    first, joins, assignments, where = match.groups()
+    parts: List[str] = _JOIN.split(" " + joins)[1:]
+    tables: List[str] = [first, *parts[0::2]]
+    conditions: List[str] = [f"({condition.strip()})" for condition in parts[1::2]] + [f"({where.strip()})"]
+    remaining: List[Any] = list(params)
+    by_table: Dict[str, List[Tuple[str, List[Any]]]] = {}
+    # The placeholders are numbered in the order of the statement: the join conditions, the SET clause, the WHERE.
+    condition_params: List[Any] = []
+    for condition in conditions[:-1]:
+        count: int = condition.count("%s")
+        condition_params += remaining[:count]
+        del remaining[:count]
+    for assignment in _split_assignments(assignments=assignments):
+        column, value = assignment.split("=", 1)
+        table, column = column.strip().split(".", 1)
+        count = value.count("%s")
+        by_table.setdefault(table, []).append((f"{column} = {value.strip()}", remaining[:count]))
+        del remaining[:count]
+    condition_params += remaining
+    statements: List[Tuple[str, Tuple[Any, ...]]] = []
+    for table, updates in by_table.items():
+        others: str = ", ".join(other for other in tables if other != table)
+        statement: str = (f"UPDATE {table} SET {', '.join(update for update, _ in updates)} FROM {others} "
+                          f"WHERE {' AND '.join(conditions)}")
+        values: List[Any] = [value for _, update_params in updates for value in update_params]
+        statements.append((statement, tuple(values + condition_params)))
+    return statements
+
+
+def _fts_query(query: str) -> str:
+    # The app only sends required word prefixes, "+word*", which FTS5 writes as "word"* joined by AND.
+    return " AND ".join(f'"{term}"*' for term in _SEARCH_TERM.findall(query)) or '""'
+
+
+def _fts_score(title: str, description: str, query: str) -> float:
+    # Counts the words of the todo each term is a prefix of, a rough stand-in for the MySQL relevance.
+    words: List[str] = _WORD.findall(f"{title} {description}".casefold())
+    return float(sum(word.startswith(term) for term in _SEARCH_TERM.findall(query.casefold()) for word in words))
+
+
+def _params(params: Sequence[Any]) -> Tuple[Any, ...]:
+    # The app passes bcrypt hashes as bytes, which MySQL stores in the VARCHAR column as text.
+    return tuple(value.decode(encoding="utf-8") if isinstance(value, bytes) else value for value in params)
+
+
+def _expression_timestamps(description: Any, rows: List[Tuple[Any, ...]]) -> List[Tuple[Any, ...]]:
+    # SQLite only converts the values of columns declared as TIMESTAMP, not the results of expressions over them.
+    if not description or not rows:
+        return rows
+    expressions: List[int] = [index for index, column in enumerate(description) if "(" in column[0]]
+    if not expressions:
+        return rows
+    converted: List[Tuple[Any, ...]] = []
+    for row in rows:
+        values: List[Any] = list(row)
+        for index in expressions:
+            if isinstance(values[index], str) and _TIMESTAMP.match(values[index]):
+                values[index] = datetime.datetime.fromisoformat(values[index])
+        converted.append(tuple(values))
+    return converted
+
+
+def _integrity_error(error: sqlite3.IntegrityError) -> IntegrityError:
+    errno: int = errorcode.ER_DUP_ENTRY if "UNIQUE" in str(error) else errorcode.ER_NO_REFERENCED_ROW_2
+    return IntegrityError(msg=str(error), errno=errno)
+
+
+class StandInCursor:
+    """
+    A SQLite cursor exposing the subset of the mysql.connector cursor API the app uses.
+    """
+
+    def __init__(self, cursor: sqlite3.Cursor, insert_id: List[Optional[int]]) -> None:
+        self._cursor: sqlite3.Cursor = cursor
+        self._insert_id: List[Optional[int]] = insert_id
+        self._lastrowid: Optional[int] = None
+        self._rowcount: Optional[int] = None
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount if self._rowcount is None else self._rowcount
+
+    @property
+    def lastrowid(self) -> Optional[int]:
+        return self._cursor.lastrowid if self._lastrowid is None else self._lastrowid
+
+    @property
+    def description(self) -> Any:
+        return self._cursor.description
+
+    def execute(self, query: str, params: Sequence[Any] = ()) -> None:
+        self._lastrowid = None
+        self._rowcount = None
+        self._insert_id[0] = None
+        statements: Optional[List[Tuple[str, Tuple[Any, ...]]]] = _split_multi_update(query=query, params=params)
+        try:
+            if statements is None:
+                self._cursor.execute(_translate(query=query), _params(params=params))
+            else:
+                # Like MySQL, report the rows matched in every table.
+                self._rowcount = 0
+                for statement, values in statements:
+                    self._cursor.execute(_translate(query=statement), _params(params=values))
+                    self._rowcount += self._cursor.rowcount
+        except sqlite3.IntegrityError as e:
+            raise _integrity_error(error=e) from e
+        # Like MySQL, report the value given to LAST_INSERT_ID(expr) by the statement as its last row id.
+        self._lastrowid = self._insert_id[0]
+
+    def executemany(self, query: str, seq_params: Iterable[Sequence[Any]]) -> None:
+        try:
+            self._cursor.executemany(_translate(query=query), [_params(params=params) for params in seq_params])
+        except sqlite3.IntegrityError as e:
+            raise _integrity_error(error=e) from e
+        # Like MySQL, report the first id generated by a multi-row insert.
+        if self._cursor.rowcount > 0 and query.lstrip().upper().startswith("INSERT"):
+            last: Tuple[int] = self._cursor.connection.execute("SELECT last_insert_rowid()").fetchone()
+            self._lastrowid = last[0] - self._cursor.rowcount + 1
+
+    def fetchone(self) -> Optional[Tuple[Any, ...]]:
+        row: Optional[Tuple[Any, ...]] = self._cursor.fetchone()
+        return None if row is None else _expression_timestamps(description=self.description, rows=[row])[0]
+
+    def fetchall(self) -> List[Tuple[Any, ...]]:
+        return _expression_timestamps(description=self.description, rows=self._cursor.fetchall())
+
+    def fetchmany(self, size: int = 1) -> List[Tuple[Any, ...]]:
+        return _expression_timestamps(description=self.description, rows=self._cursor.fetchmany(size))
+
+    def close(self) -> None:
+        self._cursor.close()
+
+
+class StandInConnection:
+    """
+    A SQLite connection exposing the subset of the mysql.connector connection API the app uses.
+
+    Args:
+        path (str): The path of the SQLite database file, shared by every connection of the pool.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._connection: sqlite3.Connection = sqlite3.connect(
+            database=path, timeout=60, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        self._connection.execute("PRAGMA synchronous = NORMAL")
+        self._connection.execute("PRAGMA foreign_keys = ON")
+        self._connection.create_function(
+            "NOW", 0, lambda: datetime.datetime.now().isoformat(sep=" ", timespec="seconds"))
+        self._connection.create_function(
+            "UTC_TIMESTAMP", -1, lambda precision=0: datetime.datetime.now(tz=datetime.timezone.utc).replace(
+                tzinfo=None).isoformat(sep=" ", timespec="microseconds" if precision else "seconds"))
+        self._connection.create_function("FT_QUERY", 1, _fts_query, deterministic=True)
+        self._connection.create_function("FT_SCORE", 3, _fts_score, deterministic=True)
+        self._insert_id: List[Optional[int]] = [None]
+        self._connection.create_function("LAST_INSERT_ID", 1, self._last_insert_id)
+        self._connection.executescript(SCHEMA)
+
+    def _last_insert_id(self, value: Optional[int]) -> Optional[int]:
+        # LAST_INSERT_ID(expr) returns expr, and makes it the last row id the statement reports.
+        self._insert_id[0] = value
+        return value
+
+    @property
+    def in_transaction(self) -> bool:
+        return self._connection.in_transaction
+
+    def cursor(self, **kwargs: Any) -> StandInCursor:
+        # Buffering options do not apply: SQLite cursors always step through the result lazily.
+        return StandInCursor(cursor=self._connection.cursor(), insert_id=self._insert_id)
+
+    def commit(self) -> None:
+        self._connection.commit()
+
+    def rollback(self) -> None:
+        self._connection.rollback()
+
+    def ping(self, reconnect: bool = False) -> None:
+        self._connection.execute("SELECT 1")
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+def install(path: Optional[str] = None, replicas: int = 0) -> str:
+    """
+    Points the app connection pool at a stand-in database, replacing any existing pool.
+
+    Args:
+        path (Optional[str]): The path of the SQLite database file. Defaults to a new file in the temporary directory.
+        replicas (int): The number of read replicas to route the reads to. They open the same file, so they never
+            lag, but exercise the routing.
+
+    Returns:
+        str: The path of the database file.
+    """
+    if path is None:
+        handle, path = tempfile.mkstemp(prefix="todo-standin-", suffix=".sqlite")
+        os.close(handle)
+    database: str = path
+    seed: StandInConnection = StandInConnection(path=database)
+    try:
+        seed._connection.executescript(SEED)
+    finally:
+        seed.close()
+    if db._pool is not None:
+        db._pool.close()
+    db._pool = db.ConnectionPool(factory=lambda: StandInConnection(path=database))
+    if db._replicas is not None:
+        db._replicas.close()
+    db._replicas = db.ReplicaSet(pools={
+        f"standin-{index}": db.ConnectionPool(factory=lambda: StandInConnection(path=database))
+        for index in range(replicas)}) if replicas else None
+    return database
@@ -0,0 +1,152 @@
+"""
+This module benchmarks GET /user/todos/stats and GET /todos/stats against downloading the todos and counting them on
+the client, as the dashboards did before.
+
+The app is called in-process. By default it runs against the SQLite stand-in of benchmarks.standin; `--backend mysql`
+uses the MySQL server configured by the usual MYSQL_* environment variables instead. `--todos` todos with every
+status and due times from a month ago to a month ahead are spread over `--users` users, then each approach is run
+`--queries` times one after the other, for a random user each time. The caches are emptied before each request, so
+that every approach reads the database; the report gives the latency and the bytes transferred per request. Run it
+from the backend directory:
+
+    python -m benchmarks.stats --todos 100000 --users 100 --queries 20
+"""
+
+import argparse
+import asyncio
+import collections
+import contextlib
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from app.auth import auth
+from app.cache.cache import todo_cache, todo_stats_cache
+from app.config import db
+from app.models.models import Status
+from benchmarks import standin
+from benchmarks.common import app_client, summarize, write_report
+
+SEED_BATCH_SIZE = 5000
+DOWNLOAD_PAGE_SIZE = 1000
+
+User = Tuple[int, Dict[str, str]]
+
+
+async def _seed(users: int, todos: int) -> List[User]:
+    run: str = uuid.uuid4().hex[:8]
+    emails: List[str] = [f"stats-{run}-{index}@example.com" for index in range(users)]
+    now: datetime = datetime.now(tz=timezone.utc).replace(tzinfo=None, microsecond=0)
+    async with db.connect() as connection:
+        cursor: Any = await connection.executemany(
+            "INSERT INTO user (email, password, name, firstname) VALUES (%s, %s, %s, %s)",
+            [(email, "-", "Bench", "Bench") for email in emails])
+        seeded: List[Tuple[int, str]] = [(cursor.lastrowid + index, email) for index, email in enumerate(emails)]
+        for start in range(0, todos, SEED_BATCH_SIZE):
+            await connection.executemany(
+                "INSERT INTO todo (title, description, due_time, status, user_id) VALUES (%s, %s, %s, %s, %s)",
+                [(f"todo {index}", "seeded by the stats benchmark",
+                  now + timedelta(seconds=random.randint(-30 * 24 * 3600, 30 * 24 * 3600)),
+                  random.choice(list(Status)).value, seeded[index % users][0])
+                 for index in range(start, min(todos, start + SEED_BATCH_SIZE))])
+            await connection.commit()
+    return [(user_id, {"token": auth.encode_jwt(email=email)["token"]}) for user_id, email in seeded]
+
+
+async def _download(client: httpx.AsyncClient, path: str, headers: Dict[str, str]) -> int:
+    # Counts the todos by status like a dashboard would, and returns the bytes transferred.
+    counts: collections.Counter = collections.Counter()
+    size: int = 0
+    params: Dict[str, Any] = {"limit": DOWNLOAD_PAGE_SIZE, "fields": "status,due_time"}
+    while True:
+        response: httpx.Response = await client.get(path, headers=headers, params=params)
+        response.raise_for_status()
+        size += len(response.content)
+        counts.update(todo["status"] for todo in response.json())
+        if "X-Next-Cursor" not in response.headers:
+            return size
+        params = {**params, "after": response.headers["X-Next-Cursor"]}
+
+
+async def _stats(client: httpx.AsyncClient, path: str, headers: Dict[str, str]) -> int:
+    response: httpx.Response = await client.get(path, headers=headers)
+    response.raise_for_status()
+    return len(response.content)
+
+
+APPROACHES: List[Tuple[str, str, Callable[[httpx.AsyncClient, str, Dict[str, str]], Awaitable[int]]]] = [
+    ("user_stats", "/user/todos/stats", _stats),
+    ("user_download", "/user/todos", _download),
+    ("all_stats", "/todos/stats", _stats),
+    ("all_download", "/todos", _download),
+]
+
+
+async def _run(args: argparse.Namespace) -> Dict[str, Any]:
+    if auth.JWT_SECRET_KEY is None:
+        auth.JWT_SECRET_KEY = "benchmark-secret-key-of-at-least-32-bytes"
+    database: Optional[str] = None
+    if args.backend == "standin":
+        database = standin.install(path=args.database)
+    try:
+        started: float = time.perf_counter()
+        users: List[User] = await _seed(users=args.users, todos=args.todos)
+        seed_seconds: float = time.perf_counter() - started
+        results: Dict[str, Any] = {}
+        async with app_client() as client:
+            for name, path, request in APPROACHES:
+                samples: List[float] = []
+                size: int = 0
+                started = time.perf_counter()
+                for _ in range(args.queries):
+                    user_id, headers = random.choice(users)
+                    todo_cache.invalidate(user_id=user_id)
+                    todo_stats_cache.clear()
+                    request_started: float = time.perf_counter()
+                    size += await request(client, path, headers)
+                    samples.append(time.perf_counter() - request_started)
+                results[name] = {
+                    **summarize(samples=samples, elapsed=time.perf_counter() - started),
+                    "bytes_per_request": size / max(args.queries, 1),
+                }
+        return {
+            "parameters": {
+                "backend": args.backend, "users": args.users, "todos": args.todos, "queries": args.queries,
+                "seed_seconds": seed_seconds,
+            },
+            **results,
+        }
+    finally:
+        if database is not None and args.database is None:
+            db.get_pool().close()
+            for suffix in ("", "-wal", "-shm"):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(database + suffix)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Runs the benchmark and prints the report.
+
+    Args:
+        argv (Optional[List[str]]): The command line arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("standin", "mysql"), default="standin", help="database to run against")
+    parser.add_argument("--database", help="SQLite file of the stand-in, defaults to a new temporary file")
+    parser.add_argument("--users", type=int, default=100, help="number of users to seed")
+    parser.add_argument("--todos", type=int, default=100000, help="number of todos to seed")
+    parser.add_argument("--queries", type=int, default=20, help="number of requests run with each approach")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random todos and users")
+    parser.add_argument("--output", help="file to write the JSON report to")
+    args: argparse.Namespace = parser.parse_args(argv)
+    random.seed(args.seed)
+    write_report(name="stats", results=asyncio.run(_run(args=args)), output=args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+This module benchmarks a read-heavy mix on GET /user/todos with the todo list cache disabled and enabled.
+
+Each client mostly lists the todos of the benchmark user and sometimes updates one of them, which invalidates the
+cached list. It needs the MySQL server configured by the usual MYSQL_* environment variables. Run it from the backend
+directory:
+
+    python -m benchmarks.todo_cache --todos 200 --write-ratio 0.05 --clients 16 --duration 10
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+from app import api
+from app.cache.cache import TodoCache, UserIdCache
+from benchmarks.common import app_client, bench_user, summarize, write_report
+
+
+async def _client(client: httpx.AsyncClient, headers: Dict[str, str], todo_ids: List[str], stop: asyncio.Event,
+                  write_ratio: float, samples: Dict[str, List[float]]) -> None:
+    while not stop.is_set():
+        started: float = time.perf_counter()
+        if random.random() < write_ratio:
+            await client.put(f"/todos/{random.choice(todo_ids)}", headers=headers, json={
+                "title": "updated", "description": "updated", "due_time": "2030-01-01 00:00:00", "status": "todo"})
+            samples["write"].append(time.perf_counter() - started)
+        else:
+            await client.get("/user/todos", headers=headers)
+            samples["read"].append(time.perf_counter() - started)
+
+
+async def _run_mode(cached: bool, client: httpx.AsyncClient, headers: Dict[str, str], todo_ids: List[str],
+                    args: argparse.Namespace) -> Dict[str, Any]:
+    api.todo_cache = TodoCache() if cached else TodoCache(size=0)
+    api.user_id_cache = UserIdCache() if cached else UserIdCache(size=0)
+    stop: asyncio.Event = asyncio.Event()
+    samples: Dict[str, List[float]] = {"read": [], "write": []}
+    tasks: List[asyncio.Task[None]] = [asyncio.create_task(_client(
+        client=client, headers=headers, todo_ids=todo_ids, stop=stop, write_ratio=args.write_ratio, samples=samples))
+        for _ in range(args.clients)]
+    started: float = time.perf_counter()
+    await asyncio.sleep(args.duration)
+    stop.set()
+    await asyncio.gather(*tasks)
+    elapsed: float = time.perf_counter() - started
+    return {
+        "read": summarize(samples=samples["read"], elapsed=elapsed),
+        "write": summarize(samples=samples["write"], elapsed=elapsed),
+        "todo_cache": api.todo_cache.stats(),
+    }
+
+
+async def _run(args: argparse.Namespace) -> Dict[str, Any]:
+    user_id, headers = await bench_user()
+    async with app_client() as client:
+        response: httpx.Response = await client.post("/todos/batch", headers=headers, json=[
+            {"title": f"todo {index}", "description": "benchmark", "due_time": "2030-01-01 00:00:00",
+             "status": "todo", "user_id": str(user_id)} for index in range(args.todos)])
+        todo_ids: List[str] = [result["id"] for result in response.json()["results"]]
+        try:
+            return {
+                "parameters": {"todos": args.todos, "write_ratio": args.write_ratio, "clients": args.clients},
+                "uncached": await _run_mode(cached=False, client=client, headers=headers, todo_ids=todo_ids,
+                                            args=args),
+                "cached": await _run_mode(cached=True, client=client, headers=headers, todo_ids=todo_ids,
+                                          args=args),
+            }
+        finally:
+            await client.request("DELETE", "/todos/batch", headers=headers, json={"ids": todo_ids})
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Runs the benchmark and prints the report.
+
+    Args:
+        argv (Optional[List[str]]): The command line arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--todos", type=int, default=200, help="number of todos of the benchmark user")
+    parser.add_argument("--write-ratio", type=float, default=0.05, help="fraction of requests which are updates")
+    parser.add_argument("--clients", type=int, default=16, help="number of concurrent clients")
+    parser.add_argument("--duration", type=float, default=10, help="duration of each run in seconds")
+    parser.add_argument("--output", help="file to write the JSON report to")
+    args: argparse.Namespace = parser.parse_args(argv)
+    write_report(name="todo_cache", results=asyncio.run(_run(args=args)), output=args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,88 @@
 """
 This module contains the main function to run the backend server for the Todo app.
+
+Usage, from the backend directory:
+
+    python main.py                  # development server, reloading on code changes
+    python main.py --production     # several worker processes, fast event loop and HTTP parser when installed
+    python main.py migrate          # apply the schema migrations, see app.migrations.migrations
+    python main.py import users users.csv       # import users or todos from CSV or NDJSON, see app.bulk.bulk
+    python main.py export todos todos.ndjson    # export users or todos to CSV or NDJSON
+
+The production mode uses uvloop and httptools when they are installed (`pip install uvloop httptools`) and falls
+back to the standard asyncio loop and h11 otherwise. Each worker opens its database connections in the application
+lifespan, not at import time. On SIGTERM it answers 503 to GET /health/ready for SHUTDOWN_DRAIN_DELAY seconds, see
+app.api, then stops accepting connections and lets the requests in flight finish before closing them.
+
+The server uses the following environment variables:
+
+- HOST (str): The address to listen on. Defaults to 0.0.0.0.
+- PORT (int): The port to listen on. Defaults to 8000.
+- WEB_CONCURRENCY (int): The number of worker processes in production mode. Defaults to the number of CPUs.
+- SHUTDOWN_TIMEOUT (float): Seconds the requests in flight are given to finish on shutdown. Defaults to 30.
 """
 
+import argparse
+import importlib.util
+import os
+from typing import List, Optional
+
 import uvicorn
+from dotenv import load_dotenv
+
+load_dotenv()
+
+HOST: str = os.getenv(key="HOST", default="0.0.0.0")
+PORT: int = int(os.getenv(key="PORT", default="8000"))
+WEB_CONCURRENCY: int = int(
+    os.getenv(key="WEB_CONCURRENCY", default=str(os.cpu_count() or 1)))
+SHUTDOWN_TIMEOUT: float = float(os.getenv(key="SHUTDOWN_TIMEOUT", default="30"))
+
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Runs the development or the production server, applies the migrations, or imports or exports data.
+
+    Args:
+        argv (Optional[List[str]]): The command line arguments.
+    """
+    parser = argparse.ArgumentParser(description="Run the Todo app backend.")
+    parser.add_argument("command", nargs="?", choices=("serve", "migrate", "import", "export"), default="serve")
+    parser.add_argument("--production", action="store_true", help="run several workers without reloading")
+    parser.add_argument("--workers", type=int, default=WEB_CONCURRENCY, help="number of worker processes")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    args, remaining = parser.parse_known_args(argv)
+    if args.command == "migrate":
+        from app.migrations.migrations import main as migrate
+
+        migrate(remaining)
+        return
+    if args.command in ("import", "export"):
+        from app.bulk.bulk import main as bulk
+
+        bulk([args.command, *remaining])
+        return
+    if not args.production:
+        uvicorn.run(app="app.api:app", host=args.host, port=args.port, reload=True)
+        return
+    uvicorn.run(
+        app="app.api:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop="uvloop" if _installed(module="uvloop") else "asyncio",
+        http="httptools" if _installed(module="httptools") else "h11",
+        lifespan="on",
+        access_log=False,
+        proxy_headers=True,
+        timeout_graceful_shutdown=SHUTDOWN_TIMEOUT,
+    )
+
 
 if __name__ == "__main__":
-    uvicorn.run(app="app.api:app", host="0.0.0.0", port=8000, reload=True)
+    main()
@@ -0,0 +1,25 @@
+-- The tables of todo.sql, so that the migrations can build an empty database on their own.
+-- Databases created from todo.sql already have them and skip these statements.
+-- user.email is UNIQUE: its index serves every lookup by email, and the constraint rejects duplicate accounts.
+
+CREATE TABLE IF NOT EXISTS user (
+  id INT UNSIGNED NOT NULL AUTO_INCREMENT,
+  email VARCHAR(255) NOT NULL UNIQUE,
+  password VARCHAR(255) NOT NULL,
+  name VARCHAR(255) NOT NULL,
+  firstname VARCHAR(255) NOT NULL,
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (id)
+);
+
+CREATE TABLE IF NOT EXISTS todo (
+  id INT NOT NULL AUTO_INCREMENT,
+  title VARCHAR(255) NOT NULL,
+  description TEXT NOT NULL,
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+  due_time DATETIME NOT NULL,
+  status ENUM('not started', 'todo', 'in progress', 'done') NOT NULL DEFAULT 'not started',
+  user_id INT UNSIGNED NOT NULL,
+  PRIMARY KEY (id),
+  FOREIGN KEY (user_id) REFERENCES user (id)
+);
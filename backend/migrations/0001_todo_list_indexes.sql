@@ -0,0 +1,11 @@
+-- Indexes backing the paginated and filtered todo lists of GET /todos and GET /user/todos.
+-- Pages are sorted by id, which every secondary index ends with, so each filter combination can walk an index
+-- range instead of scanning and sorting the table.
+
+CREATE INDEX todo_user_id_status_due_time ON todo (user_id, status, due_time);
+
+CREATE INDEX todo_user_id_created_at ON todo (user_id, created_at);
+
+CREATE INDEX todo_status_due_time ON todo (status, due_time);
+
+CREATE INDEX todo_created_at ON todo (created_at);
@@ -0,0 +1,13 @@
+-- Validators of the conditional GETs of GET /todos, GET /user/todos and GET /users.
+-- Every write to the todos of a user increases user.todos_version and sets user.todos_updated_at in the same
+-- transaction, and every write to the profile of a user increases user.profile_version. Reading them is one lookup,
+-- so an unchanged list is answered with a 304 without reading the todos.
+-- The index answers MAX(todos_updated_at), the validator of GET /todos, without reading the table.
+
+ALTER TABLE user ADD COLUMN profile_version INT UNSIGNED NOT NULL DEFAULT 0;
+
+ALTER TABLE user ADD COLUMN todos_version BIGINT UNSIGNED NOT NULL DEFAULT 0;
+
+ALTER TABLE user ADD COLUMN todos_updated_at DATETIME(6) NULL;
+
+CREATE INDEX user_todos_updated_at ON user (todos_updated_at);
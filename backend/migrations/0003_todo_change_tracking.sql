@@ -0,0 +1,28 @@
+-- Change tracking of the todos, read by the incremental sync of GET /user/todos/changes.
+-- Every write to the todos of a user increases user.todos_version under the lock of the user row, so the versions of
+-- a user's changes are committed in order. todo.version is the version of the last write to the todo, and deleted
+-- todos leave a tombstone with the version of their deletion.
+-- Tombstones are compacted after a retention period; user.todos_compacted_version is the newest version compacted,
+-- below which a sync cursor can no longer be served.
+
+ALTER TABLE todo ADD COLUMN version BIGINT UNSIGNED NOT NULL DEFAULT 0;
+
+CREATE INDEX todo_user_id_version ON todo (user_id, version);
+
+ALTER TABLE user ADD COLUMN todos_compacted_version BIGINT UNSIGNED NOT NULL DEFAULT 0;
+
+CREATE TABLE IF NOT EXISTS todo_tombstone (
+  user_id INT UNSIGNED NOT NULL,
+  version BIGINT UNSIGNED NOT NULL,
+  todo_id INT NOT NULL,
+  deleted_at DATETIME NOT NULL,
+  PRIMARY KEY (user_id, version, todo_id),
+  KEY todo_tombstone_deleted_at (deleted_at)
+);
+
+-- The existing todos get distinct versions below any later write, so that the first full sync of a user can be
+-- paged like any other: ids are unique and increasing, and each user's todos_version is raised past them.
+UPDATE todo SET version = id;
+
+UPDATE user SET todos_version = GREATEST(
+  todos_version, (SELECT COALESCE(MAX(todo.id), 0) FROM todo WHERE todo.user_id = user.id));
@@ -0,0 +1,5 @@
+-- Full-text index of GET /user/todos/search, matching words and word prefixes of the title and the description.
+-- The first FULLTEXT index of an InnoDB table adds its hidden FTS_DOC_ID column, which rebuilds the table once.
+-- The search filters the matches on user_id, so its cost grows with the matches of the terms, not with the table.
+
+CREATE FULLTEXT INDEX todo_title_description ON todo (title, description);
@@ -0,0 +1,19 @@
+-- Soft deletion of the users, purged in the background by app/purge/purge.py.
+-- DELETE /users/{id} only sets user.deleted_at and frees the email of the user, in a short transaction. The purge
+-- then deletes the todos of the user in small batches, each in its own transaction, before the user row itself, so
+-- that deleting a user with millions of todos never holds the locks of a long cascade.
+-- user_purge records the progress of each purge, and is kept once the user row is gone.
+
+ALTER TABLE user ADD COLUMN deleted_at DATETIME NULL DEFAULT NULL;
+
+CREATE INDEX user_deleted_at ON user (deleted_at);
+
+CREATE TABLE IF NOT EXISTS user_purge (
+  user_id INT UNSIGNED NOT NULL,
+  todos_total BIGINT UNSIGNED NULL,
+  todos_deleted BIGINT UNSIGNED NOT NULL DEFAULT 0,
+  requested_at DATETIME NOT NULL,
+  updated_at DATETIME NOT NULL,
+  finished_at DATETIME NULL,
+  PRIMARY KEY (user_id)
+);
@@ -0,0 +1,13 @@
+-- Checkpoints of the bulk imports of app/bulk/bulk.py, one row per import job.
+-- Each batch of imported rows updates the checkpoint of its job in its own transaction, so an interrupted import
+-- resumes after the last committed batch and never inserts a row twice.
+
+CREATE TABLE IF NOT EXISTS bulk_import (
+  job VARCHAR(255) NOT NULL,
+  records BIGINT UNSIGNED NOT NULL DEFAULT 0,
+  inserted BIGINT UNSIGNED NOT NULL DEFAULT 0,
+  skipped BIGINT UNSIGNED NOT NULL DEFAULT 0,
+  started_at DATETIME NOT NULL,
+  updated_at DATETIME NOT NULL,
+  PRIMARY KEY (job)
+);
@@ -0,0 +1,7 @@
+-- Index backing the first page of GET /user/todos and the batches of the user purge, which read a user's todos in
+-- id order: `WHERE user_id = %s ORDER BY id LIMIT %s`.
+-- The index InnoDB creates for the user_id foreign key already ends with the primary key, but the optimizer may pick
+-- the wider todo_user_id_status_due_time for the equality and then sort every todo of the user. An explicit
+-- (user_id, id) index is read in order and stops after the page.
+
+CREATE INDEX todo_user_id_id ON todo (user_id, id);
@@ -0,0 +1,18 @@
+-- Validator of GET /todos and key of the cached counts of GET /todos/stats: the sum of the todo_change counters.
+-- Every write to the todos increases one counter, in the statement increasing the todos version of its users, so
+-- the sum grows with every commit which changes a todo and never with a statement left uncommitted. A time stamped
+-- by the statement could be committed after a later one was read, and its change never seen.
+-- The writes are spread over 16 counters by user id, so that they do not all wait on one row lock. Each writer locks
+-- its counter after every other row it updates, which keeps the lock order free of cycles.
+-- MAX(user.todos_updated_at) was the previous validator; its index is no longer read.
+
+CREATE TABLE IF NOT EXISTS todo_change (
+  slot TINYINT UNSIGNED NOT NULL,
+  changes BIGINT UNSIGNED NOT NULL DEFAULT 0,
+  PRIMARY KEY (slot)
+);
+
+INSERT IGNORE INTO todo_change (slot) VALUES (0), (1), (2), (3), (4), (5), (6), (7), (8), (9), (10), (11), (12), (13),
+  (14), (15);
+
+DROP INDEX user_todos_updated_at ON user;
@@ -0,0 +1,10 @@
+-- Tombstones of the deleted todos, written by the database rather than by each DELETE of app/api.py.
+-- A todo is stamped with the version of its deletion before it is deleted, and the trigger copies that version to its
+-- tombstone, so deleting a todo takes no statement besides the stamp and the DELETE. The todos of a deleted user are
+-- left without tombstones, as the purge removes that user's tombstones anyway.
+-- With binary logging enabled, creating the trigger may need log_bin_trust_function_creators or the SUPER privilege.
+
+CREATE TRIGGER todo_tombstone_insert AFTER DELETE ON todo FOR EACH ROW
+  INSERT INTO todo_tombstone (user_id, version, todo_id, deleted_at)
+  SELECT OLD.user_id, OLD.version, OLD.id, UTC_TIMESTAMP() FROM user WHERE user.id = OLD.user_id
+  AND user.deleted_at IS NULL;
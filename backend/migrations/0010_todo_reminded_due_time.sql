@@ -0,0 +1,6 @@
+-- The due time of the last reminder posted to the webhook for each todo, see app/scheduler/scheduler.py.
+-- Every worker process runs a scheduler and fires the same reminders. Before posting a batch to the webhook, a worker
+-- claims its todos by setting reminded_due_time to their due time, under the lock of the todo rows, and only posts
+-- the ones it claimed. A todo whose due time changed since its last reminder gets a new one.
+
+ALTER TABLE todo ADD COLUMN reminded_due_time DATETIME NULL DEFAULT NULL;
@@ -0,0 +1,53 @@
+"""
+This module contains the fixtures shared by the tests of the Todo app backend.
+
+Every test runs against a new SQLite stand-in database of benchmarks.standin, see `database`. Run the tests from the
+backend directory:
+
+    python -m pytest tests
+"""
+
+import contextlib
+import os
+from typing import Iterator
+
+import pytest
+from app.auth import auth
+from app.config import db
+from benchmarks import standin
+
+
+@pytest.fixture(scope="session")
+def anyio_backend() -> str:
+    return "asyncio"
+
+
+@pytest.fixture(scope="session", autouse=True)
+def jwt_secret() -> None:
+    # The tokens of the tests are signed with a fixed key when the environment provides none.
+    if auth.JWT_SECRET_KEY is None:
+        auth.JWT_SECRET_KEY = "test-secret-key-of-at-least-32-bytes"
+
+
+@pytest.fixture(autouse=True)
+def database(tmp_path_factory: pytest.TempPathFactory) -> Iterator[str]:
+    """
+    Points the app connection pool at a new stand-in database, and removes it once the test is done.
+
+    Yields:
+        str: The path of the database file.
+    """
+    path: str = standin.install(path=str(tmp_path_factory.mktemp("standin") / "todo.db"))
+    yield path
+    db.get_pool().close()
+    for suffix in ("", "-wal", "-shm"):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path + suffix)
+
+
+@pytest.fixture
+def pool(database: str) -> db.ConnectionPool:
+    """
+    Returns the connection pool of the stand-in database.
+    """
+    return db.get_pool()
@@ -0,0 +1,67 @@
+"""
+This module checks the bulk import of app.bulk.bulk against the SQLite stand-in of benchmarks.standin. Run it from the
+backend directory:
+
+    python -m pytest tests
+"""
+
+from typing import Any, Dict, List, Sequence, Tuple
+
+import pytest
+from app.auth.hashing import PasswordHasher
+from app.bulk import bulk
+from app.config import db
+
+PASSWORD_HASH = "$2b$04$C6UzMDM.H6dfI/f/IKcEeOxm1w1r2aM/BLSSb/nViS2l8AGQJIV3W"
+
+
+def _users(count: int) -> List[Dict[str, Any]]:
+    return [{"email": f"user{index}@example.com", "name": "Name", "firstname": "Firstname",
+             "password_hash": PASSWORD_HASH} for index in range(count)]
+
+
+@pytest.mark.anyio
+async def test_import_users_racing_registrations(monkeypatch: pytest.MonkeyPatch) -> None:
+    async with db.connect() as connection:
+        await connection.execute("INSERT INTO user (email, name, firstname, password) VALUES (%s, %s, %s, %s)",
+                                 ("user1@example.com", "Registered", "Meanwhile", PASSWORD_HASH))
+        await connection.commit()
+        fetch_all = connection.fetch_all
+        lookups: List[str] = []
+
+        async def racing_fetch_all(query: str, params: Sequence[Any] = ()) -> List[Tuple[Any, ...]]:
+            # The email is registered after every lookup of the batch, which never sees it.
+            if query.startswith("SELECT email FROM user"):
+                lookups.append(query)
+                return []
+            return await fetch_all(query, params)
+
+        monkeypatch.setattr(connection, "fetch_all", racing_fetch_all)
+        hasher: PasswordHasher = PasswordHasher(executor="thread", workers=1)
+        try:
+            report: Dict[str, Any] = await bulk.import_users(
+                db=connection, records=_users(count=3), job="race", batch_size=10, hasher=hasher)
+        finally:
+            hasher.shutdown()
+        assert len(lookups) == bulk.MAX_BATCH_ATTEMPTS
+        assert (report["records"], report["inserted"], report["skipped"], report["failed"]) == (3, 2, 0, 1)
+        assert (await fetch_all("SELECT COUNT(*) FROM user"))[0][0] == 3
+        assert (await fetch_all("SELECT records, inserted, skipped FROM bulk_import WHERE job = %s", ("race",))
+                ) == [(3, 2, 1)]
+
+
+@pytest.mark.anyio
+async def test_import_todos_due_time_in_utc() -> None:
+    async with db.connect() as connection:
+        cursor: Any = await connection.execute(
+            "INSERT INTO user (email, name, firstname, password) VALUES (%s, %s, %s, %s)",
+            ("user0@example.com", "Name", "Firstname", PASSWORD_HASH))
+        await connection.commit()
+        records: List[Dict[str, Any]] = [
+            {"title": title, "description": "", "due_time": due_time, "status": "todo", "user_id": cursor.lastrowid}
+            for title, due_time in (("offset", "2030-01-01T09:00:00+02:00"), ("naive", "2030-01-01T09:00:00"))]
+        report: Dict[str, Any] = await bulk.import_todos(db=connection, records=records, job="utc", batch_size=10)
+        assert report["inserted"] == 2
+        rows: List[Tuple[Any, ...]] = await connection.fetch_all("SELECT title, due_time FROM todo ORDER BY id")
+        assert [(title, str(due_time)[:19]) for title, due_time in rows] == [
+            ("offset", "2030-01-01 07:00:00"), ("naive", "2030-01-01 09:00:00")]
@@ -0,0 +1,43 @@
+"""
+This module checks the todo list cache of app.cache.cache, and that GET /user/todos serves its pages without a
+database connection, against the SQLite stand-in of benchmarks.standin. Run it from the backend directory:
+
+    python -m pytest tests
+"""
+
+from typing import Any
+
+import pytest
+from app import api
+from app.cache.cache import TodoCache
+from benchmarks.common import app_client, bench_user
+
+
+def test_todo_cache_bounds_every_user() -> None:
+    cache: TodoCache = TodoCache(size=4, ttl=60)
+    for variant in range(3):
+        cache.put(user_id=1, variant=variant, value=variant, version=cache.version())
+    for variant in range(3):
+        cache.put(user_id=2, variant=variant, value=variant, version=cache.version())
+    assert cache.stats()["entries"] == 4
+    assert [cache.get(user_id=1, variant=variant) for variant in range(3)] == [None, None, 2]
+    assert [cache.get(user_id=2, variant=variant) for variant in range(3)] == [0, 1, 2]
+    cache.invalidate(user_id=2)
+    assert cache.stats()["entries"] == 1
+    for variant in range(100):
+        cache.put(user_id=3, variant=variant, value=variant, version=cache.version())
+    assert cache.stats()["entries"] == 4
+    assert len(cache._variants[3]) <= 8
+
+
+@pytest.mark.anyio
+async def test_cached_page_without_connection(monkeypatch: pytest.MonkeyPatch) -> None:
+    _, headers = await bench_user()
+    async with app_client() as client:
+        assert (await client.get("/user/todos", headers=headers)).status_code == 200
+
+        def no_connection(*args: Any, **kwargs: Any) -> Any:
+            raise AssertionError("a cached page checked a connection out")
+
+        monkeypatch.setattr(api, "connect", no_connection)
+        assert (await client.get("/user/todos", headers=headers)).status_code == 200
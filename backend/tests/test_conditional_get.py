@@ -0,0 +1,54 @@
+"""
+This module checks the validators of the conditional GET /todos, and the key of the counts cached by GET /todos/stats,
+against the SQLite stand-in of benchmarks.standin. Run it from the backend directory:
+
+    python -m pytest tests
+"""
+
+import httpx
+import pytest
+from app import api
+from app.cache.cache import todo_stats_cache
+from app.config import db
+from benchmarks.common import app_client, bench_user
+
+
+@pytest.mark.anyio
+async def test_todos_validator_moves_on_commit() -> None:
+    user_id, headers = await bench_user()
+    async with app_client() as client:
+        response: httpx.Response = await client.get("/todos", headers=headers)
+        assert "Last-Modified" not in response.headers
+        revalidate: dict[str, str] = {**headers, "If-None-Match": response.headers["ETag"]}
+        async with db.connect() as connection:
+            # The write runs before the next read and commits after it: its change must not be missed.
+            versions = await api._touch_todos(db=connection, user_ids=[user_id])
+            await connection.execute(
+                "INSERT INTO todo (title, description, due_time, status, user_id, version) "
+                "VALUES (%s, %s, %s, %s, %s, %s)", ("Buy groceries", "Milk", "2030-01-01 00:00:00", "todo", user_id,
+                                                     versions[user_id]))
+            assert (await client.get("/todos", headers=revalidate)).status_code == 304
+            await connection.commit()
+        response = await client.get("/todos", headers=revalidate)
+        assert response.status_code == 200
+        assert [todo["title"] for todo in response.json()] == ["Buy groceries"]
+        revalidate["If-None-Match"] = response.headers["ETag"]
+        assert (await client.get("/todos", headers=revalidate)).status_code == 304
+
+
+@pytest.mark.anyio
+async def test_todo_stats_cache_moves_on_commit() -> None:
+    # The counts cached by another test, for another database, may be keyed by the same number of writes.
+    todo_stats_cache.clear()
+    user_id, headers = await bench_user()
+    async with app_client() as client:
+        assert (await client.get("/todos/stats", headers=headers)).json()["total"] == 0
+        async with db.connect() as connection:
+            versions = await api._touch_todos(db=connection, user_ids=[user_id])
+            await connection.execute(
+                "INSERT INTO todo (title, description, due_time, status, user_id, version) "
+                "VALUES (%s, %s, %s, %s, %s, %s)", ("Buy groceries", "Milk", "2030-01-01 00:00:00", "todo", user_id,
+                                                     versions[user_id]))
+            assert (await client.get("/todos/stats", headers=headers)).json()["total"] == 0
+            await connection.commit()
+        assert (await client.get("/todos/stats", headers=headers)).json()["total"] == 1
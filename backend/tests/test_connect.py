@@ -0,0 +1,120 @@
+"""
+This module checks that app.config.db.connect gives its connection back to the pool when its caller is cancelled, and
+that the checkouts and the readiness ping keep to their timeouts, against the SQLite stand-in of benchmarks.standin. Run it from the backend directory:
+
+    python -m pytest tests
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List
+
+import pytest
+from app.config import db
+from fastapi import HTTPException
+
+
+async def _idle(pool: db.ConnectionPool, timeout: float = 5) -> None:
+    deadline: float = time.monotonic() + timeout
+    while pool.stats()["in_use"] and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.anyio
+async def test_cancelled_checkout(pool: db.ConnectionPool, monkeypatch: pytest.MonkeyPatch) -> None:
+    acquire = pool.acquire
+    acquired: threading.Event = threading.Event()
+
+    def slow_acquire(*args: Any, **kwargs: Any) -> Any:
+        time.sleep(0.2)
+        try:
+            return acquire(*args, **kwargs)
+        finally:
+            acquired.set()
+
+    monkeypatch.setattr(pool, "acquire", slow_acquire)
+
+    async def use() -> None:
+        async with db.connect():
+            pass
+
+    task: asyncio.Task[None] = asyncio.create_task(use())
+    await asyncio.sleep(0.05)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    await asyncio.get_running_loop().run_in_executor(None, acquired.wait, 5)
+    await _idle(pool=pool)
+    assert pool.stats()["checkouts"] == 1
+    assert pool.stats()["in_use"] == 0
+
+
+@pytest.mark.anyio
+async def test_cancelled_statement(pool: db.ConnectionPool, monkeypatch: pytest.MonkeyPatch) -> None:
+    events: List[str] = []
+    release = pool.release
+
+    def recorded_release(*args: Any, **kwargs: Any) -> None:
+        events.append("release")
+        release(*args, **kwargs)
+
+    def statement() -> None:
+        time.sleep(0.2)
+        events.append("statement")
+
+    monkeypatch.setattr(pool, "release", recorded_release)
+
+    async def use() -> None:
+        async with db.connect() as connection:
+            await connection.run(statement)
+
+    task: asyncio.Task[None] = asyncio.create_task(use())
+    await asyncio.sleep(0.05)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    await _idle(pool=pool)
+    assert events == ["statement", "release"]
+    assert pool.stats()["in_use"] == 0
+
+
+@pytest.mark.anyio
+async def test_queued_checkouts_time_out(pool: db.ConnectionPool, monkeypatch: pytest.MonkeyPatch) -> None:
+    held: List[Any] = [pool.acquire() for _ in range(pool.size)]
+    executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(pool, "timeout", 0.2)
+    monkeypatch.setattr(db, "_checkout_executor", executor)
+
+    async def use() -> None:
+        async with db.connect():
+            pass
+
+    started: float = time.monotonic()
+    try:
+        # Ten requests share two checkout threads, and still all give up once the pool timeout has passed.
+        results: List[Any] = await asyncio.gather(*(use() for _ in range(10)), return_exceptions=True)
+    finally:
+        for connection in held:
+            pool.release(connection)
+        executor.shutdown(wait=True)
+    assert time.monotonic() - started < 0.6
+    assert all(isinstance(result, HTTPException) and result.status_code == 503 for result in results)
+
+
+@pytest.mark.anyio
+async def test_ping_timeout(pool: db.ConnectionPool, monkeypatch: pytest.MonkeyPatch) -> None:
+    acquire = pool.acquire
+
+    def slow_acquire(*args: Any, **kwargs: Any) -> Any:
+        time.sleep(0.5)
+        return acquire(*args, **kwargs)
+
+    monkeypatch.setattr(pool, "acquire", slow_acquire)
+    started: float = time.monotonic()
+    assert not await db.ping(timeout=0.1)
+    assert time.monotonic() - started < 0.4
+    await asyncio.sleep(0.5)
+    await _idle(pool=pool)
+    assert pool.stats()["in_use"] == 0
@@ -0,0 +1,80 @@
+"""
+This module checks that the streamed export of GET /todos/export gives its connection back to the pool when the
+client disconnects half-way, against the SQLite stand-in of benchmarks.standin. Run it from the backend directory:
+
+    python -m pytest tests
+"""
+
+import asyncio
+import contextlib
+from typing import Any, Dict, List
+
+import pytest
+from app import api
+from app.auth import auth
+from app.config import db
+from benchmarks.common import BENCH_EMAIL, bench_user
+
+
+@pytest.fixture(autouse=True)
+def small_batches(monkeypatch: pytest.MonkeyPatch) -> None:
+    # Small batches, so that the export is still streaming when the client goes away.
+    monkeypatch.setattr(api, "EXPORT_BATCH_SIZE", 10)
+
+
+async def _export(spec_version: str, export_format: str) -> List[bytes]:
+    """
+    Calls GET /todos/export as an ASGI client which disconnects after the first chunk of the body.
+
+    Before ASGI 2.4 the server reports the disconnection through `receive`, and Starlette cancels the stream. From
+    2.4 on, sending to a disconnected client raises OSError instead.
+    """
+    chunks: List[bytes] = []
+    first_chunk: asyncio.Event = asyncio.Event()
+    requested: List[bool] = []
+    scope: Dict[str, Any] = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": spec_version}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": "/todos/export", "raw_path": b"/todos/export",
+        "query_string": f"format={export_format}".encode(), "root_path": "",
+        "headers": [(b"host", b"test"), (b"token", auth.encode_jwt(email=BENCH_EMAIL)["token"].encode())],
+        "client": ("127.0.0.1", 50000), "server": ("test", 80),
+    }
+
+    async def receive() -> Dict[str, Any]:
+        if not requested:
+            requested.append(True)
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await first_chunk.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: Dict[str, Any]) -> None:
+        if message["type"] != "http.response.body" or not message.get("body"):
+            return
+        if first_chunk.is_set() and spec_version >= "2.4":
+            raise OSError("Connection reset by peer")
+        chunks.append(message["body"])
+        first_chunk.set()
+        # Leaves the server the time to see the disconnection before the next chunk.
+        await asyncio.sleep(0.01)
+
+    with contextlib.suppress(Exception):
+        await asyncio.wait_for(api.app(scope, receive, send), timeout=10)
+    return chunks
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("spec_version", ["2.3", "2.4"])
+@pytest.mark.parametrize("export_format", ["ndjson", "json"])
+async def test_client_disconnect(pool: db.ConnectionPool, spec_version: str, export_format: str) -> None:
+    user_id, _ = await bench_user()
+    async with db.connect() as connection:
+        await connection.executemany(
+            "INSERT INTO todo (title, description, due_time, status, user_id) VALUES (%s, %s, %s, %s, %s)",
+            [(f"todo {index}", "exported", "2030-01-01 00:00:00", "todo", user_id) for index in range(1000)])
+        await connection.commit()
+    chunks: List[bytes] = await _export(spec_version=spec_version, export_format=export_format)
+    assert chunks
+    assert sum(chunk.count(b'"title"') for chunk in chunks) < 1000
+    assert pool.stats()["in_use"] == 0
+    async with db.connect() as connection:
+        assert (await connection.fetch_one("SELECT COUNT(*) FROM todo"))[0] == 1000
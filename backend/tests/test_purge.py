@@ -0,0 +1,44 @@
+"""
+This module checks the background purge of the deleted users of app.purge.purge against the SQLite stand-in of
+benchmarks.standin. Run it from the backend directory:
+
+    python -m pytest tests
+"""
+
+from typing import Any, List, Tuple
+
+import pytest
+from app.config import db
+from app.purge import purge
+from benchmarks.common import app_client, bench_user
+
+
+@pytest.mark.anyio
+async def test_purge_claims_each_batch(monkeypatch: pytest.MonkeyPatch) -> None:
+    user_id, headers = await bench_user()
+    async with db.connect() as connection:
+        await connection.execute(
+            "INSERT INTO todo (title, description, due_time, status, user_id) VALUES "
+            + ", ".join(["(%s, %s, %s, %s, %s)"] * 5),
+            [value for index in range(5) for value in (f"todo {index}", "", "2030-01-01 00:00:00", "todo", user_id)])
+        await connection.commit()
+    async with app_client() as client:
+        assert (await client.delete(f"/users/{user_id}", headers=headers)).status_code == 200
+    checkouts: List[int] = []
+    connect = db.connect
+
+    def counting_connect(*args: Any, **kwargs: Any) -> Any:
+        checkouts.append(1)
+        return connect(*args, **kwargs)
+
+    monkeypatch.setattr(purge, "connect", counting_connect)
+    assert await purge.purge_deleted_users(batch_size=2, pause=0) == 1
+    # Two lookups of the pending users, around one checkout per batch of at most 2 todos and one for the user row.
+    assert len(checkouts) == 2 + 3 + 1
+    async with db.connect() as connection:
+        row: Tuple[Any, ...] = await connection.fetch_one(
+            "SELECT todos_total, todos_deleted, finished_at IS NOT NULL FROM user_purge WHERE user_id = %s", (user_id,))
+        assert row == (5, 5, 1)
+        assert await connection.fetch_one("SELECT id FROM user WHERE id = %s", (user_id,)) is None
+    # A finished purge is not claimed again.
+    assert await purge.purge_user(user_id=user_id) is None
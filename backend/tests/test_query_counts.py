@@ -0,0 +1,103 @@
+"""
+This module checks the number of database statements each write endpoint sends, against the SQLite stand-in of
+benchmarks.standin, so that a change adding a round trip to a hot path fails here rather than in production. The
+single row writes must also send no more statements than they did before their changes were versioned, see BASELINE.
+
+The counts are read from the http_request_db_queries metric, which counts the statements sent while handling a
+request, commits and rollbacks excluded. Run it from the backend directory:
+
+    python -m pytest tests
+"""
+
+from typing import Any, Dict, List, Tuple
+
+import httpx
+import pytest
+from app.config import db
+from app.metrics.metrics import http_request_db_queries
+from benchmarks.common import app_client, bench_user
+
+TODO: Dict[str, Any] = {"title": "Buy groceries", "description": "Milk and eggs", "due_time": "2030-01-01T00:00:00",
+                        "status": "todo"}
+
+# The statements sent by the single row writes before the todos were versioned, which none may exceed.
+BASELINE: Dict[Tuple[str, str], int] = {
+    ("PUT", "/todos/{id}"): 3,
+    ("DELETE", "/todos/{id}"): 2,
+    ("PUT", "/users/{id}"): 3,
+    ("PUT", "/users/email/{id}"): 3,
+    ("DELETE", "/users/{id}"): 2,
+}
+
+
+async def _send(client: httpx.AsyncClient, method: str, route: str, url: str,
+                **kwargs: Any) -> Tuple[httpx.Response, int]:
+    before: float = http_request_db_queries.sum(method=method, route=route)
+    response: httpx.Response = await client.request(method, url, **kwargs)
+    return response, int(http_request_db_queries.sum(method=method, route=route) - before)
+
+
+async def _create(client: httpx.AsyncClient, headers: Dict[str, str], user_id: int, count: int) -> List[int]:
+    response: httpx.Response = await client.post(
+        "/todos/batch", headers=headers, json=[{**TODO, "user_id": user_id}] * count)
+    response.raise_for_status()
+    return [result["id"] for result in response.json()["results"]]
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize(("method", "route", "expected"), [
+    ("POST", "/todos", 3),
+    ("PUT", "/todos/{id}", 2),
+    ("DELETE", "/todos/{id}", 2),
+    ("POST", "/todos/batch", 3),
+    ("PUT", "/todos/batch", 3),
+    ("DELETE", "/todos/batch", 4),
+])
+async def test_write_statements(method: str, route: str, expected: int) -> None:
+    user_id, headers = await bench_user()
+    async with app_client() as client:
+        ids: List[int] = await _create(client=client, headers=headers, user_id=user_id, count=3)
+        requests: Dict[Tuple[str, str], Tuple[str, Any]] = {
+            ("POST", "/todos"): ("/todos", {**TODO, "user_id": user_id}),
+            ("PUT", "/todos/{id}"): (f"/todos/{ids[0]}", {**TODO, "title": "Buy bread"}),
+            ("DELETE", "/todos/{id}"): (f"/todos/{ids[0]}", None),
+            ("POST", "/todos/batch"): ("/todos/batch", [{**TODO, "user_id": user_id}] * 3),
+            ("PUT", "/todos/batch"): ("/todos/batch", [{**TODO, "id": todo_id, "title": "Buy bread"}
+                                                       for todo_id in ids]),
+            ("DELETE", "/todos/batch"): ("/todos/batch", {"ids": ids}),
+        }
+        url, body = requests[(method, route)]
+        response, queries = await _send(client=client, method=method, route=route, url=url, headers=headers,
+                                        json=body)
+    assert response.status_code < 300, response.text
+    assert queries == expected
+    assert queries <= BASELINE.get((method, route), queries)
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize(("method", "route", "expected"), [
+    ("PUT", "/users/{id}", 1),
+    ("PUT", "/users/email/{id}", 2),
+    ("DELETE", "/users/{id}", 2),
+])
+async def test_user_write_statements(method: str, route: str, expected: int) -> None:
+    _, headers = await bench_user()
+    async with db.connect() as connection:
+        cursor: Any = await connection.execute(
+            "INSERT INTO user (email, password, name, firstname) VALUES (%s, %s, %s, %s)",
+            ("user@example.com", "-", "Name", "Firstname"))
+        await connection.commit()
+        user_id: int = cursor.lastrowid
+    requests: Dict[Tuple[str, str], Tuple[str, Any]] = {
+        ("PUT", "/users/{id}"): (f"/users/{user_id}", {"email": "renamed@example.com", "password": "password",
+                                                       "name": "Renamed", "firstname": "Firstname"}),
+        ("PUT", "/users/email/{id}"): (f"/users/email/{user_id}", {"email": "renamed@example.com"}),
+        ("DELETE", "/users/{id}"): (f"/users/{user_id}", None),
+    }
+    url, body = requests[(method, route)]
+    async with app_client() as client:
+        response, queries = await _send(client=client, method=method, route=route, url=url, headers=headers,
+                                        json=body)
+    assert response.status_code < 300, response.text
+    assert queries == expected
+    assert queries <= BASELINE[(method, route)]
@@ -0,0 +1,47 @@
+"""
+This module checks that the reads of a client go to the primary after it committed a write, whichever worker serves
+them, against the SQLite stand-in of benchmarks.standin with a replica. Run it from the backend directory:
+
+    python -m pytest tests
+"""
+
+import time
+
+import httpx
+import pytest
+from app.config import db
+from benchmarks import standin
+from benchmarks.common import app_client, bench_user
+
+
+def _pinned_reads() -> int:
+    return db.get_replicas().stats()["routing"]["pinned_reads"]
+
+
+@pytest.mark.anyio
+async def test_reads_follow_the_last_write(database: str) -> None:
+    standin.install(path=database, replicas=1)
+    user_id, headers = await bench_user()
+    async with app_client() as client:
+        response: httpx.Response = await client.get("/user", headers=headers)
+        assert response.status_code == 200
+        assert db.LAST_WRITE_HEADER not in response.headers
+        assert _pinned_reads() == 0
+        response = await client.post("/todos", headers=headers, json={
+            "title": "Buy groceries", "description": "Milk", "due_time": "2030-01-01T00:00:00", "status": "todo",
+            "user_id": user_id})
+        assert response.status_code == 201
+        last_write: str = response.headers[db.LAST_WRITE_HEADER]
+        assert client.cookies[db.LAST_WRITE_COOKIE] == last_write
+        # The cookie alone sends the read to the primary.
+        assert (await client.get("/user", headers=headers)).status_code == 200
+        assert _pinned_reads() == 1
+        client.cookies.clear()
+        assert (await client.get("/user", headers={**headers, db.LAST_WRITE_HEADER: last_write})).status_code == 200
+        assert _pinned_reads() == 2
+        # A forged time is not trusted, and an expired one no longer pins the reads.
+        written_at: float = float(last_write.rpartition(".")[0])
+        for token in (f"{written_at + 1:.6f}.{last_write.rpartition('.')[2]}", "not a token"):
+            assert (await client.get("/user", headers={**headers, db.LAST_WRITE_HEADER: token})).status_code == 200
+        assert _pinned_reads() == 2
+        assert not db.get_replicas().reads_primary(written_at=time.time() - db.READ_YOUR_WRITES_WINDOW)
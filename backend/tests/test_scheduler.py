@@ -0,0 +1,38 @@
+"""
+This module checks that the reminders of app.scheduler.scheduler are posted to the webhook once whatever the number
+of workers firing them, against the SQLite stand-in of benchmarks.standin. Run it from the backend directory:
+
+    python -m pytest tests
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List
+
+import pytest
+from app.config import db
+from app.scheduler import scheduler
+from benchmarks.common import bench_user
+
+
+@pytest.mark.anyio
+async def test_reminders_claimed_once() -> None:
+    user_id, _ = await bench_user()
+    async with db.connect() as connection:
+        await connection.execute(
+            "INSERT INTO todo (title, description, due_time, status, user_id) VALUES (%s, %s, %s, %s, %s), "
+            "(%s, %s, %s, %s, %s)", ("first", "", "2030-01-01 00:00:00", "todo", user_id,
+                                     "second", "", "2030-01-01 00:00:00", "todo", user_id))
+        await connection.commit()
+        todos: List[Dict[str, Any]] = [
+            {"id": row[0], "due_time": datetime.fromisoformat(str(row[1])), "user_id": user_id}
+            for row in await connection.fetch_all("SELECT id, due_time FROM todo ORDER BY id")]
+    assert await scheduler.claim(todos=todos) == todos
+    # Another worker firing the same reminders claims none of them.
+    assert await scheduler.claim(todos=todos) == []
+    async with db.connect() as connection:
+        await connection.execute("UPDATE todo SET due_time = %s WHERE id = %s", ("2030-01-02 00:00:00", todos[1]["id"]))
+        await connection.commit()
+    # A todo due at another time gets a new reminder, and one loaded before the change gets none.
+    assert await scheduler.claim(todos=todos) == []
+    moved: Dict[str, Any] = {**todos[1], "due_time": datetime(2030, 1, 2)}
+    assert await scheduler.claim(todos=[moved]) == [moved]
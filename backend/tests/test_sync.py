@@ -0,0 +1,39 @@
+"""
+This module checks that the todo writes are versioned for the incremental sync of GET /user/todos/changes, against
+the SQLite stand-in of benchmarks.standin. Run it from the backend directory:
+
+    python -m pytest tests
+"""
+
+from typing import Any, Dict, List
+
+import httpx
+import pytest
+from benchmarks.common import app_client, bench_user
+
+TODO: Dict[str, Any] = {"title": "Buy groceries", "description": "Milk and eggs", "due_time": "2030-01-01T00:00:00",
+                        "status": "todo"}
+
+
+@pytest.mark.anyio
+async def test_changes_since_cursor() -> None:
+    user_id, headers = await bench_user()
+    async with app_client() as client:
+        response: httpx.Response = await client.post(
+            "/todos/batch", headers=headers, json=[{**TODO, "user_id": user_id}] * 3)
+        ids: List[int] = [result["id"] for result in response.json()["results"]]
+        cursor: str = (await client.get("/user/todos/changes", headers=headers)).json()["cursor"]
+        response = await client.put(f"/todos/{ids[0]}", headers=headers, json={**TODO, "title": "Buy bread"})
+        assert response.status_code == 200, response.text
+        response = await client.delete(f"/todos/{ids[1]}", headers=headers)
+        assert response.status_code == 200, response.text
+        assert (await client.delete(f"/todos/{ids[1]}", headers=headers)).status_code == 404
+        changes: Dict[str, Any] = (await client.get(
+            "/user/todos/changes", headers=headers, params={"since": cursor})).json()
+        assert [todo["title"] for todo in changes["todos"]] == ["Buy bread"]
+        assert changes["deleted"] == [ids[1]]
+        response = await client.request("DELETE", "/todos/batch", headers=headers, json={"ids": [ids[0], ids[2]]})
+        assert response.status_code < 300, response.text
+        changes = (await client.get("/user/todos/changes", headers=headers,
+                                    params={"since": changes["cursor"]})).json()
+        assert (changes["todos"], sorted(changes["deleted"])) == ([], [ids[0], ids[2]])
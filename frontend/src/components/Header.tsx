@@ -51,6 +51,7 @@ async function IsLoggedIn(): Promise<boolean> {
     return false;
   }
   const response = await fetch(`http://localhost:8000/check_token`, {
+    credentials: "include",
     method: "GET",
     headers: { token: token },
   });
@@ -147,6 +148,7 @@ function Register(): React.ReactElement {
       return;
     }
     const response = await fetch(`http://localhost:8000/register`, {
+      credentials: "include",
       method: "POST",
       headers: { "Content-Type": "application/json" },
       body: JSON.stringify(newUser),
@@ -348,6 +350,7 @@ function Login(): React.ReactElement {
       return;
     }
     const response = await fetch(`http://localhost:8000/login`, {
+      credentials: "include",
       method: "POST",
       headers: { "Content-Type": "application/json" },
       body: JSON.stringify(loginUser),
@@ -474,6 +477,7 @@ function Profile(): React.ReactElement {
   useEffect((): void => {
     const fetchUser: () => Promise<void> = async (): Promise<void> => {
       const response = await fetch("http://localhost:8000/users", {
+        credentials: "include",
         method: "GET",
         headers: { token: token },
       });
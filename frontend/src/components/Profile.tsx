@@ -32,6 +32,7 @@ export default function Profile(): React.ReactElement {
   useEffect((): void => {
     const fetchUser: () => Promise<void> = async (): Promise<void> => {
       const response = await fetch("http://localhost:8000/users", {
+        credentials: "include",
         method: "GET",
         headers: { token: token },
       });
@@ -57,6 +58,7 @@ export default function Profile(): React.ReactElement {
     setIsEditingEmail(false);
 
     const response = await fetch(`http://localhost:8000/users/email/${id}`, {
+      credentials: "include",
       method: "PUT",
       headers: { "Content-Type": "application/json", token: token },
       body: JSON.stringify({
@@ -81,6 +83,7 @@ export default function Profile(): React.ReactElement {
     setIsEditingPassword(false);
 
     const response = await fetch(`http://localhost:8000/users/${id}`, {
+      credentials: "include",
       method: "PUT",
       headers: { "Content-Type": "application/json", token: token },
       body: JSON.stringify({
@@ -59,7 +59,7 @@ const TodosContext: React.Context<{ todos: never[]; fetchTodos: () => void }> =
   });
 
 interface Todo {
-  id: string;
+  id: number;
   title: string;
   description: string;
   created_at: string;
@@ -67,6 +67,12 @@ interface Todo {
   status: string;
 }
 
+interface TodoEvent {
+  type: "created" | "updated" | "deleted" | "resync" | "reminder";
+  todo?: Todo;
+  id?: number;
+}
+
 export default function Todos(): React.ReactElement {
   const [todos, setTodos] = useState([]);
   const [sortColumn, setSortColumn] = useState<string>("id");
@@ -76,14 +82,104 @@ export default function Todos(): React.ReactElement {
     if (!token) {
       return;
     }
-    const response = await fetch("http://localhost:8000/user/todos", {
-      headers: { token: token },
+    let todos: never[] = [];
+    let url: string | null = "http://localhost:8000/user/todos?limit=1000";
+    while (url) {
+      const response: Response = await fetch(url, {
+        credentials: "include",
+        headers: { token: token },
+      });
+      if (response.status !== 200) {
+        return;
+      }
+      todos = todos.concat(await response.json());
+      const cursor: string | null = response.headers.get("X-Next-Cursor");
+      url = cursor
+        ? `http://localhost:8000/user/todos?limit=1000&after=${cursor}`
+        : null;
+    }
+    setTodos(todos);
+  };
+
+  const applyTodoEvent: (event: TodoEvent) => void = (
+    event: TodoEvent
+  ): void => {
+    if (event.type === "resync") {
+      fetchTodos();
+      return;
+    }
+    if (event.type === "reminder") {
+      // A todo came due: its fields did not change.
+      return;
+    }
+    const id: number | undefined = event.todo ? event.todo.id : event.id;
+    setTodos((todos: never[]): never[] => {
+      const others: Todo[] = (todos as Todo[]).filter(
+        (todo: Todo): boolean => todo.id !== id
+      );
+      return (
+        event.type === "deleted" || !event.todo
+          ? others
+          : [...others, event.todo]
+      ) as never[];
     });
-    const todos: React.SetStateAction<never[]> = await response.json();
-    if (response.status !== 200) {
+  };
+
+  // Receives the changes of the todos instead of polling for them. The todos
+  // are fetched once the stream is open, so that no change is missed.
+  const subscribeTodos: (signal: AbortSignal) => Promise<void> = async (
+    signal: AbortSignal
+  ): Promise<void> => {
+    const token: string | null = localStorage.getItem("jwtToken");
+    if (!token) {
       return;
     }
-    setTodos(todos);
+    while (!signal.aborted) {
+      try {
+        const response: Response = await fetch(
+          "http://localhost:8000/user/todos/events",
+          {
+            credentials: "include",
+            headers: { token: token },
+            signal: signal,
+          }
+        );
+        if (response.status !== 200 || !response.body) {
+          fetchTodos();
+          return;
+        }
+        const reader: ReadableStreamDefaultReader<string> = response.body
+          .pipeThrough(new TextDecoderStream())
+          .getReader();
+        let buffer: string = "";
+        let subscribed: boolean = false;
+        for (;;) {
+          const { value, done } = await reader.read();
+          if (done) {
+            break;
+          }
+          if (!subscribed) {
+            subscribed = true;
+            fetchTodos();
+          }
+          const messages: string[] = (buffer + value).split("\n\n");
+          buffer = messages.pop() ?? "";
+          for (const message of messages) {
+            const data: string | undefined = message
+              .split("\n")
+              .find((line: string): boolean => line.startsWith("data:"));
+            if (data) {
+              applyTodoEvent(JSON.parse(data.slice(5)));
+            }
+          }
+        }
+      } catch (error) {
+        if (signal.aborted) {
+          return;
+        }
+      }
+      await new Promise((resolve) => setTimeout(resolve, 3000));
+    }
   };
 
   const sortTodos: (column: string) => void = (column: string): void => {
@@ -97,8 +193,8 @@ export default function Todos(): React.ReactElement {
 
   const sortedTodos: Todo[] = useMemo((): Todo[] => {
     return [...todos].sort((a: Todo, b: Todo): 1 | -1 | 0 => {
-      const columnA: string = a[sortColumn as keyof Todo];
-      const columnB: string = b[sortColumn as keyof Todo];
+      const columnA: string | number = a[sortColumn as keyof Todo];
+      const columnB: string | number = b[sortColumn as keyof Todo];
       if (columnA < columnB) {
         return sortDirection === "asc" ? -1 : 1;
       }
@@ -109,8 +205,10 @@ export default function Todos(): React.ReactElement {
     });
   }, [todos, sortColumn, sortDirection]);
 
-  useEffect((): void => {
-    fetchTodos();
+  useEffect((): (() => void) => {
+    const controller: AbortController = new AbortController();
+    subscribeTodos(controller.signal);
+    return (): void => controller.abort();
   }, []);
   if (!localStorage.getItem("jwtToken")) {
     return (
@@ -197,7 +295,7 @@ function UpdateTodo({
   status,
   due_time,
 }: {
-  id: string;
+  id: number;
   title: string;
   description: string;
   status: string;
@@ -224,6 +322,7 @@ function UpdateTodo({
       return;
     }
     const response = await fetch(`http://localhost:8000/todos/${id}`, {
+      credentials: "include",
       method: "PUT",
       headers: { "Content-Type": "application/json", token: token },
       body: JSON.stringify({
@@ -356,7 +455,7 @@ function UpdateTodo({
   );
 }
 
-function DeleteTodo({ id }: { id: string }): React.ReactElement {
+function DeleteTodo({ id }: { id: number }): React.ReactElement {
   const { isOpen, onOpen, onClose } = useDisclosure();
   const { fetchTodos } = React.useContext(TodosContext);
   const token: string | null = localStorage.getItem("jwtToken");
@@ -365,6 +464,7 @@ function DeleteTodo({ id }: { id: string }): React.ReactElement {
   }
   const handleDelete: () => Promise<void> = async (): Promise<void> => {
     await fetch(`http://localhost:8000/todos/${id}`, {
+      credentials: "include",
       method: "DELETE",
       headers: { "Content-Type": "application/json", token: token },
       body: JSON.stringify({ id: id }),
@@ -432,6 +532,7 @@ function AddTodo(): React.ReactElement {
     }
 
     const response = await fetch("http://localhost:8000/users", {
+      credentials: "include",
       method: "GET",
       headers: { token: token },
     });
@@ -453,6 +554,7 @@ function AddTodo(): React.ReactElement {
     };
 
     await fetch(`http://localhost:8000/todos`, {
+      credentials: "include",
       method: "POST",
       headers: { "Content-Type": "application/json", token: token },
       body: JSON.stringify(newTodo),